@@ -1,18 +1,25 @@
 """
 Bot Matchmaking Worker
 Odpowiedzialność: Autonomiczne zarządzanie botami - tworzenie/dołączanie do lobby
+
+Jeden harmonogram zamiast osobnego taska na każdego bota:
+- widok otwartych lobby w pamięci, aktualizowany zdarzeniami z kanału
+  LOBBY_EVENTS_CHANNEL (zapis/usunięcie lobby publikują skrypty Lua),
+- decyzje (dołącz, stwórz lobby, gotowość, start, wyjście) planowane
+  na kopcu zdarzeń z konfigurowalnymi opóźnieniami,
+- wolne boty przydzielane z puli do lobby z wolnymi miejscami.
+Koszt matchmakingu rośnie z liczbą zdarzeń lobby, a nie boty × lobby × tyknięcia.
 """
 import asyncio
+import heapq
+import itertools
 import random
 import json
 import uuid
 import time
 from datetime import datetime
-from typing import Dict, List, Optional, Set
-from dataclasses import dataclass, field
-
-from database import async_sessionmaker, User
-from sqlalchemy import select
+from typing import Dict, List, Optional, Set, Tuple
+from dataclasses import dataclass
 
 
 # ===========================================
@@ -55,6 +62,22 @@ ROTATION_INTERVAL = 3 * 60 * 60  # 3 godziny
 MIN_ALWAYS_ACTIVE = 2
 
 
+
+# Opóźnienie dołączenia wolnego bota do lobby z wolnym miejscem (sekundy)
+FILL_DELAY_MIN = 15.0
+FILL_DELAY_MAX = 60.0
+
+# Opóźnienie gotowości po dołączeniu i startu gry po zapełnieniu lobby
+READY_DELAY = (2.0, 5.0)
+START_DELAY = (2.0, 5.0)
+
+# Co ile odświeżać obecność aktywnych botów (presence TTL = 180 s)
+PRESENCE_INTERVAL = 60.0
+
+# Szansa na lobby 3-osobowe gdy bot tworzy lobby gry 66
+THREE_PLAYER_CHANCE = 0.10
+
+
 @dataclass
 class BotConfig:
     """Konfiguracja pojedynczego bota"""
@@ -63,39 +86,57 @@ class BotConfig:
     algorytm: str
     avatar_url: str
     
-    # Interwały (w sekundach) - każdy bot ma swoje losowe wartości
-    min_interval: float = field(default_factory=lambda: random.uniform(20.0, 40.0))
-    max_interval: float = field(default_factory=lambda: random.uniform(60.0, 120.0))
-    
     # Stan
     is_active: bool = True
     current_lobby_id: Optional[str] = None
     in_game: bool = False
+    busy: bool = False  # Trwa akcja bota (dołączanie/tworzenie lobby)
+    
+    @property
+    def is_idle(self) -> bool:
+        """Bot wolny - można go przydzielić do lobby"""
+        return self.is_active and not self.busy and not self.current_lobby_id and not self.in_game
 
 
 class BotMatchmakingWorker:
     """
     Worker zarządzający autonomicznymi botami.
-    Każdy bot działa jako osobny task z losowym interwałem.
+    Jeden harmonogram zdarzeń dla wszystkich botów, zasilany zmianami lobby.
     Obsługuje harmonogram godzinowy i rotację botów.
     """
     
     def __init__(self):
         self.bots: Dict[int, BotConfig] = {}
-        self.bot_tasks: Dict[int, asyncio.Task] = {}
+        self._bots_by_name: Dict[str, BotConfig] = {}
         self.is_running: bool = False
         self.redis = None
         
         self.matchmaking_enabled: bool = True
+        # Opóźnienie tworzenia nowego lobby gdy brak wolnych miejsc (sekundy)
         self.min_interval: float = 30.0
         self.max_interval: float = 120.0
+        # Opóźnienie dołączania wolnego bota do lobby z wolnym miejscem (sekundy)
+        self.fill_delay_min: float = FILL_DELAY_MIN
+        self.fill_delay_max: float = FILL_DELAY_MAX
         
         self.preferred_game_type: str = "66"
         self.preferred_players: int = 4
         
+        # Widok lobby w pamięci (id -> podsumowanie z indeksu lobby)
+        self.lobbies: Dict[str, dict] = {}
+        
+        # Kopiec zaplanowanych akcji: (termin, seq, rodzaj, klucz)
+        self._heap: List[Tuple[float, int, str, Optional[object]]] = []
+        self._pending: Dict[Tuple[str, Optional[object]], int] = {}
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        
+        self.scheduler_task: Optional[asyncio.Task] = None
+        self.events_task: Optional[asyncio.Task] = None
+        self._action_tasks: Set[asyncio.Task] = set()
+        
         # Harmonogram i rotacja
         self.active_bot_ids: Set[int] = set()  # Aktualnie aktywne boty
-        self.rotation_task: Optional[asyncio.Task] = None
         self.last_rotation_time: float = 0
     
     async def initialize(self, redis_service):
@@ -104,24 +145,20 @@ class BotMatchmakingWorker:
         await self._load_bots_from_db()
     
     async def _load_bots_from_db(self):
-        """Załaduj wszystkie boty z bazy danych"""
-        async with async_sessionmaker() as session:
-            query = select(User)
-            result = await session.execute(query)
-            users = result.scalars().all()
-            
-            for user in users:
-                try:
-                    settings = json.loads(user.settings) if user.settings else {}
-                    if settings.get('jest_botem'):
-                        self.bots[user.id] = BotConfig(
-                            user_id=user.id,
-                            username=user.username,
-                            algorytm=settings.get('algorytm', 'topplayer'),
-                            avatar_url=user.avatar_url or 'default_avatar.png'
-                        )
-                except:
-                    pass
+        """Załaduj wszystkie boty (z rejestru botów - jedno zapytanie przy starcie)"""
+        from services.bot_registry import bot_registry
+        await bot_registry.ensure_loaded()
+        
+        for info in bot_registry.bots.values():
+            if info.user_id not in self.bots:
+                bot = BotConfig(
+                    user_id=info.user_id,
+                    username=info.username,
+                    algorytm=info.algorytm,
+                    avatar_url=info.avatar_url or 'default_avatar.png'
+                )
+                self.bots[info.user_id] = bot
+                self._bots_by_name[bot.username] = bot
     
     # ===========================================
     # HARMONOGRAM I ROTACJA BOTÓW
@@ -179,96 +216,333 @@ class BotMatchmakingWorker:
         # Nie zatrzymuj botów które są w grze
         to_stop = {bid for bid in to_stop if not self.bots[bid].in_game}
         
-        # Zatrzymaj nadmiarowe boty
+        # Wyłącz nadmiarowe boty (zostają w puli, ale nie są przydzielane)
         for bot_id in to_stop:
-            if bot_id in self.bot_tasks:
-                self.bot_tasks[bot_id].cancel()
-                try:
-                    await self.bot_tasks[bot_id]
-                except asyncio.CancelledError:
-                    pass
-                del self.bot_tasks[bot_id]
-                self.bots[bot_id].is_active = False
-                print(f"🔴 [{self.bots[bot_id].username}] Dezaktywowany (harmonogram: {target_count} botów o {current_hour}:00)")
+            self.bots[bot_id].is_active = False
+            print(f"🔴 [{self.bots[bot_id].username}] Dezaktywowany (harmonogram: {target_count} botów o {current_hour}:00)")
         
-        # Uruchom nowe boty
+        # Włącz nowe boty
         for bot_id in to_start:
-            if bot_id not in self.bot_tasks:
-                bot = self.bots[bot_id]
-                bot.is_active = True
-                task = asyncio.create_task(self._bot_loop(bot))
-                self.bot_tasks[bot_id] = task
-                print(f"🟢 [{bot.username}] Aktywowany (harmonogram: {target_count} botów o {current_hour}:00)")
+            self.bots[bot_id].is_active = True
+            print(f"🟢 [{self.bots[bot_id].username}] Aktywowany (harmonogram: {target_count} botów o {current_hour}:00)")
+        
+        for bot_id, bot in self.bots.items():
+            if bot_id not in bots_to_activate and bot_id not in self.active_bot_ids:
+                bot.is_active = False
         
         # Aktualizuj set aktywnych
-        self.active_bot_ids = set(self.bot_tasks.keys())
+        self.active_bot_ids = (self.active_bot_ids - to_stop) | to_start
         self.last_rotation_time = time.time()
         
         print(f"📅 Harmonogram: {len(self.active_bot_ids)}/{len(self.bots)} botów aktywnych (cel: {target_count}, godzina: {current_hour}:00)")
+        
+        # Nowo aktywne boty mogą wypełnić otwarte lobby
+        self._plan_all()
+    
+    # ===========================================
+    # HARMONOGRAM ZDARZEŃ (KOPIEC)
+    # ===========================================
     
-    async def _rotation_loop(self):
-        """Pętla rotacji botów - wywoływana co ROTATION_INTERVAL"""
+    def _schedule(self, kind: str, key=None, delay: float = 0.0, replace: bool = False):
+        """
+        Zaplanuj akcję za `delay` sekund.
+        Jedna oczekująca akcja na (rodzaj, klucz) - kolejne są ignorowane (chyba że replace).
+        """
+        if (kind, key) in self._pending and not replace:
+            return
+        seq = next(self._seq)
+        due = time.time() + delay
+        self._pending[(kind, key)] = seq
+        heapq.heappush(self._heap, (due, seq, kind, key))
+        if self._heap[0][1] == seq:
+            self._wakeup.set()
+    
+    def _cancel(self, kind: str, key=None):
+        """Anuluj oczekującą akcję (wpis w kopcu zostanie pominięty)"""
+        self._pending.pop((kind, key), None)
+    
+    async def _scheduler_loop(self):
+        """Pętla harmonogramu - śpi do najbliższego terminu lub nowego zdarzenia"""
         while self.is_running:
             try:
-                # Czekaj do następnej rotacji
-                await asyncio.sleep(ROTATION_INTERVAL)
-                
-                if not self.is_running:
-                    break
+                now = time.time()
+                while self._heap and self._heap[0][0] <= now:
+                    _, seq, kind, key = heapq.heappop(self._heap)
+                    if self._pending.get((kind, key)) != seq:
+                        continue  # Anulowana lub zastąpiona
+                    del self._pending[(kind, key)]
+                    self._run_action(kind, key)
                 
-                print(f"\n🔄 === ROTACJA BOTÓW ===")
-                await self._apply_bot_schedule()
+                timeout = self._heap[0][0] - time.time() if self._heap else None
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                print(f"❌ Błąd harmonogramu botów: {e}")
+                await asyncio.sleep(1)
+    
+    def _run_action(self, kind: str, key):
+        """Uruchom akcję jako krótki task (start gry może trwać dłużej)"""
+        handler = {
+            'fill': self._action_fill,
+            'create': self._action_create,
+            'ready': self._action_ready,
+            'start': self._action_start,
+            'leave': self._action_leave,
+            'presence': self._action_presence,
+            'rotation': self._action_rotation,
+        }[kind]
+        task = asyncio.create_task(self._guarded(kind, handler, key))
+        self._action_tasks.add(task)
+        task.add_done_callback(self._action_tasks.discard)
+    
+    async def _guarded(self, kind: str, handler, key):
+        try:
+            if key is None:
+                await handler()
+            else:
+                await handler(key)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"❌ Błąd akcji botów [{kind}]: {e}")
+    
+    # ===========================================
+    # WIDOK LOBBY (ZDARZENIA)
+    # ===========================================
+    
+    async def _events_loop(self):
+        """Subskrypcja zmian lobby; po każdym (ponownym) połączeniu - resynchronizacja z indeksu"""
+        from services.redis_service import LOBBY_EVENTS_CHANNEL, normalize_lobby
+        from redis_utils import open_pubsub
+        
+        while self.is_running:
+            pubsub = None
+            try:
+                pubsub = open_pubsub(self.redis.redis)
+                await pubsub.subscribe(LOBBY_EVENTS_CHANNEL)
+                await self._resync()
                 
+                async for message in pubsub.listen():
+                    if message.get('type') != 'message':
+                        continue
+                    try:
+                        event = json.loads(message['data'])
+                    except (ValueError, TypeError):
+                        continue
+                    if event.get('type') == 'saved' and isinstance(event.get('summary'), dict):
+                        self._on_lobby_saved(event['id'], normalize_lobby(event['summary']))
+                    elif event.get('type') == 'deleted':
+                        self._on_lobby_deleted(event['id'])
             except asyncio.CancelledError:
                 break
             except Exception as e:
-                print(f"❌ Błąd rotacji botów: {e}")
-                await asyncio.sleep(60)  # Czekaj minutę przed ponowną próbą
+                print(f"❌ Boty - błąd subskrypcji zdarzeń lobby: {e}")
+                await asyncio.sleep(5)
+            finally:
+                if pubsub is not None:
+                    try:
+                        await pubsub.close()
+                    except Exception:
+                        pass
+    
+    async def _resync(self):
+        """Zbuduj widok lobby od nowa z indeksu (start i ponowne połączenie)"""
+        summaries = await self.redis.list_lobby_summaries(status=['LOBBY', 'W_GRZE', 'ZAKONCZONA'])
+        
+        self.lobbies.clear()
+        for bot in self.bots.values():
+            bot.current_lobby_id = None
+            bot.in_game = False
+        
+        for summary in summaries:
+            lobby_id = summary.get('id_gry')
+            if lobby_id:
+                self._on_lobby_saved(lobby_id, summary)
+        
+        self._plan_supply()
     
-    async def _sync_bot_lobby_states(self):
-        """Synchronizuj stan botów z Redis"""
-        if not self.redis:
+    def _on_lobby_saved(self, lobby_id: str, summary: dict):
+        """Zdarzenie: lobby zapisane (utworzone, zmiana slotów, zmiana statusu)"""
+        status = summary.get('status', 'LOBBY')
+        names = set(summary.get('gracze') or [])
+        
+        # Stan botów z listy graczy lobby
+        for name in names:
+            bot = self._bots_by_name.get(name)
+            if bot:
+                bot.current_lobby_id = lobby_id
+                bot.in_game = (status == 'W_GRZE')
+        for bot in self.bots.values():
+            if bot.current_lobby_id == lobby_id and bot.username not in names:
+                bot.current_lobby_id = None
+                bot.in_game = False
+        
+        self.lobbies[lobby_id] = summary
+        self._plan_lobby(lobby_id, summary)
+        self._plan_supply()
+    
+    def _on_lobby_deleted(self, lobby_id: str):
+        """Zdarzenie: lobby usunięte"""
+        self.lobbies.pop(lobby_id, None)
+        for kind in ('fill', 'start', 'leave'):
+            self._cancel(kind, lobby_id)
+        for bot in self.bots.values():
+            if bot.current_lobby_id == lobby_id:
+                bot.current_lobby_id = None
+                bot.in_game = False
+        self._plan_supply()
+    
+    def _bots_in(self, lobby_id: str) -> List[BotConfig]:
+        return [bot for bot in self.bots.values() if bot.current_lobby_id == lobby_id]
+    
+    def _is_joinable(self, summary: dict) -> bool:
+        """Lobby, do którego bot może dołączyć"""
+        return (
+            summary.get('status') == 'LOBBY'
+            and summary.get('typ_gry') == self.preferred_game_type
+            and not summary.get('has_password')
+            and (summary.get('players') or 0) < (summary.get('max_graczy') or 4)
+        )
+    
+    def _has_idle_bot(self) -> bool:
+        return any(bot.is_idle for bot in self.bots.values())
+    
+    def _plan_lobby(self, lobby_id: str, summary: dict):
+        """Zaplanuj akcje botów dla jednego lobby po jego zmianie"""
+        if not self.matchmaking_enabled:
+            return
+        
+        status = summary.get('status')
+        bots_inside = self._bots_in(lobby_id)
+        
+        if status == 'ZAKONCZONA':
+            if bots_inside:
+                self._schedule('leave', lobby_id, random.uniform(self.min_interval, self.max_interval))
+            return
+        
+        if status != 'LOBBY':
+            self._cancel('fill', lobby_id)
+            self._cancel('start', lobby_id)
+            return
+        
+        # Dołączanie wolnych botów planuje _plan_supply
+        if not self._is_joinable(summary):
+            self._cancel('fill', lobby_id)
+        
+        # Pełne lobby z botem - sprawdź gotowość i wystartuj (zmiana gotowości też jest zdarzeniem)
+        full = (summary.get('players') or 0) >= (summary.get('max_graczy') or 4)
+        if full and bots_inside:
+            self._schedule('start', lobby_id, random.uniform(*START_DELAY))
+    
+    def _plan_supply(self):
+        """
+        Wolne boty -> zaplanuj dołączenie do lobby z wolnym miejscem,
+        a gdy takiego nie ma - stworzenie nowego lobby
+        """
+        if not self.matchmaking_enabled or not self._has_idle_bot():
+            self._cancel('create')
+            return
+        
+        joinable = [lobby_id for lobby_id, s in self.lobbies.items() if self._is_joinable(s)]
+        if joinable:
+            self._cancel('create')
+            for lobby_id in joinable:
+                self._schedule('fill', lobby_id, random.uniform(self.fill_delay_min, self.fill_delay_max))
+            return
+        self._schedule('create', None, random.uniform(self.min_interval, self.max_interval))
+    
+    def _plan_all(self):
+        """Przeplanuj wszystko z widoku (np. po włączeniu matchmakingu)"""
+        for lobby_id, summary in list(self.lobbies.items()):
+            self._plan_lobby(lobby_id, summary)
+        self._plan_supply()
+    
+    def _pick_idle_bot(self) -> Optional[BotConfig]:
+        idle = [bot for bot in self.bots.values() if bot.is_idle]
+        return random.choice(idle) if idle else None
+    
+    # ===========================================
+    # AKCJE
+    # ===========================================
+    
+    async def _action_fill(self, lobby_id: str):
+        """Przydziel wolnego bota do lobby z wolnym miejscem"""
+        summary = self.lobbies.get(lobby_id)
+        if not self.matchmaking_enabled or not summary or not self._is_joinable(summary):
             return
         
+        bot = self._pick_idle_bot()
+        if bot:
+            await self._join_lobby(bot, lobby_id)
+    
+    async def _action_create(self):
+        """Wolny bot tworzy nowe lobby"""
+        if not self.matchmaking_enabled:
+            return
+        if any(self._is_joinable(s) for s in self.lobbies.values()):
+            return
+        
+        bot = self._pick_idle_bot()
+        if bot:
+            await self._create_lobby(bot)
+    
+    async def _action_ready(self, bot_id: int):
+        """Bot zgłasza gotowość w swoim lobby"""
+        bot = self.bots.get(bot_id)
+        if not bot or not bot.current_lobby_id:
+            return
+        
+        lobby_id = bot.current_lobby_id
+        lobby, error, _ = await self._lobby_service().set_ready(
+            lobby_id, user_id=bot.user_id, value=True, require_status='LOBBY'
+        )
+        if error:
+            return
+        
+        # LOG: Jest gotowy
+        print(f"🤖 [{bot.username}] Jest gotowy w lobby {lobby_id}")
+        
+        await self._broadcast_lobby_update(lobby_id, lobby, f"{bot.username} jest gotowy")
+    
+    async def _action_start(self, lobby_id: str):
+        """Pełne lobby, wszyscy gotowi, host jest botem -> start gry"""
+        if self.matchmaking_enabled:
+            await self._try_start_game(lobby_id)
+    
+    async def _action_leave(self, lobby_id: str):
+        """Boty wychodzą z zakończonej gry"""
+        summary = self.lobbies.get(lobby_id)
+        if not summary or summary.get('status') != 'ZAKONCZONA':
+            return
+        for bot in self._bots_in(lobby_id):
+            await self._remove_bot_from_lobby(bot, lobby_id)
+    
+    async def _action_presence(self):
+        """Obecność aktywnych botów (oznaczonych jako boty w indeksie presence)"""
+        from services.presence_service import presence_service
+        
+        for bot in self.bots.values():
+            if bot.is_active or bot.in_game:
+                await presence_service.touch(bot.user_id, is_bot=True)
+        self._schedule('presence', None, PRESENCE_INTERVAL)
+    
+    async def _action_rotation(self):
+        """Rotacja botów - co ROTATION_INTERVAL"""
+        print(f"\n🔄 === ROTACJA BOTÓW ===")
         try:
-            lobbies = await self.redis.list_lobbies()
-            
-            for lobby in lobbies:
-                lobby_id = lobby.get('id_gry')
-                status = lobby.get('status_partii', '')
-                
-                for slot in lobby.get('slots', []):
-                    user_id = slot.get('id_uzytkownika')
-                    if user_id and user_id in self.bots:
-                        bot = self.bots[user_id]
-                        
-                        if status == 'ZAKONCZONA':
-                            await self._remove_bot_from_lobby(bot, lobby_id, lobby)
-                        elif status in ['LOBBY', 'W_GRZE']:
-                            bot.current_lobby_id = lobby_id
-                            bot.in_game = (status == 'W_GRZE')
-        except Exception as e:
-            pass
+            await self._apply_bot_schedule()
+        finally:
+            self._schedule('rotation', None, ROTATION_INTERVAL)
     
-    async def _remove_bot_from_lobby(self, bot: BotConfig, lobby_id: str, lobby: dict):
+    async def _remove_bot_from_lobby(self, bot: BotConfig, lobby_id: str):
         """Usuń bota z lobby"""
         try:
-            slots = lobby.get('slots', [])
-            changed = False
-            
-            for slot in slots:
-                if slot.get('id_uzytkownika') == bot.user_id:
-                    slot['typ'] = 'pusty'
-                    slot['id_uzytkownika'] = None
-                    slot['nazwa'] = None
-                    slot['ready'] = False
-                    slot['avatar_url'] = None
-                    slot['is_host'] = False
-                    changed = True
-                    break
-            
-            if changed:
-                await self.redis.save_lobby(lobby_id, lobby)
+            await self._lobby_service().leave(lobby_id, bot.user_id, keep_lobby=True)
             
             bot.current_lobby_id = None
             bot.in_game = False
@@ -280,190 +554,73 @@ class BotMatchmakingWorker:
         if self.is_running:
             return
         
-        await self._sync_bot_lobby_states()
-        
         self.is_running = True
         
-        # Zastosuj harmonogram zamiast uruchamiać wszystkie boty
+        # Zastosuj harmonogram (aktywne boty) i uruchom harmonogram zdarzeń
         print(f"\n🤖 === START SYSTEMU BOTÓW ===")
         print(f"🤖 Załadowano {len(self.bots)} botów")
         await self._apply_bot_schedule()
         
-        # Uruchom pętlę rotacji
-        self.rotation_task = asyncio.create_task(self._rotation_loop())
+        self._schedule('presence', None, 0)
+        self._schedule('rotation', None, ROTATION_INTERVAL)
+        self.scheduler_task = asyncio.create_task(self._scheduler_loop())
+        self.events_task = asyncio.create_task(self._events_loop())
     
     async def stop(self):
-        """Zatrzymaj wszystkie boty i rotację"""
+        """Zatrzymaj harmonogram, nasłuch zdarzeń i akcje w toku"""
         self.is_running = False
         
-        # Zatrzymaj rotację
-        if self.rotation_task:
-            self.rotation_task.cancel()
-            try:
-                await self.rotation_task
-            except asyncio.CancelledError:
-                pass
-            self.rotation_task = None
-        
-        # Zatrzymaj wszystkie boty
-        for user_id, task in self.bot_tasks.items():
-            task.cancel()
-            try:
-                await task
-            except asyncio.CancelledError:
-                pass
+        tasks = [self.scheduler_task, self.events_task, *self._action_tasks]
+        for task in tasks:
+            if task and not task.done():
+                task.cancel()
+        for task in tasks:
+            if task:
+                try:
+                    await task
+                except (asyncio.CancelledError, Exception):
+                    pass
         
-        self.bot_tasks.clear()
+        self.scheduler_task = None
+        self.events_task = None
+        self._action_tasks.clear()
+        self._heap.clear()
+        self._pending.clear()
         self.active_bot_ids.clear()
         print("🛑 System botów zatrzymany")
     
-    async def _bot_loop(self, bot: BotConfig):
-        """Główna pętla pojedynczego bota"""
-        initial_delay = random.uniform(5.0, 60.0)
-        await asyncio.sleep(initial_delay)
-        
-        # LOG: Start bota
-        print(f"🤖 [{bot.username}] Start (algorytm: {bot.algorytm}, interwał: {bot.min_interval:.0f}-{bot.max_interval:.0f}s)")
-        
-        while self.is_running and bot.is_active:
-            try:
-                interval = random.uniform(bot.min_interval, bot.max_interval)
-                await asyncio.sleep(interval)
-                
-                if not self.matchmaking_enabled:
-                    continue
-                
-                if bot.current_lobby_id:
-                    lobby = await self.redis.get_lobby(bot.current_lobby_id)
-                    
-                    if not lobby:
-                        bot.current_lobby_id = None
-                        bot.in_game = False
-                        continue
-                    
-                    status = lobby.get('status_partii', '')
-                    
-                    if status == 'W_GRZE':
-                        bot.in_game = True
-                        continue
-                    elif status == 'ZAKONCZONA':
-                        await self._remove_bot_from_lobby(bot, bot.current_lobby_id, lobby)
-                        continue
-                    elif status == 'LOBBY':
-                        bot.in_game = False
-                        await self._try_start_game(bot, lobby)
-                        continue
-                    else:
-                        bot.current_lobby_id = None
-                        bot.in_game = False
-                        continue
-                
-                await self._matchmake(bot)
-                
-            except asyncio.CancelledError:
-                break
-            except Exception as e:
-                await asyncio.sleep(10)
+    def _lobby_service(self):
+        """Atomowe operacje na slotach lobby"""
+        from services.lobby_service import LobbyService
+        return LobbyService(self.redis)
     
-    async def _matchmake(self, bot: BotConfig):
-        """Znajdź lub stwórz lobby dla bota"""
-        lobbies = await self.redis.list_lobbies()
+    async def _join_lobby(self, bot: BotConfig, lobby_id: str) -> bool:
+        """Bot dołącza do istniejącego lobby (gotowość planowana osobno)"""
+        if bot.current_lobby_id and bot.current_lobby_id != lobby_id:
+            return False
         
-        # Sprawdź czy bot nie jest już gdzieś
-        for lobby in lobbies:
-            status = lobby.get('status_partii', '')
-            if status not in ['LOBBY', 'W_GRZE']:
-                continue
+        bot.busy = True
+        try:
+            # Atomowo: sprawdzenie statusu, wolnego slotu i zajęcie go
+            lobby, error, info = await self._lobby_service().join(
+                lobby_id, bot.user_id, bot.username,
+                avatar_url=bot.avatar_url, require_status='LOBBY'
+            )
+            if error:
+                return False
             
-            for slot in lobby.get('slots', []):
-                if slot.get('id_uzytkownika') == bot.user_id:
-                    lobby_id = lobby.get('id_gry')
-                    bot.current_lobby_id = lobby_id
-                    bot.in_game = (status == 'W_GRZE')
-                    return
-        
-        # Filtruj dostępne lobby
-        available = []
-        for lobby in lobbies:
-            if lobby.get('status_partii') != 'LOBBY':
-                continue
+            bot.current_lobby_id = lobby_id
+            if info.get('already'):
+                return True
             
-            opcje = lobby.get('opcje', {})
-            if opcje.get('typ_gry') != self.preferred_game_type:
-                continue
+            # LOG: Dołączył do lobby
+            print(f"🤖 [{bot.username}] Dołączył do lobby {lobby_id}")
             
-            slots = lobby.get('slots', [])
-            empty_slots = [s for s in slots if s.get('typ') == 'pusty']
-            if empty_slots:
-                available.append(lobby)
-        
-        if available:
-            lobby = random.choice(available)
-            await self._join_lobby(bot, lobby)
-        else:
-            if random.random() < 0.3:
-                await self._create_lobby(bot)
-    
-    async def _join_lobby(self, bot: BotConfig, lobby: dict):
-        """Bot dołącza do istniejącego lobby"""
-        lobby_id = lobby.get('id_gry')
-        
-        if bot.current_lobby_id and bot.current_lobby_id != lobby_id:
-            return
-        
-        lobby = await self.redis.get_lobby(lobby_id)
-        if not lobby or lobby.get('status_partii') != 'LOBBY':
-            return
-        
-        slots = lobby.get('slots', [])
-        
-        for slot in slots:
-            if slot.get('id_uzytkownika') == bot.user_id:
-                bot.current_lobby_id = lobby_id
-                return
-        
-        empty_slot = None
-        for slot in slots:
-            if slot.get('typ') == 'pusty':
-                empty_slot = slot
-                break
-        
-        if not empty_slot:
-            return
-        
-        empty_slot['typ'] = 'gracz'
-        empty_slot['id_uzytkownika'] = bot.user_id
-        empty_slot['nazwa'] = bot.username
-        empty_slot['ready'] = False
-        empty_slot['avatar_url'] = bot.avatar_url
-        
-        await self.redis.save_lobby(lobby_id, lobby)
-        bot.current_lobby_id = lobby_id
-        
-        # LOG: Dołączył do lobby
-        print(f"🤖 [{bot.username}] Dołączył do lobby {lobby_id}")
-        
-        await self._broadcast_lobby_update(lobby_id, lobby, f"{bot.username} dołączył do lobby")
-        
-        delay = random.uniform(2.0, 5.0)
-        await asyncio.sleep(delay)
-        
-        lobby = await self.redis.get_lobby(lobby_id)
-        if not lobby or lobby.get('status_partii') != 'LOBBY':
-            return
-        
-        for slot in lobby.get('slots', []):
-            if slot.get('id_uzytkownika') == bot.user_id:
-                slot['ready'] = True
-                break
-        
-        await self.redis.save_lobby(lobby_id, lobby)
-        
-        # LOG: Jest gotowy
-        print(f"🤖 [{bot.username}] Jest gotowy w lobby {lobby_id}")
-        
-        await self._broadcast_lobby_update(lobby_id, lobby, f"{bot.username} jest gotowy")
-        await self._try_start_game(bot, lobby)
+            await self._broadcast_lobby_update(lobby_id, lobby, f"{bot.username} dołączył do lobby")
+            self._schedule('ready', bot.user_id, random.uniform(*READY_DELAY), replace=True)
+            return True
+        finally:
+            bot.busy = False
     
     async def _create_lobby(self, bot: BotConfig):
         """Bot tworzy nowe lobby"""
@@ -473,7 +630,7 @@ class BotMatchmakingWorker:
         game_id = str(uuid.uuid4())[:8]
         
         # 10% szans na lobby 3-osobowe dla gry 66
-        if self.preferred_game_type == "66" and random.random() < 0.10:
+        if self.preferred_game_type == "66" and random.random() < THREE_PLAYER_CHANCE:
             num_players = 3
             print(f"🎲 [{bot.username}] Tworzy lobby 3-osobowe (10% szans)")
         else:
@@ -521,63 +678,23 @@ class BotMatchmakingWorker:
             "created_at": time.time()
         }
         
-        await self.redis.save_lobby(game_id, lobby_data)
         bot.current_lobby_id = game_id
+        await self.redis.save_lobby(game_id, lobby_data)
         
         # LOG: Stworzył lobby
         print(f"🤖 [{bot.username}] Stworzył lobby {game_id}")
         
-        delay = random.uniform(2.0, 5.0)
-        await asyncio.sleep(delay)
-        
-        lobby_data = await self.redis.get_lobby(game_id)
-        if not lobby_data or lobby_data.get('status_partii') != 'LOBBY':
-            return
-        
-        for slot in lobby_data.get('slots', []):
-            if slot.get('id_uzytkownika') == bot.user_id:
-                slot['ready'] = True
-                break
-        
-        await self.redis.save_lobby(game_id, lobby_data)
-        
-        # LOG: Jest gotowy
-        print(f"🤖 [{bot.username}] Jest gotowy w lobby {game_id}")
+        self._schedule('ready', bot.user_id, random.uniform(*READY_DELAY), replace=True)
     
-    async def _try_start_game(self, bot: BotConfig, lobby: dict):
-        """Sprawdź czy lobby jest pełne i wystartuj grę"""
-        slots = lobby.get('slots', [])
-        lobby_id = lobby.get('id_gry')
-        
-        occupied_slots = [s for s in slots if s.get('typ') in ['gracz', 'bot']]
-        max_players = lobby.get('max_graczy', 4)
-        
-        if len(occupied_slots) < max_players:
-            return
-        
-        all_ready = all(s.get('ready', False) for s in occupied_slots)
-        if not all_ready:
-            return
-        
-        is_host = False
-        for slot in slots:
-            if slot.get('id_uzytkownika') == bot.user_id and slot.get('is_host'):
-                is_host = True
-                break
-        
-        if not is_host:
-            return
-        
-        delay = random.uniform(2.0, 5.0)
-        print(f"🤖 [{bot.username}] Wszyscy gotowi - start za {delay:.1f}s")
-        await asyncio.sleep(delay)
-        
+    async def _try_start_game(self, lobby_id: str):
+        """Sprawdź czy lobby jest pełne, wszyscy gotowi i host jest botem - wystartuj grę"""
         lobby = await self.redis.get_lobby(lobby_id)
         if not lobby or lobby.get('status_partii') != 'LOBBY':
             return
         
         slots = lobby.get('slots', [])
         occupied_slots = [s for s in slots if s.get('typ') in ['gracz', 'bot']]
+        max_players = lobby.get('max_graczy', 4)
         if len(occupied_slots) < max_players:
             return
         
@@ -585,11 +702,20 @@ class BotMatchmakingWorker:
         if not all_ready:
             return
         
+        host = next((s for s in slots if s.get('is_host')), None)
+        bot = self.bots.get(host.get('id_uzytkownika')) if host else None
+        if not bot:
+            return
+        
         # LOG: Startuje grę
         print(f"🤖 [{bot.username}] Startuje grę w lobby {lobby_id}")
         
-        lobby['status_partii'] = 'W_GRZE'
-        await self.redis.save_lobby(lobby_id, lobby)
+        # Atomowo LOBBY -> W_GRZE z ponownym sprawdzeniem slotów i gotowości
+        # (ktoś mógł wyjść albo host-człowiek wystartować w międzyczasie)
+        lobby_service = self._lobby_service()
+        lobby, error, _ = await lobby_service.start(lobby_id, host_id=bot.user_id, all_ready=True)
+        if error:
+            return
         
         await self._broadcast_game_start(lobby_id, lobby)
         
@@ -599,8 +725,7 @@ class BotMatchmakingWorker:
             await game_service.initialize_game(lobby_id, lobby, self.redis)
             bot.in_game = True
         except Exception as e:
-            lobby['status_partii'] = 'LOBBY'
-            await self.redis.save_lobby(lobby_id, lobby)
+            await lobby_service.set_status(lobby_id, 'LOBBY', expected='W_GRZE')
     
     async def _broadcast_lobby_update(self, lobby_id: str, lobby: dict, message: str):
         """Wyślij aktualizację lobby przez WebSocket"""
@@ -632,26 +757,22 @@ class BotMatchmakingWorker:
     
     def mark_bot_game_ended(self, username: str):
         """Oznacz że gra bota się zakończyła"""
-        for bot in self.bots.values():
-            if bot.username == username:
-                bot.current_lobby_id = None
-                bot.in_game = False
-                return True
+        bot = self._bots_by_name.get(username)
+        if bot:
+            bot.current_lobby_id = None
+            bot.in_game = False
+            self._plan_supply()
+            return True
         return False
     
     def is_bot(self, username: str) -> bool:
         """Sprawdź czy gracz o danej nazwie jest botem"""
-        for bot in self.bots.values():
-            if bot.username == username:
-                return True
-        return False
+        return username in self._bots_by_name
     
     def get_bot_algorithm(self, username: str) -> Optional[str]:
         """Pobierz algorytm bota"""
-        for bot in self.bots.values():
-            if bot.username == username:
-                return bot.algorytm
-        return None
+        bot = self._bots_by_name.get(username)
+        return bot.algorytm if bot else None
     
     # ==========================================
     # ADMIN API
@@ -659,12 +780,7 @@ class BotMatchmakingWorker:
     
     async def force_bot_to_lobby(self, bot_username: str, lobby_id: str) -> bool:
         """Admin: Wymuś dołączenie bota do konkretnego lobby"""
-        bot = None
-        for b in self.bots.values():
-            if b.username == bot_username:
-                bot = b
-                break
-        
+        bot = self._bots_by_name.get(bot_username)
         if not bot:
             return False
         
@@ -678,7 +794,7 @@ class BotMatchmakingWorker:
         if bot.current_lobby_id and bot.current_lobby_id != lobby_id:
             await self._leave_lobby(bot)
         
-        await self._join_lobby(bot, lobby)
+        await self._join_lobby(bot, lobby_id)
         return True
     
     async def _leave_lobby(self, bot: BotConfig):
@@ -686,38 +802,31 @@ class BotMatchmakingWorker:
         if not bot.current_lobby_id:
             return
         
-        lobby = await self.redis.get_lobby(bot.current_lobby_id)
-        if not lobby:
-            bot.current_lobby_id = None
-            return
-        
-        for slot in lobby.get('slots', []):
-            if slot.get('id_uzytkownika') == bot.user_id:
-                slot['typ'] = 'pusty'
-                slot['id_uzytkownika'] = None
-                slot['nazwa'] = None
-                slot['ready'] = False
-                slot['avatar_url'] = None
-                break
-        
-        await self.redis.save_lobby(bot.current_lobby_id, lobby)
+        await self._lobby_service().leave(bot.current_lobby_id, bot.user_id, keep_lobby=True)
         bot.current_lobby_id = None
     
     def set_matchmaking_enabled(self, enabled: bool):
         """Admin: Włącz/wyłącz matchmaking"""
         self.matchmaking_enabled = enabled
+        if enabled:
+            self._plan_all()
     
     def set_bot_active(self, bot_username: str, active: bool) -> bool:
         """Admin: Włącz/wyłącz konkretnego bota (nie można wyłączyć podczas gry)"""
-        for bot in self.bots.values():
-            if bot.username == bot_username:
-                # Zabezpieczenie: nie wyłączaj bota który jest w grze
-                if not active and bot.in_game:
-                    print(f"⚠️ Nie można wyłączyć bota {bot_username} - jest w grze")
-                    return False
-                bot.is_active = active
-                return True
-        return False
+        bot = self._bots_by_name.get(bot_username)
+        if not bot:
+            return False
+        # Zabezpieczenie: nie wyłączaj bota który jest w grze
+        if not active and bot.in_game:
+            print(f"⚠️ Nie można wyłączyć bota {bot_username} - jest w grze")
+            return False
+        bot.is_active = active
+        if active:
+            self.active_bot_ids.add(bot.user_id)
+            self._plan_all()
+        else:
+            self.active_bot_ids.discard(bot.user_id)
+        return True
     
     def get_status(self) -> dict:
         """Admin: Pobierz status wszystkich botów"""
@@ -730,7 +839,8 @@ class BotMatchmakingWorker:
             "is_running": self.is_running,
             "total_bots": len(self.bots),
             "active_bots": len(self.active_bot_ids),
-            "active_tasks": len(self.bot_tasks),
+            "scheduled_actions": len(self._pending),
+            "open_lobbies": len([s for s in self.lobbies.values() if self._is_joinable(s)]),
             "schedule": {
                 "current_hour": current_hour,
                 "target_bots": target_count,
@@ -740,6 +850,8 @@ class BotMatchmakingWorker:
             "config": {
                 "min_interval": self.min_interval,
                 "max_interval": self.max_interval,
+                "fill_delay_min": self.fill_delay_min,
+                "fill_delay_max": self.fill_delay_max,
                 "preferred_game_type": self.preferred_game_type,
                 "preferred_players": self.preferred_players
             },
@@ -749,8 +861,7 @@ class BotMatchmakingWorker:
                     "algorytm": bot.algorytm,
                     "is_active": bot.user_id in self.active_bot_ids,
                     "in_game": bot.in_game,
-                    "current_lobby": bot.current_lobby_id,
-                    "interval": f"{bot.min_interval:.0f}-{bot.max_interval:.0f}s"
+                    "current_lobby": bot.current_lobby_id
                 }
                 for bot in self.bots.values()
             ]
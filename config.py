@@ -14,6 +14,26 @@ class Settings(BaseSettings):
     REDIS_DB: int = 0
     REDIS_PASSWORD: Optional[str] = None
     
+    # Magazyn stanu: "redis" (serwer Redis), "cluster" (Redis Cluster)
+    # lub "memory" (w procesie - jeden serwer, testy, benchmarki)
+    STORAGE_BACKEND: str = "redis"
+    # Backend "cluster": węzły startowe "host:port,host:port" (None = REDIS_HOST:REDIS_PORT)
+    REDIS_CLUSTER_NODES: Optional[str] = None
+    # Backend "memory": plik snapshotu (None = bez zapisu na dysk) i interwał zapisu (sekundy)
+    STORAGE_SNAPSHOT_PATH: Optional[str] = None
+    STORAGE_SNAPSHOT_INTERVAL: int = 60
+    # Domyślny limit round-tripów do Redis na żądanie HTTP (0 = bez limitu);
+    # przekroczenie jest logowane i widoczne w /api/admin/stats
+    REDIS_ROUNDTRIP_BUDGET: int = 10
+    # Dev/testy: przekroczenie budżetu rzuca RoundTripBudgetExceeded (500 z tracebackiem)
+    REDIS_ROUNDTRIP_BUDGET_STRICT: bool = False
+    # Mikro-cache publicznych GET (/api/stats, ranking, lista lobby, health) + ETag/304
+    RESPONSE_CACHE_ENABLED: bool = True
+    
+    # Pliki statyczne serwowane przez aplikację (bez nginx): katalog i prekompresja gzip/brotli
+    STATIC_DIR: str = "static"
+    STATIC_PRECOMPRESS: bool = True
+    
     # JWT
     SECRET_KEY: str = "your-secret-key-here-change-in-production"
     ALGORITHM: str = "HS256"
@@ -36,7 +56,14 @@ class Settings(BaseSettings):
 settings = Settings()
 
 # Redis keys prefixes
+# Hash tagi ({...}) wyznaczają slot w Redis Cluster:
+# - klucze jednej gry: lobby:{id}, game:{id}, lobby:{id}:chat, disconnected:{id}:{gracz}, ...
+#   (patrz KEY HELPERS w services/redis_service.py)
+# - rodziny kluczy globalnych używane razem (Lua, MULTI) mają wspólny tag
 REDIS_PREFIX_LOBBY = "lobby:"
 REDIS_PREFIX_GAME = "game:"
 REDIS_PREFIX_USER = "user:"
-REDIS_PREFIX_RANKING = "ranking:"
+REDIS_PREFIX_RANKING = "{ranking}:"
+REDIS_PREFIX_LOBBY_INDEX = "{lobby_index}:"
+REDIS_PREFIX_PRESENCE = "{presence}:"
+REDIS_PREFIX_SESSION = "session:"
@@ -81,7 +81,7 @@ async def pokaz_istniejace_boty(skip_init: bool = False):
     print("=" * 60)
     
     async with async_sessionmaker() as session:
-        query = select(User)
+        query = select(User).where(User.is_bot == True)
         result = await session.execute(query)
         users = result.scalars().all()
         
@@ -109,6 +109,25 @@ async def pokaz_istniejace_boty(skip_init: bool = False):
         return bots
 
 
+async def powiadom_rejestr_botow():
+    """
+    Powiadom działający serwer (Redis pub/sub), że lista botów się zmieniła
+    i przelicz liczniki kont (boty dodane/usunięte poza serwerem)
+    """
+    try:
+        from services.redis_service import init_redis, close_redis
+        from services.bot_registry import bot_registry
+        from services.user_counters_service import user_counters_service
+        
+        redis_client = await init_redis()
+        await bot_registry.publish_change(redis_client)
+        await user_counters_service.rebuild(redis_client)
+        await close_redis()
+        print("📣 Rejestr botów odświeżony")
+    except Exception as e:
+        print(f"⚠️ Nie udało się powiadomić serwera o zmianie botów: {e}")
+
+
 async def stworz_konta_botow(skip_init: bool = False):
     """Stwórz konta dla wszystkich botów"""
     if not skip_init:
@@ -143,7 +162,8 @@ async def stworz_konta_botow(skip_init: bool = False):
             new_bot_user = User(
                 username=username,
                 hashed_password=hashed_pass,
-                settings=json.dumps(bot_settings)
+                settings=json.dumps(bot_settings),
+                is_bot=True
             )
             
             session.add(new_bot_user)
@@ -157,6 +177,9 @@ async def stworz_konta_botow(skip_init: bool = False):
     print()
     print(f"📊 Podsumowanie: utworzono {created}, pominięto {skipped}")
     print()
+    
+    if created:
+        await powiadom_rejestr_botow()
 
 
 async def usun_wszystkie_boty():
@@ -173,23 +196,21 @@ async def usun_wszystkie_boty():
         return
     
     async with async_sessionmaker() as session:
-        query = select(User)
+        query = select(User).where(User.is_bot == True)
         result = await session.execute(query)
         users = result.scalars().all()
         
         deleted = 0
         for user in users:
-            try:
-                settings = json.loads(user.settings) if user.settings else {}
-                if settings.get('jest_botem'):
-                    await session.delete(user)
-                    print(f"  🗑️  Usunięto: {user.username}")
-                    deleted += 1
-            except:
-                pass
+            await session.delete(user)
+            print(f"  🗑️  Usunięto: {user.username}")
+            deleted += 1
         
         await session.commit()
         print(f"\n📊 Usunięto {deleted} botów")
+    
+    if deleted:
+        await powiadom_rejestr_botow()
 
 
 async def main():
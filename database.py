@@ -6,7 +6,7 @@ from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
 from sqlalchemy import (
     Column, Integer, String, Text, Float, DateTime, ForeignKey, 
-    Boolean, BigInteger
+    Boolean, BigInteger, inspect, text, false
 )
 from sqlalchemy.sql import func
 from datetime import datetime
@@ -54,6 +54,11 @@ class User(Base):
     # Pole 'settings' z oryginalnego pliku, możemy je zostawić
     settings = Column(Text, nullable=True) 
     is_admin = Column(Boolean, nullable=False, default=False)
+    
+    # Flagi rodzaju konta jako kolumny z indeksem (zamiast parsowania settings)
+    # is_bot: konto bota (settings.jest_botem), is_guest: gość (hashed_password = NULL)
+    is_bot = Column(Boolean, nullable=False, default=False, server_default=false(), index=True)
+    is_guest = Column(Boolean, nullable=False, default=False, server_default=false(), index=True)
 
     # Pola elo_rating, games_played, games_won zostały usunięte
     # i przeniesione do player_game_stats [cite: 129]
@@ -119,6 +124,17 @@ class Message(Base):
     sent_at = Column(DateTime, server_default=func.now())
     is_read = Column(Boolean, nullable=False, default=False)
 
+class ProcessedMatch(Base):
+    """
+    Mecze, których wyniki zostały już zaksięgowane w player_game_stats.
+    Worker wyników (services/match_results_service.py) pomija powtórzone match_id.
+    """
+    __tablename__ = "processed_matches"
+    
+    match_id = Column(String, primary_key=True)
+    game_type_id = Column(Integer, ForeignKey("game_types.id"), nullable=True)
+    processed_at = Column(DateTime, server_default=func.now())
+
 # ==========================================================================
 # SEKCJA 5: FUNKCJA INICJALIZUJĄCA BAZĘ DANYCH
 # ==========================================================================
@@ -129,4 +145,43 @@ async def init_db():
     (dziedziczących po 'Base') w bazie danych.
     """
     async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
\ No newline at end of file
+        await conn.run_sync(Base.metadata.create_all)
+        await migrate_users_account_flags(conn)
+
+# ==========================================================================
+# SEKCJA 6: MIGRACJE (IDEMPOTENTNE, URUCHAMIANE PRZY STARCIE)
+# ==========================================================================
+
+async def migrate_users_account_flags(conn):
+    """
+    Dodaje kolumny users.is_bot / users.is_guest do istniejącej bazy
+    i wypełnia je na podstawie settings.jest_botem oraz hashed_password.
+    
+    create_all nie zmienia istniejących tabel, więc kolumny dodajemy ręcznie.
+    Backfill wykonuje się tylko raz - w momencie dodania kolumny.
+    """
+    existing = await conn.run_sync(
+        lambda sync_conn: {c['name'] for c in inspect(sync_conn).get_columns('users')}
+    )
+    
+    if 'is_bot' not in existing:
+        await conn.execute(text(
+            "ALTER TABLE users ADD COLUMN is_bot BOOLEAN NOT NULL DEFAULT FALSE"
+        ))
+        await conn.execute(
+            text("UPDATE users SET is_bot = TRUE WHERE settings LIKE :pattern"),
+            {"pattern": '%"jest_botem": true%'}
+        )
+        print("🔧 Migracja: dodano users.is_bot")
+    
+    if 'is_guest' not in existing:
+        await conn.execute(text(
+            "ALTER TABLE users ADD COLUMN is_guest BOOLEAN NOT NULL DEFAULT FALSE"
+        ))
+        await conn.execute(text(
+            "UPDATE users SET is_guest = TRUE WHERE hashed_password IS NULL"
+        ))
+        print("🔧 Migracja: dodano users.is_guest")
+    
+    await conn.execute(text("CREATE INDEX IF NOT EXISTS ix_users_is_bot ON users (is_bot)"))
+    await conn.execute(text("CREATE INDEX IF NOT EXISTS ix_users_is_guest ON users (is_guest)"))
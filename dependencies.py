@@ -8,8 +8,10 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from typing import Optional, Dict, AsyncGenerator
 
-from services.redis_service import RedisService, get_redis_client
+from services.redis_service import RedisService
+from redis_utils import current_roundtrips
 from services.auth_service import AuthService
+from services.session_service import session_service
 from database import async_sessionmaker, User
 
 # ============================================
@@ -37,6 +39,21 @@ async def get_redis() -> RedisService:
     """
     return RedisService()
 
+def redis_roundtrip_budget(limit: int):
+    """
+    Dependency: limit round-tripów do Redis dla endpointu (zamiast domyślnego)
+    
+    Przy REDIS_ROUNDTRIP_BUDGET_STRICT przekroczenie rzuca RoundTripBudgetExceeded.
+    
+    Usage:
+        @router.post("/{lobby_id}/chat", dependencies=[Depends(redis_roundtrip_budget(4))])
+    """
+    async def set_budget():
+        stats = current_roundtrips()
+        if stats is not None:
+            stats.budget = limit
+    return set_budget
+
 # ============================================
 # DATABASE DEPENDENCY
 # ============================================
@@ -75,7 +92,7 @@ async def get_current_user(
         db: Database session
     
     Returns:
-        Dict: User info {'id': int, 'username': str, 'email': str, 'is_guest': bool}
+        Dict: User info {'id': int, 'username': str, 'email': str, 'is_guest': bool, 'is_admin': bool}
     
     Raises:
         HTTPException: 401 jeśli token nieprawidłowy
@@ -87,25 +104,32 @@ async def get_current_user(
     """
     token = credentials.credentials
     
-    # Pobierz user_id z Redis
-    redis_client = get_redis_client()
-    user_id_bytes = await redis_client.get(f"token:{token}")
+    # 1. Lokalny cache procesu (bez Redis i bazy)
+    cached = session_service.get_local(token)
+    if cached is not None:
+        return cached
     
-    if not user_id_bytes:
+    # 2. Token + rekord sesji z Redis (jedno wywołanie)
+    try:
+        user_id, record, version = await session_service.resolve(token)
+    except Exception as e:
+        print(f"❌ Auth error: {e}")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Nieprawidłowy lub wygasły token"
+            detail="Błąd autentykacji"
         )
     
-    try:
-        user_id = int(user_id_bytes.decode('utf-8'))
-    except (ValueError, AttributeError):
+    if user_id is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Nieprawidłowy token"
+            detail="Nieprawidłowy lub wygasły token"
         )
     
-    # Pobierz użytkownika z bazy
+    if record is not None:
+        session_service.remember(token, record)
+        return record
+    
+    # 3. Brak rekordu - pobierz użytkownika z bazy i zapisz sesję
     try:
         result = await db.execute(
             select(User).where(User.id == user_id)
@@ -121,13 +145,18 @@ async def get_current_user(
         # Sprawdź czy to gość (goście nie mają hasła)
         is_guest = user.hashed_password is None
         
-        return {
+        user_data = {
             "id": user.id,
             "username": user.username,
             "email": user.email if hasattr(user, 'email') else None,
-            "is_guest": is_guest
+            "is_guest": is_guest,
+            "is_admin": bool(user.is_admin)
         }
         
+        await session_service.store(token, user_data, version)
+        
+        return user_data
+        
     except HTTPException:
         raise
     except Exception as e:
@@ -167,6 +196,32 @@ async def get_optional_user(
     except HTTPException:
         return None
 
+async def get_websocket_user(token: Optional[str]) -> Optional[Dict]:
+    """
+    Autoryzacja WebSocket (token w query - przeglądarka nie wyśle nagłówka Authorization)
+    
+    Args:
+        token: Token z parametru ?token=
+    
+    Returns:
+        Optional[Dict]: User dict lub None jeśli brak/nieprawidłowy token
+    
+    Usage:
+        user = await get_websocket_user(token)
+        if not user:
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+            return
+    """
+    if not token:
+        return None
+    
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+    try:
+        async with async_sessionmaker() as db:
+            return await get_current_user(credentials, db)
+    except HTTPException:
+        return None
+
 # ============================================
 # ROLE-BASED DEPENDENCIES
 # ============================================
@@ -245,6 +300,26 @@ async def verify_lobby_host(
     
     return user
 
+def game_busy_error() -> HTTPException:
+    """
+    Błąd 503 gdy lock gry nie zwolnił się w GAME_LOCK_WAIT_TIMEOUT
+    
+    Returns:
+        HTTPException: 503 z nagłówkiem Retry-After
+    
+    Usage:
+        try:
+            async with redis.game_lock(game_id) as lock:
+                ...
+        except LockTimeoutError:
+            raise game_busy_error()
+    """
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Gra jest zajęta - spróbuj ponownie",
+        headers={"Retry-After": "1"}
+    )
+
 # ============================================
 # HELPERS
 # ============================================
@@ -22,9 +22,31 @@ function Dashboard() {
   
   // Ref do śledzenia czy jest pierwszy load
   const isFirstLoad = useRef(true)
+  // WebSocket listy gier na żywo + aktualny filtr typu gry (dla reconnect)
+  const feedSocketRef = useRef(null)
+  const feedFilterRef = useRef(null)
 
-  // Load lobbies
+  // Podsumowanie z listy gier na żywo -> kształt lobby oczekiwany przez LobbyCard
+  const feedLobbyToCard = (summary) => ({
+    ...summary,
+    status_partii: summary.status,
+    opcje: {
+      typ_gry: summary.typ_gry,
+      max_graczy: summary.max_graczy,
+      nazwa: summary.nazwa,
+      rankingowa: summary.rankingowa
+    }
+  })
+
+  // Load lobbies (HTTP - gdy WebSocket listy gier nie działa)
   const loadLobbies = async (silent = false) => {
+    // Lista na żywo - poproś o świeży snapshot zamiast pełnej listy
+    const feed = feedSocketRef.current
+    if (feed && feed.readyState === WebSocket.OPEN) {
+      feed.send(JSON.stringify({ type: 'filter', typ_gry: feedFilterRef.current }))
+      return
+    }
+    
     try {
       if (!silent) {
         setLoading(true)
@@ -48,15 +70,74 @@ function Dashboard() {
     }
   }
 
-  // Load on mount
+  // Lista gier na żywo: snapshot + zdarzenia lobby_created/updated/removed (zamiast odpytywania)
   useEffect(() => {
-    loadLobbies()
+    let closed = false
+    let reconnectTimeout = null
     
-    // Auto-refresh co 5s (silent - bez loading spinner)
-    const interval = setInterval(() => loadLobbies(true), 5000)
-    return () => clearInterval(interval)
+    const connect = () => {
+      const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:'
+      const host = window.location.hostname === 'localhost' ? 'localhost:8000' : window.location.host
+      const typGry = feedFilterRef.current ? `?typ_gry=${feedFilterRef.current}` : ''
+      const ws = new WebSocket(`${protocol}//${host}/ws/lobbies${typGry}`)
+      
+      ws.onmessage = (event) => {
+        try {
+          const data = JSON.parse(event.data)
+          
+          if (data.type === 'lobby_snapshot') {
+            if (isFirstLoad.current) {
+              console.log('📋 Lobby:', data.lobbies.length, 'gier')
+              isFirstLoad.current = false
+            }
+            setLobbies(data.lobbies.map(feedLobbyToCard))
+            setError(null)
+            setLoading(false)
+          } else if (data.type === 'lobby_created') {
+            const lobby = feedLobbyToCard(data.lobby)
+            setLobbies(prev => [lobby, ...prev.filter(l => l.id_gry !== lobby.id_gry)])
+          } else if (data.type === 'lobby_updated') {
+            const lobby = feedLobbyToCard(data.lobby)
+            setLobbies(prev => prev.some(l => l.id_gry === lobby.id_gry)
+              ? prev.map(l => l.id_gry === lobby.id_gry ? lobby : l)
+              : [lobby, ...prev])
+          } else if (data.type === 'lobby_removed') {
+            setLobbies(prev => prev.filter(l => l.id_gry !== data.id))
+          }
+        } catch (err) {
+          console.error('Błąd wiadomości listy gier:', err)
+        }
+      }
+      
+      ws.onclose = () => {
+        feedSocketRef.current = null
+        if (!closed) {
+          // Bez połączenia - jednorazowo HTTP, potem ponowna próba
+          loadLobbies(true)
+          reconnectTimeout = setTimeout(connect, 3000)
+        }
+      }
+      
+      feedSocketRef.current = ws
+    }
+    
+    connect()
+    return () => {
+      closed = true
+      clearTimeout(reconnectTimeout)
+      feedSocketRef.current?.close(1000)
+    }
   }, [])
 
+  // Filtr typu gry po stronie serwera (nowy snapshot)
+  useEffect(() => {
+    feedFilterRef.current = filterGame === 'all' ? null : filterGame
+    const feed = feedSocketRef.current
+    if (feed && feed.readyState === WebSocket.OPEN) {
+      feed.send(JSON.stringify({ type: 'filter', typ_gry: feedFilterRef.current }))
+    }
+  }, [filterGame])
+
   // Auto-hide success message
   useEffect(() => {
     if (successMessage) {
@@ -74,7 +155,7 @@ function Dashboard() {
   // Filtrowanie lobby
   const filteredLobbies = lobbies.filter(lobby => {
     // Filtr po typie gry
-    if (filterGame !== 'all' && lobby.typ_gry !== filterGame) {
+    if (filterGame !== 'all' && (lobby.typ_gry || lobby.opcje?.typ_gry) !== filterGame) {
       return false
     }
     
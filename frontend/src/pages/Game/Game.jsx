@@ -1,7 +1,7 @@
 import { useState, useEffect, useRef } from 'react'
 import { useParams, useNavigate } from 'react-router-dom'
 import useAuthStore from '../../store/authStore'
-import { gameAPI, lobbyAPI, statsAPI } from '../../services/api'
+import { gameAPI, lobbyAPI, statsAPI, mergeChatMessages } from '../../services/api'
 import {
   LufaPanel,
   DeclarationPanel,
@@ -37,6 +37,7 @@ function Game() {
   const [chatInput, setChatInput] = useState('')
   const [chatLoading, setChatLoading] = useState(false)
   const chatEndRef = useRef(null)
+  const chatCursorRef = useRef(null) // Kursor ostatniej widzianej wiadomości
 
   // Action bubbles state
   const [actionBubbles, setActionBubbles] = useState([])
@@ -110,11 +111,21 @@ function Game() {
     }
   }
 
+  const appendChatMessages = (messages) => {
+    if (!messages?.length) return
+    setChatMessages(prev => {
+      const merged = mergeChatMessages(prev, messages)
+      chatCursorRef.current = merged[merged.length - 1]?.cursor || chatCursorRef.current
+      return merged
+    })
+  }
+
+  // Historia raz, potem tylko wiadomości nowsze niż kursor (nowe przychodzą przez WebSocket)
   const loadChat = async () => {
-    if (!lobby) return
     try {
-      const response = await lobbyAPI.getChatMessages(id)
-      setChatMessages(response || [])
+      const cursors = chatCursorRef.current ? { after: chatCursorRef.current } : {}
+      const response = await lobbyAPI.getChatMessages(id, 50, cursors)
+      appendChatMessages(response || [])
     } catch (err) {
       console.error('Błąd ładowania czatu:', err)
     }
@@ -201,9 +212,11 @@ function Game() {
     try {
       const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:'
       const host = window.location.hostname === 'localhost' ? 'localhost:8000' : window.location.host
-      const wsUrl = `${protocol}//${host}/ws/${id}/${user.username}`
+      const token = encodeURIComponent(localStorage.getItem('token') || '')
+      const chatCursor = chatCursorRef.current ? `&chat_cursor=${chatCursorRef.current}` : ''
+      const wsUrl = `${protocol}//${host}/ws/${id}/${user.username}?token=${token}${chatCursor}`
       
-      console.log('WebSocket: Łączenie...', wsUrl)
+      console.log('WebSocket: Łączenie...', id)
       
       const ws = new WebSocket(wsUrl)
       
@@ -242,6 +255,11 @@ function Game() {
             case 'connected':
               break
               
+            case 'chat':
+              // Nowa wiadomość czatu (także zaległe po ponownym połączeniu)
+              if (data.data) appendChatMessages([data.data])
+              break
+              
             case 'state_update':
               if (data.data) {
                 if (data.data.nazwa) setLobby(data.data)
@@ -536,11 +554,12 @@ function Game() {
     }
   }, [id])
 
+  const hasLobby = !!lobby
   useEffect(() => {
-    if (lobby) {
+    if (hasLobby) {
       loadChat()
     }
-  }, [lobby])
+  }, [hasLobby])
 
   // Pobierz rangi graczy
   const slotsKey = JSON.stringify(lobby?.slots?.map(s => s.nazwa).filter(Boolean) || [])
@@ -758,9 +777,11 @@ function Game() {
     
     setChatLoading(true)
     try {
-      await lobbyAPI.sendChatMessage(id, chatInput.trim())
+      const sent = await lobbyAPI.sendChatMessage(id, chatInput.trim())
       setChatInput('')
-      await loadChat()
+      // Przez WebSocket przyjdzie i tak - dopisz od razu (bez duplikatu dzięki kursorowi)
+      appendChatMessages(sent?.cursor ? [sent] : [])
+      if (!wsConnected) await loadChat()
     } catch (err) {
       alert(err.response?.data?.detail || 'Nie udało się wysłać wiadomości')
     } finally {
@@ -1877,7 +1898,7 @@ function Game() {
                 <p className="text-gray-500 text-sm text-center py-8">Brak wiadomości</p>
               ) : (
                 chatMessages.map(msg => (
-                  <div key={msg.id} className={`text-sm break-words ${msg.is_system ? 'text-center text-gray-400 italic py-1' : ''}`}>
+                  <div key={msg.cursor || msg.id} className={`text-sm break-words ${msg.is_system ? 'text-center text-gray-400 italic py-1' : ''}`}>
                     {msg.is_system ? (
                       <span>{msg.message}</span>
                     ) : (
@@ -1,7 +1,7 @@
 import { useState, useEffect, useRef } from 'react'
 import { useParams, useNavigate } from 'react-router-dom'
 import useAuthStore from '../../store/authStore'
-import { lobbyAPI, statsAPI } from '../../services/api'
+import { lobbyAPI, statsAPI, mergeChatMessages } from '../../services/api'
 
 function Lobby() {
   const { id } = useParams()
@@ -20,6 +20,8 @@ function Lobby() {
   const [chatInput, setChatInput] = useState('')
   const [chatLoading, setChatLoading] = useState(false)
   const chatEndRef = useRef(null)
+  const chatCursorRef = useRef(null) // Kursor ostatniej widzianej wiadomości
+  const chatSocketRef = useRef(null)
 
   // Swap state
   const [swapMode, setSwapMode] = useState(false)
@@ -41,11 +43,22 @@ function Lobby() {
     }
   }
 
+  const appendChatMessages = (messages) => {
+    if (!messages?.length) return
+    setChatMessages(prev => {
+      const merged = mergeChatMessages(prev, messages)
+      chatCursorRef.current = merged[merged.length - 1]?.cursor || chatCursorRef.current
+      return merged
+    })
+  }
+
+  // Historia raz, potem tylko wiadomości nowsze niż kursor (nowe przychodzą przez WebSocket)
   const loadChat = async () => {
     if (!lobby) return
     try {
-      const response = await lobbyAPI.getChatMessages(id)
-      setChatMessages(response || [])
+      const cursors = chatCursorRef.current ? { after: chatCursorRef.current } : {}
+      const response = await lobbyAPI.getChatMessages(id, 50, cursors)
+      appendChatMessages(response || [])
     } catch (err) {
       console.error('Błąd ładowania czatu:', err)
     }
@@ -72,11 +85,54 @@ function Lobby() {
     }
   }, [lobby?.status_partii, isInLobby, id, navigate])
 
+  const hasLobby = !!lobby
   useEffect(() => {
-    if (lobby) {
+    if (hasLobby) {
       loadChat()
     }
-  }, [lobby])
+  }, [hasLobby])
+
+  // Czat na żywo przez WebSocket gry (zamiast odpytywania)
+  useEffect(() => {
+    if (!user?.username || !id) return
+    let closed = false
+    let reconnectTimeout = null
+    
+    const connect = () => {
+      const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:'
+      const host = window.location.hostname === 'localhost' ? 'localhost:8000' : window.location.host
+      const token = encodeURIComponent(localStorage.getItem('token') || '')
+      const chatCursor = chatCursorRef.current ? `&chat_cursor=${chatCursorRef.current}` : ''
+      const ws = new WebSocket(`${protocol}//${host}/ws/${id}/${user.username}?token=${token}${chatCursor}`)
+      
+      ws.onmessage = (event) => {
+        try {
+          const data = JSON.parse(event.data)
+          if (data.type === 'chat' && data.data) {
+            appendChatMessages([data.data])
+          }
+        } catch (err) {
+          console.error('Błąd wiadomości WebSocket:', err)
+        }
+      }
+      
+      ws.onclose = () => {
+        chatSocketRef.current = null
+        if (!closed) {
+          reconnectTimeout = setTimeout(connect, 3000)
+        }
+      }
+      
+      chatSocketRef.current = ws
+    }
+    
+    connect()
+    return () => {
+      closed = true
+      clearTimeout(reconnectTimeout)
+      chatSocketRef.current?.close(1000)
+    }
+  }, [id, user?.username])
 
   // Pobierz rangi graczy
   const slotsKey = JSON.stringify(lobby?.slots?.map(s => s.nazwa).filter(Boolean) || [])
@@ -311,9 +367,11 @@ function Lobby() {
     
     setChatLoading(true)
     try {
-      await lobbyAPI.sendChatMessage(id, chatInput.trim())
+      const sent = await lobbyAPI.sendChatMessage(id, chatInput.trim())
       setChatInput('')
-      await loadChat()
+      // Przez WebSocket przyjdzie i tak - dopisz od razu (bez duplikatu dzięki kursorowi)
+      appendChatMessages(sent?.cursor ? [sent] : [])
+      if (chatSocketRef.current?.readyState !== WebSocket.OPEN) await loadChat()
     } catch (err) {
       alert(err.response?.data?.detail || 'Nie udało się wysłać wiadomości')
     } finally {
@@ -546,7 +604,7 @@ function Lobby() {
               ) : (
                 chatMessages.map(msg => (
                   <div 
-                    key={msg.id} 
+                    key={msg.cursor || msg.id} 
                     className={`text-sm ${
                       msg.is_system 
                         ? 'text-center text-gray-400 italic py-1' 
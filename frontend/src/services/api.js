@@ -274,13 +274,14 @@ export const lobbyAPI = {
   },
 
   /**
-   * Get chat messages
+   * Get chat messages (od najstarszej, każda z polem cursor)
    * @param {string} lobbyId 
    * @param {number} limit 
+   * @param {object} cursors - { before } starsza strona historii / { after } nowsze niż kursor
    * @returns {Promise}
    */
-  getChatMessages: async (lobbyId, limit = 50) => {
-    const response = await api.get(`/lobby/${lobbyId}/chat`, { params: { limit } })
+  getChatMessages: async (lobbyId, limit = 50, cursors = {}) => {
+    const response = await api.get(`/lobby/${lobbyId}/chat`, { params: { limit, ...cursors } })
     return response.data
   },
 
@@ -435,6 +436,25 @@ export const clearAuth = () => {
   localStorage.removeItem('user')
 }
 
+/**
+ * Merge chat messages (bez duplikatów, w kolejności kursorów)
+ * @param {Array} current 
+ * @param {Array} incoming 
+ * @returns {Array}
+ */
+export const mergeChatMessages = (current, incoming) => {
+  const byCursor = new Map()
+  for (const msg of [...current, ...incoming]) {
+    byCursor.set(msg.cursor || `id-${msg.id}`, msg)
+  }
+  const key = (msg) => (msg.cursor || '0-0').split('-').map(Number)
+  return [...byCursor.values()].sort((a, b) => {
+    const [msA, seqA] = key(a)
+    const [msB, seqB] = key(b)
+    return msA - msB || seqA - seqB
+  })
+}
+
 export default api
 
 // ============================================
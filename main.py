@@ -2,8 +2,7 @@
 Główny plik aplikacji FastAPI
 Odpowiedzialność: Inicjalizacja app, routing, startup/shutdown
 """
-from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
@@ -16,6 +15,13 @@ from database import init_db
 
 # Import utils
 from utils.cleanup import setup_periodic_cleanup, stop_cleanup, setup_inactive_users_cleanup, stop_inactive_users_cleanup
+from services.timer_service import setup_timer_scheduler, stop_timer_scheduler
+from services.bot_registry import setup_bot_registry, stop_bot_registry
+from services.match_results_service import setup_match_results_worker, stop_match_results_worker
+from services.pacing_service import setup_pacing_scheduler, stop_pacing_scheduler
+from services.storage_service import setup_storage_snapshots, stop_storage_snapshots
+from services.chat_service import setup_chat_relay, stop_chat_relay
+from services.lobby_feed_service import setup_lobby_feed, stop_lobby_feed
 
 # Import logging config
 from logging_config import setup_logging
@@ -32,74 +38,60 @@ async def cleanup_stale_bot_games(redis_service):
     Czyści stare gry botów po restarcie serwera.
     Gry W_GRZE bez silnika są usuwane.
     """
-    import json
     from database import async_sessionmaker, User
     from sqlalchemy import select
+    from services.redis_service import engine_key
     
     try:
-        # Pobierz wszystkie lobby
-        lobbies = await redis_service.list_lobbies()
-        removed_count = 0
+        # Tylko gry W_GRZE - kandydaci z indeksu lobby (podsumowania, bez pełnych danych)
+        summaries = await redis_service.list_lobby_summaries(status='W_GRZE')
+        if not summaries:
+            print("   [Cleanup] Brak starych gier do usunięcia")
+            return
         
-        for lobby in lobbies:
-            lobby_id = lobby.get('id')
-            status = lobby.get('status_partii', 'LOBBY')
-            
-            # Sprawdź tylko gry W_GRZE
-            if status != 'W_GRZE':
+        lobby_ids = [s['id_gry'] for s in summaries if s.get('id_gry')]
+        
+        # Sprawdź istnienie silników jednym pipeline (EXISTS zamiast ładowania)
+        pipe = redis_service.redis.pipeline(transaction=False)
+        for lobby_id in lobby_ids:
+            pipe.exists(engine_key(lobby_id))
+        engine_exists = dict(zip(lobby_ids, await pipe.execute()))
+        
+        # Boty z bazy - jedno zapytanie dla wszystkich nazw graczy
+        names = {
+            name for s in summaries for name in s.get('gracze', [])
+            if name and not name.startswith('Bot #')
+        }
+        db_bots = set()
+        if names:
+            try:
+                async with async_sessionmaker() as session:
+                    result = await session.execute(
+                        select(User.username).where(User.username.in_(names), User.is_bot == True)
+                    )
+                    db_bots = set(result.scalars().all())
+            except Exception as e:
+                print(f"   [Cleanup] Błąd sprawdzania botów: {e}")
+        
+        to_remove = []
+        for summary in summaries:
+            lobby_id = summary.get('id_gry')
+            if not lobby_id:
                 continue
             
-            # Sprawdź czy silnik gry istnieje
-            engine = await redis_service.get_game_engine(lobby_id)
-            
-            if not engine:
+            if not engine_exists.get(lobby_id):
                 # Brak silnika = gra zombie, usuń
                 print(f"   [Cleanup] Usuwam grę zombie: {lobby_id} (brak silnika)")
-                await redis_service.delete_game(lobby_id)
-                removed_count += 1
+                to_remove.append(lobby_id)
                 continue
             
-            # Sprawdź czy wszyscy gracze to boty
-            slots = lobby.get('slots', [])
-            all_bots = True
-            
-            for slot in slots:
-                if slot.get('typ') not in ['gracz', 'bot']:
-                    continue
-                    
-                player_name = slot.get('nazwa')
-                if not player_name:
-                    continue
-                
-                # Sprawdź czy to bot
-                is_bot = False
-                
-                # Wzorzec "Bot #X"
-                if player_name.startswith('Bot #'):
-                    is_bot = True
-                else:
-                    # Sprawdź w bazie danych
-                    try:
-                        async with async_sessionmaker() as session:
-                            query = select(User).where(User.username == player_name)
-                            result = await session.execute(query)
-                            user = result.scalar_one_or_none()
-                            
-                            if user and user.settings:
-                                settings = json.loads(user.settings)
-                                is_bot = settings.get('jest_botem', False)
-                    except:
-                        pass
-                
-                if not is_bot:
-                    all_bots = False
-                    break
-            
             # Jeśli wszyscy gracze to boty, usuń grę (po restarcie nie ma sensu kontynuować)
-            if all_bots:
+            players = [name for name in summary.get('gracze', []) if name]
+            if all(name.startswith('Bot #') or name in db_bots for name in players):
                 print(f"   [Cleanup] Usuwam grę botów: {lobby_id} (tylko boty, restart serwera)")
-                await redis_service.delete_game(lobby_id)
-                removed_count += 1
+                to_remove.append(lobby_id)
+        
+        removed_count = await redis_service.purge_games(to_remove)
         
         if removed_count > 0:
             print(f"   [Cleanup] Usunięto {removed_count} starych gier")
@@ -134,6 +126,11 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         print(f"⚠️ OSTRZEŻENIE logging: {e}")
     
+    # 0b. Pliki statyczne - indeks w pamięci + prekompresja
+    print("\n🗜️ [0b/3] Pliki statyczne...")
+    from services.static_service import setup_static_assets
+    await setup_static_assets()
+    
     # 1. Inicjalizacja bazy danych
     print("\n📦 [1/6] Inicjalizacja bazy danych...")
     try:
@@ -155,17 +152,45 @@ async def lifespan(app: FastAPI):
     # 2. Inicjalizacja Redis
     print("\n🔴 [2/6] Inicjalizacja Redis...")
     try:
-        await init_redis()
+        redis_client = await init_redis()
+        setup_storage_snapshots(redis_client)
         print("✅ Redis gotowy!")
+        
+        # Klucze sprzed hash tagów pod nowe nazwy (jednorazowo, przed odbudową indeksu)
+        from services.key_migration_service import migrate_legacy_keys
+        await migrate_legacy_keys(redis_client)
+        
+        # Indeks lobby (obejmuje lobby zapisane przed restartem)
+        from services.redis_service import RedisService
+        await RedisService().rebuild_lobby_index()
+        
+        # Liczniki kont (zarejestrowani/boty/goście) przeliczone z bazy
+        from services.user_counters_service import user_counters_service
+        await user_counters_service.rebuild()
     except Exception as e:
         print(f"❌ BŁĄD Redis: {e}")
         raise
     
+    # 2b. Rankingi ELO (sorted sety) przeliczone z player_game_stats
+    print("\n🏆 [2b/6] Budowanie rankingu...")
+    try:
+        from services.leaderboard_service import leaderboard_service
+        await leaderboard_service.rebuild()
+    except Exception as e:
+        print(f"⚠️ OSTRZEŻENIE ranking: {e}")
+        # Ranking odbuduje się przy pierwszym odczycie
+    
     # 3. Uruchomienie cleanup task
     print("\n🧹 [3/5] Uruchamianie garbage collector...")
     try:
         setup_periodic_cleanup()
         setup_inactive_users_cleanup()
+        setup_timer_scheduler()
+        await setup_bot_registry()
+        setup_match_results_worker()
+        setup_pacing_scheduler()
+        setup_chat_relay()
+        setup_lobby_feed()
         print("✅ Cleanup tasks uruchomione!")
     except Exception as e:
         print(f"⚠️ OSTRZEŻENIE cleanup: {e}")
@@ -226,6 +251,12 @@ async def lifespan(app: FastAPI):
     try:
         await stop_cleanup()
         await stop_inactive_users_cleanup()
+        await stop_timer_scheduler()
+        await stop_bot_registry()
+        await stop_match_results_worker()
+        await stop_pacing_scheduler()
+        await stop_chat_relay()
+        await stop_lobby_feed()
         print("✅ Cleanup zatrzymany!")
     except Exception as e:
         print(f"⚠️ Błąd zatrzymywania cleanup: {e}")
@@ -233,6 +264,8 @@ async def lifespan(app: FastAPI):
     # 3. Zamknij Redis
     print("\n🔴 [3/3] Zamykanie Redis...")
     try:
+        from services.redis_service import get_redis_client
+        await stop_storage_snapshots(get_redis_client())
         await close_redis()
         print("✅ Redis zamknięty!")
     except Exception as e:
@@ -281,16 +314,52 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Cache odpowiedzi GET (RESPONSE_CACHE_ENABLED) - response_cache_service
+@app.middleware("http")
+async def response_cache_middleware(request: Request, call_next):
+    # Wewnątrz licznika round-tripów - trafienie w cache raportuje 0
+    from services.response_cache_service import response_cache
+    from config import settings
+    
+    if not settings.RESPONSE_CACHE_ENABLED:
+        return await call_next(request)
+    return await response_cache.handle(request, call_next)
+
+# Round-tripy do Redis per żądanie: nagłówek X-Redis-Roundtrips, metryki
+# per endpoint (/api/admin/stats) i ostrzeżenie po przekroczeniu limitu
+@app.middleware("http")
+async def redis_roundtrips_middleware(request: Request, call_next):
+    from redis_utils import start_roundtrip_tracking, roundtrip_metrics
+    from config import settings
+    
+    stats = start_roundtrip_tracking(
+        settings.REDIS_ROUNDTRIP_BUDGET or None, strict=settings.REDIS_ROUNDTRIP_BUDGET_STRICT
+    )
+    response = await call_next(request)
+    
+    route = request.scope.get("route")
+    endpoint = f"{request.method} {route.path if route else request.url.path}"
+    if route is not None or stats.count:
+        roundtrip_metrics.record(endpoint, stats)
+    response.headers["X-Redis-Roundtrips"] = str(stats.count)
+    if stats.over_budget:
+        print(f"⚠️ {endpoint}: {stats.count} round-tripów do Redis (limit {stats.budget}): {stats.commands}")
+    return response
+
 # ============================================
 # STATIC FILES
 # ============================================
 
-# Serwuj pliki statyczne (HTML, CSS, JS)
-try:
-    app.mount("/static", StaticFiles(directory="static"), name="static")
-    print("✅ Static files mounted: /static")
-except Exception as e:
-    print(f"⚠️ OSTRZEŻENIE: Nie można zamontować /static: {e}")
+# Serwuj pliki statyczne (HTML, CSS, JS) - prekompresja gzip/brotli, ETag,
+# immutable dla assets/ z buildu Vite (wdrożenia bez nginx)
+# /assets - zahashowane pliki z buildu Vite (frontend/dist skopiowany do static/)
+from services.static_service import static_assets, StaticAssetsApp
+app.mount("/static", StaticAssetsApp(static_assets), name="static")
+app.mount("/assets", StaticAssetsApp(static_assets, prefix="assets"), name="assets")
+if os.path.isdir(static_assets.directory):
+    print(f"✅ Static files mounted: /static, /assets ({static_assets.directory})")
+else:
+    print(f"⚠️ OSTRZEŻENIE: Brak katalogu {static_assets.directory} - /static zwróci 404")
     print("   (To normalne jeśli folder 'static' nie istnieje w dev)")
 
 # ============================================
@@ -407,11 +476,10 @@ async def get_public_stats():
     """
     Publiczne statystyki dla strony głównej.
     Liczy wszystkich zarejestrowanych graczy + gości online.
+    Wszystko z liczników w Redis - bez zapytań do bazy.
     """
     from services.redis_service import get_redis_client
-    from database import async_sessionmaker, User
-    from sqlalchemy import select, func, not_
-    import json
+    from services.user_counters_service import user_counters_service
     
     try:
         total_players = 0
@@ -419,41 +487,14 @@ async def get_public_stats():
         
         redis = get_redis_client()
         
-        async with async_sessionmaker() as session:
-            # 1. Policz ZAREJESTROWANYCH użytkowników (nie-gości, nie-boty)
-            query_registered = select(func.count()).select_from(User).where(
-                not_(User.username.like('Guest_%'))
-            )
-            result_reg = await session.execute(query_registered)
-            registered_users = result_reg.scalar() or 0
-            
-            # 2. Policz botów
-            query_all = select(User)
-            result_all = await session.execute(query_all)
-            all_users = result_all.scalars().all()
-            
-            bots_count = 0
-            for user in all_users:
-                try:
-                    if user.settings:
-                        settings = json.loads(user.settings)
-                        if settings.get('jest_botem'):
-                            bots_count += 1
-                except:
-                    pass
-            
-            # 3. Policz gości online (przez heartbeat)
-            heartbeat_keys = await redis.keys("heartbeat:*")
-            guests_online = 0
-            for key in heartbeat_keys:
-                key_str = key.decode() if isinstance(key, bytes) else key
-                # Format: heartbeat:user_id
-                if 'Guest_' in str(key_str):
-                    guests_online += 1
-            
-            # TOTAL: zarejestrowani (w tym boty) + goście online
-            # Ale zarejestrowani już zawierają botów, więc:
-            total_players = registered_users + guests_online
+        # 1-3. Zarejestrowani, boty i goście online (liczniki + indeks obecności)
+        counts = await user_counters_service.get_counts()
+        registered_users = counts['registered']
+        bots_count = counts['bots']
+        guests_online = counts['guests_online']
+        
+        # TOTAL: zarejestrowani + boty + goście online
+        total_players = registered_users + bots_count + guests_online
         
         # 4. Policz rozegrane gry (counter w Redis)
         try:
@@ -467,7 +508,7 @@ async def get_public_stats():
             "totalGames": total_games,
             "availableGames": 1,  # Na razie tylko 66
             "details": {
-                "registered": registered_users - bots_count,
+                "registered": registered_users,
                 "bots": bots_count,
                 "guests_online": guests_online
             }
@@ -23,7 +23,7 @@ Użycie:
 
 from .config import NETWORK_CONFIG, TRAINING_CONFIG
 from .network import CardGameNetwork, LightweightNetwork
-from .state_encoder import StateEncoder, ENCODER
+from .state_encoder import StateEncoder, ENCODER, DirectStateEncoder, DIRECT_ENCODER
 from .nn_bot import NeuralNetworkBot, create_nn_bot, create_nn_bot_by_name
 
 __all__ = [
@@ -33,6 +33,8 @@ __all__ = [
     'LightweightNetwork',
     'StateEncoder',
     'ENCODER',
+    'DirectStateEncoder',
+    'DIRECT_ENCODER',
     'NeuralNetworkBot',
     'create_nn_bot',
     'create_nn_bot_by_name',
@@ -112,6 +112,7 @@ class TrainingConfig:
     TEMPERATURE: float = 1.0  # Eksploracja w self-play
     TEMPERATURE_DECAY: float = 0.99
     MIN_TEMPERATURE: float = 0.1
+    SELF_PLAY_PARALLEL_GAMES: int = 64  # Gry w lockstepie (jeden forward pass na krok)
     
     # Training
     BATCH_SIZE: int = 256
@@ -7,7 +7,7 @@ Policy-Value Network inspirowana AlphaZero.
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
-from typing import Tuple, Optional
+from typing import List, Tuple, Optional
 from pathlib import Path
 import sys
 
@@ -204,6 +204,41 @@ class CardGameNetwork(nn.Module):
         
         return action, policy.squeeze(0), value.squeeze()
     
+    def get_actions(self,
+                    states: torch.Tensor,
+                    action_masks: torch.Tensor,
+                    temperature: float = 1.0,
+                    greedy: bool = False) -> Tuple[List[int], torch.Tensor, torch.Tensor]:
+        """
+        Wybiera akcje dla wielu pozycji naraz (jeden forward pass).
+        
+        Args:
+            states: Tensor stanów (batch, state_dim)
+            action_masks: Maski legalnych akcji (batch, action_dim)
+            temperature: Temperatura dla softmax (wyższa = więcej eksploracji)
+            greedy: Jeśli True, wybierz najlepsze akcje
+        
+        Returns:
+            actions: Indeksy wybranych akcji (po jednym na wiersz)
+            policies: Prawdopodobieństwa akcji (batch, action_dim)
+            values: Oceny pozycji (batch,)
+        """
+        with torch.no_grad():
+            policies, values = self.forward(states, action_masks)
+        
+        if greedy:
+            actions = policies.argmax(dim=-1)
+        else:
+            if temperature != 1.0:
+                policy_logits = torch.log(policies + 1e-10) / temperature
+                policy_logits = policy_logits.masked_fill(~action_masks, float('-inf'))
+                policy_temp = F.softmax(policy_logits, dim=-1)
+            else:
+                policy_temp = policies
+            actions = torch.multinomial(policy_temp, 1).squeeze(-1)
+        
+        return actions.tolist(), policies, values.view(-1)
+    
     def save(self, path: Optional[str] = None, name: str = "model"):
         """Zapisuje model do pliku."""
         if path is None:
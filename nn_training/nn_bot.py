@@ -6,7 +6,8 @@ Może być użyty jako zamiennik dla MCTS_Bot.
 
 import torch
 import random
-from typing import Dict, List, Optional, Any, Union
+import numpy as np
+from typing import Dict, List, Optional, Any, Tuple, Union
 from pathlib import Path
 
 # Dodaj ścieżki do importów - NN_DIR musi być PRZED PROJECT_ROOT
@@ -25,11 +26,11 @@ from engines.sixtysix_engine import SixtySixEngine
 
 try:
     from .config import CHECKPOINTS_DIR, ACTION_INDEX_TO_DICT, DICT_TO_ACTION_INDEX
-    from .state_encoder import StateEncoder, ENCODER
+    from .state_encoder import StateEncoder, ENCODER, DIRECT_ENCODER
     from .network import CardGameNetwork, LightweightNetwork
 except ImportError:
     from config import CHECKPOINTS_DIR, ACTION_INDEX_TO_DICT, DICT_TO_ACTION_INDEX
-    from state_encoder import StateEncoder, ENCODER
+    from state_encoder import StateEncoder, ENCODER, DIRECT_ENCODER
     from network import CardGameNetwork, LightweightNetwork
 
 
@@ -88,8 +89,11 @@ class NeuralNetworkBot:
         self.greedy = greedy
         self.personality = personality
         
-        # Enkoder
+        # Enkoder (bezpośrednio z silnika, bufory używane przy każdym ruchu)
         self.encoder = ENCODER
+        self.direct_encoder = DIRECT_ENCODER
+        self._state_buffer = np.zeros(self.direct_encoder.state_dim, dtype=np.float32)
+        self._mask_buffer = np.zeros(self.direct_encoder.num_actions, dtype=bool)
         
         # Osobowości (biasy temperaturowe i akcji)
         self._setup_personality()
@@ -158,28 +162,15 @@ class NeuralNetworkBot:
             print(f"BŁĄD: NeuralNetworkBot obsługuje tylko SixtySixEngine")
             return {}
         
-        # Pobierz stan gry
-        state_dict = poczatkowy_stan_gry.get_state_for_player(nazwa_gracza_bota)
-        
         # Sprawdź czy to nasza tura
-        if state_dict.get('kolej_gracza') != nazwa_gracza_bota:
+        if poczatkowy_stan_gry.get_current_player() != nazwa_gracza_bota:
             return {}
         
-        # Pobierz legalne akcje
-        legal_actions = poczatkowy_stan_gry.get_legal_actions(nazwa_gracza_bota)
-        grywalne_karty = state_dict.get('grywalne_karty', [])
-        
-        # Mapuj na indeksy
-        legal_indices = []
-        for action in legal_actions:
-            idx = self._action_to_index(action)
-            if idx is not None:
-                legal_indices.append(idx)
-        
-        for karta_str in grywalne_karty:
-            idx = self._card_to_action_index(karta_str)
-            if idx is not None:
-                legal_indices.append(idx)
+        # Legalne akcje z maski (bez get_state_for_player)
+        action_mask = self.direct_encoder.get_action_mask(
+            poczatkowy_stan_gry, nazwa_gracza_bota, out=self._mask_buffer
+        )
+        legal_indices = torch.nonzero(action_mask).flatten().tolist()
         
         if not legal_indices:
             print(f"OSTRZEŻENIE: Brak legalnych akcji dla {nazwa_gracza_bota}")
@@ -190,8 +181,9 @@ class NeuralNetworkBot:
             return ACTION_INDEX_TO_DICT[legal_indices[0]].copy()
         
         # Enkoduj stan
-        state_tensor = self.encoder.encode_state(state_dict, nazwa_gracza_bota)
-        action_mask = self.encoder.get_action_mask(state_dict, nazwa_gracza_bota)
+        state_tensor = self.direct_encoder.encode_state(
+            poczatkowy_stan_gry, nazwa_gracza_bota, out=self._state_buffer
+        )
         
         # Przenieś na urządzenie
         state_tensor = state_tensor.to(self.device)
@@ -206,6 +198,44 @@ class NeuralNetworkBot:
         
         return action
     
+    def znajdz_najlepsze_ruchy(self,
+                               pozycje: List[Tuple[SixtySixEngine, str]]) -> List[Dict[str, Any]]:
+        """
+        Ruchy dla wielu pozycji naraz - jeden forward pass dla całego batcha.
+        
+        Args:
+            pozycje: Pary (silnik gry, nazwa gracza bota), np. z wielu równoległych gier
+        
+        Returns:
+            Lista słowników akcji w kolejności pozycji ({} gdy to nie tura bota)
+        """
+        akcje = [{} for _ in pozycje]
+        if not pozycje:
+            return akcje
+        
+        masks = self.direct_encoder.mask_batch(pozycje)
+        
+        # Pozycje wymagające sieci (więcej niż jedna legalna akcja)
+        rows = []
+        legal_per_row = []
+        for i, mask in enumerate(masks):
+            legal_indices = torch.nonzero(mask).flatten().tolist()
+            if len(legal_indices) == 1:
+                akcje[i] = ACTION_INDEX_TO_DICT[legal_indices[0]].copy()
+            elif legal_indices:
+                rows.append(i)
+                legal_per_row.append(legal_indices)
+        
+        if rows:
+            states = self.direct_encoder.encode_batch([pozycje[i] for i in rows]).to(self.device)
+            batch_masks = masks[rows].to(self.device)
+            with torch.no_grad():
+                policies, _ = self.model(states, batch_masks)
+                for i, policy, legal_indices in zip(rows, policies, legal_per_row):
+                    akcje[i] = ACTION_INDEX_TO_DICT[self._choose_action(policy, legal_indices)].copy()
+        
+        return akcje
+    
     def _select_action(self,
                        state: torch.Tensor,
                        action_mask: torch.Tensor,
@@ -218,8 +248,12 @@ class NeuralNetworkBot:
             action_mask = action_mask.unsqueeze(0)
         
         policy, _ = self.model(state, action_mask)
-        policy = policy.squeeze(0)
-        
+        return self._choose_action(policy.squeeze(0), legal_indices)
+    
+    def _choose_action(self,
+                       policy: torch.Tensor,
+                       legal_indices: List[int]) -> int:
+        """Wybiera akcję z policy jednej pozycji (biasy, temperatura, greedy)."""
         # Zastosuj biasy osobowości
         if self.action_biases:
             policy = self._apply_biases(policy, legal_indices)
@@ -291,49 +325,6 @@ class NeuralNetworkBot:
                 biased_policy[idx] = biased_policy[idx] / total
         
         return biased_policy
-    
-    def _action_to_index(self, action: Dict[str, Any]) -> Optional[int]:
-        """Konwertuje słownik akcji na indeks."""
-        typ = action.get('typ', '')
-        
-        if typ == 'deklaracja':
-            kontrakt = action.get('kontrakt', '')
-            if hasattr(kontrakt, 'name'):
-                kontrakt = kontrakt.name
-            
-            atut = action.get('atut')
-            if atut and hasattr(atut, 'name'):
-                atut = atut.name
-            
-            key = (typ, kontrakt, atut)
-            return DICT_TO_ACTION_INDEX.get(key)
-        
-        elif typ == 'przebicie':
-            kontrakt = action.get('kontrakt', '')
-            if hasattr(kontrakt, 'name'):
-                kontrakt = kontrakt.name
-            key = (typ, kontrakt)
-            return DICT_TO_ACTION_INDEX.get(key)
-        
-        elif typ in ['pas', 'pas_lufa', 'lufa', 'kontra', 'do_konca',
-                     'pytanie', 'nie_pytam', 'graj_normalnie']:
-            key = (typ, None)
-            return DICT_TO_ACTION_INDEX.get(key)
-        
-        return None
-    
-    def _card_to_action_index(self, card_str: str) -> Optional[int]:
-        """Konwertuje string karty na indeks akcji."""
-        try:
-            parts = card_str.split()
-            if len(parts) >= 2:
-                ranga = parts[0].upper()
-                kolor = parts[1].upper()
-                key = ('zagraj_karte', ranga, kolor)
-                return DICT_TO_ACTION_INDEX.get(key)
-        except:
-            pass
-        return None
 
 
 # === Fabryka botów ===
@@ -34,24 +34,30 @@ if str(PROJECT_ROOT) not in sys.path:
 
 from config import TRAINING_CONFIG, CHECKPOINTS_DIR, NETWORK_CONFIG
 from network import CardGameNetwork
-from self_play import generate_self_play_data, ReplayBuffer, save_experiences
+from self_play import SelfPlayWorker, generate_self_play_data, ReplayBuffer, save_experiences
 from trainer import Trainer, train_from_scratch
-from game_interface import GameInterface, play_random_game
+from game_interface import play_random_game
 from state_encoder import ENCODER
 
 
 def evaluate_model(model: CardGameNetwork,
                    num_games: int = 100,
                    opponent: str = 'random',
-                   device: str = 'cpu') -> dict:
+                   device: str = 'cpu',
+                   batch_games: int = 32) -> dict:
     """
     Ewaluuje model przeciwko określonemu przeciwnikowi.
     
+    Gry toczą się w lockstepie (SelfPlayWorker.play_games_lockstep, do
+    batch_games naraz) - ruchy NN ze wszystkich gier czekających na sieć
+    liczone są jednym forward passem, przeciwnicy grają losowo.
+    
     Args:
         model: Model do ewaluacji
         num_games: Liczba gier
         opponent: Typ przeciwnika ('random', 'heuristic', 'self')
         device: Urządzenie
+        batch_games: Liczba gier rozgrywanych naraz
         
     Returns:
         Słownik z metrykami
@@ -63,50 +69,29 @@ def evaluate_model(model: CardGameNetwork,
     
     # Stwórz bota NN
     nn_bot = NeuralNetworkBot(model=model, temperature=0.3, greedy=True)
+    worker = SelfPlayWorker(model=None, device=device)
     
     wins = 0
     total_points = 0
     
     print(f"Evaluating against {opponent} ({num_games} games)...")
     
-    for i in range(num_games):
-        # Stwórz grę
-        players = ['NN_Player', 'Opp_1', 'NN_Partner', 'Opp_2']
-        game = GameInterface(players, '4p')
-        
-        move_count = 0
-        max_moves = 200
-        
-        while not game.is_terminal() and move_count < max_moves:
-            current = game.get_current_player()
-            if current is None:
-                break
-            
-            # Wybierz akcję
-            if current in ['NN_Player', 'NN_Partner']:
-                # Użyj bota NN
-                action = nn_bot.znajdz_najlepszy_ruch(game.engine, current)
-                if action:
-                    game.perform_action(current, action)
-            else:
-                # Przeciwnik (losowy)
-                legal = game.get_legal_action_indices(current)
-                if legal:
-                    import random
-                    action_idx = random.choice(legal)
-                    game.perform_action_by_index(current, action_idx)
-            
-            move_count += 1
-        
-        # Sprawdź wynik
-        outcome = game.get_outcome()
+    games = worker.play_games_lockstep(
+        num_games,
+        parallel_games=batch_games,
+        player_ids=['NN_Player', 'Opp_1', 'NN_Partner', 'Opp_2'],
+        model_seats=['NN_Player', 'NN_Partner'],
+        collect_data=False,
+        action_chooser=nn_bot.znajdz_najlepsze_ruchy,
+    )
+    for finished, (outcome, _) in enumerate(games, start=1):
         if outcome:
             if outcome.is_win.get('NN_Player', False):
                 wins += 1
             total_points += outcome.points_awarded
         
-        if (i + 1) % 20 == 0:
-            print(f"  Progress: {i+1}/{num_games}, Win rate: {wins/(i+1)*100:.1f}%")
+        if finished % 20 == 0:
+            print(f"  Progress: {finished}/{num_games}, Win rate: {wins/finished*100:.1f}%")
     
     win_rate = wins / num_games * 100
     avg_points = total_points / num_games
@@ -8,7 +8,7 @@ import torch
 import random
 import numpy as np
 import sys
-from typing import Dict, List, Optional, Any, Tuple
+from typing import Dict, List, Optional, Any, Tuple, Iterator, Callable
 from dataclasses import dataclass, field
 from pathlib import Path
 from tqdm import tqdm
@@ -26,12 +26,12 @@ if str(PROJECT_ROOT) not in sys.path:
 
 try:
     from .config import NETWORK_CONFIG, TRAINING_CONFIG, DATA_DIR, ACTION_INDEX_TO_DICT
-    from .state_encoder import StateEncoder, ENCODER
+    from .state_encoder import StateEncoder, ENCODER, DIRECT_ENCODER
     from .network import CardGameNetwork
     from .game_interface import GameInterface, GameOutcome
 except ImportError:
     from config import NETWORK_CONFIG, TRAINING_CONFIG, DATA_DIR, ACTION_INDEX_TO_DICT
-    from state_encoder import StateEncoder, ENCODER
+    from state_encoder import StateEncoder, ENCODER, DIRECT_ENCODER
     from network import CardGameNetwork
     from game_interface import GameInterface, GameOutcome
 
@@ -65,6 +65,15 @@ class GameData:
             exp.value = outcome.rewards.get(exp.player_id, 0.0)
 
 
+@dataclass
+class LockstepGame:
+    """Gra w toku w self-play lockstep (jeden slot runnera)."""
+    game: GameInterface
+    data: Optional[GameData]
+    moves: int = 0
+    finished: bool = False
+
+
 class SelfPlayWorker:
     """
     Worker do generowania danych przez self-play.
@@ -78,12 +87,14 @@ class SelfPlayWorker:
         """
         Args:
             model: Sieć neuronowa (None = losowy gracz)
-            encoder: Enkoder stanu (domyślny jeśli None)
+            encoder: Enkoder stanu (None = enkoder bezpośredni z silnika)
             temperature: Temperatura dla eksploracji
             device: Urządzenie dla tensora
         """
         self.model = model
         self.encoder = encoder or ENCODER
+        # Bez własnego enkodera: cechy prosto z silnika (te same co ENCODER)
+        self.direct_encoder = DIRECT_ENCODER if encoder is None else None
         self.temperature = temperature
         self.device = device
         
@@ -124,24 +135,11 @@ class SelfPlayWorker:
             if current is None:
                 break
             
-            # Pobierz stan i legalne akcje
-            state_dict = game.get_state(current)
-            legal_indices = game.get_legal_action_indices(current)
-            
-            if not legal_indices:
+            # Enkoduj stan i wybierz akcję (batch jednej pozycji)
+            selected = self.select_actions([(game.engine, current)])[0]
+            if selected is None:
                 break
-            
-            # Enkoduj stan
-            state_tensor = self.encoder.encode_state(state_dict, current)
-            action_mask = self.encoder.get_action_mask(state_dict, current)
-            
-            # Wybierz akcję
-            if self.model is not None:
-                action, policy, value = self._select_action_with_model(
-                    state_tensor, action_mask, legal_indices
-                )
-            else:
-                action, policy = self._select_random_action(legal_indices, action_mask)
+            action, state_tensor, action_mask, policy = selected
             
             # Zbierz doświadczenie
             if collect_data:
@@ -169,34 +167,219 @@ class SelfPlayWorker:
         
         return outcome, game_data
     
-    def _select_action_with_model(self,
-                                   state: torch.Tensor,
-                                   action_mask: torch.Tensor,
-                                   legal_indices: List[int]) -> Tuple[int, torch.Tensor, torch.Tensor]:
-        """Wybiera akcję używając modelu.
+    def play_games_lockstep(self,
+                            num_games: int,
+                            mode: str = '4p',
+                            parallel_games: Optional[int] = None,
+                            player_ids: List[str] = None,
+                            model_seats: Optional[List[str]] = None,
+                            collect_data: bool = True,
+                            action_chooser: Optional[Callable[[List[Tuple[Any, str]]], List[Optional[dict]]]] = None
+                            ) -> Iterator[Tuple[GameOutcome, Optional[GameData]]]:
+        """
+        Rozgrywa wiele gier naraz - jeden forward pass na krok dla wszystkich gier.
+        
+        W każdym kroku zbiera gry, w których ruch ma gracz modelu, koduje je
+        jednym batchem (select_actions) i wykonuje wybrane akcje. Zakończona
+        gra zwalnia slot, który od razu dostaje nową grę.
+        
+        Args:
+            num_games: Łączna liczba gier
+            mode: Tryb gry
+            parallel_games: Gry rozgrywane naraz (None = TRAINING_CONFIG.SELF_PLAY_PARALLEL_GAMES)
+            player_ids: Lista ID graczy
+            model_seats: Gracze sterowani modelem (None = wszyscy, reszta gra losowo)
+            collect_data: Czy zbierać dane treningowe (tylko ruchy graczy modelu)
+            action_chooser: Własny wybór ruchów graczy modelu zamiast select_actions -
+                pary (silnik, ID gracza) -> akcje (dict, None = brak ruchu), np.
+                NeuralNetworkBot.znajdz_najlepsze_ruchy; bez danych treningowych
+        
+        Yields:
+            (outcome, game_data) dla każdej zakończonej gry (w kolejności zakończenia)
+        """
+        if player_ids is None:
+            if mode == '4p':
+                player_ids = ['NN_1', 'NN_2', 'NN_3', 'NN_4']
+            else:
+                player_ids = ['NN_1', 'NN_2', 'NN_3']
+        parallel_games = parallel_games or TRAINING_CONFIG.SELF_PLAY_PARALLEL_GAMES
+        model_seats = set(player_ids if model_seats is None else model_seats)
+        max_moves = 200
+        if action_chooser is not None and collect_data:
+            raise ValueError("action_chooser nie daje policy - użyj collect_data=False")
+        
+        started = 0
+        slots: List[LockstepGame] = []
+        
+        while slots or started < num_games:
+            # Wolne sloty -> nowe gry
+            while len(slots) < parallel_games and started < num_games:
+                slots.append(LockstepGame(
+                    game=GameInterface(player_ids, mode),
+                    data=GameData() if collect_data else None,
+                ))
+                started += 1
+            
+            # Gry czekające na ruch modelu
+            waiting = []
+            positions = []
+            for slot in slots:
+                current = self._advance_to_model_turn(slot, model_seats, max_moves)
+                if current is None:
+                    slot.finished = True
+                else:
+                    waiting.append(slot)
+                    positions.append((slot.game.engine, current))
+            
+            # Jeden batch dla wszystkich gier
+            if action_chooser is None:
+                chosen = self.select_actions(positions)
+            else:
+                chosen = action_chooser(positions) if positions else []
+            for slot, (_, current), selected in zip(waiting, positions, chosen):
+                if not selected:
+                    slot.finished = True
+                    continue
+                
+                if action_chooser is not None:
+                    slot.game.perform_action(current, selected)
+                else:
+                    action, state_tensor, action_mask, policy = selected
+                    if slot.data is not None:
+                        slot.data.add_experience(Experience(
+                            state=state_tensor,
+                            action_mask=action_mask,
+                            action=action,
+                            policy=policy,
+                            value=0.0,  # Zostanie ustawione po grze
+                            player_id=current,
+                            phase=slot.game.get_phase(),
+                        ))
+                    slot.game.perform_action_by_index(current, action)
+                slot.moves += 1
+                if slot.game.is_terminal() or slot.moves >= max_moves:
+                    slot.finished = True
+            
+            # Zakończone gry - wynik i zwolnienie slotu
+            for slot in slots:
+                if not slot.finished:
+                    continue
+                outcome = slot.game.get_outcome()
+                if slot.data is not None and outcome:
+                    slot.data.finalize(outcome)
+                yield outcome, slot.data
+            slots = [slot for slot in slots if not slot.finished]
+    
+    def _advance_to_model_turn(self,
+                               slot: LockstepGame,
+                               model_seats: set,
+                               max_moves: int) -> Optional[str]:
+        """Gracze spoza modelu grają losowo aż do tury modelu. None = gra skończona."""
+        game = slot.game
+        while not game.is_terminal() and slot.moves < max_moves:
+            current = game.get_current_player()
+            if current is None:
+                return None
+            if current in model_seats:
+                return current
+            
+            legal_indices = game.get_legal_action_indices(current)
+            if not legal_indices:
+                return None
+            game.perform_action_by_index(current, random.choice(legal_indices))
+            slot.moves += 1
+        return None
+    
+    def encode_positions(self,
+                         positions: List[Tuple[Any, str]]) -> Tuple[torch.Tensor, torch.Tensor]:
+        """
+        Stany i maski legalnych akcji dla wielu pozycji naraz.
+        
+        Args:
+            positions: Pary (silnik gry, ID gracza)
+        
+        Returns:
+            (states, masks) - tensory (N, TOTAL_STATE_DIM) i (N, TOTAL_ACTIONS)
+        """
+        if self.direct_encoder is not None:
+            return (
+                self.direct_encoder.encode_batch(positions),
+                self.direct_encoder.mask_batch(positions),
+            )
+        
+        # Własny enkoder słownikowy - przez get_state_for_player
+        state_dicts = [engine.get_state_for_player(pid) for engine, pid in positions]
+        states = torch.stack([
+            self.encoder.encode_state(state_dict, pid)
+            for state_dict, (_, pid) in zip(state_dicts, positions)
+        ])
+        masks = torch.stack([
+            self.encoder.get_action_mask(state_dict, pid)
+            for state_dict, (_, pid) in zip(state_dicts, positions)
+        ])
+        return states, masks
+    
+    def select_actions(self,
+                       positions: List[Tuple[Any, str]]) -> List[Optional[Tuple[int, torch.Tensor, torch.Tensor, torch.Tensor]]]:
+        """
+        Wybiera akcje dla wielu pozycji naraz (jeden forward pass modelu).
+        
+        Args:
+            positions: Pary (silnik gry, ID gracza w turze)
         
         Returns:
-            (action, policy, value) - wybrana akcja, policy i wartość
+            Dla każdej pozycji (action, state, action_mask, policy)
+            albo None gdy gracz nie ma legalnych akcji
         """
-        state = state.to(self.device)
-        action_mask = action_mask.to(self.device)
-        
-        with torch.no_grad():
-            action, policy, value = self.model.get_action(
-                state, action_mask, 
-                temperature=self.temperature,
-                greedy=False
+        results = [None] * len(positions)
+        if not positions:
+            return results
+        
+        states, masks = self.encode_positions(positions)
+        legal = [torch.nonzero(mask).flatten().tolist() for mask in masks]
+        rows = [i for i, legal_indices in enumerate(legal) if legal_indices]
+        if not rows:
+            return results
+        
+        if self.model is not None:
+            actions, policies, _ = self._select_actions_with_model(
+                states[rows], masks[rows], [legal[i] for i in rows]
             )
+        else:
+            actions, policies = zip(*(self._select_random_action(legal[i], masks[i]) for i in rows))
         
-        # Upewnij się, że wybrana akcja jest legalna
-        if action not in legal_indices:
-            # Fallback: wybierz losową legalną
-            action = random.choice(legal_indices)
-            # Popraw policy (daj całą masę na wybraną akcję)
-            policy = torch.zeros_like(policy)
-            policy[action] = 1.0
+        for i, action, policy in zip(rows, actions, policies):
+            results[i] = (action, states[i], masks[i], policy)
+        return results
+    
+    def _select_actions_with_model(self,
+                                   states: torch.Tensor,
+                                   action_masks: torch.Tensor,
+                                   legal_lists: List[List[int]]) -> Tuple[List[int], torch.Tensor, torch.Tensor]:
+        """Wybiera akcje używając modelu (batch).
         
-        return action, policy.cpu(), value.cpu()
+        Returns:
+            (actions, policies, values) - wybrane akcje, policy i wartości per wiersz
+        """
+        states = states.to(self.device)
+        action_masks = action_masks.to(self.device)
+        
+        actions, policies, values = self.model.get_actions(
+            states, action_masks,
+            temperature=self.temperature,
+            greedy=False
+        )
+        policies = policies.cpu()
+        
+        for row, legal_indices in enumerate(legal_lists):
+            # Upewnij się, że wybrana akcja jest legalna
+            if actions[row] not in legal_indices:
+                # Fallback: wybierz losową legalną i daj jej całą masę policy
+                actions[row] = random.choice(legal_indices)
+                policies[row] = 0.0
+                policies[row, actions[row]] = 1.0
+        
+        return actions, policies, values.cpu()
     
     def _select_random_action(self,
                                legal_indices: List[int],
@@ -217,10 +400,14 @@ def generate_self_play_data(model: Optional[CardGameNetwork] = None,
                             temperature: float = 1.0,
                             mode: str = '4p',
                             device: str = 'cpu',
-                            show_progress: bool = True) -> List[Experience]:
+                            show_progress: bool = True,
+                            parallel_games: Optional[int] = None) -> List[Experience]:
     """
     Generuje dane treningowe przez self-play.
     
+    Gry toczą się w lockstepie (SelfPlayWorker.play_games_lockstep) -
+    jeden forward pass modelu na krok dla wszystkich gier naraz.
+    
     Args:
         model: Model do użycia (None = losowy)
         num_games: Liczba gier
@@ -228,6 +415,7 @@ def generate_self_play_data(model: Optional[CardGameNetwork] = None,
         mode: Tryb gry
         device: Urządzenie
         show_progress: Czy pokazywać progress bar
+        parallel_games: Gry rozgrywane naraz (None = TRAINING_CONFIG.SELF_PLAY_PARALLEL_GAMES)
         
     Returns:
         Lista doświadczeń
@@ -237,13 +425,13 @@ def generate_self_play_data(model: Optional[CardGameNetwork] = None,
     all_experiences = []
     outcomes = {'wins': 0, 'total_points': 0}
     
-    iterator = range(num_games)
+    games = worker.play_games_lockstep(
+        num_games, mode=mode, parallel_games=parallel_games, collect_data=True
+    )
     if show_progress:
-        iterator = tqdm(iterator, desc="Self-play")
+        games = tqdm(games, total=num_games, desc="Self-play")
     
-    for _ in iterator:
-        outcome, game_data = worker.play_game(mode=mode, collect_data=True)
-        
+    for outcome, game_data in games:
         if game_data:
             all_experiences.extend(game_data.experiences)
         
@@ -7,7 +7,7 @@ Skupiony na informacjach kluczowych dla licytacji.
 import torch
 import numpy as np
 import sys
-from typing import Dict, List, Optional, Any, Tuple
+from typing import Dict, List, Optional, Any, Tuple, Sequence
 from dataclasses import dataclass
 from pathlib import Path
 
@@ -553,6 +553,309 @@ class StateEncoder:
 ENCODER = StateEncoder()
 
 
+# === Enkoder bezpośredni (silnik -> bufor, bez get_state_for_player) ===
+
+# Pozycje kolorów/rang w cechach ręki i zagranych kart (kolejność SUIT_ORDER / RANK_ORDER)
+_SUIT_POS = {kolor: i for i, kolor in enumerate(SUIT_ORDER)}
+_RANK_POS = {ranga: i for i, ranga in enumerate(RANK_ORDER)}
+# Rangi cech has_ace..has_nine (kolejność w tensorze)
+_HAND_RANKS = ('AS', 'DZIESIATKA', 'KROL', 'DAMA', 'WALET', 'DZIEWIATKA')
+# str(Karta) z historii rozdania ("As Czerwien") -> indeks karty 0-23
+_CARD_STRING_INDEX = {
+    f"{ranga.capitalize()} {kolor.capitalize()}": _SUIT_POS[kolor] * 6 + _RANK_POS[ranga]
+    for kolor in SUIT_ORDER for ranga in RANK_ORDER
+}
+# (ranga, kolor) -> indeks akcji zagrania karty
+_CARD_ACTION_INDEX = {
+    (key[1], key[2]): idx for key, idx in DICT_TO_ACTION_INDEX.items() if key[0] == 'zagraj_karte'
+}
+
+
+def _enum_name(value) -> Optional[str]:
+    """Nazwa Enuma (jak SixtySixEngine._serialize_enum)."""
+    if isinstance(value, str):
+        return value
+    return getattr(value, 'name', None)
+
+
+class DirectStateEncoder:
+    """
+    Koduje stan prosto z obiektów silnika (Rozdanie / RozdanieTrzyOsoby).
+    
+    Te same cechy co StateEncoder.encode_state / get_action_mask (bit w bit),
+    ale bez budowania słownika get_state_for_player i bez stringów kart
+    dla każdej karty w ręce i historii. Wynik trafia do bufora NumPy
+    (opcjonalnie przekazanego z zewnątrz i używanego wielokrotnie).
+    """
+    
+    def __init__(self):
+        self.config = NETWORK_CONFIG
+        self.state_dim = NETWORK_CONFIG.TOTAL_STATE_DIM
+        self.num_actions = NETWORK_CONFIG.TOTAL_ACTIONS
+        
+        # Początki sekcji tensora
+        self.game_offset = NETWORK_CONFIG.HAND_STATE_DIM
+        self.play_offset = NETWORK_CONFIG.HAND_STATE_DIM + NETWORK_CONFIG.GAME_STATE_DIM
+    
+    def encode_state(self,
+                     engine,
+                     player_id: str,
+                     out: Optional[np.ndarray] = None) -> torch.Tensor:
+        """
+        Koduje pełny stan gry na tensor.
+        
+        Args:
+            engine: SixtySixEngine albo jego game_state
+            player_id: ID gracza, dla którego kodujemy
+            out: Bufor float32 (TOTAL_STATE_DIM,) do nadpisania (None = nowy)
+        
+        Returns:
+            Tensor o wymiarze (TOTAL_STATE_DIM,) - widok na bufor out
+        """
+        if out is None:
+            out = np.zeros(self.state_dim, dtype=np.float32)
+        else:
+            out.fill(0.0)
+        
+        gs = getattr(engine, 'game_state', engine)
+        self._encode_into(gs, player_id, out)
+        return torch.from_numpy(out)
+    
+    def get_action_mask(self,
+                        engine,
+                        player_id: str,
+                        out: Optional[np.ndarray] = None) -> torch.Tensor:
+        """
+        Zwraca maskę legalnych akcji (jak StateEncoder.get_action_mask).
+        
+        Args:
+            engine: SixtySixEngine albo jego game_state
+            player_id: ID gracza
+            out: Bufor bool (TOTAL_ACTIONS,) do nadpisania (None = nowy)
+        
+        Returns:
+            Tensor bool o wymiarze (TOTAL_ACTIONS,)
+        """
+        if out is None:
+            out = np.zeros(self.num_actions, dtype=bool)
+        else:
+            out.fill(False)
+        
+        gs = getattr(engine, 'game_state', engine)
+        self._mask_into(gs, player_id, out)
+        return torch.from_numpy(out)
+    
+    def allocate_batch(self, capacity: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Tworzy bufory na wiele pozycji (do wielokrotnego użycia w encode_batch/mask_batch).
+        
+        Args:
+            capacity: Maksymalna liczba pozycji w jednym wywołaniu
+        
+        Returns:
+            (states, masks) - float32 (capacity, TOTAL_STATE_DIM) i bool (capacity, TOTAL_ACTIONS)
+        """
+        return (
+            np.zeros((capacity, self.state_dim), dtype=np.float32),
+            np.zeros((capacity, self.num_actions), dtype=bool),
+        )
+    
+    def encode_batch(self,
+                     positions: Sequence[Tuple[Any, str]],
+                     out: Optional[np.ndarray] = None) -> torch.Tensor:
+        """
+        Koduje wiele pozycji naraz (jeden przebieg, bez torch.stack).
+        
+        Args:
+            positions: Pary (silnik albo game_state, player_id)
+            out: Bufor float32 (>= N, TOTAL_STATE_DIM) z allocate_batch (None = nowy)
+        
+        Returns:
+            Tensor (N, TOTAL_STATE_DIM) - widok na pierwsze N wierszy bufora
+        """
+        rows = self._batch_rows(out, len(positions), self.state_dim, np.float32)
+        rows.fill(0.0)
+        for row, (engine, player_id) in zip(rows, positions):
+            self._encode_into(getattr(engine, 'game_state', engine), player_id, row)
+        return torch.from_numpy(rows)
+    
+    def mask_batch(self,
+                   positions: Sequence[Tuple[Any, str]],
+                   out: Optional[np.ndarray] = None) -> torch.Tensor:
+        """
+        Maski legalnych akcji dla wielu pozycji naraz.
+        
+        Args:
+            positions: Pary (silnik albo game_state, player_id)
+            out: Bufor bool (>= N, TOTAL_ACTIONS) z allocate_batch (None = nowy)
+        
+        Returns:
+            Tensor bool (N, TOTAL_ACTIONS) - widok na pierwsze N wierszy bufora
+        """
+        rows = self._batch_rows(out, len(positions), self.num_actions, bool)
+        rows.fill(False)
+        for row, (engine, player_id) in zip(rows, positions):
+            self._mask_into(getattr(engine, 'game_state', engine), player_id, row)
+        return torch.from_numpy(rows)
+    
+    @staticmethod
+    def _batch_rows(out: Optional[np.ndarray], n: int, dim: int, dtype) -> np.ndarray:
+        """Pierwsze n wierszy bufora (albo nowa macierz gdy out=None)."""
+        if out is None:
+            return np.zeros((n, dim), dtype=dtype)
+        if out.shape[0] < n or out.shape[1] != dim:
+            raise ValueError(f"Bufor {out.shape} za mały na {n} pozycji x {dim}")
+        return out[:n]
+    
+    def _encode_into(self, gs, player_id: str, out: np.ndarray):
+        """Wypełnia wyzerowany bufor cechami ręki, gry i rozgrywki."""
+        gracz = self._find_player(gs, player_id)
+        current_trump = _enum_name(gs.atut) if gs.kontrakt else None
+        
+        # --- Ręka: długość, rangi i punkty per kolor ---
+        reka = gracz.reka if gracz is not None else []
+        lengths = [0, 0, 0, 0]
+        ranks = [set(), set(), set(), set()]
+        points = [0, 0, 0, 0]
+        for karta in reka:
+            ranga = karta.ranga.name
+            suit_pos = _SUIT_POS[karta.kolor.name]
+            lengths[suit_pos] += 1
+            ranks[suit_pos].add(ranga)
+            points[suit_pos] += CARD_VALUES.get(ranga, 0)
+        
+        max_length = max(lengths)
+        min_length = min(lengths)
+        total_points = 0
+        high_cards = 0
+        marriages = 0
+        trump_marriage_points = 0
+        
+        for suit_pos, suit in enumerate(SUIT_ORDER):
+            base = suit_pos * self.config.SUIT_FEATURES
+            ranks_in_suit = ranks[suit_pos]
+            out[base] = lengths[suit_pos] / 6.0
+            for i, ranga in enumerate(_HAND_RANKS):
+                if ranga in ranks_in_suit:
+                    out[base + 1 + i] = 1.0
+            
+            has_marriage = 'KROL' in ranks_in_suit and 'DAMA' in ranks_in_suit
+            if has_marriage:
+                out[base + 7] = 1.0
+                marriages += 1
+                if current_trump and suit == current_trump:
+                    out[base + 10] = 1.0
+                    trump_marriage_points = 40
+            out[base + 8] = points[suit_pos] / 24.0
+            if lengths[suit_pos] == max_length and max_length > 0:
+                out[base + 9] = 1.0
+            
+            total_points += points[suit_pos]
+            high_cards += ('AS' in ranks_in_suit) + ('DZIESIATKA' in ranks_in_suit)
+        
+        total_cards = len(reka)
+        if total_cards > 0:
+            avg_length = total_cards / 4.0
+            variance = sum((length - avg_length) ** 2 for length in lengths) / 4.0
+            balance = 1.0 - min(variance / 4.0, 1.0)
+        else:
+            balance = 0.5
+        
+        base = self.config.SUIT_FEATURES * self.config.NUM_SUITS
+        out[base] = total_points / 120.0
+        out[base + 1] = high_cards / 8.0
+        out[base + 2] = marriages / 4.0
+        out[base + 3] = trump_marriage_points / 40.0
+        out[base + 4] = max_length / 6.0
+        out[base + 5] = min_length / 6.0
+        out[base + 6] = lengths.count(0) / 4.0
+        out[base + 7] = lengths.count(1) / 4.0
+        out[base + 8] = balance
+        out[base + 10] = total_cards / 6.0
+        
+        # --- Gra: faza, kontrakt, atut + cechy liczbowe ---
+        base = self.game_offset
+        phase_idx = PHASE_INDICES.get(_enum_name(gs.faza), 0)
+        if 0 <= phase_idx < 8:
+            out[base + phase_idx] = 1.0
+        contract_idx = CONTRACT_INDICES.get(_enum_name(gs.kontrakt) if gs.kontrakt else None, 0)
+        if 0 <= contract_idx < 5:
+            out[base + 8 + contract_idx] = 1.0
+        trump_idx = SUIT_INDICES.get(current_trump, 0)
+        if 0 <= trump_idx < 5:
+            out[base + 13 + trump_idx] = 1.0
+        
+        out[base + 18] = min(gs.mnoznik_lufy / 16.0, 1.0)
+        
+        punkty = gs.punkty_w_rozdaniu
+        if player_id in punkty:
+            out[base + 19] = punkty.get(player_id, 0) / 120.0
+        points_them = 0.0
+        for pid, pts in punkty.items():
+            if pid != player_id:
+                points_them += pts
+        out[base + 20] = min(points_them / 120.0, 1.0)
+        
+        gracz_grajacy = gs.grajacy.nazwa if gs.grajacy else None
+        if gracz_grajacy == player_id:
+            out[base + 21] = 1.0
+        elif gracz_grajacy:
+            out[base + 22] = 1.0
+        
+        # --- Rozgrywka: zagrane karty z historii + aktualna lewa ---
+        base = self.play_offset
+        cards_played = 0
+        for log in gs.szczegolowa_historia:
+            if log.get('typ') == 'zagranie_karty':
+                cards_played += 1
+                card_idx = _CARD_STRING_INDEX.get(log.get('karta'))
+                if card_idx is not None:
+                    out[base + card_idx] = 1.0
+        out[self.game_offset + 23] = cards_played / 24.0
+        
+        base += 24
+        lewa = gs.aktualna_lewa
+        for i, (gracz_lewy, karta) in enumerate(lewa[:4]):
+            pos = base + i * 4
+            out[pos] = 1.0
+            if gracz_lewy.nazwa == player_id:
+                out[pos + 1] = 1.0
+            out[pos + 2] = CARD_VALUES.get(karta.ranga.name, 0) / 11.0
+            if i == 0 or karta.kolor == lewa[0][1].kolor:
+                out[pos + 3] = 1.0
+    
+    def _mask_into(self, gs, player_id: str, out: np.ndarray):
+        """Wypełnia maskę: akcje licytacji albo grywalne karty (tylko w turze gracza)."""
+        gracz = self._find_player(gs, player_id)
+        if gracz is None:
+            return
+        kolej = gs.kolej_gracza_idx
+        if kolej is None or not (0 <= kolej < len(gs.gracze)) or gs.gracze[kolej].nazwa != player_id:
+            return
+        
+        if _enum_name(gs.faza) != 'ROZGRYWKA':
+            for akcja in gs.get_mozliwe_akcje(gracz):
+                idx = ENCODER._action_to_index(akcja)
+                if idx is not None and 0 <= idx < self.num_actions:
+                    out[idx] = True
+        else:
+            for karta in gracz.reka:
+                if gs._waliduj_ruch(gracz, karta):
+                    idx = _CARD_ACTION_INDEX.get((karta.ranga.name, karta.kolor.name))
+                    if idx is not None:
+                        out[idx] = True
+    
+    @staticmethod
+    def _find_player(gs, player_id: str):
+        for gracz in gs.gracze:
+            if gracz and gracz.nazwa == player_id:
+                return gracz
+        return None
+
+
+DIRECT_ENCODER = DirectStateEncoder()
+
+
 if __name__ == "__main__":
     # Test enkodera
     encoder = StateEncoder()
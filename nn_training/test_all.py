@@ -228,6 +228,31 @@ def test_self_play():
         batch = buffer.sample(min(10, len(buffer)))
         print(f"   ✓ Replay buffer OK, sampled {len(batch)} experiences")
         
+        # Lockstep z modelem (kilka gier naraz, zwalniane sloty dostają nowe gry)
+        from nn_training.network import CardGameNetwork
+        from nn_training.self_play import SelfPlayWorker
+        
+        worker = SelfPlayWorker(CardGameNetwork())
+        results = list(worker.play_games_lockstep(6, parallel_games=4))
+        assert len(results) == 6, "Lockstep: zła liczba gier"
+        lockstep_experiences = sum(len(game_data.experiences) for _, game_data in results)
+        print(f"   ✓ Lockstep self-play: {len(results)} games, {lockstep_experiences} experiences")
+        
+        # Lockstep z własnym wyborem ruchów (ewaluacja: bot NN na dwóch miejscach)
+        from nn_training.nn_bot import NeuralNetworkBot
+        
+        nn_bot = NeuralNetworkBot(model=CardGameNetwork(), greedy=True)
+        results = list(SelfPlayWorker().play_games_lockstep(
+            4, parallel_games=3,
+            player_ids=['NN_Player', 'Opp_1', 'NN_Partner', 'Opp_2'],
+            model_seats=['NN_Player', 'NN_Partner'],
+            collect_data=False,
+            action_chooser=nn_bot.znajdz_najlepsze_ruchy,
+        ))
+        assert len(results) == 4, "Lockstep z action_chooser: zła liczba gier"
+        assert all(game_data is None for _, game_data in results)
+        print(f"   ✓ Lockstep with action_chooser: {sum(1 for o, _ in results if o)} outcomes")
+        
         return True
     except Exception as e:
         print(f"   ✗ Self-play error: {e}")
@@ -321,6 +346,69 @@ def test_nn_bot():
         return False
 
 
+def test_direct_encoder():
+    """Test enkodera bezpośredniego (te same cechy co StateEncoder)."""
+    print("\n9. Testing direct state encoder...")
+    
+    try:
+        import random
+        import torch
+        import numpy as np
+        from nn_training.state_encoder import ENCODER, DIRECT_ENCODER
+        from nn_training.game_interface import GameInterface
+        
+        state_buffer = np.zeros(DIRECT_ENCODER.state_dim, dtype=np.float32)
+        batch_buffers = DIRECT_ENCODER.allocate_batch(4)
+        positions = 0
+        
+        for game_idx in range(20):
+            mode = '4p' if game_idx % 2 == 0 else '3p'
+            players = ['P1', 'P2', 'P3', 'P4'] if mode == '4p' else ['P1', 'P2', 'P3']
+            game = GameInterface(players, mode)
+            
+            for _ in range(200):
+                if game.is_terminal():
+                    break
+                
+                # Każdy gracz (także ten bez tury) - stan i maska identyczne
+                for player in players:
+                    state_dict = game.get_state(player)
+                    expected_state = ENCODER.encode_state(state_dict, player)
+                    expected_mask = ENCODER.get_action_mask(state_dict, player)
+                    
+                    direct_state = DIRECT_ENCODER.encode_state(game.engine, player, out=state_buffer)
+                    direct_mask = DIRECT_ENCODER.get_action_mask(game.engine, player)
+                    
+                    assert torch.equal(expected_state, direct_state), \
+                        f"Różne cechy ({state_dict['faza']}, {player})"
+                    assert torch.equal(expected_mask, direct_mask), \
+                        f"Różne maski ({state_dict['faza']}, {player})"
+                    positions += 1
+                
+                # Batch (wszyscy gracze naraz, bufor wielokrotnego użytku) = pojedyncze wiersze
+                batch = [(game.engine, player) for player in players]
+                batch_states = DIRECT_ENCODER.encode_batch(batch, out=batch_buffers[0])
+                batch_masks = DIRECT_ENCODER.mask_batch(batch, out=batch_buffers[1])
+                for row, player in enumerate(players):
+                    assert torch.equal(batch_states[row], DIRECT_ENCODER.encode_state(game.engine, player))
+                    assert torch.equal(batch_masks[row], DIRECT_ENCODER.get_action_mask(game.engine, player))
+                
+                current = game.get_current_player()
+                legal_indices = game.get_legal_action_indices(current)
+                if not legal_indices:
+                    break
+                game.perform_action_by_index(current, random.choice(legal_indices))
+        
+        print(f"   ✓ {positions} positions identical to StateEncoder (single and batch)")
+        
+        return True
+    except Exception as e:
+        print(f"   ✗ Direct encoder error: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
 def main():
     """Uruchom wszystkie testy."""
     print("="*60)
@@ -337,6 +425,7 @@ def main():
     results['self_play'] = test_self_play()
     results['trainer'] = test_trainer()
     results['nn_bot'] = test_nn_bot()
+    results['direct_encoder'] = test_direct_encoder()
     
     # Podsumowanie
     print("\n" + "="*60)
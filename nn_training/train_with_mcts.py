@@ -29,7 +29,7 @@ from config import (
     NETWORK_CONFIG, TRAINING_CONFIG, CHECKPOINTS_DIR, DATA_DIR,
     ACTION_INDEX_TO_DICT, DICT_TO_ACTION_INDEX
 )
-from state_encoder import StateEncoder, ENCODER
+from state_encoder import StateEncoder, DIRECT_ENCODER
 from network import CardGameNetwork
 from game_interface import GameInterface
 from self_play import Experience, ReplayBuffer
@@ -104,7 +104,7 @@ def generate_mcts_data(num_games: int = 100,
         Lista Experience z decyzjami MCTS
     """
     experiences = []
-    encoder = ENCODER
+    encoder = DIRECT_ENCODER
     
     # Stwórz MCTS bota
     mcts_bot = MCTS_Bot(personality=mcts_personality)
@@ -134,13 +134,10 @@ def generate_mcts_data(num_games: int = 100,
             if current is None:
                 break
             
-            # Pobierz stan dla encodera
-            state_dict = engine.get_state_for_player(current)
-            phase = state_dict.get('faza', '')
-            
-            # Enkoduj stan
-            state_tensor = encoder.encode_state(state_dict, current)
-            action_mask = encoder.get_action_mask(state_dict, current)
+            # Enkoduj stan prosto z silnika (bez get_state_for_player)
+            phase = engine.game_state.faza.name
+            state_tensor = encoder.encode_state(engine, current)
+            action_mask = encoder.get_action_mask(engine, current)
             
             # Pobierz akcję od MCTS
             start_time = time.time()
@@ -5,9 +5,350 @@ Zastępują `transient_game_state` z main.py.
 """
 
 import uuid
+import time
 import asyncio
 import redis.asyncio as aioredis
-from typing import Optional
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Set, Tuple
+
+
+# Kanał pub/sub zwolnień locków: lock_released:{lock_key}
+LOCK_RELEASED_CHANNEL_PREFIX = "lock_released:"
+
+
+# ============================================================================
+# REDIS CLUSTER
+# ============================================================================
+
+def is_cluster_client(redis_client) -> bool:
+    """Czy klient to Redis Cluster (komendy wielokluczowe tylko w obrębie slotu)"""
+    from redis.asyncio.cluster import RedisCluster
+    return isinstance(redis_client, RedisCluster)
+
+
+def open_pubsub(redis_client):
+    """
+    PubSub dla klienta Redis lub Redis Cluster.
+    
+    Zwykłe kanały (PUBLISH, także ze skryptów Lua) są w klastrze rozsyłane
+    do wszystkich węzłów, więc wystarczy subskrypcja przez jeden węzeł.
+    """
+    if not is_cluster_client(redis_client):
+        return redis_client.pubsub()
+    
+    node = redis_client.get_default_node()
+    kwargs = node.connection_kwargs
+    node_client = aioredis.Redis(
+        host=node.host,
+        port=node.port,
+        username=kwargs.get('username'),
+        password=kwargs.get('password'),
+        decode_responses=kwargs.get('decode_responses', False)
+    )
+    return node_client.pubsub()
+
+
+def timer_queue_key(queue: str, part: str) -> str:
+    """Klucz kolejki timerów (deadlines/processing/payload) - jeden slot na kolejkę"""
+    return f"timers:{{{queue}}}:{part}"
+
+
+# ============================================================================
+# ROUND-TRIPY DO REDIS (LICZNIK PER REQUEST)
+# ============================================================================
+
+class RoundTripBudgetExceeded(AssertionError):
+    """Żądanie przekroczyło limit round-tripów do Redis (tryb strict - dev/testy)"""
+    pass
+
+
+class RoundTripStats:
+    """Round-tripy do Redis w jednym żądaniu (komenda, skrypt lub cały pipeline = 1)"""
+    
+    def __init__(self, budget: Optional[int] = None, strict: bool = False):
+        self.count = 0
+        self.budget = budget
+        self.strict = strict
+        self.commands: Dict[str, int] = {}
+        self._raised = False
+    
+    def add(self, command: str):
+        self.count += 1
+        self.commands[command] = self.commands.get(command, 0) + 1
+        if self.strict and self.over_budget and not self._raised:
+            # Raz na żądanie - sprzątanie po błędzie może jeszcze wołać Redis
+            self._raised = True
+            raise RoundTripBudgetExceeded(
+                f"{self.count} round-tripów do Redis (limit {self.budget}): {self.commands}"
+            )
+    
+    @property
+    def over_budget(self) -> bool:
+        return self.budget is not None and self.count > self.budget
+
+
+# Statystyki bieżącego żądania (ustawiane przez middleware w main.py);
+# asyncio.create_task dziedziczy ten sam obiekt - zadania w tle startujemy
+# przez create_untracked_task, żeby nie liczyły się do budżetu żądania
+_current_roundtrips: ContextVar[Optional[RoundTripStats]] = ContextVar('redis_roundtrips', default=None)
+
+
+def start_roundtrip_tracking(budget: Optional[int] = None, strict: bool = False) -> RoundTripStats:
+    """Zacznij liczyć round-tripy w bieżącym kontekście (żądanie HTTP)"""
+    stats = RoundTripStats(budget, strict)
+    _current_roundtrips.set(stats)
+    return stats
+
+
+def create_untracked_task(coro) -> asyncio.Task:
+    """
+    asyncio.create_task poza licznikiem round-tripów żądania
+    (zadania w tle, pętle i listenery uruchamiane leniwie w trakcie żądania)
+    """
+    async def _run():
+        _current_roundtrips.set(None)
+        return await coro
+    return asyncio.create_task(_run())
+
+
+def current_roundtrips() -> Optional[RoundTripStats]:
+    """Statystyki bieżącego żądania (None poza śledzonym kontekstem)"""
+    return _current_roundtrips.get()
+
+
+def _count_roundtrip(command):
+    stats = _current_roundtrips.get()
+    if stats is not None:
+        if isinstance(command, bytes):
+            command = command.decode('utf-8', 'replace')
+        stats.add(str(command).upper())
+
+
+def instrument_roundtrips(redis_client):
+    """
+    Licz round-tripy klienta: każda komenda (także EVAL) i każdy
+    pipeline.execute() to jeden round-trip. PubSub nie jest liczony.
+    
+    Returns:
+        Ten sam klient (metody podmienione na instancji)
+    """
+    if getattr(redis_client, '_roundtrips_instrumented', False):
+        return redis_client
+    
+    execute_command = redis_client.execute_command
+    make_pipeline = redis_client.pipeline
+    
+    async def counted_execute_command(*args, **options):
+        _count_roundtrip(args[0] if args else '?')
+        return await execute_command(*args, **options)
+    
+    def counted_pipeline(*args, **kwargs):
+        pipe = make_pipeline(*args, **kwargs)
+        execute = pipe.execute
+        
+        async def counted_execute(*exec_args, **exec_kwargs):
+            _count_roundtrip('MULTI' if getattr(pipe, 'is_transaction', False) else 'PIPELINE')
+            return await execute(*exec_args, **exec_kwargs)
+        
+        pipe.execute = counted_execute
+        return pipe
+    
+    redis_client.execute_command = counted_execute_command
+    redis_client.pipeline = counted_pipeline
+    redis_client._roundtrips_instrumented = True
+    return redis_client
+
+
+class RoundTripMetrics:
+    """Round-tripy do Redis per endpoint (w procesie)"""
+    
+    def __init__(self):
+        self.routes: Dict[str, Dict[str, float]] = {}
+    
+    def record(self, route: str, stats: RoundTripStats):
+        entry = self.routes.get(route)
+        if entry is None:
+            entry = self.routes[route] = {'requests': 0, 'roundtrips': 0, 'max': 0, 'over_budget': 0}
+        entry['requests'] += 1
+        entry['roundtrips'] += stats.count
+        entry['max'] = max(entry['max'], stats.count)
+        if stats.over_budget:
+            entry['over_budget'] += 1
+    
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Kopia metryk + średnia na żądanie (najdroższe endpointy pierwsze)"""
+        result = {}
+        for route, entry in sorted(self.routes.items(), key=lambda item: -item[1]['roundtrips']):
+            result[route] = dict(entry, avg=round(entry['roundtrips'] / entry['requests'], 2))
+        return result
+
+# Singleton metryk
+roundtrip_metrics = RoundTripMetrics()
+
+
+# Zdobycie locka + nowy token fencingu (rosnący licznik)
+# KEYS[1] = lock, KEYS[2] = licznik fencingu
+# ARGV: id właściciela, TTL locka (ms), TTL licznika (s)
+# Zwraca: {token, 0} lub {0, pozostały TTL locka w ms}
+LUA_LOCK_ACQUIRE = """
+if redis.call('SET', KEYS[1], ARGV[1], 'NX', 'PX', tonumber(ARGV[2])) then
+    local token = redis.call('INCR', KEYS[2])
+    redis.call('EXPIRE', KEYS[2], tonumber(ARGV[3]))
+    return {token, 0}
+end
+return {0, redis.call('PTTL', KEYS[1])}
+"""
+
+# Zwolnienie (tylko własnego) locka + powiadomienie oczekujących
+# KEYS[1] = lock; ARGV: id właściciela, kanał powiadomień
+LUA_LOCK_RELEASE = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('DEL', KEYS[1])
+    redis.call('PUBLISH', ARGV[2], '1')
+    return 1
+end
+return 0
+"""
+
+# Przedłużenie (tylko własnego) locka; ARGV: id właściciela, TTL (ms)
+LUA_LOCK_EXTEND = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], tonumber(ARGV[2]))
+end
+return 0
+"""
+
+
+class StaleFencingTokenError(Exception):
+    """Zapis z nieaktualnym tokenem fencingu - lock przejął inny proces"""
+
+
+class LockTimeoutError(TimeoutError):
+    """Lock nie został zdobyty w wait_timeout (zasób zajęty - można ponowić)"""
+
+
+class LockMetrics:
+    """
+    Metryki locków w procesie (czas oczekiwania, kolizje, utracone locki).
+    Grupowane po rodzaju locka (klucz bez ostatniego członu, np. "lock:game").
+    """
+    
+    def __init__(self):
+        self.kinds: Dict[str, Dict[str, float]] = {}
+    
+    def _kind(self, lock_key: str) -> Dict[str, float]:
+        kind = lock_key.rsplit(':', 1)[0]
+        if kind not in self.kinds:
+            self.kinds[kind] = {
+                'acquired': 0, 'contended': 0, 'timeouts': 0,
+                'lost': 0, 'stale_writes': 0,
+                'wait_total_s': 0.0, 'wait_max_s': 0.0
+            }
+        return self.kinds[kind]
+    
+    def record_acquire(self, lock_key: str, waited: float, contended: bool):
+        stats = self._kind(lock_key)
+        stats['acquired'] += 1
+        if contended:
+            stats['contended'] += 1
+        stats['wait_total_s'] += waited
+        stats['wait_max_s'] = max(stats['wait_max_s'], waited)
+    
+    def record(self, lock_key: str, counter: str):
+        self._kind(lock_key)[counter] += 1
+    
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Kopia metryk + średni czas oczekiwania"""
+        result = {}
+        for kind, stats in self.kinds.items():
+            entry = dict(stats)
+            entry['wait_avg_ms'] = round(1000 * stats['wait_total_s'] / stats['acquired'], 2) if stats['acquired'] else 0.0
+            entry['wait_total_s'] = round(stats['wait_total_s'], 3)
+            entry['wait_max_s'] = round(stats['wait_max_s'], 3)
+            result[kind] = entry
+        return result
+
+# Singleton metryk
+lock_metrics = LockMetrics()
+
+
+class LockNotifier:
+    """
+    Jedna subskrypcja pub/sub na proces i klienta Redis (PSUBSCRIBE lock_released:*).
+    Budzi lokalnych oczekujących zamiast odpytywania SET NX co 100 ms.
+    """
+    
+    def __init__(self, redis_client: aioredis.Redis):
+        self.redis_client = redis_client
+        self._waiters: Dict[str, Set[asyncio.Event]] = {}
+        self._task: Optional[asyncio.Task] = None
+    
+    def register(self, lock_key: str) -> asyncio.Event:
+        """Zarejestruj oczekującego (przed próbą zdobycia - nie zgubi zwolnienia)"""
+        if self._task is None or self._task.done():
+            self._task = create_untracked_task(self._listen())
+        event = asyncio.Event()
+        self._waiters.setdefault(lock_key, set()).add(event)
+        return event
+    
+    def unregister(self, lock_key: str, event: asyncio.Event):
+        waiters = self._waiters.get(lock_key)
+        if waiters:
+            waiters.discard(event)
+            if not waiters:
+                del self._waiters[lock_key]
+    
+    async def _listen(self):
+        while True:
+            pubsub = None
+            try:
+                pubsub = open_pubsub(self.redis_client)
+                await pubsub.psubscribe(f"{LOCK_RELEASED_CHANNEL_PREFIX}*")
+                async for message in pubsub.listen():
+                    if message.get('type') != 'pmessage':
+                        continue
+                    channel = message['channel']
+                    if isinstance(channel, bytes):
+                        channel = channel.decode()
+                    for event in self._waiters.get(channel[len(LOCK_RELEASED_CHANNEL_PREFIX):], ()):
+                        event.set()
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                # Oczekujący i tak ponawiają próbę co retry_delay
+                print(f"❌ Lock notifier error: {e}")
+                await asyncio.sleep(1)
+            finally:
+                if pubsub is not None:
+                    try:
+                        await pubsub.close()
+                    except Exception:
+                        pass
+    
+    async def close(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+_notifiers: Dict[int, LockNotifier] = {}
+
+def get_lock_notifier(redis_client: aioredis.Redis) -> LockNotifier:
+    """Notifier dla klienta Redis (jeden na proces)"""
+    notifier = _notifiers.get(id(redis_client))
+    if notifier is None or notifier.redis_client is not redis_client:
+        notifier = LockNotifier(redis_client)
+        _notifiers[id(redis_client)] = notifier
+    return notifier
+
+async def close_lock_notifiers():
+    """Zamknij subskrypcje powiadomień (przy zamykaniu połączenia Redis)"""
+    for notifier in list(_notifiers.values()):
+        await notifier.close()
+    _notifiers.clear()
 
 
 class RedisLock:
@@ -15,11 +356,18 @@ class RedisLock:
     Rozproszony lock używający Redis.
     Umożliwia synchronizację między wieloma serwerami/procesami.
     
+    - Każde zdobycie locka daje rosnący token fencingu (self.token);
+      zapisy chronione lockiem sprawdzają token, więc proces, któremu lock
+      wygasł (np. długa pauza), nie nadpisze nowszego stanu
+    - Oczekujący budzeni powiadomieniem pub/sub przy zwolnieniu
+      (retry_delay tylko jako zabezpieczenie, gdy powiadomienie nie dotrze)
+    - auto_renew: przedłużanie locka w tle (długie obliczenia botów)
+    
     Przykład użycia:
-        lock = RedisLock(redis_client, "game:123:bot_loop")
+        lock = RedisLock(redis_client, "lock:game:123")
         async with lock:
             # Kod wykonywany z lockiem
-            pass
+            await redis.save_game_engine(game_id, engine, lock=lock)
     """
     
     def __init__(
@@ -27,94 +375,164 @@ class RedisLock:
         redis_client: aioredis.Redis, 
         lock_key: str, 
         timeout: int = 30,
-        retry_delay: float = 0.1
+        retry_delay: float = 1.0,
+        fence_key: Optional[str] = None,
+        auto_renew: bool = False,
+        wait_timeout: Optional[float] = None
     ):
         """
         Args:
             redis_client: Klient Redis
-            lock_key: Klucz dla locka (np. "game:123:bot_loop")
+            lock_key: Klucz dla locka (np. "lock:game:123")
             timeout: Czas wygaśnięcia locka (sekundy) - zabezpieczenie przed deadlock
-            retry_delay: Czas oczekiwania między próbami zdobycia locka (sekundy)
+            retry_delay: Maksymalny odstęp między próbami, gdy nie przyjdzie powiadomienie (sekundy)
+            fence_key: Klucz licznika tokenów fencingu (domyślnie w slocie locka)
+            auto_renew: Czy przedłużać lock w tle co timeout/3
+            wait_timeout: Maksymalny czas oczekiwania w `async with` (None = bez limitu)
         """
         self.redis_client = redis_client
         self.lock_key = lock_key
+        # Bez hash tagu w kluczu locka: {lock_key}:fence (ten sam slot w klastrze)
+        self.fence_key = fence_key or (
+            f"{lock_key}:fence" if '{' in lock_key else f"{{{lock_key}}}:fence"
+        )
         self.timeout = timeout
         self.retry_delay = retry_delay
+        self.auto_renew = auto_renew
+        self.wait_timeout = wait_timeout
         self.lock_id = str(uuid.uuid4())  # Unikalny ID dla tego locka
+        self.token: Optional[int] = None  # Token fencingu (po zdobyciu)
+        self.lost = False  # Lock wygasł/przejęty podczas trzymania
+        self._renew_task: Optional[asyncio.Task] = None
     
-    async def acquire(self, blocking: bool = True) -> bool:
+    @property
+    def channel(self) -> str:
+        return f"{LOCK_RELEASED_CHANNEL_PREFIX}{self.lock_key}"
+    
+    async def _try_acquire(self) -> Tuple[bool, int]:
+        """Jedna próba: (zdobyty, pozostały TTL locka w ms)"""
+        token, pttl = await self.redis_client.eval(
+            LUA_LOCK_ACQUIRE, 2, self.lock_key, self.fence_key,
+            self.lock_id, int(self.timeout * 1000), max(int(self.timeout), 86400)
+        )
+        if token:
+            self.token = int(token)
+            self.lost = False
+            return True, 0
+        return False, int(pttl)
+    
+    async def acquire(self, blocking: bool = True, wait_timeout: Optional[float] = None) -> bool:
         """
         Próbuje zdobyć locka.
         
         Args:
             blocking: Jeśli True, czeka aż lock będzie dostępny.
                      Jeśli False, zwraca False natychmiast jeśli lock jest zajęty.
+            wait_timeout: Maksymalny czas oczekiwania (sekundy, None = bez limitu)
         
         Returns:
             True jeśli udało się zdobyć locka, False w przeciwnym razie.
         """
-        while True:
-            # SET lock_key unique_id NX EX timeout
-            # NX = set only if not exists
-            # EX = expire after timeout seconds
-            result = await self.redis_client.set(
-                self.lock_key, 
-                self.lock_id, 
-                nx=True,  # Only set if key doesn't exist
-                ex=self.timeout
-            )
-            
-            if result:
-                return True  # Lock zdobyty
-            
-            if not blocking:
-                return False  # Lock zajęty, nie czekamy
-            
-            # Czekaj i spróbuj ponownie
-            await asyncio.sleep(self.retry_delay)
+        started = time.monotonic()
+        acquired, pttl = await self._try_acquire()
+        if acquired:
+            lock_metrics.record_acquire(self.lock_key, 0.0, contended=False)
+            self._start_renewal()
+            return True
+        
+        if not blocking:
+            return False  # Lock zajęty, nie czekamy
+        
+        notifier = get_lock_notifier(self.redis_client)
+        event = notifier.register(self.lock_key)
+        try:
+            while True:
+                # Ponów po zarejestrowaniu (zwolnienie mogło nastąpić przed rejestracją)
+                acquired, pttl = await self._try_acquire()
+                if acquired:
+                    lock_metrics.record_acquire(self.lock_key, time.monotonic() - started, contended=True)
+                    self._start_renewal()
+                    return True
+                
+                wait = self.retry_delay
+                if pttl > 0:
+                    wait = min(wait, pttl / 1000)
+                if wait_timeout is not None:
+                    remaining = wait_timeout - (time.monotonic() - started)
+                    if remaining <= 0:
+                        lock_metrics.record(self.lock_key, 'timeouts')
+                        return False
+                    wait = min(wait, remaining)
+                
+                # Czekaj na powiadomienie o zwolnieniu (lub wygaśnięcie TTL)
+                event.clear()
+                try:
+                    await asyncio.wait_for(event.wait(), timeout=max(wait, 0.001))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            notifier.unregister(self.lock_key, event)
+    
+    def _start_renewal(self):
+        if self.auto_renew:
+            self._renew_task = create_untracked_task(self._renew_loop())
+    
+    async def _renew_loop(self):
+        """Przedłużaj lock co timeout/3 dopóki jest trzymany"""
+        try:
+            while True:
+                await asyncio.sleep(self.timeout / 3)
+                if not await self.extend():
+                    self.lost = True
+                    lock_metrics.record(self.lock_key, 'lost')
+                    print(f"⚠️ Lock utracony: {self.lock_key}")
+                    return
+        except asyncio.CancelledError:
+            pass
+    
+    async def _stop_renewal(self):
+        if self._renew_task and not self._renew_task.done():
+            self._renew_task.cancel()
+            try:
+                await self._renew_task
+            except asyncio.CancelledError:
+                pass
+        self._renew_task = None
     
     async def release(self):
         """
-        Zwalnia locka (tylko jeśli należy do nas).
-        Używa Lua script dla atomowej operacji sprawdź-i-usuń.
-        """
-        # Lua script: usuń klucz tylko jeśli wartość się zgadza
-        lua_script = """
-        if redis.call("get", KEYS[1]) == ARGV[1] then
-            return redis.call("del", KEYS[1])
-        else
-            return 0
-        end
+        Zwalnia locka (tylko jeśli należy do nas) i budzi oczekujących.
+        Używa Lua script dla atomowej operacji sprawdź-usuń-opublikuj.
         """
-        await self.redis_client.eval(lua_script, 1, self.lock_key, self.lock_id)
+        await self._stop_renewal()
+        await self.redis_client.eval(
+            LUA_LOCK_RELEASE, 1, self.lock_key, self.lock_id, self.channel
+        )
     
-    async def extend(self, additional_time: int = None):
+    async def extend(self, additional_time: int = None) -> bool:
         """
         Przedłuża czas wygaśnięcia locka.
         Przydatne dla długotrwałych operacji.
+        
+        Returns:
+            True jeśli lock nadal należy do nas
         """
         if additional_time is None:
             additional_time = self.timeout
         
-        # Lua script: przedłuż tylko jeśli lock należy do nas
-        lua_script = """
-        if redis.call("get", KEYS[1]) == ARGV[1] then
-            return redis.call("expire", KEYS[1], ARGV[2])
-        else
-            return 0
-        end
-        """
-        await self.redis_client.eval(
-            lua_script, 
+        result = await self.redis_client.eval(
+            LUA_LOCK_EXTEND, 
             1, 
             self.lock_key, 
             self.lock_id,
-            additional_time
+            int(additional_time * 1000)
         )
+        return bool(result)
     
     async def __aenter__(self):
         """Context manager support - acquire lock"""
-        await self.acquire(blocking=True)
+        if not await self.acquire(blocking=True, wait_timeout=self.wait_timeout):
+            raise LockTimeoutError(f"Nie udało się zdobyć locka {self.lock_key} w {self.wait_timeout}s")
         return self
     
     async def __aexit__(self, exc_type, exc_val, exc_tb):
@@ -167,6 +585,241 @@ class TimerInfo:
         return max(0.0, remaining)
 
 
+class DeadlineScheduler:
+    """
+    Harmonogram timerów w Redis oparty o sorted set (score = deadline).
+    
+    Zamiast skanować wszystkie lobby co sekundę, worker pobiera tylko
+    wpisy, których deadline minął. Pobranie jest atomowym "claim"
+    (Lua: ZRANGEBYSCORE + przeniesienie do zbioru processing z lease),
+    więc wiele workerów może działać równolegle bez podwójnej obsługi.
+    Wpis, którego worker nie potwierdził (ack) przed końcem lease
+    (np. restart procesu), wraca do kolejki przy kolejnym claim.
+    
+    Klucze (dla kolejki "move", wspólny hash tag - jeden slot w klastrze):
+        timers:{move}:deadlines   ZSET timer_id -> deadline
+        timers:{move}:processing  ZSET timer_id -> koniec lease
+        timers:{move}:payload     HASH timer_id -> JSON
+    
+    Przykład użycia:
+        scheduler = DeadlineScheduler(redis_client, "move")
+        await scheduler.schedule("game:123", time.time() + 30, {"move_number": 7})
+        scheduler.register_handler("move", handle_move_timeout)
+        await scheduler.run()
+    """
+    
+    # KEYS: deadlines, processing, payload
+    # ARGV: now, limit, lease
+    CLAIM_SCRIPT = """
+    local now = tonumber(ARGV[1])
+    local expired = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', now)
+    for _, id in ipairs(expired) do
+        redis.call('ZREM', KEYS[2], id)
+        redis.call('ZADD', KEYS[1], now, id)
+    end
+    local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', now, 'LIMIT', 0, tonumber(ARGV[2]))
+    local result = {}
+    for _, id in ipairs(due) do
+        if redis.call('ZREM', KEYS[1], id) == 1 then
+            redis.call('ZADD', KEYS[2], now + tonumber(ARGV[3]), id)
+            table.insert(result, id)
+            table.insert(result, redis.call('HGET', KEYS[3], id) or '')
+        end
+    end
+    return result
+    """
+    
+    # KEYS: deadlines, processing, payload
+    # ARGV: timer_id
+    # Payload zostaje, jeśli handler zaplanował timer ponownie (jest znów w deadlines)
+    ACK_SCRIPT = """
+    redis.call('ZREM', KEYS[2], ARGV[1])
+    if not redis.call('ZSCORE', KEYS[1], ARGV[1]) then
+        redis.call('HDEL', KEYS[3], ARGV[1])
+    end
+    return 1
+    """
+    
+    def __init__(
+        self,
+        redis_client: aioredis.Redis,
+        queue: str,
+        poll_interval: float = 1.0,
+        lease: float = 30.0,
+        batch_size: int = 100
+    ):
+        """
+        Args:
+            redis_client: Klient Redis
+            queue: Nazwa kolejki (np. "move", "disconnect")
+            poll_interval: Maksymalny czas uśpienia między sprawdzeniami (sekundy)
+            lease: Po ilu sekundach niepotwierdzony timer wraca do kolejki
+            batch_size: Ile timerów pobierać na raz
+        """
+        self.redis_client = redis_client
+        self.queue = queue
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.batch_size = batch_size
+        self.deadlines_key = timer_queue_key(queue, "deadlines")
+        self.processing_key = timer_queue_key(queue, "processing")
+        self.payload_key = timer_queue_key(queue, "payload")
+        self.handlers = {}
+        self.running = False
+    
+    def register_handler(self, kind: str, handler):
+        """
+        Rejestruje handler dla rodzaju timera (payload["kind"]).
+        
+        Args:
+            kind: Rodzaj timera
+            handler: async def handler(timer_id: str, payload: dict)
+        """
+        self.handlers[kind] = handler
+    
+    async def schedule(self, timer_id: str, deadline: float, payload: dict):
+        """
+        Dodaje (lub nadpisuje) timer.
+        
+        Args:
+            timer_id: Unikalny ID timera (ten sam ID = nadpisanie)
+            deadline: Timestamp wygaśnięcia (time.time())
+            payload: Dane przekazywane do handlera (JSON)
+        """
+        import json
+        pipe = self.redis_client.pipeline(transaction=True)
+        pipe.hset(self.payload_key, timer_id, json.dumps(payload))
+        pipe.zrem(self.processing_key, timer_id)
+        pipe.zadd(self.deadlines_key, {timer_id: deadline})
+        await pipe.execute()
+    
+    async def cancel(self, timer_id: str) -> bool:
+        """
+        Anuluje timer.
+        
+        Returns:
+            True jeśli timer istniał i nie był jeszcze pobrany
+        """
+        pipe = self.redis_client.pipeline(transaction=True)
+        pipe.zrem(self.deadlines_key, timer_id)
+        pipe.zrem(self.processing_key, timer_id)
+        pipe.hdel(self.payload_key, timer_id)
+        removed, _, _ = await pipe.execute()
+        return removed > 0
+    
+    async def cancel_many(self, timer_ids: List[str]) -> int:
+        """
+        Anuluje wiele timerów w jednym round-tripie (np. sprzątanie gier).
+        
+        Returns:
+            Liczba timerów, które jeszcze czekały w kolejce
+        """
+        if not timer_ids:
+            return 0
+        pipe = self.redis_client.pipeline(transaction=True)
+        pipe.zrem(self.deadlines_key, *timer_ids)
+        pipe.zrem(self.processing_key, *timer_ids)
+        pipe.hdel(self.payload_key, *timer_ids)
+        removed, _, _ = await pipe.execute()
+        return removed
+    
+    async def ack(self, timer_id: str):
+        """Potwierdza obsłużenie timera (usuwa lease i payload, chyba że timer zaplanowano ponownie)"""
+        await self.redis_client.eval(
+            self.ACK_SCRIPT, 3,
+            self.deadlines_key, self.processing_key, self.payload_key,
+            timer_id
+        )
+    
+    async def claim_due(self, now: Optional[float] = None) -> list:
+        """
+        Atomowo pobiera timery, których deadline minął.
+        
+        Returns:
+            Lista (timer_id, payload_dict)
+        """
+        import json
+        import time
+        
+        if now is None:
+            now = time.time()
+        
+        raw = await self.redis_client.eval(
+            self.CLAIM_SCRIPT, 3,
+            self.deadlines_key, self.processing_key, self.payload_key,
+            now, self.batch_size, self.lease
+        )
+        
+        claimed = []
+        for i in range(0, len(raw), 2):
+            timer_id = raw[i].decode('utf-8') if isinstance(raw[i], bytes) else raw[i]
+            payload_raw = raw[i + 1]
+            try:
+                payload = json.loads(payload_raw) if payload_raw else {}
+            except (ValueError, TypeError):
+                payload = {}
+            claimed.append((timer_id, payload))
+        return claimed
+    
+    async def next_deadline(self) -> Optional[float]:
+        """Zwraca najbliższy deadline w kolejce (lub None)"""
+        result = await self.redis_client.zrange(self.deadlines_key, 0, 0, withscores=True)
+        return result[0][1] if result else None
+    
+    async def process_due(self) -> int:
+        """
+        Pobiera i obsługuje wszystkie wygasłe timery.
+        
+        Returns:
+            Liczba obsłużonych timerów
+        """
+        claimed = await self.claim_due()
+        
+        for timer_id, payload in claimed:
+            handler = self.handlers.get(payload.get('kind'))
+            try:
+                if handler:
+                    await handler(timer_id, payload)
+                else:
+                    print(f"[Scheduler:{self.queue}] Brak handlera dla {timer_id} ({payload.get('kind')})")
+            except Exception as e:
+                print(f"[Scheduler:{self.queue}] BŁĄD handlera {timer_id}: {e}")
+            finally:
+                await self.ack(timer_id)
+        
+        return len(claimed)
+    
+    async def run(self):
+        """
+        Główna pętla - śpi do najbliższego deadline (max poll_interval),
+        potem obsługuje wygasłe timery.
+        """
+        import time
+        
+        self.running = True
+        while self.running:
+            try:
+                processed = await self.process_due()
+                if processed >= self.batch_size:
+                    continue  # Zaległości - od razu następna paczka
+                
+                sleep_for = self.poll_interval
+                deadline = await self.next_deadline()
+                if deadline is not None:
+                    sleep_for = min(sleep_for, max(0.0, deadline - time.time()))
+                await asyncio.sleep(sleep_for)
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                print(f"[Scheduler:{self.queue}] BŁĄD pętli: {e}")
+                await asyncio.sleep(5.0)
+        self.running = False
+    
+    def stop(self):
+        """Zatrzymuje pętlę run()"""
+        self.running = False
+
+
 async def get_or_create_lock(redis_client: aioredis.Redis, lock_key: str) -> RedisLock:
     """
     Helper function do tworzenia locków.
@@ -180,47 +833,37 @@ async def get_or_create_lock(redis_client: aioredis.Redis, lock_key: str) -> Red
 
 async def cleanup_expired_games(redis_client: aioredis.Redis, max_age_seconds: int = 21600):
     """
-    Usuwa stare gry z Redis.
+    Usuwa stare gry z Redis (kandydaci z indeksu lobby po czasie utworzenia).
     
     Args:
         redis_client: Klient Redis
         max_age_seconds: Maksymalny wiek gry (domyślnie 6 godzin)
     """
     import time
-    import json
+    from services.redis_service import LOBBY_INDEX_CREATED, game_keys, unindex_lobby
     
     deleted_count = 0
     
-    async for key in redis_client.scan_iter("lobby:*"):
+    ids = await redis_client.zrangebyscore(LOBBY_INDEX_CREATED, '-inf', time.time() - max_age_seconds)
+    for raw_id in ids:
+        id_gry = raw_id.decode('utf-8') if isinstance(raw_id, bytes) else raw_id
         try:
-            lobby_data_json = await redis_client.get(key)
-            if not lobby_data_json:
-                continue
-            
-            lobby_data = json.loads(lobby_data_json.decode('utf-8'))
-            created_at = lobby_data.get("czas_stworzenia", time.time())
-            age = time.time() - created_at
-            
-            if age > max_age_seconds:
-                id_gry = key.decode('utf-8').split(":")[-1]
-                # Usuń lobby i silnik
-                await redis_client.delete(f"lobby:{id_gry}", f"engine:{id_gry}")
-                deleted_count += 1
-                print(f"[Cleanup] Usunięto starą grę {id_gry} (wiek: {age/3600:.1f}h)")
-        
+            # Klucze gry (jeden slot) + wpis indeksu
+            await redis_client.delete(*game_keys(id_gry))
+            await unindex_lobby(redis_client, id_gry)
+            deleted_count += 1
+            print(f"[Cleanup] Usunięto starą grę {id_gry}")
         except Exception as e:
-            print(f"[Cleanup] Błąd podczas sprawdzania gry: {e}")
+            print(f"[Cleanup] Błąd podczas usuwania gry {id_gry}: {e}")
     
     if deleted_count > 0:
         print(f"[Cleanup] Usunięto {deleted_count} starych gier")
 
 
 async def get_active_game_count(redis_client: aioredis.Redis) -> int:
-    """Zwraca liczbę aktywnych gier w Redis"""
-    count = 0
-    async for _ in redis_client.scan_iter("lobby:*"):
-        count += 1
-    return count
+    """Zwraca liczbę aktywnych gier w Redis (rozmiar indeksu lobby)"""
+    from services.redis_service import LOBBY_INDEX_ALL
+    return await redis_client.zcard(LOBBY_INDEX_ALL)
 
 
 async def compress_and_save_engine(redis_client: aioredis.Redis, id_gry: str, engine, expiration: int = 21600):
@@ -7,6 +7,12 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, delete, update, func, and_, or_
 from database import User, PlayerGameStats, GameType, Friendship, Message, async_sessionmaker
 from dependencies import get_current_user
+from services.session_service import session_service
+from services.user_counters_service import user_counters_service
+from services.leaderboard_service import leaderboard_service
+from redis_utils import lock_metrics, roundtrip_metrics
+from services.response_cache_service import response_cache
+from services.static_service import static_assets
 
 router = APIRouter(tags=["admin"])
 
@@ -18,21 +24,15 @@ router = APIRouter(tags=["admin"])
 async def get_current_admin(current_user: dict = Depends(get_current_user)):
     """
     Sprawdź czy użytkownik ma uprawnienia admina.
-    Teraz sprawdzamy pole users.is_admin
+    Pole users.is_admin pochodzi z rekordu sesji (unieważnianego przy zmianie uprawnień)
     """
-    async with async_sessionmaker() as session:
-        result = await session.execute(
-            select(User).where(User.id == current_user['id'])
+    if not current_user.get('is_admin'):
+        raise HTTPException(
+            status_code=403,
+            detail="Brak uprawnień administratora"
         )
-        user = result.scalar_one_or_none()
-        
-        if not user or not user.is_admin:
-            raise HTTPException(
-                status_code=403,
-                detail="Brak uprawnień administratora"
-            )
-        
-        return current_user
+    
+    return current_user
 
 
 # ============================================
@@ -43,35 +43,14 @@ async def get_current_admin(current_user: dict = Depends(get_current_user)):
 async def get_admin_stats(admin: dict = Depends(get_current_admin)):
     """
     Statystyki platformy dla admina
+    Liczniki kont i online z Redis (bez skanowania tabeli users)
     """
-    import json as json_lib
+    counts = await user_counters_service.get_counts()
+    
+    # Boty zawsze online - ludzie online z indeksu obecności + wszystkie boty
+    online_users = counts['online'] - counts['bots_online'] + counts['bots']
     
     async with async_sessionmaker() as session:
-        # Liczba użytkowników
-        total_users_result = await session.execute(select(func.count(User.id)))
-        total_users = total_users_result.scalar()
-        
-        # Policz użytkowników online (włącznie z botami)
-        all_users_result = await session.execute(select(User))
-        all_users = all_users_result.scalars().all()
-        
-        online_users = 0
-        bots_count = 0
-        for user in all_users:
-            is_bot = False
-            try:
-                if user.settings:
-                    settings = json_lib.loads(user.settings)
-                    is_bot = settings.get('jest_botem', False)
-            except:
-                pass
-            
-            if is_bot:
-                bots_count += 1
-                online_users += 1  # Boty zawsze online
-            elif user.status == 'online':
-                online_users += 1
-        
         # Użytkownicy zarejestrowani dzisiaj
         today_users_result = await session.execute(
             select(func.count(User.id)).where(
@@ -102,9 +81,9 @@ async def get_admin_stats(admin: dict = Depends(get_current_admin)):
         
         return {
             "users": {
-                "total": total_users,
+                "total": counts['total'],
                 "online": online_users,
-                "bots": bots_count,
+                "bots": counts['bots'],
                 "today": users_today,
                 "admins": total_admins
             },
@@ -112,7 +91,15 @@ async def get_admin_stats(admin: dict = Depends(get_current_admin)):
                 "friendships": total_friendships,
                 "messages": total_messages,
                 "unread_messages": unread_messages
-            }
+            },
+            # Locki gier w tym procesie (oczekiwanie, kolizje, odrzucone zapisy)
+            "locks": lock_metrics.snapshot(),
+            # Round-tripy do Redis per endpoint w tym procesie
+            "redis_roundtrips": roundtrip_metrics.snapshot(),
+            # Mikro-cache publicznych endpointów w tym procesie
+            "response_cache": response_cache.snapshot(),
+            # Pliki statyczne (prekompresja, wysłane kodowania)
+            "static_files": static_assets.get_stats()
         }
 
 
@@ -130,13 +117,9 @@ async def get_all_users(
 ):
     """
     Lista wszystkich użytkowników z możliwością filtrowania
+    Filtry, paginacja i suma rozegranych gier liczone w SQL (jedno zapytanie na stronę)
     """
-    import json as json_lib
-    
     async with async_sessionmaker() as session:
-        # Build query
-        query = select(User)
-        
         # Filters
         filters = []
         if search:
@@ -145,64 +128,50 @@ async def get_all_users(
                 User.email.ilike(f"%{search}%")
             ))
         
-        # Status filter - obsługiwany po pobraniu danych (boty zawsze online)
-        # Nie filtrujemy tu, bo musimy sprawdzić settings
+        # Status filter (boty zawsze online)
+        if status == 'online':
+            filters.append(or_(User.is_bot == True, User.status == 'online'))
+        elif status in ('offline', 'in_game'):
+            filters.append(and_(User.is_bot == False, User.status == status))
         
+        # Total (dla paginacji)
+        count_query = select(func.count(User.id))
+        if filters:
+            count_query = count_query.where(and_(*filters))
+        total = (await session.execute(count_query)).scalar() or 0
+        
+        # Strona użytkowników + suma gier (LEFT JOIN na zagregowanych statystykach)
+        games_sq = (
+            select(
+                PlayerGameStats.user_id,
+                func.sum(PlayerGameStats.games_played).label('games_played')
+            )
+            .group_by(PlayerGameStats.user_id)
+            .subquery()
+        )
+        query = (
+            select(User, func.coalesce(games_sq.c.games_played, 0))
+            .outerjoin(games_sq, games_sq.c.user_id == User.id)
+        )
         if filters:
             query = query.where(and_(*filters))
-        
-        # Get all results first (potrzebne do sprawdzenia botów)
-        query = query.order_by(User.created_at.desc())
+        query = query.order_by(User.created_at.desc(), User.id.desc()).limit(limit).offset(offset)
         result = await session.execute(query)
-        all_users = result.scalars().all()
         
-        # Format response i filtruj po statusie
         users_data = []
-        for user in all_users:
-            # Sprawdź czy to bot
-            is_bot = False
-            try:
-                if user.settings:
-                    settings = json_lib.loads(user.settings)
-                    is_bot = settings.get('jest_botem', False)
-            except:
-                pass
-            
-            # Boty zawsze online
-            effective_status = 'online' if is_bot else user.status
-            
-            # Filtruj po statusie
-            if status:
-                if status == 'online' and effective_status != 'online':
-                    continue
-                elif status == 'offline' and effective_status != 'offline':
-                    continue
-                elif status == 'in_game' and effective_status != 'in_game':
-                    continue
-            
-            # Get games stats for this user
-            stats_result = await session.execute(
-                select(func.sum(PlayerGameStats.games_played))
-                .where(PlayerGameStats.user_id == user.id)
-            )
-            games_played = stats_result.scalar() or 0
-            
+        for user, games_played in result.all():
             users_data.append({
                 "id": user.id,
                 "username": user.username,
                 "email": user.email,
-                "status": effective_status,
+                "status": 'online' if user.is_bot else user.status,
                 "is_admin": user.is_admin,
-                "is_bot": is_bot,
+                "is_bot": user.is_bot,
                 "avatar_url": user.avatar_url,
                 "created_at": user.created_at.isoformat() if user.created_at else None,
-                "games_played": games_played
+                "games_played": int(games_played)
             })
         
-        # Paginacja
-        total = len(users_data)
-        users_data = users_data[offset:offset + limit]
-        
         return {
             "users": users_data,
             "total": total,
@@ -322,6 +291,14 @@ async def delete_user(
         await session.delete(user)
         
         await session.commit()
+        await session_service.invalidate(user_id)
+        await user_counters_service.user_deleted(is_bot=user.is_bot, is_guest=user.is_guest)
+        await leaderboard_service.remove_player(user.username)
+        
+        # Usunięty bot znika z rejestru botów we wszystkich procesach
+        from services.bot_registry import bot_registry
+        if user.username in bot_registry.bots:
+            await bot_registry.publish_change()
         
         return {
             "message": "Użytkownik usunięty pomyślnie",
@@ -364,6 +341,8 @@ async def toggle_admin(
         )
         
         await session.commit()
+        await session_service.invalidate(user_id)
+        await leaderboard_service.set_admin(user.username, grant)
         
         return {
             "message": f"Uprawnienia admina {'nadane' if grant else 'odebrane'}",
@@ -398,6 +377,7 @@ async def change_user_status(
         )
         
         await session.commit()
+        await session_service.invalidate(user_id)
         
         return {
             "message": "Status zmieniony",
@@ -642,6 +622,8 @@ async def stop_all_bots(admin: dict = Depends(get_current_admin)):
 async def configure_bots(
     min_interval: float = None,
     max_interval: float = None,
+    fill_delay_min: float = None,
+    fill_delay_max: float = None,
     game_type: str = None,
     players: int = None,
     admin: dict = Depends(get_current_admin)
@@ -650,8 +632,10 @@ async def configure_bots(
     Konfiguruj ustawienia bot matchmaking
     
     Args:
-        min_interval: Minimalny interwał między akcjami (sekundy)
-        max_interval: Maksymalny interwał między akcjami (sekundy)
+        min_interval: Minimalne opóźnienie tworzenia lobby / wyjścia z zakończonej gry (sekundy)
+        max_interval: Maksymalne opóźnienie tworzenia lobby / wyjścia z zakończonej gry (sekundy)
+        fill_delay_min: Minimalne opóźnienie dołączenia bota do lobby z wolnym miejscem (sekundy)
+        fill_delay_max: Maksymalne opóźnienie dołączenia bota do lobby z wolnym miejscem (sekundy)
         game_type: Preferowany typ gry ("66" lub "tysiac")
         players: Preferowana liczba graczy (3 lub 4)
     """
@@ -663,6 +647,12 @@ async def configure_bots(
     if max_interval is not None:
         bot_matchmaking.max_interval = max_interval
     
+    if fill_delay_min is not None:
+        bot_matchmaking.fill_delay_min = fill_delay_min
+    
+    if fill_delay_max is not None:
+        bot_matchmaking.fill_delay_max = fill_delay_max
+    
     if game_type is not None:
         if game_type not in ["66", "tysiac"]:
             raise HTTPException(status_code=400, detail="game_type musi być '66' lub 'tysiac'")
@@ -678,6 +668,8 @@ async def configure_bots(
         "config": {
             "min_interval": bot_matchmaking.min_interval,
             "max_interval": bot_matchmaking.max_interval,
+            "fill_delay_min": bot_matchmaking.fill_delay_min,
+            "fill_delay_max": bot_matchmaking.fill_delay_max,
             "preferred_game_type": bot_matchmaking.preferred_game_type,
             "preferred_players": bot_matchmaking.preferred_players
         }
@@ -696,7 +688,8 @@ async def get_all_lobbies(admin: dict = Depends(get_current_admin)):
     from services.redis_service import RedisService
     
     redis = RedisService()
-    lobbies = await redis.list_lobbies()
+    # Podsumowania z indeksu (HMGET) - bez ładowania pełnych lobby
+    lobbies = await redis.list_lobby_summaries()
     
     return {
         "total": len(lobbies),
@@ -704,9 +697,9 @@ async def get_all_lobbies(admin: dict = Depends(get_current_admin)):
             {
                 "id": l.get('id_gry'),
                 "nazwa": l.get('nazwa'),
-                "status": l.get('status_partii'),
-                "typ_gry": l.get('opcje', {}).get('typ_gry'),
-                "gracze": [s.get('nazwa') for s in l.get('slots', []) if s.get('typ') != 'pusty'],
+                "status": l.get('status'),
+                "typ_gry": l.get('typ_gry'),
+                "gracze": l.get('gracze', []),
                 "created_at": l.get('created_at')
             }
             for l in lobbies
@@ -11,6 +11,8 @@ import random
 
 from services.auth_service import AuthService
 from services.redis_service import RedisService, get_redis_client
+from services.presence_service import presence_service
+from services.user_counters_service import user_counters_service
 from dependencies import get_db, get_current_user
 from database import User
 
@@ -104,6 +106,7 @@ async def login(
     # Ustaw status na online
     user.status = 'online'
     await db.commit()
+    await presence_service.touch(user.id)
     
     print(f"✅ Login: {user.username} (ID: {user.id}, Admin: {user.is_admin})")
     
@@ -167,11 +170,13 @@ async def register(
     db.add(user)
     await db.commit()
     await db.refresh(user)
+    await user_counters_service.user_created()
     
     # Wygeneruj token i zapisz w Redis
     token = auth_service.generate_token()
     redis_client = get_redis_client()
     await redis_client.set(f"token:{token}", str(user.id), ex=86400)  # 24h
+    await presence_service.touch(user.id)
     
     print(f"✅ Rejestracja: {user.username} (ID: {user.id})")
     
@@ -217,16 +222,19 @@ async def guest_login(
         username=name,
         hashed_password=None,  # NULL = gość
         status='online',
-        is_admin=False  # Goście nie są adminami
+        is_admin=False,  # Goście nie są adminami
+        is_guest=True
     )
     db.add(user)
     await db.commit()
     await db.refresh(user)
+    await user_counters_service.user_created(is_guest=True)
     
     # Wygeneruj token i zapisz w Redis
     token = auth_service.generate_token()
     redis_client = get_redis_client()
     await redis_client.set(f"token:{token}", str(user.id), ex=86400)  # 24h
+    await presence_service.touch(user.id, is_guest=True)
     
     print(f"✅ Gość: {user.username} (ID: {user.id})")
     
@@ -305,6 +313,8 @@ async def set_offline(
         )
         user = result.scalar_one_or_none()
         
+        await presence_service.remove(user_id)
+        
         if user:
             user.status = 'offline'
             await db.commit()
@@ -322,33 +332,22 @@ async def set_offline(
 
 @router.post("/heartbeat")
 async def heartbeat(
-    user: dict = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    user: dict = Depends(get_current_user)
 ):
     """
-    Heartbeat - utrzymuje status online i aktualizuje last_seen w Redis
+    Heartbeat - utrzymuje status online (jeden zapis do Redis)
+    
+    Status w bazie aktualizuje zbiorczo cleanup_inactive_users
+    (presence_service.sync_status_to_db).
     
     Args:
         user: Current user (z dependency)
-        db: Database session
     
     Returns:
         dict: Success message
     """
     try:
-        # Zapisz timestamp heartbeat w Redis (wygasa po 3 min)
-        redis_client = get_redis_client()
-        await redis_client.set(f"heartbeat:{user['id']}", "1", ex=180)  # 3 minuty
-        
-        # Aktualizuj status w bazie na online
-        result = await db.execute(
-            select(User).where(User.id == user['id'])
-        )
-        db_user = result.scalar_one_or_none()
-        
-        if db_user and db_user.status != 'online':
-            db_user.status = 'online'
-            await db.commit()
+        await presence_service.touch(user['id'], is_guest=user.get('is_guest', False))
         
         return {"success": True}
         
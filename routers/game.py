@@ -4,30 +4,30 @@ Odpowiedzialność: State, play, finalize-trick, next-round
 """
 from fastapi import APIRouter, Depends, HTTPException, status
 from pydantic import BaseModel
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
 import traceback
-import asyncio
 from enum import Enum
 
-from services.redis_service import RedisService
+from services.redis_service import (
+    RedisService, game_aux_key,
+    NEXT_ROUND_VOTES_PREFIX, STAYING_PLAYERS_PREFIX
+)
 from services.bot_service import BotService
-from dependencies import get_current_user, get_redis
+from dependencies import get_current_user, get_redis, game_busy_error
+from redis_utils import LockTimeoutError, create_untracked_task
 from routers.websocket_router import manager
 
 # ============================================
 # HELPER FUNCTIONS
 # ============================================
 
-async def sync_match_score_to_lobby(game_id: str, engine, redis: RedisService):
+async def sync_match_score_to_lobby(game_id: str, engine, redis: RedisService, lock=None):
     """
     Synchronizuj punkty meczowe z silnika gry do lobby w Redis.
     Dzięki temu podgląd lobby pokazuje aktualny wynik.
+    Zapis idzie pod lockiem gry (przekazanym lub zdobytym tutaj).
     """
     try:
-        lobby_data = await redis.get_lobby(game_id)
-        if not lobby_data:
-            return
-        
         punkty_meczowe = {}
         
         from engines.tysiac_engine import TysiacEngine
@@ -48,8 +48,10 @@ async def sync_match_score_to_lobby(game_id: str, engine, redis: RedisService):
                     if hasattr(gracz, 'punkty_meczu'):
                         punkty_meczowe[gracz.nazwa] = gracz.punkty_meczu
         
-        lobby_data['punkty_meczowe'] = punkty_meczowe
-        await redis.save_lobby(game_id, lobby_data)
+        async with redis.held_game_lock(game_id, lock) as lock:
+            await redis.update_lobby(
+                game_id, lambda lobby_data: lobby_data.update(punkty_meczowe=punkty_meczowe), lock=lock
+            )
     
     except Exception as e:
         print(f"[Game] ⚠️ Błąd synchronizacji punktów: {e}")
@@ -118,8 +120,8 @@ async def get_game_state(
         HTTPException: 404 jeśli gra nie istnieje, 403 jeśli nie jesteś w grze
     """
     try:
-        # Sprawdź czy gra istnieje
-        lobby_data = await redis.get_lobby(game_id)
+        # Lobby + silnik jednym MGET
+        lobby_data, engine = await redis.get_game_state(game_id)
         if not lobby_data:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -140,9 +142,6 @@ async def get_game_state(
                 detail="Nie jesteś w tej grze"
             )
         
-        # Pobierz silnik z Redis
-        engine = await redis.get_game_engine(game_id)
-        
         if not engine:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -222,32 +221,35 @@ async def play_action(
         HTTPException: 400 jeśli akcja nieprawidłowa, 404 jeśli gra nie istnieje
     """
     try:
-        # Pobierz silnik
-        engine = await redis.get_game_engine(game_id)
-        
-        if not engine:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Silnik gry nie znaleziony"
-            )
-        
-        player_id = current_user['username']
-        
-        print(f"[Game] Gracz {player_id} wykonuje akcję: {action}")
-        
-        # Wykonaj akcję gracza i zachowaj wynik
-        action_result = None
-        try:
-            action_result = engine.perform_action(player_id, action)
-        except Exception as e:
-            print(f"❌ Błąd wykonywania akcji: {e}")
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=str(e)
-            )
-        
-        # Zapisz silnik (ze stanem PRZED finalizacją)
-        await redis.save_game_engine(game_id, engine)
+        # Lock gry - wyklucza równoległe mutacje silnika (inne procesy, boty)
+        lock = redis.game_lock(game_id)
+        async with lock:
+            # Pobierz silnik
+            engine = await redis.get_game_engine(game_id)
+            
+            if not engine:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Silnik gry nie znaleziony"
+                )
+            
+            player_id = current_user['username']
+            
+            print(f"[Game] Gracz {player_id} wykonuje akcję: {action}")
+            
+            # Wykonaj akcję gracza i zachowaj wynik
+            action_result = None
+            try:
+                action_result = engine.perform_action(player_id, action)
+            except Exception as e:
+                print(f"❌ Błąd wykonywania akcji: {e}")
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=str(e)
+                )
+            
+            # Zapisz silnik (ze stanem PRZED finalizacją, z tokenem fencingu)
+            await redis.save_game_engine(game_id, engine, lock=lock)
         
         # Przygotuj publiczny stan (dla dymków akcji)
         state = engine.game_state
@@ -285,37 +287,13 @@ async def play_action(
             })
         # === KONIEC BROADCAST MELDUNKU ===
         
-        # === AUTOMATYCZNA FINALIZACJA LEWY (z opóźnieniem) ===
-        # Jeśli lewa jest kompletna i czeka na finalizację, sfinalizuj automatycznie
+        # === AUTOMATYCZNA FINALIZACJA LEWY I AKCJE BOTÓW (W TLE) ===
+        # Kompletna lewa finalizowana po 1.5s przez harmonogram tempa gier
+        # (gracze widzą lewę), potem boty - odpowiedź HTTP wraca od razu
         if (hasattr(engine.game_state, 'lewa_do_zamkniecia') and 
             engine.game_state.lewa_do_zamkniecia):
-            
-            print(f"[Game] Auto-finalizacja lewy w grze {game_id}")
-            
-            # Opóźnienie 1.5s, żeby gracze zobaczyli kompletną lewę
-            await asyncio.sleep(1.5)
-            
-            # Finalizuj lewę
-            engine.game_state.finalizuj_lewe()
-            print(f"[Game] Lewa sfinalizowana automatycznie")
-            
-            # Zapisz po finalizacji
-            await redis.save_game_engine(game_id, engine)
-            
-            # Broadcast po finalizacji
-            await manager.broadcast(game_id, {
-                'type': 'trick_finalized'
-            })
-            
-            # Wyślij spersonalizowany stan każdemu graczowi
-            await manager.broadcast_state_update(game_id)
-            
-            # Synchronizuj punkty meczowe do lobby (dla podglądu)
-            await sync_match_score_to_lobby(game_id, engine, redis)
-        # === KONIEC AUTO-FINALIZACJI ===
-        
-        # === AUTOMATYCZNIE WYKONAJ AKCJE BOTÓW (W TLE) ===
-        asyncio.create_task(bot_service.process_bot_actions(game_id, engine, redis))
+            print(f"[Game] Auto-finalizacja lewy w grze {game_id} (zaplanowana)")
+        await bot_service.process_bot_actions(game_id, engine, redis)
         
         # Pobierz stan (boty grają w tle, aktualizacje przyjdą przez WebSocket)
         final_state = convert_enums_to_strings(engine.get_state_for_player(player_id))
@@ -328,6 +306,8 @@ async def play_action(
         
     except HTTPException:
         raise
+    except LockTimeoutError:
+        raise game_busy_error()
     except Exception as e:
         print(f"❌ Error in play_action: {e}")
         traceback.print_exc()
@@ -361,70 +341,73 @@ async def finalize_trick(
         HTTPException: 404 jeśli gra nie istnieje
     """
     try:
-        # Pobierz silnik
-        engine = await redis.get_game_engine(game_id)
-        
-        if not engine:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Silnik gry nie znaleziony"
-            )
-        
-        # Sprawdź czy lewa czeka na finalizację
-        if not hasattr(engine.game_state, 'lewa_do_zamkniecia') or not engine.game_state.lewa_do_zamkniecia:
-            # Jeśli lewa już sfinalizowana, zwróć aktualny stan (nie błąd!)
-            print(f"[Game] Lewa już sfinalizowana w grze {game_id}")
-            player_id = current_user['username']
-            new_state = convert_enums_to_strings(engine.get_state_for_player(player_id))
+        # Lock gry - finalizacja nie może nałożyć się na ruch bota/gracza
+        lock = redis.game_lock(game_id)
+        async with lock:
+            # Pobierz silnik
+            engine = await redis.get_game_engine(game_id)
             
-            return {
-                "success": True,
-                "message": "Lewa już sfinalizowana",
-                "state": new_state
-            }
-        
-        print(f"[Game] Finalizacja lewy w grze {game_id}")
-        
-        # Import FazaGry
-        from silnik_gry import FazaGry
-        
-        # Finalizuj lewę
-        engine.game_state.finalizuj_lewe()
-        
-        # === WYMUSZENIE PODSUMOWANIA GDY ROZDANIE ZAKOŃCZONE ===
-        if (hasattr(engine.game_state, 'rozdanie_zakonczone') and 
-            engine.game_state.rozdanie_zakonczone and 
-            hasattr(engine.game_state, 'faza')):
+            if not engine:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Silnik gry nie znaleziony"
+                )
             
-            # Sprawdź jaki to silnik
-            from engines.tysiac_engine import TysiacEngine
+            # Sprawdź czy lewa czeka na finalizację
+            if not hasattr(engine.game_state, 'lewa_do_zamkniecia') or not engine.game_state.lewa_do_zamkniecia:
+                # Jeśli lewa już sfinalizowana, zwróć aktualny stan (nie błąd!)
+                print(f"[Game] Lewa już sfinalizowana w grze {game_id}")
+                player_id = current_user['username']
+                new_state = convert_enums_to_strings(engine.get_state_for_player(player_id))
+                
+                return {
+                    "success": True,
+                    "message": "Lewa już sfinalizowana",
+                    "state": new_state
+                }
             
-            if isinstance(engine, TysiacEngine):
-                # Dla Tysiąca - użyj FazaGry z silnika Tysiąca
-                from silnik_tysiac import FazaGry as FazaGryTysiac
-                if engine.game_state.faza != FazaGryTysiac.PODSUMOWANIE_ROZDANIA:
-                    print(f"[Game] Tysiąc - rozdanie zakończone - wymuszam PODSUMOWANIE_ROZDANIA")
-                    engine.game_state.faza = FazaGryTysiac.PODSUMOWANIE_ROZDANIA
-                    engine.game_state.kolej_gracza_idx = None
-                    
-                    # Rozlicz jeśli jeszcze nie rozliczone
-                    if not hasattr(engine.game_state, 'podsumowanie') or not engine.game_state.podsumowanie:
-                        engine.game_state.rozlicz_rozdanie()
-            else:
-                # Dla 66 - użyj FazaGry z silnika 66
-                from silnik_gry import FazaGry
-                if engine.game_state.faza != FazaGry.PODSUMOWANIE_ROZDANIA:
-                    print(f"[Game] 66 - rozdanie zakończone - wymuszam PODSUMOWANIE_ROZDANIA")
-                    engine.game_state.faza = FazaGry.PODSUMOWANIE_ROZDANIA
-                    engine.game_state.kolej_gracza_idx = None
-                    
-                    # Rozlicz jeśli jeszcze nie rozliczone
-                    if not hasattr(engine.game_state, 'podsumowanie') or not engine.game_state.podsumowanie:
-                        engine.game_state.rozlicz_rozdanie()
-        # === KONIEC WYMUSZENIA ===
-        
-        # Zapisz silnik
-        await redis.save_game_engine(game_id, engine)
+            print(f"[Game] Finalizacja lewy w grze {game_id}")
+            
+            # Import FazaGry
+            from silnik_gry import FazaGry
+            
+            # Finalizuj lewę
+            engine.game_state.finalizuj_lewe()
+            
+            # === WYMUSZENIE PODSUMOWANIA GDY ROZDANIE ZAKOŃCZONE ===
+            if (hasattr(engine.game_state, 'rozdanie_zakonczone') and 
+                engine.game_state.rozdanie_zakonczone and 
+                hasattr(engine.game_state, 'faza')):
+                
+                # Sprawdź jaki to silnik
+                from engines.tysiac_engine import TysiacEngine
+                
+                if isinstance(engine, TysiacEngine):
+                    # Dla Tysiąca - użyj FazaGry z silnika Tysiąca
+                    from silnik_tysiac import FazaGry as FazaGryTysiac
+                    if engine.game_state.faza != FazaGryTysiac.PODSUMOWANIE_ROZDANIA:
+                        print(f"[Game] Tysiąc - rozdanie zakończone - wymuszam PODSUMOWANIE_ROZDANIA")
+                        engine.game_state.faza = FazaGryTysiac.PODSUMOWANIE_ROZDANIA
+                        engine.game_state.kolej_gracza_idx = None
+                        
+                        # Rozlicz jeśli jeszcze nie rozliczone
+                        if not hasattr(engine.game_state, 'podsumowanie') or not engine.game_state.podsumowanie:
+                            engine.game_state.rozlicz_rozdanie()
+                else:
+                    # Dla 66 - użyj FazaGry z silnika 66
+                    from silnik_gry import FazaGry
+                    if engine.game_state.faza != FazaGry.PODSUMOWANIE_ROZDANIA:
+                        print(f"[Game] 66 - rozdanie zakończone - wymuszam PODSUMOWANIE_ROZDANIA")
+                        engine.game_state.faza = FazaGry.PODSUMOWANIE_ROZDANIA
+                        engine.game_state.kolej_gracza_idx = None
+                        
+                        # Rozlicz jeśli jeszcze nie rozliczone
+                        if not hasattr(engine.game_state, 'podsumowanie') or not engine.game_state.podsumowanie:
+                            engine.game_state.rozlicz_rozdanie()
+            # === KONIEC WYMUSZENIA ===
+            
+            # Zapisz silnik (z tokenem fencingu)
+            await redis.save_game_engine(game_id, engine, lock=lock)
         
         # Pobierz nowy stan
         player_id = current_user['username']
@@ -442,7 +425,7 @@ async def finalize_trick(
         await sync_match_score_to_lobby(game_id, engine, redis)
         
         # Auto-wykonaj akcje botów (W TLE)
-        asyncio.create_task(bot_service.process_bot_actions(game_id, engine, redis))
+        await bot_service.process_bot_actions(game_id, engine, redis)
         
         return {
             "success": True,
@@ -452,6 +435,8 @@ async def finalize_trick(
         
     except HTTPException:
         raise
+    except LockTimeoutError:
+        raise game_busy_error()
     except Exception as e:
         print(f"❌ Error finalizing trick: {e}")
         traceback.print_exc()
@@ -464,6 +449,51 @@ async def finalize_trick(
 # VOTE FOR NEXT ROUND
 # ============================================
 
+def _match_end_status(engine: Any) -> Tuple[bool, Optional[str], Dict[str, int]]:
+    """
+    Czy mecz się zakończył (Tysiąc: 1000 pkt, 66: 66 punktów meczowych)
+    
+    Returns:
+        Tuple: (mecz_zakonczony, zwyciezca_meczu, punkty_meczowe)
+    """
+    from engines.tysiac_engine import TysiacEngine
+    
+    mecz_zakonczony = False
+    zwyciezca_meczu = None
+    punkty_meczowe = {}
+    
+    if isinstance(engine, TysiacEngine):
+        # Tysiąc - sprawdź czy ktoś ma >= 1000 punktów
+        if hasattr(engine.game_state, 'gracze'):
+            for gracz in engine.game_state.gracze:
+                if hasattr(gracz, 'punkty_meczu'):
+                    punkty_meczowe[gracz.nazwa] = gracz.punkty_meczu
+                    if gracz.punkty_meczu >= 1000:
+                        mecz_zakonczony = True
+                        zwyciezca_meczu = gracz.nazwa
+                        break
+    else:
+        # 66 - sprawdź czy drużyna/gracz ma >= 66 punktów meczowych
+        if hasattr(engine.game_state, 'druzyny') and engine.game_state.druzyny:
+            for druzyna in engine.game_state.druzyny:
+                if hasattr(druzyna, 'punkty_meczu'):
+                    punkty_meczowe[druzyna.nazwa] = druzyna.punkty_meczu
+                    if druzyna.punkty_meczu >= 66:
+                        mecz_zakonczony = True
+                        zwyciezca_meczu = druzyna.nazwa
+                        break
+        elif hasattr(engine.game_state, 'gracze'):
+            for gracz in engine.game_state.gracze:
+                if hasattr(gracz, 'punkty_meczu'):
+                    punkty_meczowe[gracz.nazwa] = gracz.punkty_meczu
+                    if gracz.punkty_meczu >= 66:
+                        mecz_zakonczony = True
+                        zwyciezca_meczu = gracz.nazwa
+                        break
+    
+    return mecz_zakonczony, zwyciezca_meczu, punkty_meczowe
+
+
 @router.post("/{game_id}/next-round")
 async def vote_next_round(
     game_id: str,
@@ -500,68 +530,60 @@ async def vote_next_round(
         # === SPRAWDŹ CZY MECZ SIĘ ZAKOŃCZYŁ (66 PUNKTÓW MECZOWYCH) ===
         from engines.tysiac_engine import TysiacEngine
         
-        mecz_zakonczony = False
-        zwyciezca_meczu = None
-        punkty_meczowe = {}
+        mecz_zakonczony, zwyciezca_meczu, punkty_meczowe = _match_end_status(engine)
         
-        if isinstance(engine, TysiacEngine):
-            # Tysiąc - sprawdź czy ktoś ma >= 1000 punktów
-            if hasattr(engine.game_state, 'gracze'):
-                for gracz in engine.game_state.gracze:
-                    if hasattr(gracz, 'punkty_meczu'):
-                        punkty_meczowe[gracz.nazwa] = gracz.punkty_meczu
-                        if gracz.punkty_meczu >= 1000:
-                            mecz_zakonczony = True
-                            zwyciezca_meczu = gracz.nazwa
-                            break
-        else:
-            # 66 - sprawdź czy drużyna/gracz ma >= 66 punktów meczowych
-            if hasattr(engine.game_state, 'druzyny') and engine.game_state.druzyny:
-                for druzyna in engine.game_state.druzyny:
-                    if hasattr(druzyna, 'punkty_meczu'):
-                        punkty_meczowe[druzyna.nazwa] = druzyna.punkty_meczu
-                        if druzyna.punkty_meczu >= 66:
-                            mecz_zakonczony = True
-                            zwyciezca_meczu = druzyna.nazwa
-                            break
-            elif hasattr(engine.game_state, 'gracze'):
-                for gracz in engine.game_state.gracze:
-                    if hasattr(gracz, 'punkty_meczu'):
-                        punkty_meczowe[gracz.nazwa] = gracz.punkty_meczu
-                        if gracz.punkty_meczu >= 66:
-                            mecz_zakonczony = True
-                            zwyciezca_meczu = gracz.nazwa
-                            break
+        if mecz_zakonczony:
+            # Odczyt-modyfikacja-zapis pod lockiem gry, na świeżym silniku
+            # (równoległy bot / finalize-trick z innego procesu)
+            async with redis.game_lock(game_id) as lock:
+                engine = await redis.get_game_engine(game_id) or engine
+                mecz_zakonczony, zwyciezca_meczu, punkty_meczowe = _match_end_status(engine)
+                
+                podsumowanie = getattr(engine.game_state, 'podsumowanie', None) or {}
+                already_finished = bool(podsumowanie.get('mecz_zakonczony'))
+                
+                if mecz_zakonczony and not already_finished:
+                    print(f"[Game] 🏆 MECZ ZAKOŃCZONY! Zwycięzca: {zwyciezca_meczu}")
+                    
+                    # Ustaw fazę na ZAKONCZONE
+                    if isinstance(engine, TysiacEngine):
+                        from silnik_tysiac import FazaGry as FazaGryTysiac
+                        engine.game_state.faza = FazaGryTysiac.ZAKONCZONE
+                    else:
+                        from silnik_gry import FazaGry
+                        engine.game_state.faza = FazaGry.ZAKONCZONE
+                    
+                    engine.game_state.kolej_gracza_idx = None
+                    
+                    # Zapisz informację o końcu meczu w podsumowaniu
+                    if not hasattr(engine.game_state, 'podsumowanie') or not engine.game_state.podsumowanie:
+                        engine.game_state.podsumowanie = {}
+                    engine.game_state.podsumowanie['mecz_zakonczony'] = True
+                    engine.game_state.podsumowanie['zwyciezca_meczu'] = zwyciezca_meczu
+                    engine.game_state.podsumowanie['punkty_meczowe_koncowe'] = punkty_meczowe
+                    
+                    # Zapisz silnik i status lobby ZAKONCZONA
+                    await redis.save_game_engine(game_id, engine, lock=lock)
+                    
+                    lobby_data = await redis.update_lobby(
+                        game_id, lambda lobby: lobby.update(status_partii='ZAKONCZONA'), lock=lock
+                    )
+        
+        if mecz_zakonczony and already_finished:
+            # Koniec meczu zapisany już przez inny głos - bez ponownych statystyk
+            final_state = convert_enums_to_strings(engine.get_state_for_player(player_id))
+            final_state['mecz_zakonczony'] = True
+            final_state['zwyciezca_meczu'] = zwyciezca_meczu
+            final_state['punkty_meczowe_koncowe'] = punkty_meczowe
+            return {
+                "success": True,
+                "message": f"Mecz zakończony! Zwycięzca: {zwyciezca_meczu}",
+                "game_ended": True,
+                "winner": zwyciezca_meczu,
+                "state": final_state
+            }
         
         if mecz_zakonczony:
-            print(f"[Game] 🏆 MECZ ZAKOŃCZONY! Zwycięzca: {zwyciezca_meczu}")
-            
-            # Ustaw fazę na ZAKONCZONE
-            if isinstance(engine, TysiacEngine):
-                from silnik_tysiac import FazaGry as FazaGryTysiac
-                engine.game_state.faza = FazaGryTysiac.ZAKONCZONE
-            else:
-                from silnik_gry import FazaGry
-                engine.game_state.faza = FazaGry.ZAKONCZONE
-            
-            engine.game_state.kolej_gracza_idx = None
-            
-            # Zapisz informację o końcu meczu w podsumowaniu
-            if not hasattr(engine.game_state, 'podsumowanie') or not engine.game_state.podsumowanie:
-                engine.game_state.podsumowanie = {}
-            engine.game_state.podsumowanie['mecz_zakonczony'] = True
-            engine.game_state.podsumowanie['zwyciezca_meczu'] = zwyciezca_meczu
-            engine.game_state.podsumowanie['punkty_meczowe_koncowe'] = punkty_meczowe
-            
-            # Zapisz silnik
-            await redis.save_game_engine(game_id, engine)
-            
-            # Aktualizuj status lobby na ZAKONCZONA
-            lobby_data = await redis.get_lobby(game_id)
-            if lobby_data:
-                lobby_data['status_partii'] = 'ZAKONCZONA'
-                await redis.save_lobby(game_id, lobby_data)
-            
             # === INKREMENTUJ LICZNIK ROZEGRANYCH GIER ===
             try:
                 await redis.redis.incr("stats:total_games")
@@ -610,14 +632,13 @@ async def vote_next_round(
                             else:
                                 loser_usernames.append(gracz.nazwa)
                 
-                # Aktualizuj statystyki (w tle)
-                asyncio.create_task(
-                    update_player_stats_after_game(
-                        winner_usernames=winner_usernames,
-                        loser_usernames=loser_usernames,
-                        game_type_name=game_type_name,
-                        is_casual=is_casual
-                    )
+                # Zgłoś wynik do zaksięgowania (XADD - bez czekania na bazę)
+                await update_player_stats_after_game(
+                    winner_usernames=winner_usernames,
+                    loser_usernames=loser_usernames,
+                    game_type_name=game_type_name,
+                    is_casual=is_casual,
+                    match_id=getattr(engine, 'match_id', None)
                 )
                 print(f"[📊 Stats] Aktualizacja: winners={winner_usernames}, losers={loser_usernames}, casual={is_casual}")
             except Exception as stats_err:
@@ -641,7 +662,7 @@ async def vote_next_round(
             await manager.broadcast_state_update(game_id)
             
             # Uruchom głosowanie botów za powrotem do lobby (w tle)
-            asyncio.create_task(bot_service.trigger_return_to_lobby_voting(game_id, redis))
+            create_untracked_task(bot_service.trigger_return_to_lobby_voting(game_id, redis))
             
             return {
                 "success": True,
@@ -655,7 +676,7 @@ async def vote_next_round(
         # === SYSTEM GŁOSOWANIA NA NASTĘPNĄ RUNDĘ ===
         
         # Pobierz listę głosów z Redis
-        votes_key = f"next_round_votes:{game_id}"
+        votes_key = game_aux_key(NEXT_ROUND_VOTES_PREFIX, game_id)
         votes_data = await redis.redis.get(votes_key)
         
         if votes_data:
@@ -691,14 +712,17 @@ async def vote_next_round(
             await redis.redis.delete(votes_key)
             
             # Rozpocznij następną rundę
-            return await _start_next_round_internal(game_id, engine, redis, player_id)
+            # Pod lockiem gry, na świeżym silniku (równoległy głos/bot z innego procesu)
+            async with redis.game_lock(game_id) as lock:
+                engine = await redis.get_game_engine(game_id) or engine
+                return await _start_next_round_internal(game_id, engine, redis, player_id, lock=lock)
         else:
             # Czekamy na pozostałych graczy
             missing = [p for p in all_players if p not in votes]
             print(f"[Game] Czekam na głosy: {missing}")
             
             # === URUCHOM GŁOSOWANIE BOTÓW (W TLE) ===
-            asyncio.create_task(bot_service.trigger_bot_next_round_votes(game_id, engine, redis))
+            await bot_service.trigger_bot_next_round_votes(game_id, engine, redis)
             
             state = convert_enums_to_strings(engine.get_state_for_player(player_id))
             state['waiting_for_votes'] = True
@@ -718,6 +742,8 @@ async def vote_next_round(
         
     except HTTPException:
         raise
+    except LockTimeoutError:
+        raise game_busy_error()
     except Exception as e:
         print(f"❌ Error in vote_next_round: {e}")
         traceback.print_exc()
@@ -731,11 +757,12 @@ async def _start_next_round_internal(
     game_id: str,
     engine: Any,
     redis: RedisService,
-    player_id: str
+    player_id: str,
+    lock: Any = None
 ):
     """
     Wewnętrzna funkcja rozpoczynająca nową rundę.
-    Wywoływana gdy wszyscy gracze zagłosowali.
+    Wywoływana gdy wszyscy gracze zagłosowali (lock = trzymany lock gry).
     """
     print(f"[Game] Rozpoczynam następną rundę w grze {game_id}")
     
@@ -841,8 +868,8 @@ async def _start_next_round_internal(
     if hasattr(engine.game_state, 'rozpocznij_nowe_rozdanie'):
         engine.game_state.rozpocznij_nowe_rozdanie()
     
-    # Zapisz silnik
-    await redis.save_game_engine(game_id, engine)
+    # Zapisz silnik (z tokenem fencingu)
+    await redis.save_game_engine(game_id, engine, lock=lock)
     
     # Pobierz nowy stan
     new_state = convert_enums_to_strings(engine.get_state_for_player(player_id))
@@ -856,10 +883,10 @@ async def _start_next_round_internal(
     await manager.broadcast_state_update(game_id)
     
     # Synchronizuj punkty meczowe do lobby (dla podglądu)
-    await sync_match_score_to_lobby(game_id, engine, redis)
+    await sync_match_score_to_lobby(game_id, engine, redis, lock=lock)
     
     # === AUTO-WYKONAJ AKCJE BOTÓW (W TLE) ===
-    asyncio.create_task(bot_service.process_bot_actions(game_id, engine, redis))
+    await bot_service.process_bot_actions(game_id, engine, redis)
     
     return {
         "success": True,
@@ -911,7 +938,7 @@ async def return_to_lobby(
         
         # Dodaj gracza do listy zostających
         import json
-        staying_key = f"staying_players:{game_id}"
+        staying_key = game_aux_key(STAYING_PLAYERS_PREFIX, game_id)
         staying_data = await redis.redis.get(staying_key)
         staying = json.loads(staying_data) if staying_data else []
         
@@ -1000,125 +1027,3 @@ async def leave_to_dashboard(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
         )
-
-
-# Stara funkcja _finalize_lobby_return - zachowana dla kompatybilności
-# ale główna logika jest teraz w bot_service._finalize_end_game_lobby
-
-
-async def _finalize_lobby_return(
-    game_id: str,
-    lobby_data: dict,
-    votes: dict,
-    redis: RedisService
-):
-    """
-    Finalizuj powrót do lobby - usuń graczy którzy wychodzą,
-    wybierz nowego hosta jeśli potrzeba.
-    """
-    import json
-    
-    staying_players = votes['stay']
-    leaving_players = votes['leave']
-    
-    print(f"[Game] Finalizacja powrotu: zostają={staying_players}, wychodzą={leaving_players}")
-    
-    # Jeśli nikt nie zostaje, usuń lobby
-    if not staying_players:
-        await redis.delete_lobby(game_id)
-        await redis.redis.delete(f"game_engine:{game_id}")
-        await redis.redis.delete(f"return_to_lobby_votes:{game_id}")
-        
-        await manager.broadcast(game_id, {
-            'type': 'lobby_closed',
-            'reason': 'Wszyscy opuścili grę'
-        })
-        
-        return {
-            "success": True,
-            "message": "Lobby zamknięte - wszyscy wyszli",
-            "lobby_closed": True
-        }
-    
-    # Usuń graczy którzy wychodzą ze slotów
-    slots = lobby_data.get('slots', [])
-    old_host_slot_idx = None
-    
-    for i, slot in enumerate(slots):
-        if slot.get('is_host'):
-            old_host_slot_idx = i
-        
-        if slot.get('nazwa') in leaving_players:
-            # Opróżnij slot
-            slot['typ'] = 'pusty'
-            slot['id_uzytkownika'] = None
-            slot['nazwa'] = None
-            slot['is_host'] = False
-            slot['ready'] = False
-            slot['avatar_url'] = None
-    
-    # Sprawdź czy host został
-    current_host_name = None
-    for slot in slots:
-        if slot.get('is_host') and slot.get('nazwa'):
-            current_host_name = slot['nazwa']
-            break
-    
-    # Jeśli host wyszedł, wybierz nowego (najbliżej starego slotu hosta)
-    if not current_host_name:
-        # Znajdź gracza najbliżej starego slotu hosta (zgodnie z ruchem gry)
-        num_slots = len(slots)
-        new_host_slot = None
-        
-        if old_host_slot_idx is not None:
-            # Szukaj od następnego slotu (zgodnie z ruchem gry)
-            for offset in range(1, num_slots + 1):
-                check_idx = (old_host_slot_idx + offset) % num_slots
-                slot = slots[check_idx]
-                if slot.get('nazwa') in staying_players and slot.get('typ') == 'gracz':
-                    new_host_slot = slot
-                    break
-        
-        # Jeśli nie znaleziono gracza, weź pierwszego zostającego
-        if not new_host_slot:
-            for slot in slots:
-                if slot.get('nazwa') in staying_players:
-                    new_host_slot = slot
-                    break
-        
-        if new_host_slot:
-            new_host_slot['is_host'] = True
-            lobby_data['host_id'] = new_host_slot.get('id_uzytkownika')
-            print(f"[Game] Nowy host: {new_host_slot['nazwa']}")
-    
-    # Zresetuj gotowość wszystkich
-    for slot in slots:
-        if slot.get('typ') in ['gracz', 'bot']:
-            slot['ready'] = False
-    
-    # Zmień status na LOBBY
-    lobby_data['status_partii'] = 'LOBBY'
-    
-    # Zapisz lobby
-    await redis.save_lobby(game_id, lobby_data)
-    
-    # Usuń silnik gry i głosy
-    await redis.redis.delete(f"game_engine:{game_id}")
-    await redis.redis.delete(f"return_to_lobby_votes:{game_id}")
-    
-    # Broadcast powrotu do lobby
-    await manager.broadcast(game_id, {
-        'type': 'returned_to_lobby',
-        'lobby': lobby_data,
-        'staying_players': staying_players,
-        'leaving_players': leaving_players
-    })
-    
-    return {
-        "success": True,
-        "message": "Powrót do lobby",
-        "returned": True,
-        "lobby": lobby_data,
-        "staying_players": staying_players,
-        "leaving_players": leaving_players
-    }
\ No newline at end of file
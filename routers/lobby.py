@@ -11,9 +11,11 @@ import json
 import asyncio
 import random
 
-from services.redis_service import RedisService
+from services.redis_service import RedisService, is_chat_cursor, CHAT_MAX_MESSAGES
 from services.game_service import GameService
-from dependencies import get_current_user, get_redis
+from services.lobby_service import LobbyService
+from dependencies import get_current_user, get_redis, redis_roundtrip_budget, game_busy_error
+from redis_utils import LockTimeoutError, create_untracked_task
 from database import async_sessionmaker, User
 from sqlalchemy import select
 
@@ -40,6 +42,50 @@ class ChatMessageRequest(BaseModel):
 router = APIRouter()
 game_service = GameService()
 
+# Kody błędów LobbyService -> (status HTTP, komunikat)
+LOBBY_ERRORS = {
+    'NOT_FOUND': (status.HTTP_404_NOT_FOUND, "Lobby nie znalezione"),
+    'KICKED': (status.HTTP_403_FORBIDDEN, "Zostałeś wyrzucony z tego lobby"),
+    'FULL': (status.HTTP_400_BAD_REQUEST, "Lobby jest pełne"),
+    'NOT_IN_LOBBY': (status.HTTP_400_BAD_REQUEST, "Nie jesteś w tym lobby"),
+    'NOT_HOST': (status.HTTP_403_FORBIDDEN, "Tylko host może to zrobić"),
+    'PLAYER_NOT_FOUND': (status.HTTP_404_NOT_FOUND, "Gracz nie znaleziony w lobby"),
+    'BAD_SLOT': (status.HTTP_400_BAD_REQUEST, "Nieprawidłowy numer slotu"),
+    'SLOT_TAKEN': (status.HTTP_400_BAD_REQUEST, "Ten slot jest zajęty"),
+    'NO_FREE_SLOT': (status.HTTP_400_BAD_REQUEST, "Brak wolnych slotów"),
+    'SAME_SLOT': (status.HTTP_400_BAD_REQUEST, "Już jesteś na tym slocie"),
+    'IN_GAME': (status.HTTP_400_BAD_REQUEST, "Nie można zmieniać slotów podczas gry"),
+    'NOT_BOT': (status.HTTP_400_BAD_REQUEST, "W tym slocie nie ma bota"),
+    'BAD_SLOT_A': (status.HTTP_400_BAD_REQUEST, "Nieprawidłowy numer slotu"),
+    'BAD_SLOT_B': (status.HTTP_400_BAD_REQUEST, "Nieprawidłowy numer slotu"),
+    'ALREADY_IN_LOBBY': (status.HTTP_400_BAD_REQUEST, "Bot jest już w lobby"),
+    'ALREADY_HOST': (status.HTTP_400_BAD_REQUEST, "Już jesteś hostem"),
+    'NEW_HOST_NOT_FOUND': (status.HTTP_404_NOT_FOUND, "Nowy host nie znaleziony w lobby"),
+    'NEW_HOST_IS_BOT': (status.HTTP_400_BAD_REQUEST, "Nie można przekazać hosta botowi"),
+    'BAD_STATUS': (status.HTTP_400_BAD_REQUEST, "Gra już się rozpoczęła"),
+    'NOT_FULL': (status.HTTP_400_BAD_REQUEST, "Nie wszystkie miejsca są zajęte"),
+    'NOT_READY': (status.HTTP_400_BAD_REQUEST, "Nie wszyscy gracze są gotowi"),
+    'REDIS_ERROR': (status.HTTP_503_SERVICE_UNAVAILABLE, "Błąd zapisu lobby, spróbuj ponownie"),
+}
+
+def raise_lobby_error(error: str, messages: Optional[Dict[str, str]] = None):
+    """
+    Zamień kod błędu LobbyService na HTTPException
+    
+    Args:
+        error: Kod błędu z LobbyService
+        messages: Nadpisane komunikaty dla endpointu (kod -> tekst)
+    
+    Raises:
+        HTTPException: Zawsze
+    """
+    status_code, detail = LOBBY_ERRORS.get(
+        error, (status.HTTP_400_BAD_REQUEST, "Nie można wykonać operacji na lobby")
+    )
+    if messages and error in messages:
+        detail = messages[error]
+    raise HTTPException(status_code=status_code, detail=detail)
+
 # ============================================
 # HELPER - Delayed Bot Ready (background task)
 # ============================================
@@ -53,21 +99,12 @@ async def _delayed_bot_ready(lobby_id: str, bot_name: str, redis: RedisService):
     await asyncio.sleep(delay)
     
     try:
-        # Pobierz świeże dane lobby
-        lobby_data = await redis.get_lobby(lobby_id)
-        if not lobby_data or lobby_data.get('status_partii') != 'LOBBY':
-            return  # Lobby zniknęło lub gra wystartowała
-        
-        # Znajdź slot bota i daj gotowość
-        for slot in lobby_data.get('slots', []):
-            if slot.get('nazwa') == bot_name:
-                slot['ready'] = True
-                break
-        else:
-            return  # Bot nie znaleziony (został usunięty?)
-        
-        # Zapisz
-        await redis.save_lobby(lobby_id, lobby_data)
+        # Atomowo: tylko jeśli lobby nadal czeka i bot wciąż siedzi w slocie
+        lobby_data, error, _ = await LobbyService(redis).set_ready(
+            lobby_id, name=bot_name, value=True, require_status='LOBBY'
+        )
+        if error:
+            return  # Lobby zniknęło, gra wystartowała lub bot został usunięty
         
         # System message
         await send_system_message(lobby_id, f"{bot_name} jest gotowy", redis)
@@ -81,17 +118,15 @@ async def _delayed_bot_ready(lobby_id: str, bot_name: str, redis: RedisService):
 # HELPER - Update Last Activity
 # ============================================
 
-async def update_last_activity(lobby_id: str, lobby_data: dict, redis: RedisService):
+async def update_last_activity(lobby_id: str, redis: RedisService):
     """
-    Aktualizuj timestamp ostatniej aktywności w lobby
+    Aktualizuj timestamp ostatniej aktywności w lobby (bez nadpisywania slotów)
     
     Args:
         lobby_id: ID lobby
-        lobby_data: Dane lobby
         redis: Redis service
     """
-    lobby_data['last_activity'] = time.time()
-    await redis.save_lobby(lobby_id, lobby_data)
+    await LobbyService(redis).touch(lobby_id)
 
 # ============================================
 # HELPER - Send System Message
@@ -115,10 +150,7 @@ async def send_system_message(lobby_id: str, message: str, redis: RedisService):
         "is_system": True
     }
     
-    chat_key = f"lobby:{lobby_id}:chat"
-    await redis.redis.rpush(chat_key, json.dumps(chat_message))
-    await redis.redis.ltrim(chat_key, -100, -1)
-    await redis.redis.expire(chat_key, 86400)
+    await redis.append_chat(lobby_id, chat_message)
     
     print(f"📢 [SYSTEM] [{lobby_id}] {message}")
 
@@ -127,20 +159,30 @@ async def send_system_message(lobby_id: str, message: str, redis: RedisService):
 # ============================================
 
 @router.get("/list")
-async def list_lobbies(redis: RedisService = Depends(get_redis)):
+async def list_lobbies(
+    typ_gry: Optional[str] = Query(None, description="Filtr typu gry (66 / tysiac)"),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=500),
+    redis: RedisService = Depends(get_redis)
+):
     """
     Lista wszystkich dostępnych lobby (w lobby i w grze)
     
+    Args:
+        typ_gry: Opcjonalny filtr typu gry
+        offset: Paginacja - ile pominąć
+        limit: Paginacja - rozmiar strony
+    
     Returns:
         dict: Lista lobby
     """
-    lobbies = await redis.list_lobbies()
-    
-    # Filtruj lobby w statusie LOBBY lub W_GRZE (nie zakończone)
-    available_lobbies = [
-        lobby for lobby in lobbies
-        if lobby.get("status_partii") in ["LOBBY", "W_GRZE", "W_TRAKCIE"]
-    ]
+    # Tylko lobby w statusie LOBBY lub W_GRZE (nie zakończone) - z indeksu
+    available_lobbies = await redis.list_lobbies(
+        status=["LOBBY", "W_GRZE", "W_TRAKCIE"],
+        typ_gry=typ_gry,
+        offset=offset,
+        limit=limit
+    )
     
     # Zwróć listę bezpośrednio (kompatybilność z frontendem)
     return available_lobbies
@@ -229,19 +271,16 @@ async def create_lobby(
         "host_id": current_user['id'],
         "tryb_lobby": "online",
         "kicked_players": [],
-        "created_at": time.time()
+        "created_at": time.time(),
+        "last_activity": time.time()
     }
     
-    # Zapisz w Redis
+    # Zapisz w Redis - bez locka gry: nowe ID, nikt inny jeszcze nie pisze do tego lobby
     await redis.save_lobby(game_id, lobby_data)
     
-    # System message
+    # System message (Lua - atomowo, nie nadpisujemy już lobby drugim zapisem)
     await send_system_message(game_id, f"Lobby utworzone przez {current_user['username']}", redis)
     
-    # Aktualizuj last_activity
-    lobby_data['last_activity'] = time.time()
-    await redis.save_lobby(game_id, lobby_data)
-    
     print(f"✅ Lobby utworzone: {game_id} przez {current_user['username']}")
     
     return lobby_data
@@ -302,51 +341,19 @@ async def join_lobby(
     Raises:
         HTTPException: 400/404 jeśli nie można dołączyć
     """
-    lobby_data = await redis.get_lobby(lobby_id)
-    
-    if not lobby_data:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Lobby nie znalezione"
-        )
-    
-    # Sprawdź czy gracz nie jest wyrzucony
-    if current_user['id'] in lobby_data.get('kicked_players', []):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Zostałeś wyrzucony z tego lobby"
-        )
-    
-    # Sprawdź czy lobby jest pełne
-    slots = lobby_data.get('slots', [])
-    empty_slot = None
-    for slot in slots:
-        if slot['typ'] == 'pusty':
-            empty_slot = slot
-            break
-    
-    if not empty_slot:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Lobby jest pełne"
-        )
+    lobby_data, error, info = await LobbyService(redis).join(
+        lobby_id, current_user['id'], current_user['username']
+    )
     
-    # Zajmij slot
-    empty_slot['typ'] = 'gracz'
-    empty_slot['id_uzytkownika'] = current_user['id']
-    empty_slot['nazwa'] = current_user['username']
-    empty_slot['ready'] = False
-    empty_slot['avatar_url'] = 'default_avatar.png'
+    if error:
+        raise_lobby_error(error)
     
-    # Zapisz
-    await redis.save_lobby(lobby_id, lobby_data)
+    if info.get('already'):
+        return lobby_data
     
     # System message
     await send_system_message(lobby_id, f"{current_user['username']} dołączył do lobby", redis)
     
-    # Aktualizuj last_activity
-    await update_last_activity(lobby_id, lobby_data, redis)
-    
     print(f"✅ {current_user['username']} dołączył do lobby {lobby_id}")
     
     return lobby_data
@@ -375,47 +382,22 @@ async def leave_lobby(
     Raises:
         HTTPException: 404 jeśli lobby nie istnieje
     """
-    lobby_data = await redis.get_lobby(lobby_id)
+    lobby_data, error, info = await LobbyService(redis).leave(lobby_id, current_user['id'])
     
-    if not lobby_data:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Lobby nie znalezione"
-        )
+    if error:
+        raise_lobby_error(error)
     
-    # Znajdź slot gracza
-    slots = lobby_data.get('slots', [])
-    player_slot = None
-    for slot in slots:
-        if slot.get('id_uzytkownika') == current_user['id']:
-            player_slot = slot
-            break
-    
-    if not player_slot:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Nie jesteś w tym lobby"
-        )
-    
-    # Jeśli to host, usuń lobby
-    if player_slot.get('is_host'):
-        await redis.delete_lobby(lobby_id)
+    # Host wychodzi - Lua usunął lobby i wersję, tu sprzątamy resztę kluczy gry
+    # (czat, silnik, głosowania, rozłączenia) - podsumowania w indeksie już nie ma
+    if info.get('deleted'):
+        players = [s.get('nazwa') for s in lobby_data.get('slots', []) if s.get('nazwa')]
+        await redis.purge_games([lobby_id], players={lobby_id: players})
         print(f"✅ Host {current_user['username']} opuścił lobby {lobby_id} - lobby usunięte")
         return {"success": True, "message": "Lobby usunięte"}
     
     # System message
     await send_system_message(lobby_id, f"{current_user['username']} opuścił lobby", redis)
     
-    # Opróżnij slot
-    player_slot['typ'] = 'pusty'
-    player_slot['id_uzytkownika'] = None
-    player_slot['nazwa'] = None
-    player_slot['ready'] = False
-    player_slot['avatar_url'] = None
-    
-    # Zapisz
-    await redis.save_lobby(lobby_id, lobby_data)
-    
     print(f"✅ {current_user['username']} opuścił lobby {lobby_id}")
     
     return {"success": True, "message": "Opuszczono lobby"}
@@ -444,42 +426,19 @@ async def toggle_ready(
     Raises:
         HTTPException: 400/404 jeśli błąd
     """
-    lobby_data = await redis.get_lobby(lobby_id)
-    
-    if not lobby_data:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Lobby nie znalezione"
-        )
-    
-    # Znajdź slot gracza
-    slots = lobby_data.get('slots', [])
-    player_slot = None
-    for slot in slots:
-        if slot.get('id_uzytkownika') == current_user['id']:
-            player_slot = slot
-            break
-    
-    if not player_slot:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Nie jesteś w tym lobby"
-        )
-    
-    # Toggle ready
-    player_slot['ready'] = not player_slot.get('ready', False)
+    # Toggle ready (atomowo, razem z last_activity)
+    lobby_data, error, info = await LobbyService(redis).set_ready(
+        lobby_id, user_id=current_user['id']
+    )
     
-    # Zapisz
-    await redis.save_lobby(lobby_id, lobby_data)
+    if error:
+        raise_lobby_error(error)
     
     # System message
-    status_text = "gotowy" if player_slot['ready'] else "nie gotowy"
+    status_text = "gotowy" if info.get('ready') else "nie gotowy"
     await send_system_message(lobby_id, f"{current_user['username']} jest {status_text}", redis)
     
-    # Aktualizuj last_activity
-    await update_last_activity(lobby_id, lobby_data, redis)
-    
-    print(f"✅ {current_user['username']} zmienił ready na {player_slot['ready']}")
+    print(f"✅ {current_user['username']} zmienił ready na {info.get('ready')}")
     
     return lobby_data
 
@@ -509,52 +468,15 @@ async def kick_player(
     Raises:
         HTTPException: 403 jeśli nie jesteś hostem, 404 jeśli lobby/gracz nie istnieje
     """
-    lobby_data = await redis.get_lobby(lobby_id)
-    
-    if not lobby_data:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Lobby nie znalezione"
-        )
-    
-    # Sprawdź czy jest hostem
-    if lobby_data.get('host_id') != current_user['id']:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Tylko host może wyrzucać graczy"
-        )
-    
-    # Znajdź slot gracza
-    slots = lobby_data.get('slots', [])
-    player_slot = None
-    for slot in slots:
-        if slot.get('id_uzytkownika') == user_id:
-            player_slot = slot
-            break
-    
-    if not player_slot:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Gracz nie znaleziony w lobby"
-        )
-    
-    # Dodaj do listy wyrzuconych
-    if 'kicked_players' not in lobby_data:
-        lobby_data['kicked_players'] = []
-    lobby_data['kicked_players'].append(user_id)
-    
-    # Opróżnij slot
-    player_name = player_slot['nazwa']
-    player_slot['typ'] = 'pusty'
-    player_slot['id_uzytkownika'] = None
-    player_slot['nazwa'] = None
-    player_slot['ready'] = False
-    player_slot['avatar_url'] = None
+    lobby_data, error, info = await LobbyService(redis).kick(
+        lobby_id, current_user['id'], user_id
+    )
     
-    # Zapisz
-    await redis.save_lobby(lobby_id, lobby_data)
+    if error:
+        raise_lobby_error(error, {'NOT_HOST': "Tylko host może wyrzucać graczy"})
     
     # System message
+    player_name = info.get('name')
     await send_system_message(lobby_id, f"{player_name} został wyrzucony", redis)
     
     print(f"✅ Host wyrzucił gracza {player_name} z lobby {lobby_id}")
@@ -587,72 +509,13 @@ async def add_bot(
     Raises:
         HTTPException: 400/404 jeśli nie można dodać bota
     """
-    lobby_data = await redis.get_lobby(lobby_id)
+    # Dodaj bota (jeszcze NIE GOTOWY) - numer "Bot #N" wybierany w Lua
+    lobby_data, error, info = await LobbyService(redis).add_bot(lobby_id, slot=slot_number)
     
-    if not lobby_data:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Lobby nie znalezione"
-        )
-    
-    slots = lobby_data.get('slots', [])
-    
-    # Znajdź slot do dodania bota
-    empty_slot = None
-    
-    if slot_number is not None:
-        # Konkretny slot
-        if slot_number < 0 or slot_number >= len(slots):
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Nieprawidłowy numer slotu"
-            )
-        
-        if slots[slot_number]['typ'] != 'pusty':
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Ten slot jest zajęty"
-            )
-        
-        empty_slot = slots[slot_number]
-    else:
-        # Pierwszy wolny slot
-        for slot in slots:
-            if slot['typ'] == 'pusty':
-                empty_slot = slot
-                break
+    if error:
+        raise_lobby_error(error)
     
-    if not empty_slot:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Brak wolnych slotów"
-        )
-    
-    # Znajdź numer dla bota
-    bot_numbers = []
-    for slot in slots:
-        if slot.get('typ') == 'bot' and slot.get('nazwa'):
-            # Wyciągnij numer z "Bot #X"
-            try:
-                num = int(slot['nazwa'].split('#')[1])
-                bot_numbers.append(num)
-            except:
-                pass
-    
-    next_bot_num = 1
-    while next_bot_num in bot_numbers:
-        next_bot_num += 1
-    
-    # Dodaj bota (jeszcze NIE GOTOWY)
-    empty_slot['typ'] = 'bot'
-    empty_slot['nazwa'] = f"Bot #{next_bot_num}"
-    empty_slot['ready'] = False  # Bot NIE jest jeszcze gotowy
-    empty_slot['avatar_url'] = 'bot_avatar.png'
-    
-    bot_name = f"Bot #{next_bot_num}"
-    
-    # Zapisz
-    await redis.save_lobby(lobby_id, lobby_data)
+    bot_name = info['name']
     
     # System message - dołączenie
     await send_system_message(lobby_id, f"{bot_name} dołączył do lobby", redis)
@@ -660,7 +523,7 @@ async def add_bot(
     print(f"✅ Dodano bota {bot_name} do lobby {lobby_id}")
     
     # Uruchom task w tle który da ready po 2-5s
-    asyncio.create_task(_delayed_bot_ready(lobby_id, bot_name, redis))
+    create_untracked_task(_delayed_bot_ready(lobby_id, bot_name, redis))
     
     return lobby_data
 
@@ -676,27 +539,18 @@ async def list_available_bots():
     Returns:
         List[dict]: Lista botów z ich algorytmami/osobowościami
     """
-    async with async_sessionmaker() as session:
-        query = select(User)
-        result = await session.execute(query)
-        users = result.scalars().all()
-        
-        bots = []
-        for user in users:
-            try:
-                settings = json.loads(user.settings) if user.settings else {}
-                if settings.get('jest_botem'):
-                    algorytm = settings.get('algorytm', 'topplayer')
-                    bots.append({
-                        'id': user.id,
-                        'username': user.username,
-                        'algorytm': algorytm,
-                        'avatar_url': user.avatar_url or 'bot_avatar.png'
-                    })
-            except:
-                pass
-        
-        return bots
+    from services.bot_registry import bot_registry
+    await bot_registry.ensure_loaded()
+    
+    return [
+        {
+            'id': info.user_id,
+            'username': info.username,
+            'algorytm': info.algorytm,
+            'avatar_url': info.avatar_url or 'bot_avatar.png'
+        }
+        for info in bot_registry.bots.values()
+    ]
 
 # ============================================
 # ADD NAMED BOT - NOWE!
@@ -728,14 +582,6 @@ async def add_named_bot(
     Raises:
         HTTPException: 400/404 jeśli nie można dodać bota
     """
-    lobby_data = await redis.get_lobby(lobby_id)
-    
-    if not lobby_data:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Lobby nie znalezione"
-        )
-    
     # Znajdź bota w bazie danych
     async with async_sessionmaker() as session:
         query = select(User).where(User.username == request.bot_username)
@@ -762,37 +608,18 @@ async def add_named_bot(
                 detail="Błędne ustawienia bota"
             )
     
-    # Znajdź pusty slot
-    slots = lobby_data.get('slots', [])
-    empty_slot = None
-    for slot in slots:
-        if slot['typ'] == 'pusty':
-            empty_slot = slot
-            break
-    
-    if not empty_slot:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Brak wolnych slotów"
-        )
-    
-    # Sprawdź czy ten bot nie jest już w lobby
-    for slot in slots:
-        if slot.get('nazwa') == request.bot_username:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Bot '{request.bot_username}' jest już w lobby"
-            )
-    
     # Dodaj bota (jeszcze NIE GOTOWY)
-    empty_slot['typ'] = 'bot'
-    empty_slot['id_uzytkownika'] = bot_user.id
-    empty_slot['nazwa'] = bot_user.username
-    empty_slot['ready'] = False  # Bot NIE jest jeszcze gotowy
-    empty_slot['avatar_url'] = bot_user.avatar_url or 'bot_avatar.png'
+    lobby_data, error, _ = await LobbyService(redis).add_bot(
+        lobby_id,
+        name=bot_user.username,
+        user_id=bot_user.id,
+        avatar_url=bot_user.avatar_url or 'bot_avatar.png'
+    )
     
-    # Zapisz
-    await redis.save_lobby(lobby_id, lobby_data)
+    if error:
+        raise_lobby_error(error, {
+            'ALREADY_IN_LOBBY': f"Bot '{request.bot_username}' jest już w lobby"
+        })
     
     # Pobierz algorytm dla wiadomości
     algorytm = settings.get('algorytm', 'topplayer')
@@ -803,7 +630,7 @@ async def add_named_bot(
     print(f"✅ Dodano bota {bot_user.username} ({algorytm}) do lobby {lobby_id}")
     
     # Uruchom task w tle który da ready po 2-5s
-    asyncio.create_task(_delayed_bot_ready(lobby_id, bot_user.username, redis))
+    create_untracked_task(_delayed_bot_ready(lobby_id, bot_user.username, redis))
     
     return lobby_data
 
@@ -833,79 +660,12 @@ async def change_slot(
     Raises:
         HTTPException: 400/404 jeśli błąd
     """
-    lobby_data = await redis.get_lobby(lobby_id)
-    
-    if not lobby_data:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Lobby nie znalezione"
-        )
-    
-    # Sprawdź czy gra nie rozpoczęta
-    if lobby_data.get('status_partii') == 'W_GRZE':
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Nie można zmieniać slotów podczas gry"
-        )
-    
-    slots = lobby_data.get('slots', [])
-    
-    # Znajdź obecny slot gracza
-    current_slot = None
-    current_slot_index = None
-    for i, slot in enumerate(slots):
-        if slot.get('id_uzytkownika') == current_user['id']:
-            current_slot = slot
-            current_slot_index = i
-            break
-    
-    if not current_slot:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Nie jesteś w tym lobby"
-        )
-    
-    # Sprawdź czy to nie ten sam slot
-    if current_slot_index == target_slot:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Już jesteś na tym slocie"
-        )
-    
-    # Sprawdź czy target slot istnieje i jest pusty
-    if target_slot < 0 or target_slot >= len(slots):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Nieprawidłowy numer slotu"
-        )
-    
-    target_slot_data = slots[target_slot]
-    
-    if target_slot_data['typ'] != 'pusty':
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Ten slot jest zajęty"
-        )
+    lobby_data, error, _ = await LobbyService(redis).change_slot(
+        lobby_id, current_user['id'], target_slot
+    )
     
-    # Zamień sloty
-    # Skopiuj dane gracza do target slotu
-    target_slot_data['typ'] = current_slot['typ']
-    target_slot_data['id_uzytkownika'] = current_slot['id_uzytkownika']
-    target_slot_data['nazwa'] = current_slot['nazwa']
-    target_slot_data['is_host'] = current_slot['is_host']
-    target_slot_data['ready'] = current_slot['ready']
-    target_slot_data['avatar_url'] = current_slot['avatar_url']
-    
-    # Opróżnij stary slot
-    current_slot['typ'] = 'pusty'
-    current_slot['id_uzytkownika'] = None
-    current_slot['nazwa'] = None
-    current_slot['is_host'] = False
-    current_slot['ready'] = False
-    current_slot['avatar_url'] = None
-    
-    # Zapisz
-    await redis.save_lobby(lobby_id, lobby_data)
+    if error:
+        raise_lobby_error(error)
     
     # System message
     await send_system_message(lobby_id, f"{current_user['username']} zmienił miejsce", redis)
@@ -940,50 +700,15 @@ async def kick_bot(
     Raises:
         HTTPException: 400/403/404 jeśli błąd
     """
-    lobby_data = await redis.get_lobby(lobby_id)
-    
-    if not lobby_data:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Lobby nie znalezione"
-        )
-    
-    # Sprawdź czy jest hostem
-    if lobby_data.get('host_id') != current_user['id']:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Tylko host może wyrzucać boty"
-        )
-    
-    slots = lobby_data.get('slots', [])
-    
-    # Sprawdź czy slot istnieje
-    if slot_number < 0 or slot_number >= len(slots):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Nieprawidłowy numer slotu"
-        )
-    
-    slot = slots[slot_number]
-    
-    # Sprawdź czy to bot
-    if slot.get('typ') != 'bot':
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="W tym slocie nie ma bota"
-        )
-    
-    # Opróżnij slot
-    bot_name = slot['nazwa']
-    slot['typ'] = 'pusty'
-    slot['nazwa'] = None
-    slot['ready'] = False
-    slot['avatar_url'] = None
+    lobby_data, error, info = await LobbyService(redis).kick_bot(
+        lobby_id, current_user['id'], slot_number
+    )
     
-    # Zapisz
-    await redis.save_lobby(lobby_id, lobby_data)
+    if error:
+        raise_lobby_error(error, {'NOT_HOST': "Tylko host może wyrzucać boty"})
     
     # System message
+    bot_name = info.get('name')
     await send_system_message(lobby_id, f"{bot_name} został usunięty", redis)
     
     print(f"🤖❌ Host wyrzucił bota {bot_name} ze slotu {slot_number} w lobby {lobby_id}")
@@ -997,49 +722,50 @@ async def kick_bot(
 @router.get("/{lobby_id}/chat")
 async def get_chat_messages(
     lobby_id: str,
-    limit: int = 50,
+    limit: int = Query(50, ge=1, le=CHAT_MAX_MESSAGES),
+    before: Optional[str] = Query(None, description="Kursor - starsze wiadomości (poprzednia strona)"),
+    after: Optional[str] = Query(None, description="Kursor - wiadomości nowsze niż ostatnio widziana"),
     current_user: dict = Depends(get_current_user),
     redis: RedisService = Depends(get_redis)
 ):
     """
-    Pobierz historię czatu w lobby
+    Pobierz historię czatu w lobby (stronicowanie kursorem)
+    
+    Bez kursora - ostatnie `limit` wiadomości. Nowe wiadomości przychodzą
+    przez WebSocket gry (typ 'chat'), więc strona nie musi odpytywać.
     
     Args:
         lobby_id: ID lobby
         limit: Max liczba wiadomości (default 50)
+        before: Kursor pierwszej wczytanej wiadomości
+        after: Kursor ostatniej widzianej wiadomości
         current_user: Zalogowany użytkownik
         redis: Redis service
     
     Returns:
-        List[dict]: Lista wiadomości
+        List[dict]: Lista wiadomości (od najstarszej, z polem 'cursor')
     """
-    # Sprawdź czy lobby istnieje
-    lobby_data = await redis.get_lobby(lobby_id)
-    if not lobby_data:
+    for cursor in (before, after):
+        if cursor is not None and not is_chat_cursor(cursor):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Nieprawidłowy kursor czatu"
+            )
+    
+    messages = await redis.get_chat(lobby_id, limit=limit, before=before, after=after)
+    if messages is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Lobby nie znalezione"
         )
     
-    # Pobierz wiadomości z Redis
-    chat_key = f"lobby:{lobby_id}:chat"
-    messages = await redis.redis.lrange(chat_key, -limit, -1)
-    
-    # Parse JSON messages
-    parsed_messages = []
-    for msg in messages:
-        try:
-            parsed_messages.append(json.loads(msg))
-        except:
-            pass
-    
-    return parsed_messages
+    return messages
 
 # ============================================
 # CHAT - SEND MESSAGE - NOWE!
 # ============================================
 
-@router.post("/{lobby_id}/chat")
+@router.post("/{lobby_id}/chat", dependencies=[Depends(redis_roundtrip_budget(4))])
 async def send_chat_message(
     lobby_id: str,
     message: ChatMessageRequest,
@@ -1061,14 +787,6 @@ async def send_chat_message(
     Raises:
         HTTPException: 400/404 jeśli błąd
     """
-    # Sprawdź czy lobby istnieje
-    lobby_data = await redis.get_lobby(lobby_id)
-    if not lobby_data:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Lobby nie znalezione"
-        )
-    
     # Walidacja wiadomości
     msg_text = message.message.strip()
     
@@ -1084,16 +802,6 @@ async def send_chat_message(
             detail="Wiadomość za długa (max 500 znaków)"
         )
     
-    # Sprawdź czy użytkownik jest w lobby
-    slots = lobby_data.get('slots', [])
-    is_in_lobby = any(slot.get('id_uzytkownika') == current_user['id'] for slot in slots)
-    
-    if not is_in_lobby:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Musisz być w lobby aby wysyłać wiadomości"
-        )
-    
     # Stwórz wiadomość
     chat_message = {
         "id": int(time.time() * 1000),  # Timestamp jako ID
@@ -1104,14 +812,16 @@ async def send_chat_message(
         "is_system": False
     }
     
-    # Zapisz w Redis (lista)
-    chat_key = f"lobby:{lobby_id}:chat"
-    await redis.redis.rpush(chat_key, json.dumps(chat_message))
-    await redis.redis.ltrim(chat_key, -100, -1)
-    await redis.redis.expire(chat_key, 86400)
-    
-    # Aktualizuj last_activity
-    await update_last_activity(lobby_id, lobby_data, redis)
+    # Jeden skrypt: lobby istnieje + autor w lobby, zapis na czat, last_activity
+    _, error, info = await LobbyService(redis).post_chat(lobby_id, chat_message, user_id=current_user['id'])
+    if error == 'NOT_IN_LOBBY':
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Musisz być w lobby aby wysyłać wiadomości"
+        )
+    if error:
+        raise_lobby_error(error)
+    chat_message['cursor'] = info.get('cursor')
     
     print(f"💬 [{lobby_id}] {current_user['username']}: {msg_text}")
     
@@ -1157,15 +867,21 @@ async def start_game(
             detail=error
         )
     
-    # Zmień status na W_GRZE
-    lobby_data['status_partii'] = 'W_GRZE'
-    await redis.save_lobby(lobby_id, lobby_data)
+    # Zmień status na W_GRZE atomowo z ponowną walidacją w Lua - między odczytem
+    # a zapisem ktoś mógł wyjść albo cofnąć gotowość (podwójne kliknięcie też odpada)
+    lobby_data, error, _ = await LobbyService(redis).start(lobby_id, host_id=current_user['id'])
+    if error:
+        raise_lobby_error(error, {'NOT_HOST': "Tylko host może rozpocząć grę"})
     
     # System message
     await send_system_message(lobby_id, "Gra rozpoczęta!", redis)
     
-    # Inicjalizuj silnik gry
-    engine = await game_service.initialize_game(lobby_id, lobby_data, redis)
+    # Inicjalizuj silnik gry (zapis pod lockiem gry)
+    try:
+        engine = await game_service.initialize_game(lobby_id, lobby_data, redis)
+    except LockTimeoutError:
+        await LobbyService(redis).set_status(lobby_id, 'LOBBY', expected='W_GRZE')
+        raise game_busy_error()
     
     print(f"✅ Gra rozpoczęta w lobby {lobby_id}")
     
@@ -1204,95 +920,22 @@ async def swap_slots(
     Raises:
         HTTPException: 400/403/404 jeśli błąd
     """
-    lobby_data = await redis.get_lobby(lobby_id)
-    
-    if not lobby_data:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Lobby nie znalezione"
-        )
-    
-    # Sprawdź czy jest hostem
-    if lobby_data.get('host_id') != current_user['id']:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Tylko host może zamieniać sloty"
-        )
-    
-    # Sprawdź czy gra nie rozpoczęta
-    if lobby_data.get('status_partii') == 'W_GRZE':
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Nie można zamieniać slotów podczas gry"
-        )
-    
-    slots = lobby_data.get('slots', [])
-    
-    # Walidacja numerów slotów
-    if slot_a < 0 or slot_a >= len(slots):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Nieprawidłowy numer slotu A: {slot_a}"
-        )
-    
-    if slot_b < 0 or slot_b >= len(slots):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Nieprawidłowy numer slotu B: {slot_b}"
-        )
-    
-    if slot_a == slot_b:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Nie można zamienić slotu samego ze sobą"
-        )
-    
-    # Pobierz dane slotów
-    slot_a_data = slots[slot_a]
-    slot_b_data = slots[slot_b]
-    
-    # Zamień zawartość (ale nie numery!)
-    # Zapisz numer_gracza przed zamianą
-    temp_numer_a = slot_a_data['numer_gracza']
-    temp_numer_b = slot_b_data['numer_gracza']
-    
-    # Zamień wszystkie pola OPRÓCZ numer_gracza
-    temp = {
-        'typ': slot_a_data['typ'],
-        'id_uzytkownika': slot_a_data.get('id_uzytkownika'),
-        'nazwa': slot_a_data.get('nazwa'),
-        'is_host': slot_a_data.get('is_host', False),
-        'ready': slot_a_data.get('ready', False),
-        'avatar_url': slot_a_data.get('avatar_url')
-    }
-    
-    slot_a_data['typ'] = slot_b_data['typ']
-    slot_a_data['id_uzytkownika'] = slot_b_data.get('id_uzytkownika')
-    slot_a_data['nazwa'] = slot_b_data.get('nazwa')
-    slot_a_data['is_host'] = slot_b_data.get('is_host', False)
-    slot_a_data['ready'] = slot_b_data.get('ready', False)
-    slot_a_data['avatar_url'] = slot_b_data.get('avatar_url')
-    
-    slot_b_data['typ'] = temp['typ']
-    slot_b_data['id_uzytkownika'] = temp['id_uzytkownika']
-    slot_b_data['nazwa'] = temp['nazwa']
-    slot_b_data['is_host'] = temp['is_host']
-    slot_b_data['ready'] = temp['ready']
-    slot_b_data['avatar_url'] = temp['avatar_url']
-    
-    # Zachowaj oryginalne numery slotów
-    slot_a_data['numer_gracza'] = temp_numer_a
-    slot_b_data['numer_gracza'] = temp_numer_b
+    # Zamień zawartość slotów (numer_gracza zostaje na miejscu)
+    lobby_data, error, info = await LobbyService(redis).swap_slots(
+        lobby_id, current_user['id'], slot_a, slot_b
+    )
     
-    # Zapisz
-    await redis.save_lobby(lobby_id, lobby_data)
+    if error:
+        raise_lobby_error(error, {
+            'NOT_HOST': "Tylko host może zamieniać sloty",
+            'IN_GAME': "Nie można zamieniać slotów podczas gry",
+            'BAD_SLOT_A': f"Nieprawidłowy numer slotu A: {slot_a}",
+            'BAD_SLOT_B': f"Nieprawidłowy numer slotu B: {slot_b}",
+            'SAME_SLOT': "Nie można zamienić slotu samego ze sobą"
+        })
     
     # System message
-    names = []
-    if slot_a_data.get('nazwa'):
-        names.append(slot_a_data['nazwa'])
-    if slot_b_data.get('nazwa'):
-        names.append(slot_b_data['nazwa'])
+    names = info.get('names') or []
     
     if len(names) == 2:
         msg = f"{names[0]} i {names[1]} zamienili się miejscami"
@@ -1334,77 +977,26 @@ async def transfer_host(
     Raises:
         HTTPException: 400/403/404 jeśli błąd
     """
-    lobby_data = await redis.get_lobby(lobby_id)
-    
-    if not lobby_data:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Lobby nie znalezione"
-        )
-    
-    # Sprawdź czy jest obecnym hostem
-    if lobby_data.get('host_id') != current_user['id']:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Tylko host może przekazać role hosta"
-        )
-    
-    # Sprawdź czy próbuje przekazać samemu sobie
-    if new_host_user_id == current_user['id']:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Już jesteś hostem"
-        )
-    
-    slots = lobby_data.get('slots', [])
-    
-    # Znajdź obecnego hosta i nowego hosta
-    old_host_slot = None
-    new_host_slot = None
-    
-    for slot in slots:
-        if slot.get('id_uzytkownika') == current_user['id']:
-            old_host_slot = slot
-        if slot.get('id_uzytkownika') == new_host_user_id:
-            new_host_slot = slot
-    
-    if not old_host_slot:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Nie jesteś w lobby"
-        )
-    
-    if not new_host_slot:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Nowy host nie znaleziony w lobby"
-        )
-    
-    # Sprawdź czy nowy host to gracz (nie bot)
-    if new_host_slot.get('typ') != 'gracz':
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Nie można przekazać hosta botowi"
-        )
-    
-    # Przekaż role
-    old_host_slot['is_host'] = False
-    new_host_slot['is_host'] = True
-    
-    # Zaktualizuj host_id w lobby
-    lobby_data['host_id'] = new_host_user_id
+    lobby_data, error, info = await LobbyService(redis).transfer_host(
+        lobby_id, current_user['id'], new_host_user_id
+    )
     
-    # Zapisz
-    await redis.save_lobby(lobby_id, lobby_data)
+    if error:
+        raise_lobby_error(error, {
+            'NOT_HOST': "Tylko host może przekazać role hosta",
+            'ALREADY_HOST': "Już jesteś hostem",
+            'NOT_IN_LOBBY': "Nie jesteś w lobby",
+            'NEW_HOST_IS_BOT': "Nie można przekazać hosta botowi"
+        })
     
     # System message
     await send_system_message(
         lobby_id, 
-        f"{new_host_slot['nazwa']} jest teraz hostem! 👑", 
+        f"{info.get('name')} jest teraz hostem! 👑", 
         redis
     )
     
-    print(f"👑 Host przekazany: {current_user['username']} → {new_host_slot['nazwa']} w lobby {lobby_id}")
+    print(f"👑 Host przekazany: {current_user['username']} → {info.get('name')} w lobby {lobby_id}")
     
     return lobby_data
 
@@ -2,9 +2,11 @@
 Router: Pages
 Odpowiedzialność: Static HTML pages (index, lobby, game)
 """
-from fastapi import APIRouter
+from fastapi import APIRouter, Request
 from fastapi.responses import FileResponse, HTMLResponse
 
+from services.static_service import static_assets
+
 router = APIRouter()
 
 # ============================================
@@ -12,38 +14,38 @@ router = APIRouter()
 # ============================================
 
 @router.get("/", response_class=FileResponse)
-async def index():
+async def index(request: Request):
     """Strona główna"""
-    return FileResponse("static/index.html")
+    return static_assets.response(request, "index.html")
 
 @router.get("/index.html", response_class=FileResponse)
-async def index_alt():
+async def index_alt(request: Request):
     """Strona główna (alternatywna ścieżka)"""
-    return FileResponse("static/index.html")
+    return static_assets.response(request, "index.html")
 
 @router.get("/dashboard", response_class=FileResponse)
 @router.get("/dashboard.html", response_class=FileResponse)
-async def dashboard_page():
+async def dashboard_page(request: Request):
     """Dashboard - lista lobby"""
-    return FileResponse("static/dashboard.html")
+    return static_assets.response(request, "dashboard.html")
 
 @router.get("/lobby", response_class=FileResponse)
 @router.get("/lobby.html", response_class=FileResponse)
-async def lobby_page():
+async def lobby_page(request: Request):
     """Strona lobby"""
-    return FileResponse("static/lobby.html")
+    return static_assets.response(request, "lobby.html")
 
 @router.get("/game", response_class=FileResponse)
 @router.get("/game.html", response_class=FileResponse)
-async def game_page():
+async def game_page(request: Request):
     """Strona gry"""
-    return FileResponse("static/game.html")
+    return static_assets.response(request, "game.html")
 
 @router.get("/zasady", response_class=FileResponse)
 @router.get("/zasady.html", response_class=FileResponse)
-async def zasady_page():
+async def zasady_page(request: Request):
     """Strona z zasadami"""
-    return FileResponse("static/zasady.html")
+    return static_assets.response(request, "zasady.html")
 
 # ============================================
 # ADDITIONAL PAGES (opcjonalnie)
@@ -51,16 +53,16 @@ async def zasady_page():
 
 @router.get("/rules", response_class=FileResponse)
 @router.get("/rules.html", response_class=FileResponse)
-async def rules_page():
+async def rules_page(request: Request):
     """Strona z zasadami gry (alias)"""
-    return FileResponse("static/zasady.html")
+    return static_assets.response(request, "zasady.html")
 
 @router.get("/profile", response_class=FileResponse)
 @router.get("/profile.html", response_class=FileResponse)
-async def profile_page():
+async def profile_page(request: Request):
     """Strona profilu gracza"""
     try:
-        return FileResponse("static/profile.html")
+        return static_assets.response(request, "profile.html")
     except:
         return HTMLResponse(content="""
         <html>
@@ -75,10 +77,10 @@ async def profile_page():
 
 @router.get("/ranking", response_class=FileResponse)
 @router.get("/ranking.html", response_class=FileResponse)
-async def ranking_page():
+async def ranking_page(request: Request):
     """Strona rankingu"""
     try:
-        return FileResponse("static/ranking.html")
+        return static_assets.response(request, "ranking.html")
     except:
         return HTMLResponse(content="""
         <html>
@@ -3,14 +3,14 @@ Router: Stats (ranking i statystyki)
 Odpowiedzialność: Ranking graczy, statystyki, system ELO
 """
 from fastapi import APIRouter, Depends, HTTPException, status, Query, Body
-from sqlalchemy import select, func, and_, or_
+from sqlalchemy import select, func, or_
 from sqlalchemy.orm import selectinload
 from typing import Optional, List
-import json
 
 from database import async_sessionmaker, User, PlayerGameStats, GameType
 from dependencies import get_current_user, get_redis
 from services.redis_service import RedisService
+from services.leaderboard_service import leaderboard_service
 
 router = APIRouter()
 
@@ -22,39 +22,19 @@ async def get_ranks_for_usernames(usernames: list) -> dict:
     """
     Pobiera rangi dla listy użytkowników.
     Zwraca dict {username: rank_info} z dodatkowymi polami is_admin
+    Najwyższe ELO i flaga admina z rankingu w Redis (jeden pipeline dla całej listy)
     """
     if not usernames:
         return {}
     
     ranks = {}
     try:
-        async with async_sessionmaker() as session:
-            # Pobierz użytkowników z ich danymi
-            users_query = select(User).where(User.username.in_(usernames))
-            users_result = await session.execute(users_query)
-            users_data = {u.username: {'id': u.id, 'is_admin': u.is_admin} for u in users_result.scalars().all()}
-            
-            for username in usernames:
-                if username not in users_data:
-                    # Nowy gracz bez statystyk - domyślna ranga
-                    rank_info = get_rank_for_elo(1200)
-                    rank_info['is_admin'] = False
-                    ranks[username] = rank_info
-                    continue
-                
-                user_info = users_data[username]
-                user_id = user_info['id']
-                
-                # Pobierz najwyższe ELO
-                stats_query = select(func.max(PlayerGameStats.elo_rating)).where(
-                    PlayerGameStats.user_id == user_id
-                )
-                stats_result = await session.execute(stats_query)
-                max_elo = stats_result.scalar() or 1200
-                
-                rank_info = get_rank_for_elo(max_elo)
-                rank_info['is_admin'] = user_info['is_admin']
-                ranks[username] = rank_info
+        ratings = await leaderboard_service.get_ratings(usernames)
+        for username, (max_elo, is_admin) in ratings.items():
+            # Gracz bez rozegranych gier - domyślna ranga
+            rank_info = get_rank_for_elo(max_elo or 1200)
+            rank_info['is_admin'] = is_admin
+            ranks[username] = rank_info
     except Exception as e:
         print(f"[⚠️ Stats] Błąd pobierania rang: {e}")
         # Fallback - domyślna ranga dla wszystkich
@@ -126,115 +106,71 @@ async def get_ranking(
         Lista graczy z ich statystykami i rangami
     """
     try:
-        async with async_sessionmaker() as session:
-            # Pobierz typ gry jeśli podany
-            game_type_id = None
-            if game_type:
-                game_type_query = select(GameType).where(GameType.name.ilike(f"%{game_type}%"))
-                result = await session.execute(game_type_query)
-                gt = result.scalar_one_or_none()
-                if gt:
-                    game_type_id = gt.id
-            
-            # Buduj query
-            if game_type_id:
-                # Ranking dla konkretnej gry
-                query = (
-                    select(User, PlayerGameStats)
-                    .join(PlayerGameStats, User.id == PlayerGameStats.user_id)
-                    .where(PlayerGameStats.game_type_id == game_type_id)
-                    .where(PlayerGameStats.games_played > 0)
-                    .order_by(PlayerGameStats.elo_rating.desc())
-                    .offset(offset)
-                    .limit(limit)
-                )
-            else:
-                # Ranking globalny - użyj najwyższego ELO gracza
-                # Subquery: max ELO dla każdego użytkownika
-                subq = (
-                    select(
-                        PlayerGameStats.user_id,
-                        func.max(PlayerGameStats.elo_rating).label('max_elo'),
-                        func.sum(PlayerGameStats.games_played).label('total_games'),
-                        func.sum(PlayerGameStats.games_won).label('total_wins')
-                    )
-                    .group_by(PlayerGameStats.user_id)
-                    .subquery()
-                )
-                
-                query = (
-                    select(User, subq.c.max_elo, subq.c.total_games, subq.c.total_wins)
-                    .join(subq, User.id == subq.c.user_id)
-                    .where(subq.c.total_games > 0)
-                    .order_by(subq.c.max_elo.desc())
-                    .offset(offset)
-                    .limit(limit)
-                )
-            
-            result = await session.execute(query)
-            rows = result.all()
-            
-            ranking = []
-            for i, row in enumerate(rows):
+        # Typ gry jeśli podany (ID cache'owane w procesie)
+        game_type_id = None
+        if game_type:
+            game_type_id = await leaderboard_service.get_game_type_id(game_type)
+        
+        # Strona rankingu z sorted setu w Redis (ZREVRANGE + ZCARD)
+        entries, total_players = await leaderboard_service.get_page(game_type_id, offset, limit)
+        usernames = [username for username, _ in entries]
+        
+        # Dane graczy ze strony - jedno zapytanie po kluczu (bez sortowania całej tabeli)
+        players = {}
+        if usernames:
+            async with async_sessionmaker() as session:
                 if game_type_id:
-                    user, stats = row
-                    elo = stats.elo_rating
-                    games = stats.games_played
-                    wins = stats.games_won
+                    query = (
+                        select(User, PlayerGameStats.games_played, PlayerGameStats.games_won)
+                        .join(PlayerGameStats, User.id == PlayerGameStats.user_id)
+                        .where(User.username.in_(usernames))
+                        .where(PlayerGameStats.game_type_id == game_type_id)
+                    )
                 else:
-                    user, elo, games, wins = row
-                    elo = elo or 1200
-                    games = games or 0
-                    wins = wins or 0
-                
-                rank_info = get_rank_for_elo(elo)
-                win_rate = round((wins / games * 100), 1) if games > 0 else 0
-                
-                # Sprawdź czy to bot
-                is_bot = False
-                if user.settings:
-                    try:
-                        settings = json.loads(user.settings)
-                        is_bot = settings.get('jest_botem', False)
-                    except:
-                        pass
-                
-                ranking.append({
-                    'position': offset + i + 1,
-                    'username': user.username,
-                    'avatar_url': user.avatar_url or 'default_avatar.png',
-                    'elo': round(elo),
-                    'rank': rank_info,
-                    'games_played': int(games),
-                    'games_won': int(wins),
-                    'win_rate': win_rate,
-                    'is_bot': is_bot,
-                    'is_admin': user.is_admin
-                })
-            
-            # Policz całkowitą liczbę graczy
-            if game_type_id:
-                count_query = (
-                    select(func.count())
-                    .select_from(PlayerGameStats)
-                    .where(PlayerGameStats.game_type_id == game_type_id)
-                    .where(PlayerGameStats.games_played > 0)
-                )
-            else:
-                count_query = (
-                    select(func.count(func.distinct(PlayerGameStats.user_id)))
-                    .where(PlayerGameStats.games_played > 0)
-                )
+                    query = (
+                        select(
+                            User,
+                            func.sum(PlayerGameStats.games_played),
+                            func.sum(PlayerGameStats.games_won)
+                        )
+                        .join(PlayerGameStats, User.id == PlayerGameStats.user_id)
+                        .where(User.username.in_(usernames))
+                        .group_by(User.id)
+                    )
+                result = await session.execute(query)
+                players = {user.username: (user, games, wins) for user, games, wins in result.all()}
+        
+        ranking = []
+        for i, (username, elo) in enumerate(entries):
+            if username not in players:
+                # Konto usunięte po zbudowaniu rankingu
+                continue
+            user, games, wins = players[username]
+            games = games or 0
+            wins = wins or 0
             
-            count_result = await session.execute(count_query)
-            total_players = count_result.scalar() or 0
+            rank_info = get_rank_for_elo(elo)
+            win_rate = round((wins / games * 100), 1) if games > 0 else 0
             
-            return {
-                'ranking': ranking,
-                'total_players': total_players,
-                'limit': limit,
-                'offset': offset
-            }
+            ranking.append({
+                'position': offset + i + 1,
+                'username': user.username,
+                'avatar_url': user.avatar_url or 'default_avatar.png',
+                'elo': round(elo),
+                'rank': rank_info,
+                'games_played': int(games),
+                'games_won': int(wins),
+                'win_rate': win_rate,
+                'is_bot': user.is_bot,
+                'is_admin': user.is_admin
+            })
+        
+        return {
+            'ranking': ranking,
+            'total_players': total_players,
+            'limit': limit,
+            'offset': offset
+        }
             
     except Exception as e:
         print(f"❌ Error getting ranking: {e}")
@@ -308,29 +244,14 @@ async def get_player_stats(username: str):
             global_rank = get_rank_for_elo(highest_elo)
             global_win_rate = round((total_wins / total_games * 100), 1) if total_games > 0 else 0
             
-            # Znajdź pozycję w rankingu
-            position_query = (
-                select(func.count())
-                .select_from(PlayerGameStats)
-                .where(PlayerGameStats.elo_rating > highest_elo)
-            )
-            pos_result = await session.execute(position_query)
-            position = (pos_result.scalar() or 0) + 1
-            
-            # Sprawdź czy to bot
-            is_bot = False
-            if user.settings:
-                try:
-                    settings = json.loads(user.settings)
-                    is_bot = settings.get('jest_botem', False)
-                except:
-                    pass
+            # Znajdź pozycję w rankingu (ZCOUNT na rankingu globalnym)
+            position = await leaderboard_service.get_position(highest_elo)
             
             return {
                 'username': user.username,
                 'avatar_url': user.avatar_url or 'default_avatar.png',
                 'created_at': user.created_at.isoformat() if user.created_at else None,
-                'is_bot': is_bot,
+                'is_bot': user.is_bot,
                 'is_admin': user.is_admin,
                 'global_stats': {
                     'elo': round(highest_elo),
@@ -387,109 +308,37 @@ async def update_player_stats_after_game(
     winner_usernames: List[str],
     loser_usernames: List[str],
     game_type_name: str,
-    is_casual: bool = False
+    is_casual: bool = False,
+    match_id: Optional[str] = None
 ):
     """
-    Aktualizuje statystyki graczy po zakończeniu meczu.
+    Zgłasza wynik meczu do zaksięgowania (statystyki i ELO).
+    
+    Wynik trafia do strumienia Redis - worker (services/match_results_service.py)
+    księguje wiele meczów naraz w jednej transakcji, idempotentnie po match_id.
     
     Args:
         winner_usernames: Lista nazw zwycięzców
         loser_usernames: Lista nazw przegranych
         game_type_name: Nazwa typu gry (np. "66", "Tysiąc")
         is_casual: Czy gra casual (bez wpływu na ELO)
+        match_id: Unikalne ID meczu (engine.match_id); brak = nowe losowe ID
     """
-    try:
-        async with async_sessionmaker() as session:
-            # Pobierz typ gry (lub stwórz)
-            game_type_query = select(GameType).where(GameType.name == game_type_name)
-            result = await session.execute(game_type_query)
-            game_type = result.scalar_one_or_none()
-            
-            if not game_type:
-                game_type = GameType(name=game_type_name)
-                session.add(game_type)
-                await session.flush()
-            
-            # Pobierz wszystkich graczy
-            all_usernames = winner_usernames + loser_usernames
-            users_query = select(User).where(User.username.in_(all_usernames))
-            users_result = await session.execute(users_query)
-            users = {u.username: u for u in users_result.scalars().all()}
-            
-            # Stwórz brakujących użytkowników (np. boty które nie są jeszcze w bazie)
-            for username in all_usernames:
-                if username not in users:
-                    print(f"[📊 Stats] Tworzę użytkownika dla: {username}")
-                    new_user = User(
-                        username=username,
-                        hashed_password="bot_no_password",
-                        settings=json.dumps({'jest_botem': True})
-                    )
-                    session.add(new_user)
-                    await session.flush()
-                    users[username] = new_user
-            
-            # Pobierz lub stwórz statystyki dla każdego gracza
-            stats_map = {}
-            for username in all_usernames:
-                user = users[username]
-                stats_query = select(PlayerGameStats).where(
-                    and_(
-                        PlayerGameStats.user_id == user.id,
-                        PlayerGameStats.game_type_id == game_type.id
-                    )
-                )
-                stats_result = await session.execute(stats_query)
-                stats = stats_result.scalar_one_or_none()
-                
-                if not stats:
-                    stats = PlayerGameStats(
-                        user_id=user.id,
-                        game_type_id=game_type.id,
-                        elo_rating=1200.0,
-                        games_played=0,
-                        games_won=0
-                    )
-                    session.add(stats)
-                    await session.flush()
-                
-                stats_map[username] = stats
-            
-            # Oblicz średnie ELO dla drużyn
-            winner_elos = [stats_map[u].elo_rating for u in winner_usernames if u in stats_map]
-            loser_elos = [stats_map[u].elo_rating for u in loser_usernames if u in stats_map]
-            
-            avg_winner_elo = sum(winner_elos) / len(winner_elos) if winner_elos else 1200
-            avg_loser_elo = sum(loser_elos) / len(loser_elos) if loser_elos else 1200
-            
-            # Oblicz zmianę ELO
-            elo_gain, elo_loss = calculate_elo_change(avg_winner_elo, avg_loser_elo)
-            
-            # Aktualizuj statystyki
-            for username in winner_usernames:
-                if username in stats_map:
-                    stats = stats_map[username]
-                    stats.games_played += 1
-                    stats.games_won += 1
-                    if not is_casual:
-                        stats.elo_rating = max(100, stats.elo_rating + elo_gain)
-                    print(f"📊 {username}: +1 win, ELO {'+' if elo_gain > 0 else ''}{elo_gain if not is_casual else 0}")
-            
-            for username in loser_usernames:
-                if username in stats_map:
-                    stats = stats_map[username]
-                    stats.games_played += 1
-                    if not is_casual:
-                        stats.elo_rating = max(100, stats.elo_rating + elo_loss)
-                    print(f"📊 {username}: +1 loss, ELO {elo_loss if not is_casual else 0}")
-            
-            await session.commit()
-            print(f"✅ Statystyki zaktualizowane dla {len(all_usernames)} graczy")
-            
-    except Exception as e:
-        print(f"❌ Błąd aktualizacji statystyk: {e}")
-        import traceback
-        traceback.print_exc()
+    from services.match_results_service import match_results_service
+    
+    if not match_id:
+        import uuid
+        match_id = uuid.uuid4().hex
+    
+    entry_id = await match_results_service.publish(
+        match_id,
+        game_type_name,
+        winner_usernames,
+        loser_usernames,
+        is_casual
+    )
+    if entry_id:
+        print(f"📊 Wynik meczu {match_id} w kolejce do zaksięgowania ({entry_id})")
 
 
 async def ensure_game_types_exist():
@@ -2,14 +2,42 @@
 Router: WebSocket
 Odpowiedzialność: Real-time communication (WebSocket)
 """
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query
-from typing import Dict, List, Optional
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query, status
+from typing import Dict, List, Optional, Set
 import json
 import asyncio
 import copy
+import time
+from collections import deque
 from enum import Enum
 
-from services.redis_service import RedisService, get_redis_client
+from services.redis_service import RedisService, get_redis_client, disconnect_key, is_chat_cursor
+from services.lobby_service import LobbyService
+from services.chat_service import chat_relay
+from services.lobby_feed_service import lobby_feed
+from dependencies import get_websocket_user
+from redis_utils import create_untracked_task
+
+# Okno debounce dla broadcast_state_update (sekundy)
+STATE_COALESCE_WINDOW = 0.05
+# Jak długo cache widoku może obsługiwać request_state (sekundy)
+STATE_CACHE_TTL = 1.0
+
+# Kolejki wysyłki per połączenie (slow consumer)
+SEND_QUEUE_MAX = 64
+# Maksymalny czas pojedynczego send_json zanim uznamy klienta za martwego
+SEND_TIMEOUT = 5.0
+# Ile przepełnień kolejki tolerujemy zanim rozłączymy klienta
+SLOW_CONSUMER_MAX_OVERFLOWS = 3
+
+# Wiadomości przejściowe - przy przepełnieniu można je porzucić,
+# bo pełny stan i tak dojdzie w state_update (resync)
+# (lista gier: resync = nowy lobby_snapshot)
+DROPPABLE_MESSAGE_TYPES = {
+    'state_update', 'bot_action', 'action_performed', 'trick_finalized',
+    'chat', 'pong', 'meldunek',
+    'lobby_snapshot', 'lobby_created', 'lobby_updated', 'lobby_removed'
+}
 
 # ============================================
 # HELPER FUNCTIONS
@@ -32,6 +60,157 @@ def convert_enums_to_strings(obj):
     else:
         return obj
 
+# ============================================
+# PER-CONNECTION SENDER
+# ============================================
+
+class ConnectionSender:
+    """
+    Ograniczona kolejka wysyłki + writer task dla jednego WebSocket.
+    
+    Broadcast tylko wrzuca wiadomość do kolejki i wraca - postęp gry
+    nigdy nie czeka na sieć klienta. Polityka dla wolnych klientów:
+    - nowy state_update zastępuje poprzedni, jeszcze niewysłany
+    - przy przepełnieniu porzucane są wiadomości przejściowe i
+      wymuszany jest resync (pełny state_update)
+    - po SLOW_CONSUMER_MAX_OVERFLOWS przepełnieniach, timeout wysyłki
+      lub kolejce pełnej samych krytycznych wiadomości klient jest
+      rozłączany (krytycznych nie porzucamy po cichu)
+    """
+    
+    def __init__(self, manager: 'ConnectionManager', websocket: WebSocket, player_id: str):
+        self.manager = manager
+        self.websocket = websocket
+        self.player_id = player_id
+        self.queue: deque = deque()
+        self._wakeup = asyncio.Event()
+        self._closed = False
+        self.task: Optional[asyncio.Task] = None
+        # Zadania poboczne (resync, zamknięcie) - referencje, żeby GC ich nie zebrał
+        self._side_tasks: Set[asyncio.Task] = set()
+        
+        # Metryki
+        self.sent = 0
+        self.dropped = 0
+        self.overflows = 0
+        self.resyncs = 0
+        self.max_depth = 0
+    
+    def start(self):
+        """Uruchom writer task"""
+        self.task = asyncio.create_task(self._writer())
+    
+    def stop(self):
+        """Zatrzymaj writer task i wyczyść kolejkę"""
+        self._closed = True
+        self.queue.clear()
+        if self.task and not self.task.done() and self.task is not asyncio.current_task():
+            self.task.cancel()
+    
+    def enqueue(self, message: dict):
+        """
+        Dodaj wiadomość do kolejki (bez czekania na sieć)
+        
+        Args:
+            message: Wiadomość już skonwertowana do JSON-safe dict
+        """
+        if self._closed:
+            return
+        
+        message_type = message.get('type')
+        
+        # Nowszy snapshot stanu zastępuje starszy, jeszcze niewysłany
+        if message_type == 'state_update':
+            before = len(self.queue)
+            self.queue = deque(m for m in self.queue if m.get('type') != 'state_update')
+            self.dropped += before - len(self.queue)
+        
+        if len(self.queue) >= SEND_QUEUE_MAX:
+            self._handle_overflow()
+            if self._closed:
+                return
+        
+        self.queue.append(message)
+        self.max_depth = max(self.max_depth, len(self.queue))
+        self._wakeup.set()
+    
+    def _spawn(self, coro, what: str):
+        """Uruchom zadanie poboczne z referencją i logiem błędu"""
+        task = create_untracked_task(coro)
+        self._side_tasks.add(task)
+        
+        def _done(t: asyncio.Task):
+            self._side_tasks.discard(t)
+            if not t.cancelled() and t.exception() is not None:
+                print(f"❌ WebSocket: {what} dla {self.player_id} nieudany: {t.exception()}")
+        
+        task.add_done_callback(_done)
+        return task
+    
+    def _close_slow_consumer(self, reason: str):
+        """Rozłącz klienta (polityka slow consumer) - frontend połączy się ponownie"""
+        print(f"🐢 WebSocket: {self.player_id} nie nadąża - rozłączam ({reason})")
+        self._closed = True
+        self.queue.clear()
+        self._spawn(self.manager.close_slow_consumer(self.websocket), "zamknięcie połączenia")
+    
+    def _handle_overflow(self):
+        """Klient nie nadąża - porzuć przejściowe wiadomości i wymuś resync"""
+        self.overflows += 1
+        
+        if self.overflows > SLOW_CONSUMER_MAX_OVERFLOWS:
+            self._close_slow_consumer("slow consumer")
+            return
+        
+        before = len(self.queue)
+        self.queue = deque(m for m in self.queue if m.get('type') not in DROPPABLE_MESSAGE_TYPES)
+        self.dropped += before - len(self.queue)
+        
+        if len(self.queue) >= SEND_QUEUE_MAX:
+            # Same krytyczne wiadomości - żadnej nie porzucamy, rozłączenie + pełny stan po powrocie
+            self._close_slow_consumer("kolejka pełna krytycznych wiadomości")
+            return
+        
+        # Pełny stan zastąpi porzucone delty
+        self.resyncs += 1
+        self._spawn(self.manager.send_state_to(self.websocket, force=True), "resync")
+        print(f"⚠️ WebSocket: kolejka {self.player_id} przepełniona - resync")
+    
+    async def _writer(self):
+        """Pętla wysyłająca wiadomości z kolejki"""
+        try:
+            while not self._closed:
+                if not self.queue:
+                    # Klient nadrobił zaległości - licz przepełnienia od nowa
+                    self.overflows = 0
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+                
+                message = self.queue.popleft()
+                try:
+                    await asyncio.wait_for(self.websocket.send_json(message), timeout=SEND_TIMEOUT)
+                    self.sent += 1
+                except Exception as e:
+                    print(f"❌ Błąd wysyłania do {self.player_id}: {e}")
+                    # Zamknij złe połączenie (1013) - frontend połączy się ponownie
+                    self._close_slow_consumer("timeout/błąd wysyłania")
+                    return
+        except asyncio.CancelledError:
+            pass
+    
+    def get_metrics(self) -> dict:
+        """Metryki kolejki dla /ws/stats"""
+        return {
+            'player': self.player_id,
+            'queue_depth': len(self.queue),
+            'max_depth': self.max_depth,
+            'sent': self.sent,
+            'dropped': self.dropped,
+            'overflows': self.overflows,
+            'resyncs': self.resyncs
+        }
+
 # ============================================
 # CONNECTION MANAGER
 # ============================================
@@ -48,6 +227,12 @@ class ConnectionManager:
         self.active_connections: Dict[str, List[WebSocket]] = {}
         # Słownik: WebSocket -> (game_id, player_id)
         self.connection_info: Dict[WebSocket, tuple] = {}
+        # Coalescing: game_id -> zaplanowany flush stanu (debounce)
+        self._pending_flushes: Dict[str, asyncio.Task] = {}
+        # Cache ostatniego widoku: game_id -> {'lobby', 'engine', 'loaded_at', 'views'}
+        self._state_cache: Dict[str, dict] = {}
+        # Słownik: WebSocket -> ConnectionSender (kolejka + writer task)
+        self.senders: Dict[WebSocket, ConnectionSender] = {}
     
     async def connect(self, websocket: WebSocket, game_id: str, player_id: str):
         """
@@ -67,17 +252,18 @@ class ConnectionManager:
         self.active_connections[game_id].append(websocket)
         self.connection_info[websocket] = (game_id, player_id)
         
+        sender = ConnectionSender(self, websocket, player_id)
+        self.senders[websocket] = sender
+        sender.start()
+        
         # === REJOIN - Usuń klucz disconnect jeśli gracz wraca ===
         try:
             redis = RedisService()
-            disconnect_key = f"disconnected:{game_id}:{player_id}"
-            was_disconnected = await redis.redis.get(disconnect_key)
+            was_disconnected = await redis.pop_value(disconnect_key(game_id, player_id))
             
             if was_disconnected:
-                await redis.redis.delete(disconnect_key)
-                
-                # Anuluj task timeout
-                cancel_disconnect_timeout(game_id, player_id)
+                # Anuluj timer w harmonogramie
+                await cancel_disconnect_timeout(game_id, player_id)
                 
                 print(f"✅ WebSocket: {player_id} wrócił do gry {game_id} (rejoin)")
                 
@@ -106,15 +292,31 @@ class ConnectionManager:
                 if websocket in self.active_connections[game_id]:
                     self.active_connections[game_id].remove(websocket)
                 
-                # Usuń game_id jeśli puste
+                # Usuń game_id jeśli puste (razem z cache stanu)
                 if not self.active_connections[game_id]:
                     del self.active_connections[game_id]
+                    self._state_cache.pop(game_id, None)
+                    pending = self._pending_flushes.pop(game_id, None)
+                    if pending and not pending.done():
+                        pending.cancel()
             
             # Usuń z connection_info
             del self.connection_info[websocket]
             
+            # Zatrzymaj writer task
+            sender = self.senders.pop(websocket, None)
+            if sender:
+                sender.stop()
+            
             print(f"👋 WebSocket: {player_id} rozłączył się z gry {game_id}")
     
+    def is_connected(self, game_id: str, player_id: str) -> bool:
+        """Czy gracz ma jeszcze jakieś połączenie z grą (np. druga karta, lobby -> gra)"""
+        return any(
+            self.connection_info.get(ws) == (game_id, player_id)
+            for ws in self.active_connections.get(game_id, [])
+        )
+    
     async def send_personal_message(self, message: dict, websocket: WebSocket):
         """
         Wyślij wiadomość do konkretnego połączenia
@@ -123,17 +325,15 @@ class ConnectionManager:
             message: Wiadomość (dict)
             websocket: WebSocket connection
         """
-        try:
-            # Konwertuj Enumy i Karty na stringi przed wysłaniem
-            safe_message = convert_enums_to_strings(message)
-            await websocket.send_json(safe_message)
-        except Exception as e:
-            print(f"❌ Błąd wysyłania wiadomości: {e}")
+        await self._safe_send(websocket, message)
     
     async def broadcast(self, game_id: str, message: dict, exclude: Optional[WebSocket] = None):
         """
         Broadcast wiadomości do wszystkich w grze
         
+        Wiadomość trafia do kolejek połączeń - metoda nie czeka na
+        wysłanie przez sieć.
+        
         Args:
             game_id: ID gry
             message: Wiadomość (dict)
@@ -142,20 +342,21 @@ class ConnectionManager:
         if game_id not in self.active_connections:
             return
         
-        # Zrób kopię listy (żeby można było modyfikować podczas iteracji)
-        connections = self.active_connections[game_id][:]
+        # Konwertuj raz dla wszystkich odbiorców
+        try:
+            safe_message = convert_enums_to_strings(message)
+        except Exception as e:
+            print(f"❌ Błąd konwersji wiadomości: {e}")
+            return
         
-        tasks = []
-        for connection in connections:
+        # Zrób kopię listy (żeby można było modyfikować podczas iteracji)
+        for connection in self.active_connections[game_id][:]:
             if connection != exclude:
-                tasks.append(self._safe_send(connection, message))
-        
-        if tasks:
-            await asyncio.gather(*tasks, return_exceptions=True)
+                self._enqueue(connection, safe_message)
     
     async def _safe_send(self, websocket: WebSocket, message: dict):
         """
-        Bezpieczne wysyłanie (złap błędy)
+        Bezpieczne wysyłanie (złap błędy) - przez kolejkę połączenia
         
         Args:
             websocket: WebSocket connection
@@ -164,59 +365,180 @@ class ConnectionManager:
         try:
             # Konwertuj Enumy i Karty na stringi przed wysłaniem
             safe_message = convert_enums_to_strings(message)
-            await websocket.send_json(safe_message)
+            self._enqueue(websocket, safe_message)
         except Exception as e:
             print(f"❌ Błąd wysyłania: {e}")
-            # Usuń złe połączenie
-            self.disconnect(websocket)
+    
+    def _enqueue(self, websocket: WebSocket, safe_message: dict):
+        """Wrzuć wiadomość do kolejki połączenia (jeśli nadal aktywne)"""
+        sender = self.senders.get(websocket)
+        if sender:
+            sender.enqueue(safe_message)
+    
+    async def close_slow_consumer(self, websocket: WebSocket):
+        """
+        Rozłącz klienta, który nie nadąża z odbiorem
+        
+        Args:
+            websocket: WebSocket connection
+        """
+        self.disconnect(websocket)
+        try:
+            # 1013 = Try Again Later - frontend i tak się połączy ponownie
+            await asyncio.wait_for(websocket.close(code=1013), timeout=SEND_TIMEOUT)
+        except Exception as e:
+            print(f"⚠️ Błąd zamykania wolnego połączenia: {e}")
     
     async def broadcast_state_update(self, game_id: str):
         """
-        Broadcast aktualizacji stanu gry (pobiera z Redis i wysyła każdemu graczowi)
+        Zaplanuj broadcast aktualizacji stanu gry (coalescing).
+        
+        Wywołania w oknie STATE_COALESCE_WINDOW są łączone w jeden push:
+        lobby i silnik są ładowane z Redis raz, a każdy gracz dostaje
+        jedną ramkę state_update zamiast kilku pod rząd.
+        
+        Args:
+            game_id: ID gry
+        """
+        if game_id not in self.active_connections:
+            return
+        
+        pending = self._pending_flushes.get(game_id)
+        if pending and not pending.done():
+            # Flush już zaplanowany - dołącz do niego
+            return
+        
+        self._pending_flushes[game_id] = create_untracked_task(
+            self._flush_state_update(game_id)
+        )
+    
+    async def _flush_state_update(self, game_id: str):
+        """
+        Wykonaj zaplanowany broadcast stanu (po oknie debounce)
         
         Args:
             game_id: ID gry
         """
+        try:
+            await asyncio.sleep(STATE_COALESCE_WINDOW)
+        except asyncio.CancelledError:
+            return
+        finally:
+            # Nowe wywołania po tym punkcie zaplanują kolejny flush
+            if self._pending_flushes.get(game_id) is asyncio.current_task():
+                del self._pending_flushes[game_id]
+        
         if game_id not in self.active_connections:
             return
         
         try:
-            # Pobierz dane z Redis
-            redis = RedisService()
-            lobby_data = await redis.get_lobby(game_id)
-            engine = await redis.get_game_engine(game_id)
-            
-            if not lobby_data:
+            cache = await self._load_state_cache(game_id)
+            if not cache:
                 print(f"⚠️ Brak lobby data dla {game_id}")
                 return
             
-            # Wyślij spersonalizowany stan każdemu graczowi
-            connections = self.active_connections[game_id][:]
-            tasks = []
+            # Wyślij spersonalizowany stan każdemu graczowi (do kolejek)
+            connections = self.active_connections.get(game_id, [])[:]
             
             for connection in connections:
                 if connection in self.connection_info:
                     _, player_id = self.connection_info[connection]
+                    state = await self._get_cached_view(cache, player_id)
                     
-                    # Zbuduj stan dla gracza
-                    state = await self._build_state_for_player(
-                        lobby_data,
-                        engine,
-                        player_id
-                    )
-                    
-                    # Wyślij
-                    tasks.append(self._safe_send(connection, {
+                    await self._safe_send(connection, {
                         'type': 'state_update',
                         'data': state
-                    }))
-            
-            if tasks:
-                await asyncio.gather(*tasks, return_exceptions=True)
+                    })
                 
         except Exception as e:
             print(f"❌ Błąd broadcast_state_update: {e}")
     
+    async def send_state_to(self, websocket: WebSocket, force: bool = False):
+        """
+        Wyślij stan tylko do jednego połączenia (request_state, connect).
+        
+        Korzysta z cache ostatniego widoku - Redis jest odpytywany tylko
+        gdy cache jest starszy niż STATE_CACHE_TTL. Jeśli flush dla gry
+        jest już zaplanowany, połączenie i tak dostanie świeży stan.
+        
+        Args:
+            websocket: WebSocket connection
+            force: Pomiń cache i pending flush (resync po porzuceniu wiadomości)
+        """
+        if websocket not in self.connection_info:
+            return
+        
+        game_id, player_id = self.connection_info[websocket]
+        
+        pending = self._pending_flushes.get(game_id)
+        if pending and not pending.done() and not force:
+            return
+        
+        try:
+            cache = self._state_cache.get(game_id)
+            if force or not cache or time.monotonic() - cache['loaded_at'] > STATE_CACHE_TTL:
+                cache = await self._load_state_cache(game_id)
+            if not cache:
+                return
+            
+            state = await self._get_cached_view(cache, player_id)
+            await self._safe_send(websocket, {
+                'type': 'state_update',
+                'data': state
+            })
+        except Exception as e:
+            print(f"❌ Błąd send_state_to: {e}")
+    
+    async def _load_state_cache(self, game_id: str) -> Optional[dict]:
+        """
+        Pobierz lobby i silnik z Redis i zapisz w cache gry
+        
+        Args:
+            game_id: ID gry
+        
+        Returns:
+            dict | None: Wpis cache lub None gdy lobby nie istnieje
+        """
+        # Lobby + silnik jednym MGET (silnik tylko gdy gra trwa)
+        lobby_data, engine = await RedisService().get_game_state(game_id, with_engine=False)
+        if not lobby_data:
+            self._state_cache.pop(game_id, None)
+            return None
+        
+        cache = {
+            'lobby': lobby_data,
+            'engine': engine,
+            'loaded_at': time.monotonic(),
+            'views': {}
+        }
+        
+        # Nie trzymaj cache dla gier bez połączeń
+        if game_id in self.active_connections:
+            self._state_cache[game_id] = cache
+        
+        return cache
+    
+    async def _get_cached_view(self, cache: dict, player_id: str) -> dict:
+        """
+        Zwróć widok stanu dla gracza (budowany raz na wpis cache)
+        
+        Args:
+            cache: Wpis cache gry
+            player_id: Username gracza
+        
+        Returns:
+            dict: Stan gry
+        """
+        view = cache['views'].get(player_id)
+        if view is None:
+            view = await self._build_state_for_player(
+                cache['lobby'],
+                cache['engine'],
+                player_id
+            )
+            cache['views'][player_id] = view
+        return view
+    
     async def _build_state_for_player(
         self,
         lobby_data: dict,
@@ -266,6 +588,22 @@ class ConnectionManager:
         """
         return len(self.active_connections.get(game_id, []))
     
+    def get_queue_metrics(self, game_id: str) -> List[dict]:
+        """
+        Metryki kolejek wysyłki dla połączeń w grze
+        
+        Args:
+            game_id: ID gry
+        
+        Returns:
+            List[dict]: Metryki per połączenie
+        """
+        return [
+            self.senders[ws].get_metrics()
+            for ws in self.active_connections.get(game_id, [])
+            if ws in self.senders
+        ]
+    
     def get_all_games(self) -> List[str]:
         """
         Lista wszystkich game_id z aktywnymi połączeniami
@@ -282,29 +620,42 @@ manager = ConnectionManager()
 # DISCONNECT TIMEOUT HANDLER
 # ============================================
 
-# Globalna lista aktywnych tasków timeout (żeby nie zostały garbage collected)
-_disconnect_timeout_tasks: Dict[str, asyncio.Task] = {}
+# Czas na powrót po rozłączeniu (sekundy)
+RECONNECT_TIMEOUT = 60
+
+async def schedule_disconnect_timeout(game_id: str, player_id: str):
+    """
+    Zaplanuj timeout na powrót w harmonogramie Redis (przeżywa restart serwera).
+    """
+    from services.timer_service import get_disconnect_scheduler, disconnect_timer_id
+    
+    await get_disconnect_scheduler().schedule(
+        disconnect_timer_id(game_id, player_id),
+        time.time() + RECONNECT_TIMEOUT,
+        {'kind': 'ws_disconnect', 'game_id': game_id, 'player_id': player_id}
+    )
+    print(f"⏳ Timeout dla {player_id} w grze {game_id} - {RECONNECT_TIMEOUT}s na powrót")
+
+async def handle_disconnect_timer(timer_id: str, payload: dict):
+    """Handler harmonogramu - deadline na powrót minął"""
+    await _handle_disconnect_timeout(payload.get('game_id'), payload.get('player_id'))
 
 async def _handle_disconnect_timeout(game_id: str, player_id: str):
     """
     Obsługa timeout po rozłączeniu gracza.
     Jeśli gracz nie wróci w ciągu 60 sekund, przegrywa grę.
     """
-    task_key = f"{game_id}:{player_id}"
-    
     try:
-        print(f"⏳ Timeout task dla {player_id} w grze {game_id} - czekam 60s...")
-        await asyncio.sleep(60)  # Czekaj 60 sekund
         print(f"⏰ Timeout minął dla {player_id} w grze {game_id} - sprawdzam status...")
         
         # Nowa instancja Redis (stara mogła zostać zamknięta)
         redis = RedisService()
         
         # Sprawdź czy klucz nadal istnieje (gracz nie wrócił)
-        disconnect_key = f"disconnected:{game_id}:{player_id}"
-        disconnect_timestamp = await redis.redis.get(disconnect_key)
+        dc_key = disconnect_key(game_id, player_id)
+        disconnect_timestamp = await redis.redis.get(dc_key)
         
-        print(f"🔍 Klucz {disconnect_key} = {disconnect_timestamp}")
+        print(f"🔍 Klucz {dc_key} = {disconnect_timestamp}")
         
         if not disconnect_timestamp:
             # Klucz nie istnieje = gracz wrócił (klucz został usunięty przy rejoin)
@@ -318,49 +669,53 @@ async def _handle_disconnect_timeout(game_id: str, player_id: str):
         if not lobby_data or lobby_data.get('status_partii') not in ['W_GRZE', 'W_TRAKCIE']:
             # Gra już się skończyła
             print(f"ℹ️ Gra {game_id} już nie jest aktywna - pomijam forfeit")
-            await redis.redis.delete(disconnect_key)
+            await redis.redis.delete(dc_key)
             return
         
         print(f"❌ Gracz {player_id} nie wrócił w ciągu 60s - walkower w grze {game_id}")
         
         # Usuń klucz disconnect
-        await redis.redis.delete(disconnect_key)
+        await redis.redis.delete(dc_key)
         
         # === FORFEIT - Gracz przegrywa ===
-        engine = await redis.get_game_engine(game_id)
-        
-        # Znajdź zwycięzców (wszyscy oprócz gracza który wyszedł)
-        winners = []
-        if engine:
-            # Ustaw fazę na ZAKONCZONE i oznacz przegranego
-            from engines.tysiac_engine import TysiacEngine
-            
-            if isinstance(engine, TysiacEngine):
-                from silnik_tysiac import FazaGry as FazaGryTysiac
-                engine.game_state.faza = FazaGryTysiac.ZAKONCZONE
-            else:
-                from silnik_gry import FazaGry
-                engine.game_state.faza = FazaGry.ZAKONCZONE
-            
-            engine.game_state.kolej_gracza_idx = None
-            
-            # Zapisz info o forfeit
-            if not hasattr(engine.game_state, 'podsumowanie') or not engine.game_state.podsumowanie:
-                engine.game_state.podsumowanie = {}
-            engine.game_state.podsumowanie['forfeit'] = True
-            engine.game_state.podsumowanie['forfeit_player'] = player_id
-            engine.game_state.podsumowanie['forfeit_reason'] = 'Przekroczono czas na powrót'
+        # Pod lockiem gry - ruch bota z innego procesu nie nadpisze walkowera
+        lock = redis.game_lock(game_id)
+        async with lock:
+            engine = await redis.get_game_engine(game_id)
             
-            # Pobierz listę zwycięzców
-            for gracz in engine.game_state.gracze:
-                if gracz.nazwa != player_id:
-                    winners.append(gracz.nazwa)
+            # Znajdź zwycięzców (wszyscy oprócz gracza który wyszedł)
+            winners = []
+            if engine:
+                # Ustaw fazę na ZAKONCZONE i oznacz przegranego
+                from engines.tysiac_engine import TysiacEngine
+                
+                if isinstance(engine, TysiacEngine):
+                    from silnik_tysiac import FazaGry as FazaGryTysiac
+                    engine.game_state.faza = FazaGryTysiac.ZAKONCZONE
+                else:
+                    from silnik_gry import FazaGry
+                    engine.game_state.faza = FazaGry.ZAKONCZONE
+                
+                engine.game_state.kolej_gracza_idx = None
+                
+                # Zapisz info o forfeit
+                if not hasattr(engine.game_state, 'podsumowanie') or not engine.game_state.podsumowanie:
+                    engine.game_state.podsumowanie = {}
+                engine.game_state.podsumowanie['forfeit'] = True
+                engine.game_state.podsumowanie['forfeit_player'] = player_id
+                engine.game_state.podsumowanie['forfeit_reason'] = 'Przekroczono czas na powrót'
+                
+                # Pobierz listę zwycięzców
+                for gracz in engine.game_state.gracze:
+                    if gracz.nazwa != player_id:
+                        winners.append(gracz.nazwa)
+                
+                await redis.save_game_engine(game_id, engine, lock=lock)
             
-            await redis.save_game_engine(game_id, engine)
-        
-        # Zmień status lobby
-        lobby_data['status_partii'] = 'ZAKONCZONA'
-        await redis.save_lobby(game_id, lobby_data)
+            # Zmień status lobby (świeże lobby, z kontrolą wersji)
+            await redis.update_lobby(
+                game_id, lambda lobby: lobby.update(status_partii='ZAKONCZONA'), lock=lock
+            )
         
         # Broadcast końca gry - użyj game_forfeit (frontend tego oczekuje)
         await manager.broadcast(game_id, {
@@ -370,24 +725,17 @@ async def _handle_disconnect_timeout(game_id: str, player_id: str):
             'reason': 'Przekroczono czas na powrót'
         })
         
-    except asyncio.CancelledError:
-        print(f"ℹ️ Task timeout dla {player_id} w grze {game_id} został anulowany")
     except Exception as e:
         print(f"❌ Błąd _handle_disconnect_timeout: {e}")
         import traceback
         traceback.print_exc()
-    finally:
-        # Usuń task z globalnej listy
-        if task_key in _disconnect_timeout_tasks:
-            del _disconnect_timeout_tasks[task_key]
 
 
-def cancel_disconnect_timeout(game_id: str, player_id: str):
-    """Anuluj task timeout dla gracza (gdy wraca do gry)."""
-    task_key = f"{game_id}:{player_id}"
-    if task_key in _disconnect_timeout_tasks:
-        _disconnect_timeout_tasks[task_key].cancel()
-        del _disconnect_timeout_tasks[task_key]
+async def cancel_disconnect_timeout(game_id: str, player_id: str):
+    """Anuluj timer timeout dla gracza (gdy wraca do gry)."""
+    from services.timer_service import get_disconnect_scheduler, disconnect_timer_id
+    
+    if await get_disconnect_scheduler().cancel(disconnect_timer_id(game_id, player_id)):
         print(f"ℹ️ Anulowano timeout dla {player_id} w grze {game_id}")
 
 # ============================================
@@ -400,12 +748,59 @@ router = APIRouter()
 # WEBSOCKET ENDPOINT
 # ============================================
 
+@router.websocket("/ws/lobbies")
+async def lobby_feed_endpoint(
+    websocket: WebSocket,
+    typ_gry: Optional[str] = Query(None)
+):
+    """
+    WebSocket listy gier (dashboard) - zamiast odpytywania /api/lobby/list
+    
+    Args:
+        websocket: WebSocket connection
+        typ_gry: Opcjonalny filtr typu gry (66 / tysiac)
+    
+    Wiadomości od klienta:
+        {"type": "filter", "typ_gry": "66" | "tysiac" | null} - zmiana filtru (nowy snapshot)
+        {"type": "ping"}
+    """
+    await lobby_feed.connect(websocket, typ_gry or None)
+    
+    try:
+        while True:
+            data = await websocket.receive_text()
+            
+            try:
+                message = json.loads(data)
+                message_type = message.get('type')
+                
+                if message_type == 'ping':
+                    await lobby_feed.send_personal_message({'type': 'pong'}, websocket)
+                
+                elif message_type == 'filter':
+                    await lobby_feed.set_filter(websocket, message.get('typ_gry') or None)
+                
+                else:
+                    print(f"⚠️ Lista gier - nieznany typ wiadomości: {message_type}")
+            
+            except json.JSONDecodeError:
+                print(f"❌ Błąd parsowania JSON: {data}")
+    
+    except WebSocketDisconnect:
+        lobby_feed.disconnect(websocket)
+    
+    except Exception as e:
+        print(f"❌ WebSocket listy gier error: {e}")
+        lobby_feed.disconnect(websocket)
+
 @router.websocket("/ws/{game_id}/{player_id}")
 async def websocket_endpoint(
     websocket: WebSocket,
     game_id: str,
     player_id: str,
-    password: Optional[str] = Query(None)
+    password: Optional[str] = Query(None),
+    chat_cursor: Optional[str] = Query(None),
+    token: Optional[str] = Query(None)
 ):
     """
     WebSocket endpoint dla gry
@@ -413,9 +808,18 @@ async def websocket_endpoint(
     Args:
         websocket: WebSocket connection
         game_id: ID gry
-        player_id: Username gracza
+        player_id: Username gracza (musi zgadzać się z właścicielem tokena)
         password: Opcjonalne hasło do lobby
+        chat_cursor: Kursor ostatniej widzianej wiadomości czatu - nowsze zostaną dosłane
+        token: Token sesji (jak w nagłówku Authorization dla HTTP)
     """
+    # Autoryzacja przed accept - bez niej każdy mógłby podszyć się pod gracza z URL
+    user = await get_websocket_user(token)
+    if not user or user['username'] != player_id:
+        print(f"🚫 WebSocket: odrzucono połączenie jako {player_id} z gry {game_id} (brak/zły token)")
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    
     # Połącz
     await manager.connect(websocket, game_id, player_id)
     
@@ -426,8 +830,12 @@ async def websocket_endpoint(
             'message': f'Połączono z grą {game_id}'
         }, websocket)
         
-        # Wyślij aktualny stan
-        await manager.broadcast_state_update(game_id)
+        # Wyślij aktualny stan (tylko do nowego połączenia)
+        await manager.send_state_to(websocket)
+        
+        # Zaległe wiadomości czatu (nowe dostarcza przekaźnik czatu)
+        if is_chat_cursor(chat_cursor):
+            await chat_relay.send_backlog(websocket, game_id, chat_cursor)
         
         # Pętla odbierania wiadomości
         while True:
@@ -448,17 +856,23 @@ async def websocket_endpoint(
                     }, websocket)
                 
                 elif message_type == 'chat':
-                    # Broadcast wiadomości czatu
-                    await manager.broadcast(game_id, {
-                        'type': 'chat',
-                        'player': player_id,
-                        'message': message.get('message', ''),
-                        'timestamp': message.get('timestamp')
-                    })
+                    # Zapis w strumieniu czatu - do wszystkich (też nadawcy) trafi przez przekaźnik
+                    text = str(message.get('message', '')).strip()[:500]
+                    if text:
+                        _, error, _ = await LobbyService(RedisService()).post_chat(game_id, {
+                            'id': int(time.time() * 1000),
+                            'user_id': user['id'],
+                            'username': player_id,
+                            'message': text,
+                            'timestamp': time.time(),
+                            'is_system': False
+                        }, name=player_id)
+                        if error:
+                            print(f"⚠️ Czat WebSocket [{game_id}] {player_id}: {error}")
                 
                 elif message_type == 'request_state':
-                    # Żądanie aktualnego stanu
-                    await manager.broadcast_state_update(game_id)
+                    # Żądanie aktualnego stanu - odpowiedz tylko pytającemu z cache
+                    await manager.send_state_to(websocket)
                 
                 else:
                     print(f"⚠️ Nieznany typ wiadomości: {message_type}")
@@ -472,6 +886,10 @@ async def websocket_endpoint(
         # Gracz rozłączył się
         manager.disconnect(websocket)
         
+        # Inne połączenie tego gracza nadal otwarte (np. przejście lobby -> gra)
+        if manager.is_connected(game_id, player_id):
+            return
+        
         # === SYSTEM REJOIN - Zapisz info o opuszczeniu ===
         try:
             redis = RedisService()
@@ -479,27 +897,21 @@ async def websocket_endpoint(
             
             # Tylko jeśli gra jest w trakcie
             if lobby_data and lobby_data.get('status_partii') in ['W_GRZE', 'W_TRAKCIE']:
-                import time
-                
                 # Zapisz timestamp opuszczenia (90 sekund TTL - więcej niż timeout 60s)
-                disconnect_key = f"disconnected:{game_id}:{player_id}"
-                await redis.redis.set(disconnect_key, str(time.time()), ex=90)
+                dc_key = disconnect_key(game_id, player_id)
+                await redis.redis.set(dc_key, str(time.time()), ex=RECONNECT_TIMEOUT + 30)
                 
-                print(f"📴 Gracz {player_id} opuścił grę {game_id} - ma 60s na powrót")
+                print(f"📴 Gracz {player_id} opuścił grę {game_id} - ma {RECONNECT_TIMEOUT}s na powrót")
                 
                 # Broadcast info o rozłączeniu z countdown
                 await manager.broadcast(game_id, {
                     'type': 'player_disconnected',
                     'player': player_id,
-                    'reconnect_timeout': 60
+                    'reconnect_timeout': RECONNECT_TIMEOUT
                 })
                 
-                # Uruchom task który sprawdzi po 60s (zapisz w globalnej liście)
-                task_key = f"{game_id}:{player_id}"
-                task = asyncio.create_task(
-                    _handle_disconnect_timeout(game_id, player_id)
-                )
-                _disconnect_timeout_tasks[task_key] = task
+                # Zaplanuj sprawdzenie po 60s (harmonogram w Redis)
+                await schedule_disconnect_timeout(game_id, player_id)
             else:
                 # Gra nie jest w trakcie - zwykłe rozłączenie
                 await manager.broadcast(game_id, {
@@ -534,7 +946,10 @@ async def websocket_stats():
     
     for game_id in games:
         stats['games'][game_id] = {
-            'connections': manager.get_connections_count(game_id)
+            'connections': manager.get_connections_count(game_id),
+            'queues': manager.get_queue_metrics(game_id)
         }
     
+    stats['lobby_feed'] = lobby_feed.get_stats()
+    
     return stats
\ No newline at end of file
@@ -3,7 +3,7 @@ Services package
 Lazy imports to avoid circular dependencies
 """
 
-__all__ = ['redis_service', 'bot_service', 'auth_service', 'game_service']
+__all__ = ['redis_service', 'bot_service', 'auth_service', 'game_service', 'lobby_service', 'presence_service', 'session_service', 'bot_registry', 'user_counters_service', 'leaderboard_service', 'match_results_service', 'pacing_service', 'storage_service', 'chat_service', 'lobby_feed_service', 'response_cache_service', 'static_service']
 
 # Lazy imports - nie importuj automatycznie, żeby uniknąć circular imports
 # Użyj: from services.auth_service import AuthService
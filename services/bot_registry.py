@@ -0,0 +1,182 @@
+"""
+Service: Rejestr botów
+Odpowiedzialność: Kto jest botem i jakiego algorytmu używa - w pamięci procesu
+
+Rejestr ładowany jest raz przy starcie (użytkownicy z users.is_bot)
+i przeładowywany po komunikacie na kanale Redis BOT_REGISTRY_CHANNEL
+(create_bots.py, usunięcie bota w panelu admina). BotService pyta rejestr
+zamiast otwierać sesję bazy danych przy każdym ruchu bota.
+"""
+import asyncio
+import json
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from redis_utils import open_pubsub
+from services.redis_service import get_redis_client
+
+# Kanał pub/sub - dowolna wiadomość = przeładuj rejestr
+BOT_REGISTRY_CHANNEL = "bots:registry"
+
+# Prefiks nazw botów dodawanych przez "Dodaj bota" (bez konta w bazie)
+GENERIC_BOT_PREFIX = "Bot #"
+
+DEFAULT_BOT_ALGORITHM = "topplayer"
+
+@dataclass
+class BotInfo:
+    """Wpis rejestru botów"""
+    user_id: int
+    username: str
+    algorytm: str
+    avatar_url: Optional[str]
+
+# ============================================
+# BOT REGISTRY CLASS
+# ============================================
+
+class BotRegistry:
+    """Rejestr botów w pamięci (nazwa -> BotInfo)"""
+    
+    def __init__(self):
+        self._bots: Dict[str, BotInfo] = {}
+        self._loaded = False
+        self._load_lock = asyncio.Lock()
+        self.listener_task: Optional[asyncio.Task] = None
+    
+    @property
+    def bots(self) -> Dict[str, BotInfo]:
+        """Wszystkie zarejestrowane boty (nazwa -> BotInfo)"""
+        return self._bots
+    
+    async def load(self):
+        """Załaduj boty z bazy (jedno zapytanie) - podmienia cały rejestr"""
+        from database import async_sessionmaker, User
+        from sqlalchemy import select
+        from boty import DOSTEPNE_ALGORYTMY
+        
+        bots: Dict[str, BotInfo] = {}
+        async with async_sessionmaker() as session:
+            result = await session.execute(
+                select(User.id, User.username, User.settings, User.avatar_url)
+                .where(User.is_bot == True)
+            )
+            for user_id, username, user_settings, avatar_url in result.all():
+                try:
+                    settings = json.loads(user_settings) if user_settings else {}
+                except (ValueError, TypeError):
+                    settings = {}
+                
+                algorytm = settings.get('algorytm', DEFAULT_BOT_ALGORITHM)
+                if algorytm not in DOSTEPNE_ALGORYTMY:
+                    algorytm = DEFAULT_BOT_ALGORITHM
+                bots[username] = BotInfo(
+                    user_id=user_id,
+                    username=username,
+                    algorytm=algorytm,
+                    avatar_url=avatar_url
+                )
+        
+        self._bots = bots
+        self._loaded = True
+        print(f"🤖 Rejestr botów: {len(bots)} botów")
+    
+    async def ensure_loaded(self):
+        """Załaduj rejestr przy pierwszym użyciu (jeśli startup go nie załadował)"""
+        if self._loaded:
+            return
+        async with self._load_lock:
+            if not self._loaded:
+                try:
+                    await self.load()
+                except Exception as e:
+                    print(f"❌ Błąd ładowania rejestru botów: {e}")
+    
+    def is_bot(self, username: str) -> bool:
+        """Czy gracz o tej nazwie jest botem"""
+        if not username:
+            return False
+        return username in self._bots or username.startswith(GENERIC_BOT_PREFIX)
+    
+    def get_algorithm(self, username: str) -> str:
+        """Algorytm bota (domyślny dla botów bez konta)"""
+        info = self._bots.get(username)
+        return info.algorytm if info else DEFAULT_BOT_ALGORITHM
+    
+    def bot_seats(self, lobby_data: dict) -> Dict[str, str]:
+        """
+        Miejsca botów w lobby: nazwa -> algorytm
+        Zapisywane w silniku przy tworzeniu gry (engine.bot_seats).
+        """
+        seats = {}
+        for slot in lobby_data.get('slots', []):
+            name = slot.get('nazwa')
+            if slot.get('typ') == 'pusty' or not name:
+                continue
+            if slot.get('typ') == 'bot' or self.is_bot(name):
+                seats[name] = self.get_algorithm(name)
+        return seats
+    
+    # ============================================
+    # PUB/SUB
+    # ============================================
+    
+    async def publish_change(self, redis_client=None):
+        """Powiadom wszystkie procesy, że lista botów się zmieniła"""
+        try:
+            client = redis_client or get_redis_client()
+            await client.publish(BOT_REGISTRY_CHANNEL, "reload")
+        except Exception as e:
+            print(f"❌ Błąd publikacji zmiany rejestru botów: {e}")
+    
+    async def listen(self):
+        """Pętla subskrypcji - przeładuj rejestr po każdym komunikacie"""
+        while True:
+            pubsub = None
+            try:
+                pubsub = open_pubsub(get_redis_client())
+                await pubsub.subscribe(BOT_REGISTRY_CHANNEL)
+                async for message in pubsub.listen():
+                    if message.get('type') == 'message':
+                        await self.load()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ Rejestr botów - błąd subskrypcji: {e}")
+                await asyncio.sleep(5)
+            finally:
+                if pubsub is not None:
+                    try:
+                        await pubsub.close()
+                    except Exception:
+                        pass
+
+# Singleton
+bot_registry = BotRegistry()
+
+async def setup_bot_registry():
+    """
+    Załaduj rejestr i uruchom nasłuch zmian
+    Wywoływane w main.py przy startup (po init_redis)
+    """
+    try:
+        await bot_registry.load()
+    except Exception as e:
+        print(f"⚠️ Rejestr botów nie załadowany: {e}")
+    
+    if bot_registry.listener_task is None or bot_registry.listener_task.done():
+        bot_registry.listener_task = asyncio.create_task(bot_registry.listen())
+
+async def stop_bot_registry():
+    """
+    Zatrzymaj nasłuch zmian rejestru
+    Wywoływane w main.py przy shutdown
+    """
+    task = bot_registry.listener_task
+    if task and not task.done():
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    bot_registry.listener_task = None
@@ -8,13 +8,19 @@ import json
 from typing import Any, Optional, Dict
 from enum import Enum
 
-from services.redis_service import RedisService
+from services.redis_service import (
+    RedisService, game_aux_key,
+    NEXT_ROUND_VOTES_PREFIX, STAYING_PLAYERS_PREFIX, RETURN_TIMER_PREFIX,
+    RETURN_VOTES_PREFIX, GAME_ENGINE_AUX_PREFIX
+)
+from services.bot_registry import bot_registry
+from services.pacing_service import pacing_scheduler
 from routers.websocket_router import manager
+from redis_utils import create_untracked_task
 
 # Import systemu botów z nowym MCTS i osobowościami
 from boty import (
     stworz_bota,
-    DOSTEPNE_ALGORYTMY,
     MCTS_Bot,
     AdvancedHeuristicBot,
     RandomBot,
@@ -22,6 +28,10 @@ from boty import (
 )
 from boty_tysiac import wybierz_akcje_dla_bota_testowego_tysiac
 
+# Opóźnienie pierwszej akcji bota (szybki start) i czas pokazania kompletnej lewy (sekundy)
+BOT_FIRST_ACTION_DELAY = 0.2
+TRICK_DISPLAY_DELAY = 1.5
+
 # ============================================
 # HELPER FUNCTIONS
 # ============================================
@@ -88,27 +98,23 @@ class BotService:
         else:
             return akcja
     
-    async def get_bot_algorithm(self, player_id: str, redis: RedisService) -> str:
-        """Pobiera algorytm bota z bazy danych."""
-        try:
-            from database import async_sessionmaker, User
-            from sqlalchemy import select
-            
-            async with async_sessionmaker() as session:
-                query = select(User).where(User.username == player_id)
-                result = await session.execute(query)
-                user = result.scalar_one_or_none()
-                
-                if user and user.settings:
-                    settings = json.loads(user.settings)
-                    if settings.get('jest_botem'):
-                        algorytm = settings.get('algorytm', 'topplayer')
-                        if algorytm in DOSTEPNE_ALGORYTMY:
-                            return algorytm
-        except Exception as e:
-            pass
+    async def get_bot_algorithm(self, player_id: str, redis: RedisService = None) -> str:
+        """Pobiera algorytm bota z rejestru botów (bez zapytania do bazy)."""
+        await bot_registry.ensure_loaded()
+        return bot_registry.get_algorithm(player_id)
+    
+    async def _bot_seat_algorithm(self, engine: Any, player_id: str) -> Optional[str]:
+        """
+        Algorytm bota na danym miejscu lub None jeśli to człowiek.
+        Najpierw engine.bot_seats (zapisane przy tworzeniu gry), potem rejestr.
+        """
+        bot_seats = getattr(engine, 'bot_seats', None)
+        if bot_seats is not None:
+            return bot_seats.get(player_id)
         
-        return 'topplayer'
+        if await self._is_registered_bot_by_name(player_id):
+            return await self.get_bot_algorithm(player_id)
+        return None
     
     def _execute_bot_action_mcts(self, bot: Any, engine: Any, player_id: str) -> Optional[dict]:
         """Wykonuje akcję bota używając MCTS lub innego algorytmu."""
@@ -129,109 +135,171 @@ class BotService:
     
     async def process_bot_actions(self, game_id: str, engine: Any, redis: RedisService) -> None:
         """
-        Automatycznie wykonuje akcje botów dopóki jest ich kolej.
+        Zaplanuj akcje botów dopóki jest ich kolej.
+        Kolejne kroki (ruch bota, finalizacja lewy) planowane we wspólnym harmonogramie
+        tempa gier - bez śpiącej coroutine na grę. Zwraca od razu.
+        """
+        await self._schedule_next_step(game_id, engine, redis, iteration=0, first_delay=BOT_FIRST_ACTION_DELAY)
+    
+    def schedule_trick_finalization(self, game_id: str, redis: RedisService, iteration: int = 0) -> None:
+        """Zaplanuj finalizację kompletnej lewy (gracze widzą lewę przez TRICK_DISPLAY_DELAY)"""
+        pacing_scheduler.schedule(
+            game_id, TRICK_DISPLAY_DELAY,
+            lambda: self._finalize_trick_step(game_id, redis, iteration)
+        )
+    
+    async def _schedule_next_step(
+        self,
+        game_id: str,
+        engine: Any,
+        redis: RedisService,
+        iteration: int,
+        first_delay: Optional[float] = None
+    ) -> None:
+        """
+        Zaplanuj następny krok gry po akcji: finalizacja lewy, ruch bota
+        albo (gdy kolej człowieka / koniec rozdania) sprawdzenie nowej rundy.
         """
-        iteration = 0
-        first_action = True
+        state = engine.game_state
         
-        while iteration < self.max_iterations:
-            iteration += 1
-            
-            state = engine.game_state
-            kolej_idx = state.kolej_gracza_idx
-            
-            if kolej_idx is None:
-                break
-            
-            current_player = state.gracze[kolej_idx]
-            player_id = str(current_player.nazwa).strip()
-            
-            # Sprawdź czy to bot
-            is_bot = await self._is_registered_bot_by_name(player_id)
-            
-            if not is_bot:
-                break
-            
-            # Delay PRZED akcją bota (krótszy dla pierwszej akcji)
-            if first_action:
-                await asyncio.sleep(0.2)  # Szybki start
-                first_action = False
-            else:
-                await asyncio.sleep(self.bot_delay)
-            
-            # Pobierz algorytm bota
-            algorytm = await self.get_bot_algorithm(player_id, redis)
-            
-            # Wykryj typ gry
-            from engines.tysiac_engine import TysiacEngine
-            is_tysiac = isinstance(engine, TysiacEngine)
-            
-            bot_action = None
+        if getattr(state, 'lewa_do_zamkniecia', False):
+            self.schedule_trick_finalization(game_id, redis, iteration)
+            return
+        
+        if iteration < self.max_iterations and state.kolej_gracza_idx is not None:
+            player_id = str(state.gracze[state.kolej_gracza_idx].nazwa).strip()
+            if await self._bot_seat_algorithm(engine, player_id) is not None:
+                delay = self.bot_delay if first_delay is None else first_delay
+                pacing_scheduler.schedule(
+                    game_id, delay,
+                    lambda: self._bot_move_step(game_id, redis, iteration + 1)
+                )
+                return
+        
+        # === AUTOMATYCZNE PRZEJŚCIE DO NOWEJ RUNDY ===
+        pacing_scheduler.schedule(
+            game_id, 0,
+            lambda: self._auto_next_round_if_all_bots(game_id, engine, redis)
+        )
+    
+    async def _bot_move_step(self, game_id: str, redis: RedisService, iteration: int) -> None:
+        """
+        Krok harmonogramu: jeden ruch bota.
+        Pod lockiem gry, na świeżym silniku z Redis (inny proces mógł go zmienić).
+        """
+        async with redis.game_lock(game_id) as lock:
+            engine = await redis.get_game_engine(game_id)
+            if not engine:
+                return
+            moved = await self._perform_bot_move(game_id, engine, redis, lock)
+        
+        if moved:
+            await self._schedule_next_step(game_id, engine, redis, iteration)
+        else:
+            await self._auto_next_round_if_all_bots(game_id, engine, redis)
+    
+    async def _perform_bot_move(self, game_id: str, engine: Any, redis: RedisService, lock: Any) -> bool:
+        """Wykonaj ruch bota, którego jest kolej (False = nie ma ruchu bota)"""
+        state = engine.game_state
+        kolej_idx = state.kolej_gracza_idx
+        
+        if kolej_idx is None:
+            return False
+        
+        current_player = state.gracze[kolej_idx]
+        player_id = str(current_player.nazwa).strip()
+        
+        # Sprawdź czy to bot (i jaki algorytm) - kolej mogła się zmienić od zaplanowania
+        algorytm = await self._bot_seat_algorithm(engine, player_id)
+        
+        if algorytm is None:
+            return False
+        
+        # Wykryj typ gry
+        from engines.tysiac_engine import TysiacEngine
+        is_tysiac = isinstance(engine, TysiacEngine)
+        
+        bot_action = None
+        
+        if is_tysiac:
+            typ_akcji, parametry = wybierz_akcje_dla_bota_testowego_tysiac(current_player, state)
+            bot_action = self._convert_old_bot_action(typ_akcji, parametry)
+        else:
+            bot = get_or_create_bot(algorytm)
+            if bot:
+                # Wyszukiwanie (MCTS do mcts_time_limit) w wątku - pętla zdarzeń
+                # dalej przedłuża lock gry i obsługuje inne gry
+                bot_action = await asyncio.to_thread(self._execute_bot_action_mcts, bot, engine, player_id)
             
-            if is_tysiac:
-                typ_akcji, parametry = wybierz_akcje_dla_bota_testowego_tysiac(current_player, state)
+            if not bot_action:
+                typ_akcji, parametry = wybierz_akcje_dla_bota_testowego(current_player, state)
                 bot_action = self._convert_old_bot_action(typ_akcji, parametry)
-            else:
-                bot = get_or_create_bot(algorytm)
-                if bot:
-                    bot_action = self._execute_bot_action_mcts(bot, engine, player_id)
-                
-                if not bot_action:
-                    typ_akcji, parametry = wybierz_akcje_dla_bota_testowego(current_player, state)
-                    bot_action = self._convert_old_bot_action(typ_akcji, parametry)
+        
+        if not bot_action:
+            return False
+        
+        # Konwertuj karty na stringi
+        bot_action = self._convert_karty_w_akcji(bot_action)
+        
+        # LOG: Zagranie karty
+        if bot_action.get('typ') == 'zagraj_karte':
+            print(f"🃏 [{player_id}] gra: {bot_action.get('karta')}")
+        
+        try:
+            # Wykonaj akcję
+            action_result = engine.perform_action(player_id, bot_action)
             
-            if not bot_action:
-                break
+            # Zapisz silnik (z tokenem fencingu)
+            await redis.save_game_engine(game_id, engine, lock=lock)
             
-            # Konwertuj karty na stringi
-            bot_action = self._convert_karty_w_akcji(bot_action)
+            # Przygotuj publiczny stan (bez kart) dla dymków akcji
+            public_state = {
+                'faza': state.faza.name if hasattr(state.faza, 'name') else str(state.faza),
+                'rece_graczy': {g.nazwa: len(g.reka) for g in state.gracze},
+                'kolej_gracza': state.gracze[state.kolej_gracza_idx].nazwa if state.kolej_gracza_idx is not None else None
+            }
             
-            # LOG: Zagranie karty
-            if bot_action.get('typ') == 'zagraj_karte':
-                print(f"🃏 [{player_id}] gra: {bot_action.get('karta')}")
+            # Broadcast akcji bota
+            await manager.broadcast(game_id, {
+                'type': 'bot_action',
+                'player': player_id,
+                'action': convert_enums_to_strings(bot_action),
+                'state': public_state
+            })
             
-            try:
-                # Wykonaj akcję
-                action_result = engine.perform_action(player_id, bot_action)
-                
-                # Zapisz silnik
-                await redis.save_game_engine(game_id, engine)
-                
-                # Przygotuj publiczny stan (bez kart) dla dymków akcji
-                public_state = {
-                    'faza': state.faza.name if hasattr(state.faza, 'name') else str(state.faza),
-                    'rece_graczy': {g.nazwa: len(g.reka) for g in state.gracze},
-                    'kolej_gracza': state.gracze[state.kolej_gracza_idx].nazwa if state.kolej_gracza_idx is not None else None
-                }
-                
-                # Broadcast akcji bota
+            # Wyślij spersonalizowany stan każdemu graczowi
+            await manager.broadcast_state_update(game_id)
+            
+            # Broadcast meldunku jeśli był
+            if action_result and action_result.get('meldunek_pkt', 0) > 0:
+                meldunek_pkt = action_result.get('meldunek_pkt')
                 await manager.broadcast(game_id, {
                     'type': 'bot_action',
                     'player': player_id,
-                    'action': convert_enums_to_strings(bot_action),
-                    'state': public_state
-                })
-                
-                # Wyślij spersonalizowany stan każdemu graczowi
-                await manager.broadcast_state_update(game_id)
-                
-                # Broadcast meldunku jeśli był
-                if action_result and action_result.get('meldunek_pkt', 0) > 0:
-                    meldunek_pkt = action_result.get('meldunek_pkt')
-                    await manager.broadcast(game_id, {
-                        'type': 'bot_action',
-                        'player': player_id,
-                        'action': convert_enums_to_strings({
-                            'typ': 'meldunek',
-                            'punkty': meldunek_pkt
-                        })
+                    'action': convert_enums_to_strings({
+                        'typ': 'meldunek',
+                        'punkty': meldunek_pkt
                     })
-                
-                # Auto-finalizacja lewy
-                if (hasattr(state, 'lewa_do_zamkniecia') and state.lewa_do_zamkniecia):
-                    await asyncio.sleep(1.5)
+                })
+        except Exception as e:
+            print(f"[Bot] Błąd akcji: {e}")
+            return False
+        
+        return True
+    
+    async def _finalize_trick_step(self, game_id: str, redis: RedisService, iteration: int) -> None:
+        """Krok harmonogramu: finalizacja lewy (pod lockiem gry) i dalsza gra"""
+        async with redis.game_lock(game_id) as lock:
+            engine = await redis.get_game_engine(game_id)
+            if not engine:
+                return
+            state = engine.game_state
+            
+            # Lewa mogła zostać już sfinalizowana przez /finalize-trick
+            if getattr(state, 'lewa_do_zamkniecia', False):
+                try:
                     state.finalizuj_lewe()
-                    await redis.save_game_engine(game_id, engine)
+                    await redis.save_game_engine(game_id, engine, lock=lock)
                     
                     await manager.broadcast(game_id, {
                         'type': 'trick_finalized'
@@ -239,14 +307,12 @@ class BotService:
                     await manager.broadcast_state_update(game_id)
                     
                     # Synchronizuj punkty meczowe do lobby
-                    await self._sync_match_score_to_lobby(game_id, engine, redis)
-                
-            except Exception as e:
-                print(f"[Bot] Błąd akcji: {e}")
-                break
+                    await self._sync_match_score_to_lobby(game_id, engine, redis, lock=lock)
+                except Exception as e:
+                    print(f"[Bot] Błąd finalizacji lewy: {e}")
+                    return
         
-        # === AUTOMATYCZNE PRZEJŚCIE DO NOWEJ RUNDY ===
-        await self._auto_next_round_if_all_bots(game_id, engine, redis)
+        await self._schedule_next_step(game_id, engine, redis, iteration)
     
     def _convert_old_bot_action(self, typ_akcji: str, parametry: Any) -> Optional[dict]:
         """Konwertuje stary format akcji bota testowego na nowy format."""
@@ -277,44 +343,22 @@ class BotService:
             current_player = state.gracze[kolej_idx]
             player_id = str(current_player.nazwa).strip()
             
-            return await self._is_registered_bot_by_name(player_id)
+            return await self._bot_seat_algorithm(engine, player_id) is not None
         except:
             return False
     
     async def _is_registered_bot_by_name(self, player_name: str, redis: RedisService = None, game_id: str = None) -> bool:
-        """Sprawdza czy gracz o danej nazwie jest botem."""
-        try:
-            from database import async_sessionmaker, User
-            from sqlalchemy import select
-            
-            async with async_sessionmaker() as session:
-                query = select(User).where(User.username == player_name)
-                result = await session.execute(query)
-                user = result.scalar_one_or_none()
-                
-                if user and user.settings:
-                    settings = json.loads(user.settings)
-                    if settings.get('jest_botem', False):
-                        return True
-        except:
-            pass
-        
-        if player_name and player_name.startswith('Bot #'):
-            return True
-        
-        return False
+        """Sprawdza czy gracz o danej nazwie jest botem (rejestr botów w pamięci)."""
+        await bot_registry.ensure_loaded()
+        return bot_registry.is_bot(player_name)
     
     def get_bot_difficulty(self, bot_name: str) -> str:
         """Pobierz poziom trudności bota"""
         return 'medium'
     
-    async def _sync_match_score_to_lobby(self, game_id: str, engine: Any, redis: RedisService) -> None:
-        """Synchronizuj punkty meczowe z silnika gry do lobby w Redis."""
+    async def _sync_match_score_to_lobby(self, game_id: str, engine: Any, redis: RedisService, lock: Any = None) -> None:
+        """Synchronizuj punkty meczowe z silnika gry do lobby w Redis (lock = trzymany lock gry, inaczej zdobywany tutaj)."""
         try:
-            lobby_data = await redis.get_lobby(game_id)
-            if not lobby_data:
-                return
-            
             punkty_meczowe = {}
             
             from engines.tysiac_engine import TysiacEngine
@@ -335,15 +379,15 @@ class BotService:
                         if hasattr(gracz, 'punkty_meczu'):
                             punkty_meczowe[gracz.nazwa] = gracz.punkty_meczu
             
-            lobby_data['punkty_meczowe'] = punkty_meczowe
-            await redis.save_lobby(game_id, lobby_data)
+            async with redis.held_game_lock(game_id, lock) as lock:
+                await redis.update_lobby(
+                    game_id, lambda lobby_data: lobby_data.update(punkty_meczowe=punkty_meczowe), lock=lock
+                )
         except Exception as e:
             print(f"[Bot] ⚠️ Błąd sync punkty: {e}")
     
     async def _auto_next_round_if_all_bots(self, game_id: str, engine: Any, redis: RedisService) -> None:
         """Automatycznie głosuje za nową rundą gdy rozdanie jest zakończone."""
-        import random
-        
         try:
             state = engine.game_state
             
@@ -383,10 +427,10 @@ class BotService:
                 # LOG: Mecz zakończony
                 print(f"🏆 [Gra {game_id[:8]}] MECZ ZAKOŃCZONY! Wygrywa: {zwyciezca}")
                 
-                lobby_data = await redis.get_lobby(game_id)
-                if lobby_data:
-                    lobby_data['status_partii'] = 'ZAKONCZONA'
-                    await redis.save_lobby(game_id, lobby_data)
+                async with redis.game_lock(game_id) as lock:
+                    lobby_data = await redis.update_lobby(
+                        game_id, lambda lobby: lobby.update(status_partii='ZAKONCZONA'), lock=lock
+                    )
                 
                 # === INKREMENTUJ LICZNIK ROZEGRANYCH GIER ===
                 try:
@@ -429,12 +473,13 @@ class BotService:
                             else:
                                 loser_usernames.append(gracz.nazwa)
                     
-                    # Aktualizuj statystyki
+                    # Zgłoś wynik do zaksięgowania (XADD - bez czekania na bazę)
                     await update_player_stats_after_game(
                         winner_usernames=winner_usernames,
                         loser_usernames=loser_usernames,
                         game_type_name=game_type_name,
-                        is_casual=is_casual
+                        is_casual=is_casual,
+                        match_id=getattr(engine, 'match_id', None)
                     )
                     print(f"[📊 Stats] Aktualizacja botów: winners={winner_usernames}, losers={loser_usernames}")
                 except Exception as stats_err:
@@ -443,17 +488,12 @@ class BotService:
                     traceback.print_exc()
                 # === KONIEC AKTUALIZACJI STATYSTYK ===
                 
-                # Boty głosują za powrotem do lobby
-                await self._bots_vote_return_to_lobby(game_id, engine, redis)
+                # Boty głosują za powrotem do lobby (osobny task - 10s timer nie blokuje kroków gry)
+                create_untracked_task(self._bots_vote_return_to_lobby(game_id, engine, redis))
                 return
             
-            # Boty głosują za następną rundą
-            for gracz in state.gracze:
-                is_bot = await self._is_registered_bot_by_name(gracz.nazwa)
-                if is_bot:
-                    delay = random.uniform(0.5, 1.5)  # Szybsze głosowanie
-                    await asyncio.sleep(delay)
-                    await self._bot_vote_next_round(game_id, gracz.nazwa, redis)
+            # Boty głosują za następną rundą (szybsze głosowanie)
+            await self._schedule_bot_votes(game_id, engine, redis, delay_range=(0.5, 1.5))
             
         except Exception as e:
             print(f"[Bot] Błąd _auto_next_round: {e}")
@@ -463,28 +503,45 @@ class BotService:
         Wywoływane gdy gracz zagłosował za następną rundą.
         Uruchamia głosowanie wszystkich botów w grze.
         """
-        import random
-        
         try:
-            state = engine.game_state
-            
-            for gracz in state.gracze:
-                is_bot = await self._is_registered_bot_by_name(gracz.nazwa)
-                if is_bot:
-                    # Bot głosuje z losowym opóźnieniem
-                    delay = random.uniform(0.3, 1.0)
-                    await asyncio.sleep(delay)
-                    await self._bot_vote_next_round(game_id, gracz.nazwa, redis)
-                    
+            # Boty głosują z losowym opóźnieniem
+            await self._schedule_bot_votes(game_id, engine, redis, delay_range=(0.3, 1.0))
         except Exception as e:
             print(f"[Bot] Błąd trigger_bot_next_round_votes: {e}")
     
+    async def _schedule_bot_votes(self, game_id: str, engine: Any, redis: RedisService, delay_range: tuple) -> None:
+        """
+        Zaplanuj głosy botów za następną rundą - jeden po drugim w harmonogramie
+        tempa gier (każdy głos planuje następny z losowym opóźnieniem).
+        """
+        bot_names = [
+            gracz.nazwa for gracz in engine.game_state.gracze
+            if await self._bot_seat_algorithm(engine, gracz.nazwa) is not None
+        ]
+        self._schedule_next_vote(game_id, bot_names, redis, delay_range)
+    
+    def _schedule_next_vote(self, game_id: str, bot_names: list, redis: RedisService, delay_range: tuple) -> None:
+        import random
+        
+        if not bot_names:
+            return
+        
+        bot_name, rest = bot_names[0], bot_names[1:]
+        
+        async def vote_step():
+            await self._bot_vote_next_round(game_id, bot_name, redis)
+            # Ostatni głos mógł wystartować rundę (zaplanowane ruchy botów) - nie nadpisuj
+            if not pacing_scheduler.is_pending(game_id):
+                self._schedule_next_vote(game_id, rest, redis, delay_range)
+        
+        pacing_scheduler.schedule(game_id, random.uniform(*delay_range), vote_step)
+    
     async def _bot_vote_next_round(self, game_id: str, bot_name: str, redis: RedisService) -> None:
         """Bot głosuje za następną rundą."""
         import json
         
         try:
-            votes_key = f"next_round_votes:{game_id}"
+            votes_key = game_aux_key(NEXT_ROUND_VOTES_PREFIX, game_id)
             votes_data = await redis.redis.get(votes_key)
             
             if votes_data:
@@ -511,7 +568,10 @@ class BotService:
                     # Sprawdź czy wszyscy zagłosowali
                     if set(votes) >= set(all_players):
                         await redis.redis.delete(votes_key)
-                        await self._start_next_round_internal(game_id, engine, redis)
+                        # Pod lockiem gry, na świeżym silniku
+                        async with redis.game_lock(game_id) as lock:
+                            engine = await redis.get_game_engine(game_id) or engine
+                            await self._start_next_round_internal(game_id, engine, redis, lock=lock)
                         await self.process_bot_actions(game_id, engine, redis)
         except Exception as e:
             pass
@@ -521,8 +581,8 @@ class BotService:
         # Deleguj do głównej funkcji z timerem
         await self.trigger_return_to_lobby_voting(game_id, redis)
     
-    async def _start_next_round_internal(self, game_id: str, engine: Any, redis: RedisService) -> None:
-        """Wewnętrzna metoda rozpoczynająca nową rundę."""
+    async def _start_next_round_internal(self, game_id: str, engine: Any, redis: RedisService, lock: Any = None) -> None:
+        """Wewnętrzna metoda rozpoczynająca nową rundę (lock = trzymany lock gry)."""
         state = engine.game_state
         
         # Zmień rozdającego
@@ -616,11 +676,11 @@ class BotService:
         if hasattr(state, 'rozpocznij_nowe_rozdanie'):
             state.rozpocznij_nowe_rozdanie()
         
-        # Zapisz silnik
-        await redis.save_game_engine(game_id, engine)
+        # Zapisz silnik (z tokenem fencingu)
+        await redis.save_game_engine(game_id, engine, lock=lock)
         
         # Synchronizuj punkty meczowe do lobby
-        await self._sync_match_score_to_lobby(game_id, engine, redis)
+        await self._sync_match_score_to_lobby(game_id, engine, redis, lock=lock)
         
         # Broadcast info o nowej rundzie
         await manager.broadcast(game_id, {'type': 'next_round_started'})
@@ -631,16 +691,15 @@ class BotService:
         import random
         
         try:
-            lobby_data = await redis.get_lobby(game_id)
+            lobby_data, engine = await redis.get_game_state(game_id)
             if not lobby_data or lobby_data.get('status_partii') != 'ZAKONCZONA':
                 return
             
-            engine = await redis.get_game_engine(game_id)
             if not engine:
                 return
             
             # === ZABEZPIECZENIE PRZED WIELOKROTNYM URUCHOMIENIEM ===
-            timer_key = f"return_timer_active:{game_id}"
+            timer_key = game_aux_key(RETURN_TIMER_PREFIX, game_id)
             already_running = await redis.redis.get(timer_key)
             if already_running:
                 print(f"[Bot] Timer powrotu już aktywny dla {game_id[:8]} - pomijam")
@@ -651,16 +710,16 @@ class BotService:
             # === KONIEC ZABEZPIECZENIA ===
             
             state = engine.game_state
-            staying_key = f"staying_players:{game_id}"
+            staying_key = game_aux_key(STAYING_PLAYERS_PREFIX, game_id)
             
             # Uruchom boty równolegle (każdy decyduje niezależnie)
             bot_tasks = []
             for gracz in state.gracze:
-                is_bot = await self._is_registered_bot_by_name(gracz.nazwa)
+                is_bot = await self._bot_seat_algorithm(engine, gracz.nazwa) is not None
                 if is_bot:
                     # 20% szans że bot kliknie "zostań"
                     if random.random() < 0.20:
-                        task = asyncio.create_task(
+                        task = create_untracked_task(
                             self._bot_click_stay(game_id, gracz.nazwa, staying_key, redis)
                         )
                         bot_tasks.append(task)
@@ -726,73 +785,88 @@ class BotService:
         except Exception as e:
             print(f"[Bot] Błąd _bot_click_stay: {e}")
     
+    def _apply_staying_players(self, lobby_data: dict, staying_players: list) -> None:
+        """Opróżnia sloty graczy, którzy nie zostają, wybiera hosta i wraca do statusu LOBBY."""
+        slots = lobby_data.get('slots', [])
+        
+        # Usuń graczy którzy nie kliknęli "zostań"
+        old_host_idx = None
+        for i, slot in enumerate(slots):
+            if slot.get('is_host'):
+                old_host_idx = i
+            
+            player_name = slot.get('nazwa')
+            if player_name and player_name not in staying_players:
+                # Gracz wychodzi - opróżnij slot
+                print(f"   ✖ {player_name} opuścił grę")
+                slot['typ'] = 'pusty'
+                slot['id_uzytkownika'] = None
+                slot['nazwa'] = None
+                slot['is_host'] = False
+                slot['ready'] = False
+                slot['avatar_url'] = None
+        
+        # Sprawdź czy host został
+        current_host = None
+        for slot in slots:
+            if slot.get('is_host') and slot.get('nazwa'):
+                current_host = slot['nazwa']
+                break
+        
+        # Jeśli host wyszedł, wybierz nowego z zostających
+        if not current_host:
+            for slot in slots:
+                if slot.get('nazwa') in staying_players:
+                    slot['is_host'] = True
+                    lobby_data['host_id'] = slot.get('id_uzytkownika')
+                    print(f"   👑 Nowy host: {slot['nazwa']}")
+                    break
+        
+        # Zresetuj gotowość wszystkich
+        for slot in slots:
+            if slot.get('typ') in ['gracz', 'bot']:
+                slot['ready'] = False
+        
+        # Zmień status na LOBBY
+        lobby_data['status_partii'] = 'LOBBY'
+    
     async def _finalize_end_game_lobby(self, game_id: str, staying_players: list, redis: RedisService) -> None:
         """Finalizuje lobby po zakończeniu meczu - usuwa graczy którzy nie kliknęli 'zostań'."""
         try:
-            lobby_data = await redis.get_lobby(game_id)
-            if not lobby_data:
-                return
-            
-            slots = lobby_data.get('slots', [])
+            # Pod lockiem gry - zapis nie nadpisze równoległej zmiany lobby
+            ended = []
+            
+            def return_to_lobby(lobby_data: dict) -> bool:
+                ended[:] = [lobby_data.get('status_partii') == 'ZAKONCZONA']
+                if not ended[0] or not staying_players:
+                    return False
+                self._apply_staying_players(lobby_data, staying_players)
+                return True
+            
+            async with redis.game_lock(game_id) as lock:
+                # Sloty na świeżym lobby (leave z Lua mógł je zmienić) - z kontrolą wersji
+                lobby_data = await redis.update_lobby(game_id, return_to_lobby, lock=lock)
+                if not lobby_data or not ended[0]:
+                    return
+                
+                # Jeśli nikt nie zostaje - usuń lobby
+                if not staying_players:
+                    print(f"🗑️ [Gra {game_id[:8]}] Nikt nie został - usuwam lobby")
+                    await redis.delete_game(game_id)
             
-            # Jeśli nikt nie zostaje - usuń lobby
             if not staying_players:
-                print(f"🗑️ [Gra {game_id[:8]}] Nikt nie został - usuwam lobby")
-                await redis.delete_game(game_id)
                 await manager.broadcast(game_id, {
                     'type': 'lobby_closed',
                     'reason': 'Wszyscy opuścili grę'
                 })
                 return
             
-            # Usuń graczy którzy nie kliknęli "zostań"
-            old_host_idx = None
-            for i, slot in enumerate(slots):
-                if slot.get('is_host'):
-                    old_host_idx = i
-                
-                player_name = slot.get('nazwa')
-                if player_name and player_name not in staying_players:
-                    # Gracz wychodzi - opróżnij slot
-                    print(f"   ✖ {player_name} opuścił grę")
-                    slot['typ'] = 'pusty'
-                    slot['id_uzytkownika'] = None
-                    slot['nazwa'] = None
-                    slot['is_host'] = False
-                    slot['ready'] = False
-                    slot['avatar_url'] = None
-            
-            # Sprawdź czy host został
-            current_host = None
-            for slot in slots:
-                if slot.get('is_host') and slot.get('nazwa'):
-                    current_host = slot['nazwa']
-                    break
-            
-            # Jeśli host wyszedł, wybierz nowego z zostających
-            if not current_host and staying_players:
-                for slot in slots:
-                    if slot.get('nazwa') in staying_players:
-                        slot['is_host'] = True
-                        lobby_data['host_id'] = slot.get('id_uzytkownika')
-                        print(f"   👑 Nowy host: {slot['nazwa']}")
-                        break
-            
-            # Zresetuj gotowość wszystkich
-            for slot in slots:
-                if slot.get('typ') in ['gracz', 'bot']:
-                    slot['ready'] = False
-            
-            # Zmień status na LOBBY
-            lobby_data['status_partii'] = 'LOBBY'
-            
-            # Zapisz
-            await redis.save_lobby(game_id, lobby_data)
-            
             # Usuń silnik gry i klucze tymczasowe
-            await redis.redis.delete(f"game_engine:{game_id}")
-            await redis.redis.delete(f"staying_players:{game_id}")
-            await redis.redis.delete(f"return_to_lobby_votes:{game_id}")
+            await redis.redis.delete(
+                game_aux_key(GAME_ENGINE_AUX_PREFIX, game_id),
+                game_aux_key(STAYING_PLAYERS_PREFIX, game_id),
+                game_aux_key(RETURN_VOTES_PREFIX, game_id)
+            )
             
             print(f"✅ [Gra {game_id[:8]}] Powrót do lobby - zostali: {staying_players}")
             
@@ -0,0 +1,141 @@
+"""
+Service: Czat lobby na żywo
+Odpowiedzialność: Dostarczanie nowych wiadomości czatu przez WebSocket gry
+
+- Wiadomości trzymane w strumieniu Redis lobby (RedisService.append_chat,
+  LobbyService.post_chat) - każdy zapis publikuje {id, cursor} na CHAT_EVENTS_CHANNEL
+- Przekaźnik w każdym procesie słucha kanału i dla lobby z lokalnymi
+  połączeniami doczytuje wpisy nowsze niż ostatnio dostarczony kursor (XRANGE)
+- Zgubione powiadomienie nie gubi wiadomości - następne doczyta całą zaległość
+- Klient po ponownym połączeniu podaje ostatni widziany kursor (chat_cursor)
+"""
+import asyncio
+import json
+from typing import Dict, List, Optional
+
+from services.redis_service import (
+    RedisService, get_redis_client, chat_key, parse_chat_entries,
+    CHAT_EVENTS_CHANNEL, CHAT_MAX_MESSAGES
+)
+from redis_utils import open_pubsub
+
+def chat_frame(message: dict) -> dict:
+    """Ramka WebSocket z wiadomością czatu (pola player/message/timestamp jak dotąd)"""
+    return {
+        'type': 'chat',
+        'player': message.get('username'),
+        'message': message.get('message', ''),
+        'timestamp': message.get('timestamp'),
+        'cursor': message.get('cursor'),
+        'data': message
+    }
+
+def _cursor_key(cursor: str):
+    ms, _, seq = cursor.partition('-')
+    return int(ms), int(seq or 0)
+
+# ============================================
+# CHAT RELAY CLASS
+# ============================================
+
+class ChatRelay:
+    """Przekaźnik czatu: strumień Redis -> lokalne połączenia WebSocket"""
+    
+    def __init__(self):
+        # id lobby -> ostatni dostarczony kursor (tylko lobby z połączeniami)
+        self._cursors: Dict[str, str] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self.listener_task: Optional[asyncio.Task] = None
+    
+    async def send_backlog(self, websocket, lobby_id: str, after: str):
+        """Wyślij jednemu połączeniu wiadomości nowsze niż jego kursor"""
+        from routers.websocket_router import manager
+        
+        messages = await RedisService().get_chat(lobby_id, limit=CHAT_MAX_MESSAGES, after=after)
+        for message in messages or []:
+            await manager.send_personal_message(chat_frame(message), websocket)
+    
+    async def deliver(self, lobby_id: str, cursor: str):
+        """
+        Dostarcz nowe wiadomości lobby do lokalnych połączeń
+        
+        Args:
+            lobby_id: ID lobby
+            cursor: Kursor wiadomości z powiadomienia
+        """
+        from routers.websocket_router import manager
+        
+        if lobby_id not in manager.active_connections:
+            self._cursors.pop(lobby_id, None)
+            self._locks.pop(lobby_id, None)
+            return
+        
+        lock = self._locks.setdefault(lobby_id, asyncio.Lock())
+        async with lock:
+            last = self._cursors.get(lobby_id)
+            if last is not None and _cursor_key(cursor) <= _cursor_key(last):
+                return  # Już dostarczone razem z wcześniejszym powiadomieniem
+            
+            client = get_redis_client()
+            if last is None:
+                entries = await client.xrange(chat_key(lobby_id), min=cursor, max=cursor)
+            else:
+                entries = await client.xrange(chat_key(lobby_id), min=f"({last}", count=CHAT_MAX_MESSAGES)
+            
+            messages: List[dict] = parse_chat_entries(entries)
+            for message in messages:
+                await manager.broadcast(lobby_id, chat_frame(message))
+            self._cursors[lobby_id] = messages[-1]['cursor'] if messages else cursor
+    
+    async def listen(self):
+        """Pętla subskrypcji CHAT_EVENTS_CHANNEL"""
+        while True:
+            pubsub = None
+            try:
+                pubsub = open_pubsub(get_redis_client())
+                await pubsub.subscribe(CHAT_EVENTS_CHANNEL)
+                async for message in pubsub.listen():
+                    if message.get('type') != 'message':
+                        continue
+                    try:
+                        event = json.loads(message['data'])
+                        await self.deliver(event['id'], event['cursor'])
+                    except Exception as e:
+                        print(f"❌ Przekaźnik czatu - błąd dostarczenia: {e}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ Przekaźnik czatu - błąd subskrypcji: {e}")
+                await asyncio.sleep(5)
+            finally:
+                if pubsub is not None:
+                    try:
+                        await pubsub.close()
+                    except Exception:
+                        pass
+
+# Singleton
+chat_relay = ChatRelay()
+
+def setup_chat_relay():
+    """
+    Uruchom przekaźnik czatu
+    Wywoływane w main.py przy startup (po init_redis)
+    """
+    if chat_relay.listener_task is None or chat_relay.listener_task.done():
+        chat_relay.listener_task = asyncio.create_task(chat_relay.listen())
+
+async def stop_chat_relay():
+    """
+    Zatrzymaj przekaźnik czatu
+    Wywoływane w main.py przy shutdown
+    """
+    task = chat_relay.listener_task
+    if task and not task.done():
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    chat_relay.listener_task = None
+    print("👋 Przekaźnik czatu zatrzymany")
@@ -1,16 +1,16 @@
 """
 Service: Disconnect Handler
 Odpowiedzialność: Obsługa rozłączeń graczy podczas gry
-- Timer na powrót (60 sekund)
+- Timer na powrót (60 sekund) - w harmonogramie Redis (services.timer_service)
 - Zakończenie gry po timeout
 - Aktualizacja rankingu (przegrany traci punkty)
 """
-import asyncio
 import time
 from typing import Dict, Optional, Callable
 from dataclasses import dataclass
 
 from services.redis_service import RedisService
+from services.timer_service import get_disconnect_scheduler
 
 
 @dataclass
@@ -19,7 +19,6 @@ class DisconnectInfo:
     player_name: str
     game_id: str
     disconnect_time: float
-    task: Optional[asyncio.Task] = None
 
 
 class DisconnectService:
@@ -27,7 +26,7 @@ class DisconnectService:
     Serwis obsługujący rozłączenia graczy podczas gry.
     
     Gdy gracz się rozłączy:
-    1. Uruchamia timer 60 sekund
+    1. Planuje timer 60 sekund (sorted set w Redis - przeżywa restart)
     2. Jeśli gracz wróci - anuluje timer
     3. Jeśli nie wróci - kończy grę, gracz przegrywa
     """
@@ -96,22 +95,32 @@ class DisconnectService:
             disconnect_time=time.time()
         )
         
-        # Uruchom timer
-        task = asyncio.create_task(
-            self._timeout_handler(game_id, player_name, redis)
-        )
-        disconnect_info.task = task
-        
         self.disconnected_players[key] = disconnect_info
         
-        # Zapisz info o rozłączeniu w Redis (dla frontendu)
-        if 'disconnected_players' not in lobby:
-            lobby['disconnected_players'] = {}
-        lobby['disconnected_players'][player_name] = {
-            'disconnect_time': disconnect_info.disconnect_time,
-            'timeout_at': disconnect_info.disconnect_time + self.RECONNECT_TIMEOUT
-        }
-        await redis.save_lobby(game_id, lobby)
+        # Zapisz info o rozłączeniu w Redis (dla frontendu) - pod lockiem gry, na świeżym lobby
+        def mark_disconnected(lobby: dict) -> bool:
+            if lobby.get('status_partii') != 'W_GRZE':
+                return False
+            if 'disconnected_players' not in lobby:
+                lobby['disconnected_players'] = {}
+            lobby['disconnected_players'][player_name] = {
+                'disconnect_time': disconnect_info.disconnect_time,
+                'timeout_at': disconnect_info.disconnect_time + self.RECONNECT_TIMEOUT
+            }
+            return True
+        
+        async with redis.game_lock(game_id) as lock:
+            lobby = await redis.update_lobby(game_id, mark_disconnected, lock=lock)
+            if not lobby or lobby.get('status_partii') != 'W_GRZE':
+                self.disconnected_players.pop(key, None)
+                return False
+        
+        # Zaplanuj timer w harmonogramie
+        await get_disconnect_scheduler().schedule(
+            self._timer_id(game_id, player_name),
+            disconnect_info.disconnect_time + self.RECONNECT_TIMEOUT,
+            {'kind': 'disconnect_service', 'game_id': game_id, 'player_name': player_name}
+        )
         
         print(f"⏱️ [Disconnect] {player_name} rozłączył się z gry {game_id}. Ma {self.RECONNECT_TIMEOUT}s na powrót.")
         
@@ -136,65 +145,63 @@ class DisconnectService:
         """
         key = (game_id, player_name)
         
-        if key not in self.disconnected_players:
+        # Anuluj timer (także zaplanowany przez inną instancję serwera)
+        cancelled = await get_disconnect_scheduler().cancel(self._timer_id(game_id, player_name))
+        disconnect_info = self.disconnected_players.pop(key, None)
+        
+        if not cancelled and not disconnect_info:
             # Gracz nie był rozłączony (lub już timeout)
             return True
         
-        disconnect_info = self.disconnected_players[key]
-        
-        # Anuluj timer
-        if disconnect_info.task and not disconnect_info.task.done():
-            disconnect_info.task.cancel()
-            try:
-                await disconnect_info.task
-            except asyncio.CancelledError:
-                pass
-        
-        # Usuń z listy rozłączonych
-        del self.disconnected_players[key]
-        
-        # Usuń z Redis
-        lobby = await redis.get_lobby(game_id)
-        if lobby and 'disconnected_players' in lobby:
+        # Usuń z Redis (pod lockiem gry)
+        def clear_disconnected(lobby: dict) -> bool:
+            if 'disconnected_players' not in lobby:
+                return False
             lobby['disconnected_players'].pop(player_name, None)
-            await redis.save_lobby(game_id, lobby)
+            return True
+        
+        async with redis.game_lock(game_id) as lock:
+            await redis.update_lobby(game_id, clear_disconnected, lock=lock)
         
-        elapsed = time.time() - disconnect_info.disconnect_time
-        print(f"✅ [Disconnect] {player_name} wrócił do gry {game_id} po {elapsed:.1f}s")
+        if disconnect_info:
+            elapsed = time.time() - disconnect_info.disconnect_time
+            print(f"✅ [Disconnect] {player_name} wrócił do gry {game_id} po {elapsed:.1f}s")
+        else:
+            print(f"✅ [Disconnect] {player_name} wrócił do gry {game_id}")
         
         return True
     
-    async def _timeout_handler(
-        self,
-        game_id: str,
-        player_name: str,
-        redis: RedisService
-    ):
+    @staticmethod
+    def _timer_id(game_id: str, player_name: str) -> str:
+        """ID timera w harmonogramie (osobny od timerów websocket_router)"""
+        return f"svc:{game_id}:{player_name}"
+    
+    async def handle_timer(self, timer_id: str, payload: dict):
         """
-        Handler wywoływany po upływie czasu na powrót.
+        Handler harmonogramu wywoływany po upływie czasu na powrót.
         Kończy grę - rozłączony gracz przegrywa.
+        
+        Stan rozłączenia sprawdzany jest w Redis (lobby['disconnected_players']),
+        więc timer działa także po restarcie serwera.
         """
+        game_id = payload.get('game_id')
+        player_name = payload.get('player_name')
+        
         try:
-            # Czekaj na timeout
-            await asyncio.sleep(self.RECONNECT_TIMEOUT)
+            self.disconnected_players.pop((game_id, player_name), None)
             
-            key = (game_id, player_name)
+            redis = RedisService()
+            lobby = await redis.get_lobby(game_id)
             
             # Sprawdź czy gracz nadal jest rozłączony
-            if key not in self.disconnected_players:
+            if not lobby or player_name not in lobby.get('disconnected_players', {}):
                 return
             
             print(f"⏰ [Disconnect] TIMEOUT! {player_name} nie wrócił do gry {game_id}")
             
-            # Usuń z listy
-            del self.disconnected_players[key]
-            
             # Zakończ grę - gracz przegrywa
             await self._forfeit_game(game_id, player_name, redis)
             
-        except asyncio.CancelledError:
-            # Timer anulowany (gracz wrócił)
-            pass
         except Exception as e:
             print(f"❌ [Disconnect] Błąd timeout handler: {e}")
     
@@ -214,58 +221,74 @@ class DisconnectService:
             redis: Redis service
         """
         try:
-            lobby = await redis.get_lobby(game_id)
-            if not lobby:
-                print(f"[Forfeit] Lobby {game_id} nie istnieje")
-                return
-            
-            if lobby.get('status_partii') != 'W_GRZE':
-                print(f"[Forfeit] Gra {game_id} nie jest już w toku")
-                return
-            
-            slots = lobby.get('slots', [])
-            opcje = lobby.get('opcje', {})
-            is_ranked = opcje.get('rankingowa', False)
+            # Pod lockiem gry - zakończenie nie nadpisze równoległego zapisu lobby/silnika
+            forfeit = {}
             
-            # Znajdź graczy
-            all_players = [s for s in slots if s.get('typ') == 'gracz']
-            winners = [s for s in all_players if s.get('nazwa') != disconnected_player]
-            loser = next((s for s in all_players if s.get('nazwa') == disconnected_player), None)
-            
-            print(f"[Forfeit] Gra {game_id} zakończona przez rozłączenie {disconnected_player}")
-            print(f"[Forfeit] Zwycięzcy: {[w.get('nazwa') for w in winners]}")
-            
-            # Aktualizuj ranking jeśli gra rankingowa
-            if is_ranked and loser:
-                await self._update_ranking_forfeit(
+            def finish_by_forfeit(lobby: dict) -> bool:
+                forfeit.clear()
+                if lobby.get('status_partii') != 'W_GRZE':
+                    print(f"[Forfeit] Gra {game_id} nie jest już w toku")
+                    return False
+                
+                # Gracz mógł wrócić, zanim zdobyliśmy lock
+                if disconnected_player not in lobby.get('disconnected_players', {}):
+                    return False
+                
+                slots = lobby.get('slots', [])
+                opcje = lobby.get('opcje', {})
+                
+                # Znajdź graczy
+                all_players = [s for s in slots if s.get('typ') == 'gracz']
+                winners = [s for s in all_players if s.get('nazwa') != disconnected_player]
+                loser = next((s for s in all_players if s.get('nazwa') == disconnected_player), None)
+                forfeit.update(
                     winners=[w.get('nazwa') for w in winners],
-                    loser=loser.get('nazwa'),
-                    redis=redis
+                    loser=loser.get('nazwa') if loser else None,
+                    is_ranked=opcje.get('rankingowa', False)
                 )
+                
+                # Zmień status gry
+                lobby['status_partii'] = 'ZAKONCZONA'
+                lobby['forfeit'] = {
+                    'player': disconnected_player,
+                    'reason': 'disconnect_timeout',
+                    'timestamp': time.time()
+                }
+                lobby['winner'] = ', '.join(forfeit['winners']) if winners else None
+                
+                # Usuń disconnected_players info
+                lobby.pop('disconnected_players', None)
+                return True
             
-            # Zmień status gry
-            lobby['status_partii'] = 'ZAKONCZONA'
-            lobby['forfeit'] = {
-                'player': disconnected_player,
-                'reason': 'disconnect_timeout',
-                'timestamp': time.time()
-            }
-            lobby['winner'] = ', '.join([w.get('nazwa') for w in winners]) if winners else None
-            
-            # Usuń disconnected_players info
-            lobby.pop('disconnected_players', None)
-            
-            await redis.save_lobby(game_id, lobby)
-            
-            # Usuń silnik gry
-            await redis.delete_game_engine(game_id)
+            async with redis.game_lock(game_id) as lock:
+                lobby = await redis.update_lobby(game_id, finish_by_forfeit, lock=lock)
+                if not lobby:
+                    print(f"[Forfeit] Lobby {game_id} nie istnieje")
+                    return
+                if not forfeit:
+                    return
+                
+                winners = forfeit['winners']
+                print(f"[Forfeit] Gra {game_id} zakończona przez rozłączenie {disconnected_player}")
+                print(f"[Forfeit] Zwycięzcy: {winners}")
+                
+                # Aktualizuj ranking jeśli gra rankingowa
+                if forfeit['is_ranked'] and forfeit['loser']:
+                    await self._update_ranking_forfeit(
+                        winners=winners,
+                        loser=forfeit['loser'],
+                        redis=redis
+                    )
+                
+                # Usuń silnik gry
+                await redis.delete_game_engine(game_id)
             
             # Wywołaj callback (broadcast do graczy)
             if self.on_game_forfeit:
                 await self.on_game_forfeit(
                     game_id=game_id,
                     disconnected_player=disconnected_player,
-                    winners=[w.get('nazwa') for w in winners]
+                    winners=winners
                 )
             
             print(f"✅ [Forfeit] Gra {game_id} zakończona, lobby zapisane")
@@ -352,14 +375,9 @@ class DisconnectService:
             if key[0] == game_id
         ]
         
+        scheduler = get_disconnect_scheduler()
         for key in keys_to_remove:
-            info = self.disconnected_players[key]
-            if info.task and not info.task.done():
-                info.task.cancel()
-                try:
-                    await info.task
-                except asyncio.CancelledError:
-                    pass
+            await scheduler.cancel(self._timer_id(*key))
             del self.disconnected_players[key]
         
         if keys_to_remove:
@@ -2,6 +2,7 @@
 Service: Game
 Odpowiedzialność: Inicjalizacja gry, zarządzanie stanem gry
 """
+import uuid
 from typing import Dict, List, Optional, Any
 from fastapi import HTTPException, status
 
@@ -75,35 +76,54 @@ class GameService:
             }
             engine = SixtySixEngine(player_ids, game_settings)
         
-        # Zapisz silnik do Redis
-        await redis.save_game_engine(lobby_id, engine)
+        # Miejsca botów (nazwa -> algorytm) - BotService nie pyta już bazy co ruch
+        from services.bot_registry import bot_registry
+        await bot_registry.ensure_loaded()
+        engine.bot_seats = bot_registry.bot_seats(lobby_data)
         
-        print(f"[GameService] Silnik utworzony, faza: {engine.game_state.faza}")
+        # ID meczu - klucz idempotencji przy księgowaniu wyniku (lobby bywa używane ponownie)
+        engine.match_id = f"{lobby_id}:{uuid.uuid4().hex[:12]}"
+        lobby_data['match_id'] = engine.match_id
         
         # === SYNCHRONIZUJ PUNKTY MECZOWE DO LOBBY ===
-        try:
-            punkty_meczowe = {}
-            if game_type == 'tysiac' or game_type == '1000':
+        punkty_meczowe = {}
+        if game_type == 'tysiac' or game_type == '1000':
+            for gracz in engine.game_state.gracze:
+                if hasattr(gracz, 'punkty_meczu'):
+                    punkty_meczowe[gracz.nazwa] = gracz.punkty_meczu
+        else:
+            # 66 - drużyny lub gracze
+            if hasattr(engine.game_state, 'druzyny') and engine.game_state.druzyny:
+                for druzyna in engine.game_state.druzyny:
+                    if hasattr(druzyna, 'punkty_meczu'):
+                        punkty_meczowe[druzyna.nazwa] = druzyna.punkty_meczu
+            elif hasattr(engine.game_state, 'gracze'):
                 for gracz in engine.game_state.gracze:
                     if hasattr(gracz, 'punkty_meczu'):
                         punkty_meczowe[gracz.nazwa] = gracz.punkty_meczu
-            else:
-                # 66 - drużyny lub gracze
-                if hasattr(engine.game_state, 'druzyny') and engine.game_state.druzyny:
-                    for druzyna in engine.game_state.druzyny:
-                        if hasattr(druzyna, 'punkty_meczu'):
-                            punkty_meczowe[druzyna.nazwa] = druzyna.punkty_meczu
-                elif hasattr(engine.game_state, 'gracze'):
-                    for gracz in engine.game_state.gracze:
-                        if hasattr(gracz, 'punkty_meczu'):
-                            punkty_meczowe[gracz.nazwa] = gracz.punkty_meczu
-            
-            lobby_data['punkty_meczowe'] = punkty_meczowe
-            await redis.save_lobby(lobby_id, lobby_data)
-        except Exception as e:
-            print(f"[GameService] ⚠️ Błąd synchronizacji punktów: {e}")
+        lobby_data['punkty_meczowe'] = punkty_meczowe
         # === KONIEC SYNCHRONIZACJI ===
         
+        # Zapisz silnik i lobby pod lockiem gry (fencing token) - razem z zapisami ruchów
+        async with redis.game_lock(lobby_id) as lock:
+            await redis.save_game_engine(lobby_id, engine, lock=lock)
+            
+            try:
+                # Świeże lobby - Lua (czat, touch) mógł je zmienić od walidacji startu
+                def set_match(lobby: dict):
+                    lobby['match_id'] = engine.match_id
+                    lobby['punkty_meczowe'] = punkty_meczowe
+                
+                current = await redis.update_lobby(lobby_id, set_match, lock=lock)
+                if current is None:
+                    await redis.save_lobby(lobby_id, lobby_data, lock=lock)
+                else:
+                    lobby_data.update(current)
+            except Exception as e:
+                print(f"[GameService] ⚠️ Błąd synchronizacji punktów: {e}")
+        
+        print(f"[GameService] Silnik utworzony, faza: {engine.game_state.faza}")
+        
         # Auto-wykonaj akcje botów jeśli bot ma turę
         await self.bot_service.process_bot_actions(lobby_id, engine, redis)
         
@@ -164,8 +184,7 @@ class GameService:
         Returns:
             Dict: Status gry
         """
-        lobby_data = await redis.get_lobby(game_id)
-        engine = await redis.get_game_engine(game_id)
+        lobby_data, engine = await redis.get_game_state(game_id)
         
         if not lobby_data:
             return {'exists': False}
@@ -207,7 +226,8 @@ class GameService:
         self,
         game_id: str,
         winner: Optional[str],
-        redis: RedisService
+        redis: RedisService,
+        lock=None
     ) -> bool:
         """
         Zakończ grę
@@ -216,23 +236,21 @@ class GameService:
             game_id: ID gry
             winner: Zwycięzca (opcjonalnie)
             redis: Redis service
+            lock: Trzymany już lock gry (None = zdobądź własny)
         
         Returns:
             bool: True jeśli sukces
         """
         try:
-            # Pobierz lobby
-            lobby_data = await redis.get_lobby(game_id)
-            if not lobby_data:
-                return False
-            
-            # Zmień status
-            lobby_data['status_partii'] = 'ZAKONCZONA'
-            if winner:
-                lobby_data['winner'] = winner
-            
-            # Zapisz
-            await redis.save_lobby(game_id, lobby_data)
+            async with redis.held_game_lock(game_id, lock) as lock:
+                # Zmień status (odczyt-zapis z kontrolą wersji lobby)
+                def finish(lobby_data: dict):
+                    lobby_data['status_partii'] = 'ZAKONCZONA'
+                    if winner:
+                        lobby_data['winner'] = winner
+                
+                if not await redis.update_lobby(game_id, finish, lock=lock):
+                    return False
             
             # Opcjonalnie: usuń silnik (oszczędność pamięci)
             # await redis.delete_game(game_id)
@@ -271,7 +289,8 @@ class GameService:
         self,
         game_id: str,
         engine: Any,
-        redis: RedisService
+        redis: RedisService,
+        lock=None
     ) -> bool:
         """
         Sprawdź czy runda się skończyła i finalizuj jeśli tak
@@ -280,6 +299,7 @@ class GameService:
             game_id: ID gry
             engine: Silnik gry
             redis: Redis service
+            lock: Trzymany już lock gry (None = zdobądź własny)
         
         Returns:
             bool: True jeśli runda zakończona
@@ -299,7 +319,7 @@ class GameService:
                         winner = state.zwyciezca_partii
                     
                     # Zakończ grę
-                    await self.end_game(game_id, winner, redis)
+                    await self.end_game(game_id, winner, redis, lock=lock)
                     return True
                 
                 return True
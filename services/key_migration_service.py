@@ -0,0 +1,152 @@
+"""
+Service: Migracja kluczy Redis
+Odpowiedzialność: Jednorazowe przeniesienie kluczy sprzed hash tagów pod nowe nazwy
+
+- lobby:<id>, game:<id>, disconnected:<id>:<gracz>, klucze pomocnicze gry
+  -> lobby:{id}, game:{id}, disconnected:{id}:<gracz>, ... (slot gry)
+- ranking:*, presence:*, session:<uid>, stats:users:*, timers:<kolejka>:*
+  -> {ranking}:*, {presence}:*, session:{uid}, stats:{users}:*, timers:{kolejka}:*
+- lobby_index:* jest usuwany - przeniesione lobby trafiają do rejestru
+  {lobby_index}:created, z którego rebuild_lobby_index odbudowuje indeks
+- Czat sprzed strumieni (lista lobby:<id>:chat) nie jest przenoszony - wygasa po TTL
+
+RENAMENX zachowuje TTL. Jeśli klucz pod nową nazwą już istnieje, jest nowszy
+i stary zostaje usunięty. Migracja uruchamia się przy starcie serwera (przed
+odbudową indeksu) i zapisuje znacznik, więc SCAN wykonuje się tylko raz.
+Stary układ istniał tylko na pojedynczym węźle - w klastrze nie ma czego migrować.
+"""
+import re
+import time
+from typing import Callable, List, Optional, Tuple
+
+from redis.asyncio import Redis
+
+from config import REDIS_PREFIX_RANKING, REDIS_PREFIX_PRESENCE
+from redis_utils import is_cluster_client, timer_queue_key
+from services.redis_service import (
+    lobby_key, engine_key, disconnect_key, game_aux_key, GAME_AUX_KEY_PREFIXES,
+    LOBBY_INDEX_CREATED
+)
+
+# Znacznik wykonanej migracji (kolejne starty pomijają SCAN)
+LEGACY_KEYS_MIGRATED = "migrations:hash_tags"
+
+LEGACY_SCAN_COUNT = 1000
+LEGACY_BATCH_SIZE = 500
+
+# ID gry / użytkownika / kolejki w starych nazwach - bez ':' i nawiasów klamrowych
+_ID = r'([^:{}]+)'
+
+def _legacy_rules() -> List[Tuple[re.Pattern, Optional[Callable]]]:
+    """
+    Reguły: wzorzec starej nazwy -> funkcja nowej nazwy (None = usuń klucz)
+    """
+    from services.session_service import session_key, session_version_key
+    from services.user_counters_service import USER_COUNTER_KEYS
+    
+    rules = [
+        (re.compile(rf'^lobby:{_ID}$'), lambda m: lobby_key(m.group(1))),
+        (re.compile(rf'^game:{_ID}$'), lambda m: engine_key(m.group(1))),
+        (re.compile(rf'^disconnected:{_ID}:(.+)$'), lambda m: disconnect_key(m.group(1), m.group(2))),
+        (re.compile(r'^ranking:(.+)$'), lambda m: f"{REDIS_PREFIX_RANKING}{m.group(1)}"),
+        (re.compile(r'^presence:(.+)$'), lambda m: f"{REDIS_PREFIX_PRESENCE}{m.group(1)}"),
+        (re.compile(rf'^session:{_ID}$'), lambda m: session_key(m.group(1))),
+        (re.compile(rf'^session:{_ID}:version$'), lambda m: session_version_key(m.group(1))),
+        (re.compile(rf'^timers:{_ID}:(deadlines|processing|payload)$'),
+         lambda m: timer_queue_key(m.group(1), m.group(2))),
+        (re.compile(r'^lobby_index:'), None),
+    ]
+    for prefix in GAME_AUX_KEY_PREFIXES:
+        rules.append((
+            re.compile(rf'^{re.escape(prefix)}{_ID}$'),
+            lambda m, prefix=prefix: game_aux_key(prefix, m.group(1))
+        ))
+    for name, key in USER_COUNTER_KEYS.items():
+        rules.append((re.compile(rf'^stats:users:{re.escape(name)}$'), lambda m, key=key: key))
+    return rules
+
+def legacy_key_target(key: str, rules=None) -> Tuple[bool, Optional[str]]:
+    """
+    Nowa nazwa dla klucza w starym układzie
+    
+    Args:
+        key: Nazwa klucza
+        rules: Reguły z _legacy_rules (domyślnie budowane na nowo)
+    
+    Returns:
+        Tuple[bool, Optional[str]]: (czy klucz jest w starym układzie, nowa nazwa lub None = usuń)
+    """
+    for pattern, target in rules if rules is not None else _legacy_rules():
+        match = pattern.match(key)
+        if match:
+            return True, target(match) if target else None
+    return False, None
+
+async def _migrate_batch(client: Redis, batch: List[Tuple[str, Optional[str]]]) -> Tuple[int, List[str]]:
+    """RENAMENX partii kluczy; zwraca (liczba przeniesionych, ID przeniesionych lobby)"""
+    pipe = client.pipeline(transaction=False)
+    renames = [(old, new) for old, new in batch if new]
+    for old, new in renames:
+        pipe.renamenx(old, new)
+    results = await pipe.execute(raise_on_error=False) if renames else []
+    
+    # Nowa nazwa już zajęta (nowszy zapis) albo klucz usunięty - stary klucz do skasowania
+    stale = [old for old, new in batch if not new]
+    stale += [old for (old, _), result in zip(renames, results) if result is not True and result != 1]
+    if stale:
+        await client.delete(*stale)
+    
+    moved = [old for (old, _), result in zip(renames, results) if result is True or result == 1]
+    lobby_ids = [old.split(':', 1)[1] for old in moved if old.startswith('lobby:')]
+    return len(moved), lobby_ids
+
+async def migrate_legacy_keys(client: Redis) -> int:
+    """
+    Przenieś klucze sprzed hash tagów pod nowe nazwy (jednorazowo)
+    
+    Args:
+        client: Klient Redis
+    
+    Returns:
+        int: Liczba przeniesionych kluczy
+    """
+    if is_cluster_client(client):
+        return 0
+    
+    try:
+        if await client.exists(LEGACY_KEYS_MIGRATED):
+            return 0
+        
+        rules = _legacy_rules()
+        moved = 0
+        lobby_ids: List[str] = []
+        batch: List[Tuple[str, Optional[str]]] = []
+        
+        async for raw_key in client.scan_iter(count=LEGACY_SCAN_COUNT):
+            key = raw_key.decode('utf-8') if isinstance(raw_key, bytes) else raw_key
+            legacy, target = legacy_key_target(key, rules)
+            if not legacy:
+                continue
+            batch.append((key, target))
+            if len(batch) >= LEGACY_BATCH_SIZE:
+                count, ids = await _migrate_batch(client, batch)
+                moved += count
+                lobby_ids += ids
+                batch = []
+        if batch:
+            count, ids = await _migrate_batch(client, batch)
+            moved += count
+            lobby_ids += ids
+        
+        # Przeniesione lobby do rejestru indeksu - rebuild_lobby_index zaindeksuje je z nowych kluczy
+        if lobby_ids:
+            now = time.time()
+            await client.zadd(LOBBY_INDEX_CREATED, {lobby_id: now for lobby_id in lobby_ids}, nx=True)
+        
+        await client.set(LEGACY_KEYS_MIGRATED, time.time())
+        if moved:
+            print(f"✅ Migracja kluczy Redis: {moved} kluczy pod nowymi nazwami ({len(lobby_ids)} lobby)")
+        return moved
+    except Exception as e:
+        print(f"❌ Redis migrate_legacy_keys error: {e}")
+        return 0
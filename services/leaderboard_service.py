@@ -0,0 +1,236 @@
+"""
+Service: Ranking (leaderboard w Redis)
+Odpowiedzialność: Rankingi ELO w sorted setach - strony rankingu i rangi graczy bez zapytań agregujących
+
+- {ranking}:game:<game_type_id> - ZSET username -> ELO w danej grze (gracze z rozegranymi grami)
+- {ranking}:global - ZSET username -> najwyższe ELO gracza ze wszystkich gier
+- {ranking}:admins - SET nazw adminów (odznaka przy randze)
+- Wspólny hash tag {ranking}: RENAME/MULTI przy odbudowie działają w Redis Cluster
+- Aktualizacja po każdym meczu (update_player_stats_after_game)
+- Odbudowa z Postgres przy starcie lub gdy klucze zniknęły z Redis
+"""
+import asyncio
+from typing import Dict, List, Optional, Tuple
+
+from config import REDIS_PREFIX_RANKING
+from services.redis_service import get_redis_client
+
+LEADERBOARD_GLOBAL = f"{REDIS_PREFIX_RANKING}global"
+LEADERBOARD_ADMINS = f"{REDIS_PREFIX_RANKING}admins"
+# Zbiór ID typów gier, dla których istnieje ranking
+LEADERBOARD_GAMES = f"{REDIS_PREFIX_RANKING}games"
+# Znacznik - ranking zbudowany (brak = trzeba odbudować z bazy)
+LEADERBOARD_BUILT = f"{REDIS_PREFIX_RANKING}built"
+
+def leaderboard_key(game_type_id: Optional[int] = None) -> str:
+    """Klucz rankingu dla typu gry (None = ranking globalny)"""
+    if game_type_id is None:
+        return LEADERBOARD_GLOBAL
+    return f"{REDIS_PREFIX_RANKING}game:{game_type_id}"
+
+def _decode(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+# ============================================
+# LEADERBOARD SERVICE CLASS
+# ============================================
+
+class LeaderboardService:
+    """Rankingi graczy w sorted setach Redis"""
+    
+    def __init__(self):
+        self._rebuild_lock = asyncio.Lock()
+        # Cache nazwa typu gry -> ID (typy gier praktycznie się nie zmieniają)
+        self._game_type_ids: Dict[str, Optional[int]] = {}
+    
+    @property
+    def redis(self):
+        return get_redis_client()
+    
+    # ============================================
+    # ODBUDOWA Z BAZY
+    # ============================================
+    
+    async def rebuild(self) -> int:
+        """
+        Zbuduj wszystkie rankingi od nowa z player_game_stats (jedno zapytanie)
+        Klucze budowane obok i podmieniane atomowo (RENAME w MULTI)
+        
+        Returns:
+            int: Liczba graczy w rankingu globalnym
+        """
+        from database import async_sessionmaker, User, PlayerGameStats
+        from sqlalchemy import select
+        
+        per_game: Dict[int, Dict[str, float]] = {}
+        global_elo: Dict[str, float] = {}
+        async with async_sessionmaker() as session:
+            result = await session.execute(
+                select(User.username, PlayerGameStats.game_type_id, PlayerGameStats.elo_rating)
+                .join(PlayerGameStats, User.id == PlayerGameStats.user_id)
+                .where(PlayerGameStats.games_played > 0)
+            )
+            for username, game_type_id, elo in result.all():
+                per_game.setdefault(game_type_id, {})[username] = elo
+                global_elo[username] = max(elo, global_elo.get(username, elo))
+            
+            admins_result = await session.execute(
+                select(User.username).where(User.is_admin == True)
+            )
+            admins = list(admins_result.scalars().all())
+        
+        boards = {leaderboard_key(gt_id): scores for gt_id, scores in per_game.items()}
+        boards[LEADERBOARD_GLOBAL] = global_elo
+        
+        pipe = self.redis.pipeline(transaction=True)
+        for key, scores in boards.items():
+            tmp = f"{key}:rebuild"
+            pipe.delete(tmp)
+            if scores:
+                pipe.zadd(tmp, scores)
+                pipe.rename(tmp, key)
+            else:
+                pipe.delete(key)
+        pipe.delete(LEADERBOARD_ADMINS)
+        if admins:
+            pipe.sadd(LEADERBOARD_ADMINS, *admins)
+        pipe.delete(LEADERBOARD_GAMES)
+        if per_game:
+            pipe.sadd(LEADERBOARD_GAMES, *per_game.keys())
+        pipe.set(LEADERBOARD_BUILT, 1)
+        await pipe.execute()
+        
+        print(f"🏆 Ranking odbudowany: {len(global_elo)} graczy, {len(per_game)} typów gier")
+        return len(global_elo)
+    
+    async def ensure_built(self):
+        """Odbuduj ranking jeśli nie ma go w Redis (np. po wyczyszczeniu bazy Redis)"""
+        if await self.redis.exists(LEADERBOARD_BUILT):
+            return
+        async with self._rebuild_lock:
+            if not await self.redis.exists(LEADERBOARD_BUILT):
+                await self.rebuild()
+    
+    # ============================================
+    # ZAPIS
+    # ============================================
+    
+    async def record_ratings(
+        self,
+        game_type_id: int,
+        game_elos: Dict[str, float],
+        global_elos: Dict[str, float]
+    ):
+        """
+        Zapisz nowe ELO graczy po meczu (jeden pipeline)
+        
+        Args:
+            game_type_id: ID typu gry
+            game_elos: username -> ELO w tej grze
+            global_elos: username -> najwyższe ELO ze wszystkich gier
+        """
+        try:
+            pipe = self.redis.pipeline(transaction=True)
+            if game_elos:
+                pipe.zadd(leaderboard_key(game_type_id), game_elos)
+                pipe.sadd(LEADERBOARD_GAMES, game_type_id)
+            if global_elos:
+                pipe.zadd(LEADERBOARD_GLOBAL, global_elos)
+            await pipe.execute()
+        except Exception as e:
+            print(f"❌ Leaderboard record error: {e}")
+    
+    async def remove_player(self, username: str):
+        """Usuń gracza ze wszystkich rankingów (usunięte konto)"""
+        try:
+            game_ids = await self.redis.smembers(LEADERBOARD_GAMES)
+            pipe = self.redis.pipeline(transaction=True)
+            for gt_id in game_ids:
+                pipe.zrem(leaderboard_key(int(gt_id)), username)
+            pipe.zrem(LEADERBOARD_GLOBAL, username)
+            pipe.srem(LEADERBOARD_ADMINS, username)
+            await pipe.execute()
+        except Exception as e:
+            print(f"❌ Leaderboard remove error [{username}]: {e}")
+    
+    async def set_admin(self, username: str, is_admin: bool):
+        """Zaktualizuj odznakę admina"""
+        try:
+            if is_admin:
+                await self.redis.sadd(LEADERBOARD_ADMINS, username)
+            else:
+                await self.redis.srem(LEADERBOARD_ADMINS, username)
+        except Exception as e:
+            print(f"❌ Leaderboard admin error [{username}]: {e}")
+    
+    # ============================================
+    # ODCZYT
+    # ============================================
+    
+    async def get_game_type_id(self, game_type: str) -> Optional[int]:
+        """ID typu gry po nazwie (ILIKE jak wcześniej, wynik cache'owany w procesie)"""
+        if game_type in self._game_type_ids:
+            return self._game_type_ids[game_type]
+        
+        from database import async_sessionmaker, GameType
+        from sqlalchemy import select
+        
+        async with async_sessionmaker() as session:
+            result = await session.execute(
+                select(GameType.id).where(GameType.name.ilike(f"%{game_type}%"))
+            )
+            game_type_id = result.scalar_one_or_none()
+        
+        if game_type_id is not None:
+            self._game_type_ids[game_type] = game_type_id
+        return game_type_id
+    
+    async def get_page(
+        self,
+        game_type_id: Optional[int],
+        offset: int,
+        limit: int
+    ) -> Tuple[List[Tuple[str, float]], int]:
+        """
+        Strona rankingu (ZREVRANGE + ZCARD w jednym pipeline)
+        
+        Returns:
+            tuple: ([(username, elo), ...] od najwyższego ELO, liczba graczy w rankingu)
+        """
+        await self.ensure_built()
+        
+        key = leaderboard_key(game_type_id)
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.zrevrange(key, offset, offset + limit - 1, withscores=True)
+        pipe.zcard(key)
+        entries, total = await pipe.execute()
+        return [(_decode(name), score) for name, score in entries], total
+    
+    async def get_ratings(self, usernames: List[str]) -> Dict[str, Tuple[Optional[float], bool]]:
+        """
+        Najwyższe ELO i flaga admina dla listy graczy (ZMSCORE + SMISMEMBER)
+        
+        Returns:
+            dict: username -> (ELO lub None jeśli gracz nie ma rozegranych gier, is_admin)
+        """
+        if not usernames:
+            return {}
+        
+        await self.ensure_built()
+        
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.zmscore(LEADERBOARD_GLOBAL, usernames)
+        pipe.smismember(LEADERBOARD_ADMINS, usernames)
+        scores, admins = await pipe.execute()
+        return {
+            username: (score, bool(is_admin))
+            for username, score, is_admin in zip(usernames, scores, admins)
+        }
+    
+    async def get_position(self, elo: float) -> int:
+        """Pozycja w rankingu globalnym dla danego ELO (1 + liczba graczy z wyższym ELO)"""
+        await self.ensure_built()
+        return await self.redis.zcount(LEADERBOARD_GLOBAL, f"({elo}", '+inf') + 1
+
+# Singleton
+leaderboard_service = LeaderboardService()
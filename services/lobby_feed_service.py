@@ -0,0 +1,272 @@
+"""
+Service: Lista gier na żywo (lobby feed)
+Odpowiedzialność: Push listy lobby do dashboardu przez WebSocket (/ws/lobbies)
+
+- Po połączeniu klient dostaje kompaktowy snapshot (podsumowania z indeksu
+  lobby - bez pełnego JSON lobby), potem tylko zdarzenia
+  lobby_created / lobby_updated / lobby_removed
+- Źródło zdarzeń: LOBBY_EVENTS_CHANNEL publikowany przez skrypty indeksu
+  (zapis i usunięcie lobby) - jeden subskrybent na proces
+- Filtr typu gry po stronie serwera (typ_gry), zmiana filtru = nowy snapshot
+- Zdarzenia zbierane w oknie LOBBY_FEED_COALESCE_WINDOW - kilka zapisów
+  jednego lobby daje jedno zdarzenie z najnowszym podsumowaniem
+- Wolny klient: ta sama kolejka co WebSocket gry (ConnectionSender), przy
+  przepełnieniu zdarzenia są porzucane i wysyłany jest nowy snapshot
+"""
+import asyncio
+import json
+from typing import Dict, Optional
+
+from services.redis_service import (
+    RedisService, get_redis_client, normalize_lobby, LOBBY_EVENTS_CHANNEL
+)
+from redis_utils import open_pubsub, create_untracked_task
+
+# Statusy widoczne na liście gier (jak GET /api/lobby/list)
+LOBBY_FEED_STATUSES = ('LOBBY', 'W_GRZE', 'W_TRAKCIE')
+# Maksymalna liczba lobby w snapshocie
+LOBBY_FEED_SNAPSHOT_LIMIT = 500
+# Okno zbierania zdarzeń przed rozesłaniem (sekundy)
+LOBBY_FEED_COALESCE_WINDOW = 0.25
+
+class LobbyFeedSubscriber:
+    """Jedno połączenie dashboardu: filtr + lobby, które klient już zna"""
+    
+    def __init__(self, websocket, typ_gry: Optional[str] = None):
+        self.websocket = websocket
+        self.typ_gry = typ_gry
+        self.known: set = set()
+        self.sender = None
+        # Snapshot w trakcie - zdarzenia czekają w backlog (id -> podsumowanie / None)
+        self.syncing = False
+        self.backlog: Dict[str, Optional[dict]] = {}
+        self.generation = 0
+    
+    def matches(self, summary: Optional[dict]) -> bool:
+        """Czy lobby powinno być widoczne dla tego połączenia"""
+        if not summary or summary.get('status') not in LOBBY_FEED_STATUSES:
+            return False
+        return self.typ_gry is None or summary.get('typ_gry') == self.typ_gry
+
+# ============================================
+# LOBBY FEED CLASS
+# ============================================
+
+class LobbyFeed:
+    """Połączenia listy gier w tym procesie + subskrypcja zdarzeń indeksu"""
+    
+    def __init__(self):
+        self.subscribers: Dict[object, LobbyFeedSubscriber] = {}
+        # id lobby -> najnowsze podsumowanie (None = usunięte) do rozesłania
+        self._pending: Dict[str, Optional[dict]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self.listener_task: Optional[asyncio.Task] = None
+        
+        # Metryki
+        self.events_received = 0
+        self.events_sent = 0
+        self.snapshots_sent = 0
+    
+    async def connect(self, websocket, typ_gry: Optional[str] = None):
+        """
+        Przyjmij połączenie i wyślij snapshot
+        
+        Args:
+            websocket: WebSocket connection
+            typ_gry: Filtr typu gry (None = wszystkie)
+        """
+        from routers.websocket_router import ConnectionSender
+        
+        await websocket.accept()
+        subscriber = LobbyFeedSubscriber(websocket, typ_gry)
+        subscriber.sender = ConnectionSender(self, websocket, 'lobby-feed')
+        subscriber.sender.start()
+        self.subscribers[websocket] = subscriber
+        
+        await self.send_snapshot(websocket)
+    
+    def disconnect(self, websocket):
+        """Usuń połączenie (wywoływane też przez ConnectionSender przy błędzie wysyłki)"""
+        subscriber = self.subscribers.pop(websocket, None)
+        if subscriber and subscriber.sender:
+            subscriber.sender.stop()
+    
+    async def close_slow_consumer(self, websocket):
+        """Rozłącz klienta, który nie nadąża (dashboard połączy się ponownie)"""
+        self.disconnect(websocket)
+        try:
+            await websocket.close(code=1013)
+        except Exception as e:
+            print(f"⚠️ Błąd zamykania wolnego połączenia listy gier: {e}")
+    
+    async def send_personal_message(self, message: dict, websocket):
+        """Wiadomość do jednego połączenia (przez kolejkę - bez równoległych send_json)"""
+        subscriber = self.subscribers.get(websocket)
+        if subscriber and subscriber.sender:
+            subscriber.sender.enqueue(message)
+    
+    async def send_state_to(self, websocket, force: bool = False):
+        """Resync po przepełnieniu kolejki (interfejs ConnectionSender) - nowy snapshot"""
+        await self.send_snapshot(websocket)
+    
+    async def set_filter(self, websocket, typ_gry: Optional[str]):
+        """Zmień filtr typu gry i wyślij snapshot dla nowego filtru"""
+        subscriber = self.subscribers.get(websocket)
+        if subscriber is None:
+            return
+        subscriber.typ_gry = typ_gry
+        await self.send_snapshot(websocket)
+    
+    async def send_snapshot(self, websocket):
+        """
+        Wyślij kompaktowy snapshot listy gier (podsumowania z indeksu)
+        
+        Args:
+            websocket: WebSocket connection
+        """
+        subscriber = self.subscribers.get(websocket)
+        if subscriber is None:
+            return
+        
+        subscriber.generation += 1
+        generation = subscriber.generation
+        subscriber.syncing = True
+        subscriber.backlog.clear()
+        
+        summaries = await RedisService().list_lobby_summaries(
+            status=list(LOBBY_FEED_STATUSES),
+            typ_gry=subscriber.typ_gry,
+            limit=LOBBY_FEED_SNAPSHOT_LIMIT
+        )
+        if subscriber.generation != generation or websocket not in self.subscribers:
+            return  # Nowszy snapshot w drodze lub klient rozłączony
+        
+        subscriber.known = {summary.get('id_gry') for summary in summaries}
+        subscriber.sender.enqueue({
+            'type': 'lobby_snapshot',
+            'typ_gry': subscriber.typ_gry,
+            'lobbies': summaries
+        })
+        self.snapshots_sent += 1
+        
+        # Zdarzenia, które przyszły w trakcie odczytu
+        subscriber.syncing = False
+        backlog, subscriber.backlog = subscriber.backlog, {}
+        for lobby_id, summary in backlog.items():
+            self._send_event(subscriber, lobby_id, summary)
+    
+    def handle_event(self, event: dict):
+        """
+        Zdarzenie z LOBBY_EVENTS_CHANNEL ({type: saved|deleted, id, summary})
+        
+        Args:
+            event: Zdekodowane zdarzenie
+        """
+        lobby_id = event.get('id')
+        if not lobby_id:
+            return
+        self.events_received += 1
+        
+        if not self.subscribers:
+            return
+        
+        if event.get('type') == 'saved' and isinstance(event.get('summary'), dict):
+            self._pending[lobby_id] = normalize_lobby(event['summary'])
+        elif event.get('type') == 'deleted':
+            self._pending[lobby_id] = None
+        else:
+            return
+        
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = create_untracked_task(self._flush())
+    
+    async def _flush(self):
+        """Roześlij zebrane zdarzenia po oknie LOBBY_FEED_COALESCE_WINDOW"""
+        await asyncio.sleep(LOBBY_FEED_COALESCE_WINDOW)
+        batch, self._pending = self._pending, {}
+        
+        for subscriber in list(self.subscribers.values()):
+            for lobby_id, summary in batch.items():
+                if subscriber.syncing:
+                    subscriber.backlog[lobby_id] = summary
+                else:
+                    self._send_event(subscriber, lobby_id, summary)
+    
+    def _send_event(self, subscriber: LobbyFeedSubscriber, lobby_id: str, summary: Optional[dict]):
+        """created/updated dla widocznego lobby, removed gdy zniknęło z widoku klienta"""
+        if subscriber.matches(summary):
+            message_type = 'lobby_updated' if lobby_id in subscriber.known else 'lobby_created'
+            subscriber.known.add(lobby_id)
+            subscriber.sender.enqueue({'type': message_type, 'lobby': summary})
+        elif lobby_id in subscriber.known:
+            subscriber.known.discard(lobby_id)
+            subscriber.sender.enqueue({'type': 'lobby_removed', 'id': lobby_id})
+        else:
+            return
+        self.events_sent += 1
+    
+    async def listen(self):
+        """Pętla subskrypcji LOBBY_EVENTS_CHANNEL"""
+        while True:
+            pubsub = None
+            try:
+                pubsub = open_pubsub(get_redis_client())
+                await pubsub.subscribe(LOBBY_EVENTS_CHANNEL)
+                async for message in pubsub.listen():
+                    if message.get('type') != 'message':
+                        continue
+                    try:
+                        self.handle_event(json.loads(message['data']))
+                    except Exception as e:
+                        print(f"❌ Lista gier - błąd zdarzenia: {e}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ Lista gier - błąd subskrypcji: {e}")
+                await asyncio.sleep(5)
+            finally:
+                if pubsub is not None:
+                    try:
+                        await pubsub.close()
+                    except Exception:
+                        pass
+    
+    def get_stats(self) -> dict:
+        """Statystyki dla /ws/stats"""
+        return {
+            'connections': len(self.subscribers),
+            'events_received': self.events_received,
+            'events_sent': self.events_sent,
+            'snapshots_sent': self.snapshots_sent,
+            'queues': [s.sender.get_metrics() for s in self.subscribers.values() if s.sender]
+        }
+
+# Singleton
+lobby_feed = LobbyFeed()
+
+def setup_lobby_feed():
+    """
+    Uruchom subskrypcję zdarzeń listy gier
+    Wywoływane w main.py przy startup (po init_redis)
+    """
+    if lobby_feed.listener_task is None or lobby_feed.listener_task.done():
+        lobby_feed.listener_task = asyncio.create_task(lobby_feed.listen())
+
+async def stop_lobby_feed():
+    """
+    Zatrzymaj subskrypcję listy gier
+    Wywoływane w main.py przy shutdown
+    """
+    tasks = [lobby_feed.listener_task, lobby_feed._flush_task]
+    for task in tasks:
+        if task and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+    lobby_feed.listener_task = None
+    lobby_feed._flush_task = None
+    for websocket in list(lobby_feed.subscribers):
+        lobby_feed.disconnect(websocket)
+    print("👋 Lista gier na żywo zatrzymana")
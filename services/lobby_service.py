@@ -0,0 +1,472 @@
+"""
+Service: Lobby
+Odpowiedzialność: Atomowe operacje na slotach/statusie lobby (Lua po stronie Redis)
+
+Każda mutacja (join, leave, ready, kick, add-bot, change/swap slot, transfer
+hosta, zmiana statusu, start gry) to jeden skrypt Lua w slocie gry: odczyt, walidacja,
+zmiana i zapis (z nową wersją lobby) dzieją się atomowo w Redis. Nie ma już
+GET -> json.loads -> mutacja -> SET po stronie aplikacji, więc równoczesne
+dołączenia botów i graczy nie nadpisują sobie nawzajem slotów.
+Indeks lobby (inny slot w Redis Cluster) aktualizowany jest zaraz potem
+i przyjmuje tylko nowszą wersję.
+"""
+import json
+import time
+from typing import Optional, Tuple
+
+from services.redis_service import (
+    RedisService, lobby_key, lobby_rev_key, chat_key, normalize_lobby,
+    build_lobby_summary, index_lobby, unindex_lobby,
+    LUA_CHAT_APPEND_FN, CHAT_MAX_MESSAGES, CHAT_TTL
+)
+
+# ============================================
+# LUA
+# ============================================
+# KEYS[1] = lobby:{id}, KEYS[2] = lobby:{id}:rev (wersja),
+# KEYS[3] = strumień czatu (tylko operacja 'chat')
+# ARGV[1] = operacja, ARGV[2] = argumenty (JSON), ARGV[3] = now,
+# ARGV[4] = TTL, ARGV[5] = id lobby
+# Zwraca: {kod_błędu} albo {'', lobby_json, info_json[, wersja]}
+# (wersja tylko przy zapisie - wtedy wywołujący aktualizuje indeks)
+# Uwaga: cjson koduje puste listy jako {} - normalize_lobby() to naprawia.
+LUA_LOBBY_MUTATE = LUA_CHAT_APPEND_FN + """
+local NULL = cjson.null
+local op = ARGV[1]
+local args = cjson.decode(ARGV[2])
+local now = tonumber(ARGV[3])
+local id = ARGV[5]
+
+local raw = redis.call('GET', KEYS[1])
+if not raw then return {'NOT_FOUND'} end
+
+local lobby = cjson.decode(raw)
+if type(lobby['slots']) ~= 'table' then lobby['slots'] = {} end
+local slots = lobby['slots']
+local info = {}
+
+local function str_or(v, default)
+    if type(v) == 'string' and v ~= '' then return v end
+    return default
+end
+
+local function find_by_user(uid)
+    for i, s in ipairs(slots) do
+        if uid ~= nil and s['id_uzytkownika'] == uid then return i, s end
+    end
+    return nil, nil
+end
+
+local function find_by_name(name)
+    for i, s in ipairs(slots) do
+        if name ~= nil and s['nazwa'] == name then return i, s end
+    end
+    return nil, nil
+end
+
+local function find_player(a)
+    if a['user_id'] ~= nil then return find_by_user(a['user_id']) end
+    return find_by_name(a['name'])
+end
+
+local function first_empty()
+    for i, s in ipairs(slots) do
+        if s['typ'] == 'pusty' then return i, s end
+    end
+    return nil, nil
+end
+
+local function clear_slot(s)
+    s['typ'] = 'pusty'
+    s['id_uzytkownika'] = NULL
+    s['nazwa'] = NULL
+    s['ready'] = false
+    s['avatar_url'] = NULL
+end
+
+local SLOT_FIELDS = {'typ', 'id_uzytkownika', 'nazwa', 'is_host', 'ready', 'avatar_url'}
+
+local function status_of(l)
+    return str_or(l['status_partii'], 'LOBBY')
+end
+
+local function save()
+    lobby['last_activity'] = now
+    local encoded = cjson.encode(lobby)
+    redis.call('SET', KEYS[1], encoded, 'EX', tonumber(ARGV[4]))
+    local rev = redis.call('INCR', KEYS[2])
+    redis.call('EXPIRE', KEYS[2], tonumber(ARGV[4]))
+    return {'', encoded, cjson.encode(info), rev}
+end
+
+local function delete()
+    redis.call('DEL', KEYS[1], KEYS[2])
+    info['deleted'] = true
+    return {'', raw, cjson.encode(info)}
+end
+
+local function unchanged()
+    return {'', raw, cjson.encode(info)}
+end
+
+if args['require_status'] and status_of(lobby) ~= args['require_status'] then
+    return {'BAD_STATUS'}
+end
+
+if op == 'join' then
+    local kicked = lobby['kicked_players']
+    if type(kicked) == 'table' then
+        for _, k in ipairs(kicked) do
+            if k == args['user_id'] then return {'KICKED'} end
+        end
+    end
+    local i, s = find_by_user(args['user_id'])
+    if s then
+        info['already'] = true
+        info['slot'] = i - 1
+        return unchanged()
+    end
+    i, s = first_empty()
+    if not s then return {'FULL'} end
+    s['typ'] = args['typ'] or 'gracz'
+    s['id_uzytkownika'] = args['user_id']
+    s['nazwa'] = args['username']
+    s['ready'] = false
+    s['avatar_url'] = args['avatar_url'] or 'default_avatar.png'
+    info['slot'] = i - 1
+    return save()
+
+elseif op == 'leave' then
+    local i, s = find_by_user(args['user_id'])
+    if not s then return {'NOT_IN_LOBBY'} end
+    if s['is_host'] == true and not args['keep_lobby'] then return delete() end
+    clear_slot(s)
+    s['is_host'] = false
+    return save()
+
+elseif op == 'ready' then
+    local i, s = find_player(args)
+    if not s then return {'NOT_IN_LOBBY'} end
+    if args['value'] == nil then
+        s['ready'] = not (s['ready'] == true)
+    else
+        s['ready'] = args['value'] == true
+    end
+    info['ready'] = s['ready']
+    return save()
+
+elseif op == 'kick' then
+    if lobby['host_id'] ~= args['host_id'] then return {'NOT_HOST'} end
+    local i, s = find_by_user(args['user_id'])
+    if not s then return {'PLAYER_NOT_FOUND'} end
+    if type(lobby['kicked_players']) ~= 'table' then lobby['kicked_players'] = {} end
+    table.insert(lobby['kicked_players'], args['user_id'])
+    info['name'] = s['nazwa']
+    clear_slot(s)
+    return save()
+
+elseif op == 'add_bot' then
+    local s
+    if args['slot'] ~= nil then
+        if args['slot'] < 0 or args['slot'] >= #slots then return {'BAD_SLOT'} end
+        s = slots[args['slot'] + 1]
+        if s['typ'] ~= 'pusty' then return {'SLOT_TAKEN'} end
+    else
+        local _
+        _, s = first_empty()
+        if not s then return {'NO_FREE_SLOT'} end
+    end
+    local name = args['name']
+    if name then
+        if find_by_name(name) then return {'ALREADY_IN_LOBBY'} end
+    else
+        local used = {}
+        for _, other in ipairs(slots) do
+            if other['typ'] == 'bot' and type(other['nazwa']) == 'string' then
+                local n = tonumber(string.match(other['nazwa'], '#(%d+)'))
+                if n then used[n] = true end
+            end
+        end
+        local n = 1
+        while used[n] do n = n + 1 end
+        name = 'Bot #' .. n
+    end
+    s['typ'] = args['typ'] or 'bot'
+    s['nazwa'] = name
+    s['ready'] = false
+    s['avatar_url'] = args['avatar_url'] or 'bot_avatar.png'
+    if args['user_id'] ~= nil then s['id_uzytkownika'] = args['user_id'] end
+    info['name'] = name
+    return save()
+
+elseif op == 'change_slot' then
+    if status_of(lobby) == 'W_GRZE' then return {'IN_GAME'} end
+    local i, s = find_by_user(args['user_id'])
+    if not s then return {'NOT_IN_LOBBY'} end
+    local target = args['target']
+    if i - 1 == target then return {'SAME_SLOT'} end
+    if target < 0 or target >= #slots then return {'BAD_SLOT'} end
+    local t = slots[target + 1]
+    if t['typ'] ~= 'pusty' then return {'SLOT_TAKEN'} end
+    for _, f in ipairs(SLOT_FIELDS) do
+        local v = s[f]
+        if v == nil then v = NULL end
+        t[f] = v
+    end
+    clear_slot(s)
+    s['is_host'] = false
+    return save()
+
+elseif op == 'kick_bot' then
+    if lobby['host_id'] ~= args['host_id'] then return {'NOT_HOST'} end
+    local n = args['slot']
+    if n < 0 or n >= #slots then return {'BAD_SLOT'} end
+    local s = slots[n + 1]
+    if s['typ'] ~= 'bot' then return {'NOT_BOT'} end
+    info['name'] = s['nazwa']
+    clear_slot(s)
+    return save()
+
+elseif op == 'swap' then
+    if lobby['host_id'] ~= args['host_id'] then return {'NOT_HOST'} end
+    if status_of(lobby) == 'W_GRZE' then return {'IN_GAME'} end
+    local a, b = args['a'], args['b']
+    if a < 0 or a >= #slots then return {'BAD_SLOT_A'} end
+    if b < 0 or b >= #slots then return {'BAD_SLOT_B'} end
+    if a == b then return {'SAME_SLOT'} end
+    local sa, sb = slots[a + 1], slots[b + 1]
+    for _, f in ipairs(SLOT_FIELDS) do
+        local va, vb = sa[f], sb[f]
+        if va == nil then va = (f == 'is_host' or f == 'ready') and false or NULL end
+        if vb == nil then vb = (f == 'is_host' or f == 'ready') and false or NULL end
+        sa[f], sb[f] = vb, va
+    end
+    info['names'] = {}
+    if type(sa['nazwa']) == 'string' then table.insert(info['names'], sa['nazwa']) end
+    if type(sb['nazwa']) == 'string' then table.insert(info['names'], sb['nazwa']) end
+    return save()
+
+elseif op == 'transfer_host' then
+    if lobby['host_id'] ~= args['host_id'] then return {'NOT_HOST'} end
+    if args['new_host_id'] == args['host_id'] then return {'ALREADY_HOST'} end
+    local _, old = find_by_user(args['host_id'])
+    if not old then return {'NOT_IN_LOBBY'} end
+    local _, new = find_by_user(args['new_host_id'])
+    if not new then return {'NEW_HOST_NOT_FOUND'} end
+    if new['typ'] ~= 'gracz' then return {'NEW_HOST_IS_BOT'} end
+    old['is_host'] = false
+    new['is_host'] = true
+    lobby['host_id'] = args['new_host_id']
+    info['name'] = new['nazwa']
+    return save()
+
+elseif op == 'set_status' then
+    if args['expected'] and status_of(lobby) ~= args['expected'] then return {'BAD_STATUS'} end
+    lobby['status_partii'] = args['status']
+    return save()
+
+elseif op == 'start' then
+    -- LOBBY -> W_GRZE tylko gdy (w chwili zapisu) host się zgadza, sloty są pełne
+    -- i wszyscy gotowi (host i boty zwolnieni, chyba że all_ready)
+    if status_of(lobby) ~= 'LOBBY' then return {'BAD_STATUS'} end
+    if args['host_id'] ~= nil then
+        local _, host = find_by_user(args['host_id'])
+        if not host or host['is_host'] ~= true then return {'NOT_HOST'} end
+    end
+    local count = 0
+    local not_ready = {}
+    for _, s in ipairs(slots) do
+        if s['typ'] ~= 'pusty' then
+            count = count + 1
+            local exempt = not args['all_ready'] and (s['is_host'] == true or s['typ'] ~= 'gracz')
+            if s['ready'] ~= true and not exempt then table.insert(not_ready, s['nazwa']) end
+        end
+    end
+    if count < (tonumber(lobby['max_graczy']) or #slots) then return {'NOT_FULL'} end
+    if #not_ready > 0 then return {'NOT_READY'} end
+    lobby['status_partii'] = 'W_GRZE'
+    return save()
+
+elseif op == 'touch' then
+    return save()
+
+elseif op == 'chat' then
+    -- Wiadomość + last_activity w jednym round-tripie
+    if (args['user_id'] ~= nil or args['name'] ~= nil) and not find_player(args) then return {'NOT_IN_LOBBY'} end
+    info['cursor'] = chat_append(KEYS[3], args['message'], args['max_messages'], args['ttl'], id)
+    return save()
+end
+
+return {'UNKNOWN_OP'}
+"""
+
+# ============================================
+# LOBBY SERVICE CLASS
+# ============================================
+
+class LobbyService:
+    """
+    Atomowe operacje na lobby.
+
+    Każda metoda zwraca (lobby_data, error, info):
+    - lobby_data: dane lobby po operacji (None przy błędzie)
+    - error: kod błędu (np. 'NOT_FOUND', 'FULL', 'NOT_HOST') lub None
+    - info: dodatkowe dane operacji (np. nazwa dodanego bota)
+    """
+
+    def __init__(self, redis: RedisService):
+        self.redis = redis
+
+    async def _mutate(self, lobby_id: str, op: str, extra_keys: Tuple[str, ...] = (), **args) -> Tuple[Optional[dict], Optional[str], dict]:
+        """Wykonaj operację w Lua (extra_keys - dodatkowe klucze z tego samego slotu gry)"""
+        # None -> brak klucza (cjson.null w Lua jest "prawdą")
+        args = {k: v for k, v in args.items() if v is not None}
+        try:
+            result = await self.redis.redis.eval(
+                LUA_LOBBY_MUTATE, 2 + len(extra_keys),
+                lobby_key(lobby_id), lobby_rev_key(lobby_id), *extra_keys,
+                op, json.dumps(args), time.time(), self.redis.expiration,
+                lobby_id
+            )
+        except Exception as e:
+            print(f"❌ Redis lobby {op} error [{lobby_id}]: {e}")
+            return None, 'REDIS_ERROR', {}
+
+        code = result[0].decode('utf-8') if isinstance(result[0], bytes) else result[0]
+        if code:
+            return None, code, {}
+
+        lobby_data = normalize_lobby(json.loads(result[1]))
+        info = json.loads(result[2]) if len(result) > 2 and result[2] else {}
+        if not isinstance(info, dict):
+            info = {}
+        
+        # Indeks lobby (osobny slot) - starsza wersja zostanie odrzucona
+        try:
+            if info.get('deleted'):
+                await unindex_lobby(self.redis.redis, lobby_id)
+            elif len(result) > 3:
+                summary = build_lobby_summary(lobby_data)
+                summary['id_gry'] = summary['id_gry'] or lobby_id
+                await index_lobby(self.redis.redis, lobby_id, summary, int(result[3]))
+        except Exception as e:
+            # Następny zapis lub rebuild_lobby_index naprawi indeks
+            print(f"❌ Redis lobby index error [{lobby_id}]: {e}")
+        return lobby_data, None, info
+
+    async def join(
+        self,
+        lobby_id: str,
+        user_id: int,
+        username: str,
+        avatar_url: Optional[str] = None,
+        require_status: Optional[str] = None
+    ):
+        """Zajmij pierwszy wolny slot (no-op jeśli gracz już jest w lobby)"""
+        return await self._mutate(
+            lobby_id, 'join',
+            user_id=user_id, username=username,
+            avatar_url=avatar_url, require_status=require_status
+        )
+
+    async def leave(self, lobby_id: str, user_id: int, keep_lobby: bool = False):
+        """Opuść lobby (host usuwa lobby - info['deleted'], chyba że keep_lobby)"""
+        return await self._mutate(lobby_id, 'leave', user_id=user_id, keep_lobby=keep_lobby)
+
+    async def set_ready(
+        self,
+        lobby_id: str,
+        user_id: Optional[int] = None,
+        name: Optional[str] = None,
+        value: Optional[bool] = None,
+        require_status: Optional[str] = None
+    ):
+        """Ustaw (value) lub przełącz (value=None) gotowość gracza/bota"""
+        return await self._mutate(
+            lobby_id, 'ready',
+            user_id=user_id, name=name, value=value, require_status=require_status
+        )
+
+    async def kick(self, lobby_id: str, host_id: int, user_id: int):
+        """Host wyrzuca gracza (dopisany do kicked_players)"""
+        return await self._mutate(lobby_id, 'kick', host_id=host_id, user_id=user_id)
+
+    async def add_bot(
+        self,
+        lobby_id: str,
+        slot: Optional[int] = None,
+        name: Optional[str] = None,
+        user_id: Optional[int] = None,
+        avatar_url: Optional[str] = None
+    ):
+        """Dodaj bota (name=None -> kolejny 'Bot #N'); info['name'] = nazwa bota"""
+        return await self._mutate(
+            lobby_id, 'add_bot',
+            slot=slot, name=name, user_id=user_id, avatar_url=avatar_url
+        )
+
+    async def change_slot(self, lobby_id: str, user_id: int, target: int):
+        """Gracz przechodzi na pusty slot"""
+        return await self._mutate(lobby_id, 'change_slot', user_id=user_id, target=target)
+
+    async def kick_bot(self, lobby_id: str, host_id: int, slot: int):
+        """Host usuwa bota ze slotu"""
+        return await self._mutate(lobby_id, 'kick_bot', host_id=host_id, slot=slot)
+
+    async def swap_slots(self, lobby_id: str, host_id: int, slot_a: int, slot_b: int):
+        """Host zamienia zawartość dwóch slotów"""
+        return await self._mutate(lobby_id, 'swap', host_id=host_id, a=slot_a, b=slot_b)
+
+    async def transfer_host(self, lobby_id: str, host_id: int, new_host_id: int):
+        """Przekaż rolę hosta innemu graczowi"""
+        return await self._mutate(
+            lobby_id, 'transfer_host',
+            host_id=host_id, new_host_id=new_host_id
+        )
+
+    async def set_status(self, lobby_id: str, new_status: str, expected: Optional[str] = None):
+        """Zmień status_partii (compare-and-set gdy podano expected)"""
+        return await self._mutate(lobby_id, 'set_status', status=new_status, expected=expected)
+
+    async def start(self, lobby_id: str, host_id: Optional[int] = None, all_ready: bool = False):
+        """
+        Atomowy start gry: LOBBY -> W_GRZE po sprawdzeniu hosta, pełnych slotów i gotowości
+
+        Args:
+            host_id: Użytkownik startujący - musi być hostem (None - bez sprawdzania)
+            all_ready: Gotowość wymagana też od hosta i botów (jak w matchmakingu botów)
+
+        Returns:
+            Jak _mutate; błędy 'BAD_STATUS', 'NOT_HOST', 'NOT_FULL', 'NOT_READY'
+        """
+        return await self._mutate(
+            lobby_id, 'start', host_id=host_id, all_ready=all_ready or None
+        )
+
+    async def touch(self, lobby_id: str):
+        """Aktualizuj last_activity"""
+        return await self._mutate(lobby_id, 'touch')
+
+    async def post_chat(
+        self,
+        lobby_id: str,
+        message: dict,
+        user_id: Optional[int] = None,
+        name: Optional[str] = None,
+        max_messages: int = CHAT_MAX_MESSAGES,
+        ttl: int = CHAT_TTL
+    ):
+        """
+        Dopisz wiadomość do czatu i zaktualizuj last_activity (jeden skrypt)
+
+        Args:
+            user_id/name: Autor musi być w slotach lobby ('NOT_IN_LOBBY'); brak - bez sprawdzania
+
+        Returns:
+            Jak _mutate; info['cursor'] - kursor wiadomości w strumieniu czatu
+        """
+        return await self._mutate(
+            lobby_id, 'chat', extra_keys=(chat_key(lobby_id),),
+            message=json.dumps(message), user_id=user_id, name=name,
+            max_messages=max_messages, ttl=ttl
+        )
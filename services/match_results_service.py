@@ -0,0 +1,443 @@
+"""
+Service: Wyniki meczów (write-behind)
+Odpowiedzialność: Koniec meczu = XADD do strumienia Redis; worker księguje ELO i statystyki paczkami
+
+- Publikacja nie dotyka bazy (koniec meczu nie czeka na Postgres)
+- Worker czyta strumień w grupie konsumentów i przetwarza wiele meczów w jednej transakcji:
+  jedno zapytanie o typy gier, użytkowników i statystyki, zbiorczy upsert player_game_stats
+- Idempotentnie po match_id (tabela processed_matches) - ponowne dostarczenie nic nie zmienia
+- Wpisy nie potwierdzone (np. crash workera) są przejmowane po MATCH_RESULTS_CLAIM_IDLE_MS
+"""
+import asyncio
+import json
+import os
+import socket
+import time
+from typing import Dict, List, Optional
+
+from services.redis_service import get_redis_client
+
+MATCH_RESULTS_STREAM = "stats:match_results"
+MATCH_RESULTS_GROUP = "stats_workers"
+
+# Przybliżony limit długości strumienia (XADD MAXLEN ~)
+MATCH_RESULTS_MAXLEN = 100000
+
+# Maksymalna liczba meczów w jednej transakcji
+MATCH_RESULTS_BATCH = 200
+
+# Jak długo XREADGROUP czeka na nowe wpisy
+MATCH_RESULTS_BLOCK_MS = 2000
+
+# Po tylu ms bez ACK wpis jest przejmowany przez innego workera
+MATCH_RESULTS_CLAIM_IDLE_MS = 60000
+
+DEFAULT_ELO = 1200.0
+MIN_ELO = 100
+
+def encode_match_result(
+    match_id: str,
+    game_type_name: str,
+    winner_usernames: List[str],
+    loser_usernames: List[str],
+    is_casual: bool = False
+) -> Dict[str, str]:
+    """Pola wpisu strumienia dla wyniku meczu"""
+    return {
+        'match_id': match_id,
+        'game_type': game_type_name,
+        'winners': json.dumps(winner_usernames),
+        'losers': json.dumps(loser_usernames),
+        'casual': '1' if is_casual else '0',
+        'ts': str(time.time()),
+    }
+
+def decode_match_result(fields: dict) -> dict:
+    """Wpis strumienia -> dict wyniku meczu"""
+    fields = {
+        (k.decode() if isinstance(k, bytes) else k): (v.decode() if isinstance(v, bytes) else v)
+        for k, v in fields.items()
+    }
+    return {
+        'match_id': fields['match_id'],
+        'game_type': fields.get('game_type', '66'),
+        'winners': json.loads(fields.get('winners', '[]')),
+        'losers': json.loads(fields.get('losers', '[]')),
+        'casual': fields.get('casual') == '1',
+    }
+
+def _insert_for(session):
+    """INSERT z ON CONFLICT dla dialektu bazy (Postgres na produkcji, SQLite lokalnie)"""
+    if session.bind.dialect.name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        from sqlalchemy.dialects.postgresql import insert
+    return insert
+
+# ============================================
+# MATCH RESULTS SERVICE CLASS
+# ============================================
+
+class MatchResultsService:
+    """Strumień wyników meczów i worker księgujący je w bazie"""
+    
+    def __init__(self):
+        self.consumer = f"{socket.gethostname()}:{os.getpid()}"
+        self.worker_task: Optional[asyncio.Task] = None
+        self._group_ready = False
+    
+    @property
+    def redis(self):
+        return get_redis_client()
+    
+    # ============================================
+    # PUBLIKACJA
+    # ============================================
+    
+    async def publish(
+        self,
+        match_id: str,
+        game_type_name: str,
+        winner_usernames: List[str],
+        loser_usernames: List[str],
+        is_casual: bool = False,
+        redis_client=None
+    ) -> Optional[str]:
+        """
+        Opublikuj wynik meczu (jeden XADD)
+        
+        Args:
+            match_id: Unikalne ID meczu (klucz idempotencji)
+            game_type_name: Nazwa typu gry ("66", "Tysiąc")
+            winner_usernames: Zwycięzcy
+            loser_usernames: Przegrani
+            is_casual: Gra bez wpływu na ELO
+            redis_client: Opcjonalny klient (timer_worker jako osobny proces)
+        
+        Returns:
+            str: ID wpisu strumienia lub None przy błędzie
+        """
+        try:
+            client = redis_client or self.redis
+            entry_id = await client.xadd(
+                MATCH_RESULTS_STREAM,
+                encode_match_result(match_id, game_type_name, winner_usernames, loser_usernames, is_casual),
+                maxlen=MATCH_RESULTS_MAXLEN,
+                approximate=True
+            )
+            return entry_id.decode() if isinstance(entry_id, bytes) else entry_id
+        except Exception as e:
+            print(f"❌ Match results publish error [{match_id}]: {e}")
+            return None
+    
+    # ============================================
+    # KSIĘGOWANIE (BAZA)
+    # ============================================
+    
+    async def apply_matches(self, matches: List[dict]) -> int:
+        """
+        Zaksięguj wyniki meczów w jednej transakcji
+        
+        Mecze stosowane są w kolejności strumienia (ELO zależy od kolejności).
+        Mecze już zaksięgowane (processed_matches) są pomijane.
+        
+        Args:
+            matches: Wyniki z decode_match_result
+        
+        Returns:
+            int: Liczba nowo zaksięgowanych meczów
+        """
+        from database import async_sessionmaker, User, PlayerGameStats, GameType, ProcessedMatch
+        from sqlalchemy import select, and_
+        from routers.stats import calculate_elo_change
+        
+        # Duplikaty w obrębie paczki - pierwszy wpis wygrywa
+        unique = {}
+        for match in matches:
+            unique.setdefault(match['match_id'], match)
+        if not unique:
+            return 0
+        
+        async with async_sessionmaker() as session:
+            insert = _insert_for(session)
+            
+            # 1. Typy gier (brakujące tworzone)
+            type_names = {m['game_type'] for m in unique.values()}
+            result = await session.execute(
+                select(GameType.name, GameType.id).where(GameType.name.in_(type_names))
+            )
+            game_types = dict(result.all())
+            for name in type_names - game_types.keys():
+                game_type = GameType(name=name)
+                session.add(game_type)
+                await session.flush()
+                game_types[name] = game_type.id
+            
+            # 2. Idempotencja - zarezerwuj match_id (ON CONFLICT DO NOTHING)
+            result = await session.execute(
+                insert(ProcessedMatch)
+                .values([
+                    {'match_id': match_id, 'game_type_id': game_types[m['game_type']]}
+                    for match_id, m in unique.items()
+                ])
+                .on_conflict_do_nothing(index_elements=['match_id'])
+                .returning(ProcessedMatch.match_id)
+            )
+            new_ids = set(result.scalars().all())
+            new_matches = [m for match_id, m in unique.items() if match_id in new_ids]
+            if not new_matches:
+                await session.commit()
+                return 0
+            
+            # 3. Użytkownicy (brakujący - np. boty bez konta - tworzeni jednym INSERT)
+            usernames = {u for m in new_matches for u in m['winners'] + m['losers']}
+            result = await session.execute(
+                select(User.username, User.id).where(User.username.in_(usernames))
+            )
+            user_ids = dict(result.all())
+            missing = usernames - user_ids.keys()
+            created_bots = 0
+            if missing:
+                result = await session.execute(
+                    insert(User)
+                    .values([
+                        {
+                            'username': username,
+                            'hashed_password': "bot_no_password",
+                            'settings': json.dumps({'jest_botem': True}),
+                            'is_bot': True,
+                            'is_admin': False,
+                            'status': 'offline',
+                        }
+                        for username in sorted(missing)
+                    ])
+                    .on_conflict_do_nothing(index_elements=['username'])
+                    .returning(User.username, User.id)
+                )
+                created = dict(result.all())
+                created_bots = len(created)
+                user_ids.update(created)
+                for username in sorted(created):
+                    print(f"[📊 Stats] Utworzono użytkownika dla: {username}")
+                
+                still_missing = usernames - user_ids.keys()
+                if still_missing:
+                    # Utworzeni równolegle przez inny proces
+                    result = await session.execute(
+                        select(User.username, User.id).where(User.username.in_(still_missing))
+                    )
+                    user_ids.update(dict(result.all()))
+            
+            # 4. Statystyki - jedno zapytanie, wiersze zablokowane do końca transakcji
+            ids = set(user_ids.values())
+            gt_ids = {game_types[m['game_type']] for m in new_matches}
+            result = await session.execute(
+                select(PlayerGameStats)
+                .where(and_(
+                    PlayerGameStats.user_id.in_(ids),
+                    PlayerGameStats.game_type_id.in_(gt_ids)
+                ))
+                .order_by(PlayerGameStats.user_id, PlayerGameStats.game_type_id)
+                .with_for_update()
+            )
+            stats = {
+                (row.user_id, row.game_type_id): {
+                    'user_id': row.user_id,
+                    'game_type_id': row.game_type_id,
+                    'elo_rating': row.elo_rating,
+                    'games_played': row.games_played,
+                    'games_won': row.games_won,
+                }
+                for row in result.scalars().all()
+            }
+            
+            # 5. ELO i liczniki w pamięci, mecz po meczu
+            touched = set()
+            for match in new_matches:
+                gt_id = game_types[match['game_type']]
+                
+                def row_for(username):
+                    key = (user_ids[username], gt_id)
+                    if key not in stats:
+                        stats[key] = {
+                            'user_id': key[0],
+                            'game_type_id': gt_id,
+                            'elo_rating': DEFAULT_ELO,
+                            'games_played': 0,
+                            'games_won': 0,
+                        }
+                    touched.add(key)
+                    return stats[key]
+                
+                winners = [row_for(u) for u in match['winners'] if u in user_ids]
+                losers = [row_for(u) for u in match['losers'] if u in user_ids]
+                
+                avg_winner_elo = sum(r['elo_rating'] for r in winners) / len(winners) if winners else DEFAULT_ELO
+                avg_loser_elo = sum(r['elo_rating'] for r in losers) / len(losers) if losers else DEFAULT_ELO
+                elo_gain, elo_loss = calculate_elo_change(avg_winner_elo, avg_loser_elo)
+                
+                for row in winners:
+                    row['games_played'] += 1
+                    row['games_won'] += 1
+                    if not match['casual']:
+                        row['elo_rating'] = max(MIN_ELO, row['elo_rating'] + elo_gain)
+                for row in losers:
+                    row['games_played'] += 1
+                    if not match['casual']:
+                        row['elo_rating'] = max(MIN_ELO, row['elo_rating'] + elo_loss)
+            
+            # 6. Zbiorczy upsert statystyk
+            if touched:
+                stmt = insert(PlayerGameStats).values([stats[key] for key in sorted(touched)])
+                await session.execute(
+                    stmt.on_conflict_do_update(
+                        index_elements=['user_id', 'game_type_id'],
+                        set_={
+                            'elo_rating': stmt.excluded.elo_rating,
+                            'games_played': stmt.excluded.games_played,
+                            'games_won': stmt.excluded.games_won,
+                        }
+                    )
+                )
+            
+            await session.commit()
+        
+        print(f"✅ Zaksięgowano {len(new_matches)} meczów ({len(touched)} wierszy statystyk)")
+        
+        await self._after_commit(touched, stats, user_ids, created_bots)
+        return len(new_matches)
+    
+    async def _after_commit(self, touched: set, stats: dict, user_ids: dict, created_bots: int):
+        """Ranking w Redis i liczniki kont po zaksięgowaniu paczki"""
+        from database import async_sessionmaker, PlayerGameStats
+        from sqlalchemy import select, func
+        from services.leaderboard_service import leaderboard_service
+        from services.user_counters_service import user_counters_service
+        
+        if created_bots:
+            for _ in range(created_bots):
+                await user_counters_service.user_created(is_bot=True)
+        
+        if not touched:
+            return
+        
+        try:
+            names = {user_id: username for username, user_id in user_ids.items()}
+            per_game: Dict[int, Dict[str, float]] = {}
+            for user_id, gt_id in touched:
+                per_game.setdefault(gt_id, {})[names[user_id]] = stats[(user_id, gt_id)]['elo_rating']
+            
+            # Najwyższe ELO graczy ze wszystkich gier (ranking globalny)
+            async with async_sessionmaker() as session:
+                result = await session.execute(
+                    select(PlayerGameStats.user_id, func.max(PlayerGameStats.elo_rating))
+                    .where(PlayerGameStats.user_id.in_({user_id for user_id, _ in touched}))
+                    .where(PlayerGameStats.games_played > 0)
+                    .group_by(PlayerGameStats.user_id)
+                )
+                global_elos = {names[user_id]: elo for user_id, elo in result.all()}
+            
+            for gt_id, game_elos in per_game.items():
+                await leaderboard_service.record_ratings(gt_id, game_elos, {})
+            await leaderboard_service.record_ratings(None, {}, global_elos)
+        except Exception as e:
+            print(f"❌ Match results leaderboard error: {e}")
+    
+    # ============================================
+    # WORKER (STRUMIEŃ)
+    # ============================================
+    
+    async def ensure_group(self):
+        """Utwórz grupę konsumentów (i strumień) jeśli nie istnieje"""
+        if self._group_ready:
+            return
+        try:
+            await self.redis.xgroup_create(MATCH_RESULTS_STREAM, MATCH_RESULTS_GROUP, id='0', mkstream=True)
+        except Exception as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+        self._group_ready = True
+    
+    async def process_batch(self, block_ms: Optional[int] = MATCH_RESULTS_BLOCK_MS) -> int:
+        """
+        Jeden krok workera: przejmij porzucone wpisy, doczytaj nowe, zaksięguj, potwierdź
+        
+        Returns:
+            int: Liczba przetworzonych wpisów strumienia
+        """
+        await self.ensure_group()
+        
+        # Wpisy porzucone przez innego workera (brak ACK przez CLAIM_IDLE_MS)
+        claimed = await self.redis.xautoclaim(
+            MATCH_RESULTS_STREAM, MATCH_RESULTS_GROUP, self.consumer,
+            min_idle_time=MATCH_RESULTS_CLAIM_IDLE_MS, start_id='0-0', count=MATCH_RESULTS_BATCH
+        )
+        entries = [(entry_id, fields) for entry_id, fields in claimed[1] if fields]
+        
+        if len(entries) < MATCH_RESULTS_BATCH:
+            response = await self.redis.xreadgroup(
+                MATCH_RESULTS_GROUP, self.consumer,
+                {MATCH_RESULTS_STREAM: '>'},
+                count=MATCH_RESULTS_BATCH - len(entries),
+                block=None if entries else block_ms
+            )
+            for _stream, stream_entries in response or []:
+                entries.extend(stream_entries)
+        
+        if not entries:
+            return 0
+        
+        matches = []
+        for entry_id, fields in entries:
+            try:
+                matches.append(decode_match_result(fields))
+            except Exception as e:
+                print(f"❌ Niepoprawny wpis wyniku meczu {entry_id}: {e}")
+        
+        # Błąd bazy = brak ACK, wpisy zostaną przejęte ponownie
+        await self.apply_matches(matches)
+        
+        entry_ids = [entry_id for entry_id, _ in entries]
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.xack(MATCH_RESULTS_STREAM, MATCH_RESULTS_GROUP, *entry_ids)
+        pipe.xdel(MATCH_RESULTS_STREAM, *entry_ids)
+        await pipe.execute()
+        return len(entries)
+    
+    async def run(self):
+        """Pętla workera"""
+        print(f"🏁 Worker wyników meczów uruchomiony ({self.consumer})")
+        while True:
+            try:
+                await self.process_batch()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ Match results worker error: {e}")
+                await asyncio.sleep(5)
+
+# Singleton
+match_results_service = MatchResultsService()
+
+def setup_match_results_worker():
+    """
+    Uruchom worker księgujący wyniki meczów
+    Wywoływane w main.py przy startup (po init_redis)
+    """
+    if match_results_service.worker_task is None or match_results_service.worker_task.done():
+        match_results_service.worker_task = asyncio.create_task(match_results_service.run())
+
+async def stop_match_results_worker():
+    """
+    Zatrzymaj worker wyników meczów
+    Wywoływane w main.py przy shutdown
+    """
+    task = match_results_service.worker_task
+    if task and not task.done():
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        print("👋 Worker wyników meczów zatrzymany")
+    match_results_service.worker_task = None
@@ -0,0 +1,159 @@
+"""
+Service: Tempo gry (wspólny harmonogram kroków gier)
+Odpowiedzialność: Opóźnione kroki gier (ruch bota, finalizacja lewy) bez śpiących coroutine
+
+- Jeden kopiec zdarzeń (termin, seq, id_gry) i jedna pętla dla wszystkich stołów
+- Najwyżej jeden oczekujący krok na grę - nowy krok zastępuje poprzedni
+- Kroki jednej gry wykonywane po kolei (blokada per gra), różne gry równolegle
+- Żądania HTTP tylko planują krok i od razu zwracają odpowiedź
+"""
+import asyncio
+import heapq
+import itertools
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from redis_utils import create_untracked_task
+
+# Krok gry - bezargumentowa coroutine (kontekst w domknięciu)
+PacingStep = Callable[[], Awaitable[None]]
+
+# ============================================
+# PACING SCHEDULER CLASS
+# ============================================
+
+class PacingScheduler:
+    """Harmonogram kroków gier (kopiec + jedna pętla)"""
+    
+    def __init__(self):
+        self._heap: List[Tuple[float, int, str]] = []
+        # id_gry -> (seq, krok) - aktualny oczekujący krok gry
+        self._pending: Dict[str, Tuple[int, PacingStep]] = {}
+        self._seq = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._game_locks: Dict[str, Tuple[asyncio.Lock, int]] = {}
+        self._step_tasks: set = set()
+        self.loop_task: Optional[asyncio.Task] = None
+    
+    def schedule(self, game_id: str, delay: float, step: PacingStep):
+        """
+        Zaplanuj krok gry za `delay` sekund (zastępuje oczekujący krok tej gry)
+        
+        Args:
+            game_id: ID gry
+            delay: Opóźnienie (sekundy)
+            step: Coroutine function wykonująca krok
+        """
+        self._ensure_running()
+        seq = next(self._seq)
+        self._pending[game_id] = (seq, step)
+        heapq.heappush(self._heap, (time.time() + delay, seq, game_id))
+        if self._heap[0][1] == seq:
+            self._wakeup.set()
+    
+    def cancel(self, game_id: str):
+        """Anuluj oczekujący krok gry (np. gra usunięta)"""
+        self._pending.pop(game_id, None)
+    
+    def is_pending(self, game_id: str) -> bool:
+        return game_id in self._pending
+    
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending)
+    
+    def _ensure_running(self):
+        """Uruchom pętlę przy pierwszym kroku (także poza serwerem, np. w skryptach)"""
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        if self.loop_task is None or self.loop_task.done():
+            self.loop_task = create_untracked_task(self.run())
+    
+    async def run(self):
+        """Pętla - śpi do najbliższego terminu lub nowego kroku"""
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        
+        while True:
+            try:
+                now = time.time()
+                while self._heap and self._heap[0][0] <= now:
+                    _, seq, game_id = heapq.heappop(self._heap)
+                    pending = self._pending.get(game_id)
+                    if not pending or pending[0] != seq:
+                        continue  # Zastąpiony lub anulowany
+                    del self._pending[game_id]
+                    self._dispatch(game_id, pending[1])
+                
+                timeout = self._heap[0][0] - time.time() if self._heap else None
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ Pacing scheduler error: {e}")
+                await asyncio.sleep(0.1)
+    
+    def _dispatch(self, game_id: str, step: PacingStep):
+        """Uruchom krok jako task (szeregowo w ramach gry)"""
+        task = create_untracked_task(self._run_step(game_id, step))
+        self._step_tasks.add(task)
+        task.add_done_callback(self._step_tasks.discard)
+    
+    async def _run_step(self, game_id: str, step: PacingStep):
+        # Blokada gry + liczba kroków, które jej używają (usuwana przy ostatnim)
+        lock, users = self._game_locks.get(game_id, (asyncio.Lock(), 0))
+        self._game_locks[game_id] = (lock, users + 1)
+        try:
+            async with lock:
+                await step()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"❌ Pacing step error [{game_id}]: {e}")
+        finally:
+            lock, users = self._game_locks[game_id]
+            if users <= 1:
+                del self._game_locks[game_id]
+            else:
+                self._game_locks[game_id] = (lock, users - 1)
+    
+    async def stop(self):
+        """Zatrzymaj pętlę i kroki w toku"""
+        tasks = [self.loop_task, *self._step_tasks]
+        for task in tasks:
+            if task and not task.done():
+                task.cancel()
+        for task in tasks:
+            if task:
+                try:
+                    await task
+                except (asyncio.CancelledError, Exception):
+                    pass
+        
+        self.loop_task = None
+        self._step_tasks.clear()
+        self._heap.clear()
+        self._pending.clear()
+        self._game_locks.clear()
+
+# Singleton
+pacing_scheduler = PacingScheduler()
+
+def setup_pacing_scheduler():
+    """
+    Uruchom pętlę harmonogramu tempa gier
+    Wywoływane w main.py przy startup
+    """
+    pacing_scheduler._ensure_running()
+
+async def stop_pacing_scheduler():
+    """
+    Zatrzymaj harmonogram tempa gier
+    Wywoływane w main.py przy shutdown
+    """
+    await pacing_scheduler.stop()
+    print("👋 Harmonogram tempa gier zatrzymany")
@@ -0,0 +1,243 @@
+"""
+Service: Obecność (presence)
+Odpowiedzialność: Kto jest online - ZSET user_id -> last_seen zamiast kluczy heartbeat:*
+
+- Heartbeat to jeden skrypt Lua (ZADD + oznaczenie gościa/bota)
+- Liczniki online to ZCOUNT po zakresie czasu (O(log n)), bez KEYS/SCAN
+- Status w tabeli users synchronizowany zbiorczo (kilka zapytań na cykl)
+"""
+import time
+from typing import Dict, List
+
+from config import REDIS_PREFIX_PRESENCE
+from services.redis_service import get_redis_client
+
+# Po tylu sekundach bez heartbeat użytkownik jest offline
+PRESENCE_TTL = 180
+
+# Maksymalna liczba ID przetwarzanych w jednym kroku synchronizacji
+PRESENCE_SYNC_BATCH = 1000
+
+PRESENCE_ONLINE = f"{REDIS_PREFIX_PRESENCE}online"
+PRESENCE_GUESTS = f"{REDIS_PREFIX_PRESENCE}guests"
+PRESENCE_BOTS = f"{REDIS_PREFIX_PRESENCE}bots"
+# Użytkownicy, którzy pojawili się online od ostatniej synchronizacji z bazą
+PRESENCE_DIRTY = f"{REDIS_PREFIX_PRESENCE}came_online"
+
+PRESENCE_KINDS = {
+    'all': PRESENCE_ONLINE,
+    'guest': PRESENCE_GUESTS,
+    'bot': PRESENCE_BOTS,
+}
+
+# ============================================
+# LUA
+# ============================================
+
+# KEYS: online, guests, bots, dirty; ARGV: user_id, now, is_guest, is_bot
+LUA_TOUCH = """
+local added = redis.call('ZADD', KEYS[1], ARGV[2], ARGV[1])
+if ARGV[3] == '1' then redis.call('ZADD', KEYS[2], ARGV[2], ARGV[1]) end
+if ARGV[4] == '1' then redis.call('ZADD', KEYS[3], ARGV[2], ARGV[1]) end
+if added == 1 then redis.call('SADD', KEYS[4], ARGV[1]) end
+return added
+"""
+
+# KEYS: online, guests, bots; ARGV: cutoff, limit
+# Zwraca ID usunięte z obecności
+LUA_EXPIRE = """
+local ids = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+if #ids > 0 then
+    redis.call('ZREM', KEYS[1], unpack(ids))
+    redis.call('ZREM', KEYS[2], unpack(ids))
+    redis.call('ZREM', KEYS[3], unpack(ids))
+end
+return ids
+"""
+
+# ============================================
+# PRESENCE SERVICE CLASS
+# ============================================
+
+class PresenceService:
+    """Obecność użytkowników w Redis"""
+    
+    @property
+    def redis(self):
+        return get_redis_client()
+    
+    async def touch(self, user_id: int, is_guest: bool = False, is_bot: bool = False) -> bool:
+        """
+        Heartbeat - jeden zapis do Redis
+        
+        Args:
+            user_id: ID użytkownika
+            is_guest: Czy to gość
+            is_bot: Czy to bot
+        
+        Returns:
+            bool: True jeśli użytkownik właśnie pojawił się online
+        """
+        try:
+            added = await self.redis.eval(
+                LUA_TOUCH, 4,
+                PRESENCE_ONLINE, PRESENCE_GUESTS, PRESENCE_BOTS, PRESENCE_DIRTY,
+                user_id, time.time(), int(is_guest), int(is_bot)
+            )
+            return bool(added)
+        except Exception as e:
+            print(f"❌ Presence touch error [{user_id}]: {e}")
+            return False
+    
+    async def remove(self, user_id: int):
+        """Usuń użytkownika z obecności (logout / zamknięcie karty)"""
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for key in PRESENCE_KINDS.values():
+                pipe.zrem(key, user_id)
+            pipe.srem(PRESENCE_DIRTY, user_id)
+            await pipe.execute()
+        except Exception as e:
+            print(f"❌ Presence remove error [{user_id}]: {e}")
+    
+    async def is_online(self, user_id: int) -> bool:
+        """Czy użytkownik miał heartbeat w ciągu PRESENCE_TTL"""
+        try:
+            score = await self.redis.zscore(PRESENCE_ONLINE, user_id)
+            return score is not None and score >= time.time() - PRESENCE_TTL
+        except Exception as e:
+            print(f"❌ Presence is_online error [{user_id}]: {e}")
+            return False
+    
+    async def count_online(self, kind: str = 'all') -> int:
+        """
+        Liczba użytkowników online (ZCOUNT po zakresie last_seen)
+        
+        Args:
+            kind: 'all', 'guest' lub 'bot'
+        
+        Returns:
+            int: Liczba użytkowników online
+        """
+        try:
+            return await self.redis.zcount(
+                PRESENCE_KINDS[kind], time.time() - PRESENCE_TTL, '+inf'
+            )
+        except Exception as e:
+            print(f"❌ Presence count error [{kind}]: {e}")
+            return 0
+    
+    async def get_counts(self) -> Dict[str, int]:
+        """Liczniki online dla wszystkich rodzajów (jeden pipeline)"""
+        try:
+            cutoff = time.time() - PRESENCE_TTL
+            pipe = self.redis.pipeline(transaction=False)
+            for key in PRESENCE_KINDS.values():
+                pipe.zcount(key, cutoff, '+inf')
+            counts = await pipe.execute()
+            return dict(zip(PRESENCE_KINDS.keys(), counts))
+        except Exception as e:
+            print(f"❌ Presence counts error: {e}")
+            return {kind: 0 for kind in PRESENCE_KINDS}
+    
+    async def get_online_ids(self, user_ids: List[int]) -> List[int]:
+        """
+        Które z podanych ID są online (jedno ZMSCORE)
+        
+        Args:
+            user_ids: Lista ID użytkowników
+        
+        Returns:
+            List[int]: ID użytkowników online
+        """
+        if not user_ids:
+            return []
+        try:
+            cutoff = time.time() - PRESENCE_TTL
+            scores = await self.redis.zmscore(PRESENCE_ONLINE, user_ids)
+            return [
+                user_id for user_id, score in zip(user_ids, scores)
+                if score is not None and score >= cutoff
+            ]
+        except Exception as e:
+            print(f"❌ Presence get_online_ids error: {e}")
+            return []
+    
+    async def expire_stale(self) -> List[int]:
+        """Usuń z obecności użytkowników bez heartbeat dłużej niż PRESENCE_TTL"""
+        ids = await self.redis.eval(
+            LUA_EXPIRE, 3,
+            PRESENCE_ONLINE, PRESENCE_GUESTS, PRESENCE_BOTS,
+            time.time() - PRESENCE_TTL, PRESENCE_SYNC_BATCH
+        )
+        return [int(i) for i in ids]
+    
+    async def pop_came_online(self) -> List[int]:
+        """Pobierz (i wyczyść) użytkowników, którzy pojawili się online"""
+        ids = await self.redis.spop(PRESENCE_DIRTY, PRESENCE_SYNC_BATCH)
+        return [int(i) for i in ids or []]
+    
+    async def sync_status_to_db(self) -> Dict[str, int]:
+        """
+        Zbiorcza synchronizacja users.status z obecnością w Redis
+        
+        - nowi online: jeden UPDATE ... WHERE id IN (...) AND status = 'offline'
+        - online w bazie bez heartbeat: jeden SELECT id + ZMSCORE + jeden UPDATE
+        
+        Returns:
+            Dict[str, int]: {'online': ..., 'offline': ..., 'expired': ...}
+        """
+        from database import async_sessionmaker, User
+        from sqlalchemy import select, update
+        
+        came_online = await self.pop_came_online()
+        expired = await self.expire_stale()
+        went_offline = 0
+        
+        try:
+            async with async_sessionmaker() as session:
+                if came_online:
+                    await session.execute(
+                        update(User)
+                        .where(User.id.in_(came_online), User.status == 'offline')
+                        .values(status='online')
+                    )
+                
+                result = await session.execute(
+                    select(User.id).where(User.status == 'online')
+                )
+                db_online = [row[0] for row in result.all()]
+                
+                if db_online:
+                    # Błąd Redis przerywa cykl - nigdy nie oznaczamy wszystkich jako offline
+                    cutoff = time.time() - PRESENCE_TTL
+                    scores = await self.redis.zmscore(PRESENCE_ONLINE, db_online)
+                    stale = [
+                        user_id for user_id, score in zip(db_online, scores)
+                        if score is None or score < cutoff
+                    ]
+                
+                    if stale:
+                        await session.execute(
+                            update(User)
+                            .where(User.id.in_(stale), User.status == 'online')
+                            .values(status='offline')
+                        )
+                        went_offline = len(stale)
+                
+                await session.commit()
+        
+        except Exception:
+            # Nie gub nowych online - spróbujemy w następnym cyklu
+            if came_online:
+                await self.redis.sadd(PRESENCE_DIRTY, *came_online)
+            raise
+        
+        return {
+            'online': len(came_online),
+            'offline': went_offline,
+            'expired': len(expired)
+        }
+
+# Singleton
+presence_service = PresenceService()
@@ -2,11 +2,23 @@
 Service: Redis
 Odpowiedzialność: Wszystkie operacje na Redis (save/load game, lobby, etc.)
 """
+import inspect
 import json
+import re
+import time
+import heapq
 import cloudpickle
-from redis.asyncio import Redis, from_url
-from typing import Optional, Dict, Any, List
-from config import settings, REDIS_PREFIX_LOBBY, REDIS_PREFIX_GAME, REDIS_PREFIX_USER
+from contextlib import asynccontextmanager
+from redis.asyncio import Redis
+from typing import Optional, Dict, Any, List, Tuple, Union, Iterable, Callable
+from config import (
+    settings, REDIS_PREFIX_LOBBY, REDIS_PREFIX_GAME, REDIS_PREFIX_USER,
+    REDIS_PREFIX_LOBBY_INDEX
+)
+from redis_utils import (
+    RedisLock, StaleFencingTokenError, lock_metrics, close_lock_notifiers,
+    is_cluster_client, instrument_roundtrips
+)
 
 # Singleton Redis client
 _redis_client: Optional[Redis] = None
@@ -20,13 +32,14 @@ async def init_redis() -> Redis:
     """
     global _redis_client
     if _redis_client is None:
-        _redis_client = from_url(
-            f"redis://{settings.REDIS_HOST}:{settings.REDIS_PORT}/{settings.REDIS_DB}",
-            password=settings.REDIS_PASSWORD,
-            decode_responses=False  # Dla pickle (binarny)
-        )
+        from services.storage_service import create_storage_client, restore_storage_snapshot
+        
+        # Backend z konfiguracji (STORAGE_BACKEND): serwer Redis lub magazyn w procesie
+        # Round-tripy liczone per żądanie (middleware w main.py)
+        _redis_client = instrument_roundtrips(create_storage_client())
         await _redis_client.ping()
-        print("✅ Redis połączony")
+        await restore_storage_snapshot(_redis_client)
+        print(f"✅ Redis połączony (backend: {settings.STORAGE_BACKEND})")
     return _redis_client
 
 def get_redis_client() -> Redis:
@@ -47,6 +60,7 @@ async def close_redis():
     """Zamknij połączenie Redis (wywoływane przy shutdown)"""
     global _redis_client
     if _redis_client:
+        await close_lock_notifiers()
         await _redis_client.close()
         _redis_client = None
         print("👋 Redis zamknięty")
@@ -54,19 +68,468 @@ async def close_redis():
 # ============================================
 # KEY HELPERS
 # ============================================
+# Wszystkie klucze jednej gry mają hash tag {id_gry} - w Redis Cluster
+# trafiają do tego samego slotu, więc skrypty Lua, MULTI i wielokluczowe
+# DEL na kluczach gry działają po shardowaniu. Klucze globalne (indeks lobby,
+# obecność, ranking) mają własne tagi rodzin - patrz config.py.
+
+def game_tag(game_id: str) -> str:
+    """Hash tag gry (slot w Redis Cluster)"""
+    return f"{{{game_id}}}"
 
 def lobby_key(lobby_id: str) -> str:
     """Klucz Redis dla lobby"""
-    return f"{REDIS_PREFIX_LOBBY}{lobby_id}"
+    return f"{REDIS_PREFIX_LOBBY}{game_tag(lobby_id)}"
 
 def engine_key(game_id: str) -> str:
     """Klucz Redis dla silnika gry"""
-    return f"{REDIS_PREFIX_GAME}{game_id}"
+    return f"{REDIS_PREFIX_GAME}{game_tag(game_id)}"
+
+def chat_key(lobby_id: str) -> str:
+    """Klucz strumienia wiadomości czatu lobby (ID wpisu = kursor)"""
+    return f"{lobby_key(lobby_id)}:chat:stream"
+
+def lobby_rev_key(lobby_id: str) -> str:
+    """Klucz licznika wersji lobby (kolejność aktualizacji indeksu)"""
+    return f"{lobby_key(lobby_id)}:rev"
+
+def disconnect_key(game_id: str, player_id: str) -> str:
+    """Klucz znacznika rozłączenia gracza w grze"""
+    return f"disconnected:{game_tag(game_id)}:{player_id}"
+
+def game_aux_key(prefix: str, game_id: str) -> str:
+    """Klucz pomocniczy gry (głosowania, powrót do lobby, lock)"""
+    return f"{prefix}{game_tag(game_id)}"
 
 def user_key(username: str) -> str:
     """Klucz Redis dla użytkownika"""
     return f"{REDIS_PREFIX_USER}{username}"
 
+# Lock mutacji gry (silnik + lobby w trakcie gry) i licznik tokenów fencingu
+GAME_LOCK_PREFIX = "lock:game:"
+GAME_FENCE_PREFIX = "fence:game:"
+GAME_LOCK_TIMEOUT = 10  # sekundy (przedłużany w tle)
+GAME_LOCK_WAIT_TIMEOUT = 15.0
+
+def game_lock_key(game_id: str) -> str:
+    """Klucz locka mutacji gry"""
+    return game_aux_key(GAME_LOCK_PREFIX, game_id)
+
+def game_fence_key(game_id: str) -> str:
+    """Klucz licznika tokenów fencingu gry"""
+    return game_aux_key(GAME_FENCE_PREFIX, game_id)
+
+# Klucze pomocnicze gry (głosowania, powrót do lobby) - usuwane razem z grą
+NEXT_ROUND_VOTES_PREFIX = "next_round_votes:"
+STAYING_PLAYERS_PREFIX = "staying_players:"
+RETURN_TIMER_PREFIX = "return_timer_active:"
+RETURN_VOTES_PREFIX = "return_to_lobby_votes:"
+GAME_ENGINE_AUX_PREFIX = "game_engine:"
+
+GAME_AUX_KEY_PREFIXES = (
+    NEXT_ROUND_VOTES_PREFIX,
+    STAYING_PLAYERS_PREFIX,
+    RETURN_TIMER_PREFIX,
+    RETURN_VOTES_PREFIX,
+    GAME_ENGINE_AUX_PREFIX,
+    GAME_LOCK_PREFIX,
+    GAME_FENCE_PREFIX,
+)
+
+def game_keys(game_id: str, players: Iterable[str] = ()) -> List[str]:
+    """
+    Wszystkie klucze gry (jeden slot - można je usunąć jednym DEL)
+    
+    Args:
+        game_id: ID gry
+        players: Nazwy graczy (klucze rozłączeń)
+    
+    Returns:
+        List[str]: Klucze lobby, silnika, czatu, wersji, pomocnicze i rozłączeń
+    """
+    keys = [lobby_key(game_id), engine_key(game_id), chat_key(game_id), lobby_rev_key(game_id)]
+    keys += [game_aux_key(prefix, game_id) for prefix in GAME_AUX_KEY_PREFIXES]
+    keys += [disconnect_key(game_id, player) for player in players]
+    return keys
+
+# ============================================
+# LOBBY INDEX
+# ============================================
+# Indeks lobby (wspólny hash tag {lobby_index} - jeden slot w klastrze):
+#   {lobby_index}:all                      ZSET id -> last_activity
+#   {lobby_index}:status:{status}          ZSET id -> last_activity
+#   {lobby_index}:type:{typ_gry}           ZSET id -> last_activity
+#   {lobby_index}:status:{status}:type:{t} ZSET id -> last_activity
+#   {lobby_index}:created                  ZSET id -> created_at (GC po wieku, rejestr lobby)
+#   {lobby_index}:summary                  HASH id -> kompaktowy JSON
+#   {lobby_index}:rev                      HASH id -> wersja lobby w indeksie
+# Dzięki temu lista lobby kosztuje O(strona), a nie O(wszystkie klucze).
+#
+# Zapis lobby to dwa kroki w dwóch slotach: skrypt w slocie gry (SET + INCR
+# wersji, opcjonalnie fencing) i skrypt w slocie indeksu. Indeks przyjmuje
+# tylko nowszą wersję, więc równoległe mutacje nie cofną podsumowania.
+
+LOBBY_INDEX_ALL = f"{REDIS_PREFIX_LOBBY_INDEX}all"
+LOBBY_INDEX_SUMMARY = f"{REDIS_PREFIX_LOBBY_INDEX}summary"
+LOBBY_INDEX_CREATED = f"{REDIS_PREFIX_LOBBY_INDEX}created"
+LOBBY_INDEX_REVS = f"{REDIS_PREFIX_LOBBY_INDEX}rev"
+# Kursor (score) przeglądu wygasłych wpisów indeksu między przebiegami garbage collectora
+LOBBY_INDEX_PRUNE_CURSOR = f"{REDIS_PREFIX_LOBBY_INDEX}prune_cursor"
+
+# Najkrótszy TTL klucza lobby (zapis z timer_worker) - lobby aktywne
+# później niż LOBBY_MIN_TTL temu nie mogło jeszcze wygasnąć
+LOBBY_MIN_TTL = 21600
+
+# Kanał pub/sub ze zmianami lobby (publikowany przez skrypty Lua indeksu):
+#   {"type": "saved", "id": ..., "summary": {...}} | {"type": "deleted", "id": ...}
+LOBBY_EVENTS_CHANNEL = f"{REDIS_PREFIX_LOBBY_INDEX}events"
+
+def lobby_index_key(status: Optional[str] = None, typ_gry: Optional[str] = None) -> str:
+    """Klucz ZSET indeksu lobby dla statusu i/lub typu gry"""
+    if status and typ_gry:
+        return f"{REDIS_PREFIX_LOBBY_INDEX}status:{status}:type:{typ_gry}"
+    if status:
+        return f"{REDIS_PREFIX_LOBBY_INDEX}status:{status}"
+    if typ_gry:
+        return f"{REDIS_PREFIX_LOBBY_INDEX}type:{typ_gry}"
+    return LOBBY_INDEX_ALL
+
+def build_lobby_summary(lobby_data: dict) -> dict:
+    """
+    Kompaktowe podsumowanie lobby (trzymane w {lobby_index}:summary)
+    
+    Args:
+        lobby_data: Pełne dane lobby
+    
+    Returns:
+        dict: Podsumowanie (bez hasła, sloty tylko z polami dla listy gier)
+    """
+    opcje = lobby_data.get('opcje') or {}
+    slots = lobby_data.get('slots') or []
+    occupied = [s for s in slots if s.get('typ') != 'pusty']
+    
+    return {
+        'id_gry': lobby_data.get('id_gry'),
+        'nazwa': lobby_data.get('nazwa'),
+        'status': lobby_data.get('status_partii') or 'LOBBY',
+        'typ_gry': opcje.get('typ_gry') or '66',
+        'rankingowa': bool(opcje.get('rankingowa')),
+        'has_password': bool(opcje.get('haslo')),
+        'max_graczy': lobby_data.get('max_graczy'),
+        'players': len(occupied),
+        'humans': len([s for s in occupied if s.get('typ') == 'gracz']),
+        'gracze': [s.get('nazwa') for s in occupied],
+        # Kompaktowe sloty (karta lobby na liście gier - kolejność = drużyny)
+        'slots': [
+            {
+                'typ': s.get('typ'),
+                'nazwa': s.get('nazwa'),
+                'id_uzytkownika': s.get('id_uzytkownika'),
+                'is_host': bool(s.get('is_host'))
+            }
+            for s in slots
+        ],
+        'punkty_meczowe': lobby_data.get('punkty_meczowe'),
+        'created_at': lobby_data.get('created_at'),
+        'last_activity': lobby_data.get('last_activity') or lobby_data.get('created_at')
+    }
+
+def _decode(value) -> str:
+    return value.decode('utf-8') if isinstance(value, bytes) else value
+
+# Pola lobby/podsumowania, które zawsze są listami
+_LOBBY_LIST_FIELDS = ('slots', 'kicked_players', 'gracze')
+
+def normalize_lobby(data: dict) -> dict:
+    """
+    Napraw pola-listy po zapisie z Lua (cjson koduje pustą listę jako {})
+    
+    Args:
+        data: Dane lobby lub podsumowanie
+    
+    Returns:
+        dict: Te same dane (zmienione w miejscu)
+    """
+    for field in _LOBBY_LIST_FIELDS:
+        if data.get(field) == {}:
+            data[field] = []
+    return data
+
+# Usuwa lobby z indeksów na podstawie poprzedniego podsumowania.
+# KEYS[1] = summary hash, KEYS[2] = indeks all
+# ARGV[1] = lobby id, ARGV[2] = prefiks indeksu,
+# ARGV[3]/ARGV[4] = nowy status/typ (pomijane przy ZREM) lub ''
+_LUA_UNINDEX_OLD = """
+local old = redis.call('HGET', KEYS[1], ARGV[1])
+if old then
+    local ok, s = pcall(cjson.decode, old)
+    if ok and type(s) == 'table' then
+        local st = s['status']
+        local tg = s['typ_gry']
+        if type(st) ~= 'string' then st = nil end
+        if type(tg) ~= 'string' then tg = nil end
+        if st and st ~= ARGV[3] then
+            redis.call('ZREM', ARGV[2] .. 'status:' .. st, ARGV[1])
+        end
+        if tg and tg ~= ARGV[4] then
+            redis.call('ZREM', ARGV[2] .. 'type:' .. tg, ARGV[1])
+        end
+        if st and tg and (st ~= ARGV[3] or tg ~= ARGV[4]) then
+            redis.call('ZREM', ARGV[2] .. 'status:' .. st .. ':type:' .. tg, ARGV[1])
+        end
+    end
+end
+"""
+
+# Zapis lobby w slocie gry (+ wersja), pod lockiem tylko z aktualnym tokenem fencingu
+# KEYS[1] = klucz lobby, KEYS[2] = wersja lobby, KEYS[3] = licznik fencingu (opcjonalnie)
+# ARGV: json lobby, ttl, token ('' bez locka), oczekiwana wersja ('' = bez sprawdzania)
+# Zwraca: nową wersję lobby, 0 (nieaktualny token) albo -1 (lobby zmienione od odczytu)
+LUA_WRITE_LOBBY = """
+if KEYS[3] and redis.call('GET', KEYS[3]) ~= ARGV[3] then
+    return 0
+end
+if ARGV[4] ~= '' and tonumber(redis.call('GET', KEYS[2]) or '0') ~= tonumber(ARGV[4]) then
+    return -1
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', tonumber(ARGV[2]))
+local rev = redis.call('INCR', KEYS[2])
+redis.call('EXPIRE', KEYS[2], tonumber(ARGV[2]))
+return rev
+"""
+
+# Aktualizacja indeksu po zapisie lobby (slot indeksu) - tylko nowsza wersja
+# KEYS[1] = summary, KEYS[2] = all, KEYS[3] = wersje
+# ARGV: id, prefiks, status, typ, score, json summary, created_at, wersja
+LUA_INDEX_LOBBY = """
+local rev = tonumber(ARGV[8])
+if rev <= tonumber(redis.call('HGET', KEYS[3], ARGV[1]) or '0') then
+    return 0
+end
+""" + _LUA_UNINDEX_OLD + """
+local score = tonumber(ARGV[5])
+redis.call('ZADD', KEYS[2], score, ARGV[1])
+redis.call('ZADD', ARGV[2] .. 'created', tonumber(ARGV[7]), ARGV[1])
+redis.call('ZADD', ARGV[2] .. 'status:' .. ARGV[3], score, ARGV[1])
+redis.call('ZADD', ARGV[2] .. 'type:' .. ARGV[4], score, ARGV[1])
+redis.call('ZADD', ARGV[2] .. 'status:' .. ARGV[3] .. ':type:' .. ARGV[4], score, ARGV[1])
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[6])
+redis.call('HSET', KEYS[3], ARGV[1], rev)
+redis.call('PUBLISH', '""" + LOBBY_EVENTS_CHANNEL + """',
+    '{"type":"saved","id":' .. cjson.encode(ARGV[1]) .. ',"summary":' .. ARGV[6] .. '}')
+return 1
+"""
+
+# Usunięcie lobby z indeksu (klucze gry usuwa osobny DEL w slocie gry)
+# KEYS[1] = summary, KEYS[2] = all, KEYS[3] = wersje
+# ARGV: id, prefiks
+LUA_UNINDEX_LOBBY = _LUA_UNINDEX_OLD + """
+redis.call('ZREM', KEYS[2], ARGV[1])
+redis.call('ZREM', ARGV[2] .. 'created', ARGV[1])
+redis.call('HDEL', KEYS[3], ARGV[1])
+if redis.call('HDEL', KEYS[1], ARGV[1]) == 1 then
+    redis.call('PUBLISH', '""" + LOBBY_EVENTS_CHANNEL + """', cjson.encode({type = 'deleted', id = ARGV[1]}))
+    return 1
+end
+return 0
+"""
+
+# Zapis silnika gry pod lockiem (sprawdzenie tokenu fencingu)
+# KEYS[1] = klucz silnika, KEYS[2] = licznik fencingu; ARGV: token, dane, ttl
+LUA_SAVE_ENGINE_FENCED = """
+if redis.call('GET', KEYS[2]) ~= ARGV[1] then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', tonumber(ARGV[3]))
+return 1
+"""
+
+# ============================================
+# CHAT (REDIS STREAMS)
+# ============================================
+# Czat lobby: strumień lobby:{id}:chat:stream, wpis {'m': json wiadomości}.
+# ID wpisu to kursor - historia stronicowana kursorem, a WebSocket dosyła
+# wiadomości nowsze niż ostatni widziany kursor. Każdy zapis publikuje
+# {id, cursor} na CHAT_EVENTS_CHANNEL (przekaźnik czatu w każdym procesie).
+
+CHAT_MAX_MESSAGES = 100
+CHAT_TTL = 86400
+CHAT_EVENTS_CHANNEL = "chat:events"
+
+# Funkcja Lua współdzielona z LUA_LOBBY_MUTATE (operacja 'chat')
+LUA_CHAT_APPEND_FN = """
+local function chat_append(key, message, maxlen, ttl, lobby_id)
+    local cursor = redis.call('XADD', key, 'MAXLEN', '~', maxlen, '*', 'm', message)
+    redis.call('EXPIRE', key, ttl)
+    redis.call('PUBLISH', '""" + CHAT_EVENTS_CHANNEL + """', cjson.encode({id = lobby_id, cursor = cursor}))
+    return cursor
+end
+"""
+
+# KEYS[1] = strumień czatu; ARGV: json wiadomości, maxlen, ttl, id lobby
+LUA_CHAT_APPEND = LUA_CHAT_APPEND_FN + """
+return chat_append(KEYS[1], ARGV[1], ARGV[2], ARGV[3], ARGV[4])
+"""
+
+_CHAT_CURSOR_RE = re.compile(r'^\d+-\d+$')
+
+def is_chat_cursor(cursor: Optional[str]) -> bool:
+    """Czy to poprawny kursor czatu (ID wpisu strumienia "ms-seq")"""
+    return bool(cursor) and bool(_CHAT_CURSOR_RE.match(cursor))
+
+def append_chat_message(
+    client,
+    lobby_id: str,
+    message: dict,
+    max_messages: int = CHAT_MAX_MESSAGES,
+    ttl: int = CHAT_TTL
+):
+    """Dopisz wiadomość do strumienia czatu (zwraca kursor wpisu)"""
+    return client.eval(
+        LUA_CHAT_APPEND, 1, chat_key(lobby_id),
+        json.dumps(message), max_messages, ttl, lobby_id
+    )
+
+def parse_chat_entries(entries) -> List[dict]:
+    """Wpisy XRANGE/XREAD -> wiadomości z polem 'cursor'"""
+    messages = []
+    for entry_id, fields in entries:
+        try:
+            message = json.loads(fields.get(b'm') or fields.get('m'))
+        except (TypeError, ValueError):
+            continue
+        message['cursor'] = _decode(entry_id)
+        messages.append(message)
+    return messages
+
+# ============================================
+# LOBBY WRITE HELPERS
+# ============================================
+# Wspólne dla RedisService, LobbyService i timer_worker (własny klient).
+# index_lobby/unindex_lobby przyjmują klienta albo pipeline (wtedy tylko kolejkują komendę).
+
+# Klucze przejściowe (tylko w pamięci procesu) - nie trafiają do Redis
+LOBBY_TRANSIENT_KEYS = ('timer_task', 'bot_loop_lock')
+
+# Próby odczytu-modyfikacji-zapisu lobby przy równoległych zmianach (update_stored_lobby)
+LOBBY_UPDATE_RETRIES = 5
+
+class LobbyWriteConflictError(Exception):
+    """Lobby zmieniane równolegle przy każdej próbie zapisu z kontrolą wersji"""
+
+def index_lobby(client, lobby_id: str, summary: dict, rev: int):
+    """Zaktualizuj indeks lobby podsumowaniem w wersji `rev`"""
+    score = summary['last_activity'] or time.time()
+    return client.eval(
+        LUA_INDEX_LOBBY, 3,
+        LOBBY_INDEX_SUMMARY, LOBBY_INDEX_ALL, LOBBY_INDEX_REVS,
+        lobby_id, REDIS_PREFIX_LOBBY_INDEX,
+        summary['status'], summary['typ_gry'],
+        score, json.dumps(summary), summary['created_at'] or score, rev
+    )
+
+def unindex_lobby(client, lobby_id: str):
+    """Usuń lobby z indeksu (publikuje zdarzenie "deleted")"""
+    return client.eval(
+        LUA_UNINDEX_LOBBY, 3,
+        LOBBY_INDEX_SUMMARY, LOBBY_INDEX_ALL, LOBBY_INDEX_REVS,
+        lobby_id, REDIS_PREFIX_LOBBY_INDEX, '', ''
+    )
+
+async def store_lobby(
+    client: Redis,
+    lobby_id: str,
+    lobby_data: dict,
+    ttl: int,
+    lock: Optional[RedisLock] = None,
+    expected_rev: Optional[int] = None
+) -> int:
+    """
+    Zapisz lobby (slot gry) i zaktualizuj indeks (slot indeksu)
+    
+    Args:
+        client: Klient Redis
+        lobby_id: ID lobby
+        lobby_data: Dane lobby (bez kluczy przejściowych)
+        ttl: Czas życia klucza (sekundy)
+        lock: Trzymany lock gry - zapis tylko z aktualnym tokenem fencingu
+        expected_rev: Wersja z odczytu - zapis tylko, jeśli lobby od tej pory się nie zmieniło
+    
+    Returns:
+        int: Wersja zapisanego lobby (0 = odrzucony przez fencing, -1 = lobby zmienione od odczytu)
+    """
+    keys = [lobby_key(lobby_id), lobby_rev_key(lobby_id)]
+    args = [json.dumps(lobby_data), ttl, '', '' if expected_rev is None else expected_rev]
+    if lock is not None:
+        keys.append(lock.fence_key)
+        args[2] = lock.token
+    
+    rev = await client.eval(LUA_WRITE_LOBBY, len(keys), *keys, *args)
+    if rev > 0:
+        await index_lobby(client, lobby_id, build_lobby_summary(lobby_data), rev)
+    return rev
+
+async def load_lobby(client: Redis, lobby_id: str) -> Tuple[Optional[dict], int]:
+    """Lobby razem z wersją (jeden MGET w slocie gry); (None, 0) gdy brak lobby"""
+    raw, rev = await client.mget([lobby_key(lobby_id), lobby_rev_key(lobby_id)])
+    if not raw:
+        return None, 0
+    return normalize_lobby(json.loads(raw.decode('utf-8'))), int(rev or 0)
+
+async def update_stored_lobby(
+    client: Redis,
+    lobby_id: str,
+    mutate: Callable[[dict], Any],
+    ttl: int,
+    lock: Optional[RedisLock] = None
+) -> Tuple[Optional[dict], Optional[int]]:
+    """
+    Odczyt-modyfikacja-zapis lobby z kontrolą wersji
+    
+    Operacje LobbyService (Lua) nie biorą locka gry - jeśli któraś zmieni
+    lobby między odczytem a zapisem, zapis jest odrzucany, a `mutate`
+    wołane ponownie na świeżych danych (dlatego bez efektów ubocznych).
+    
+    Args:
+        client: Klient Redis
+        lobby_id: ID lobby
+        mutate: Zmienia lobby w miejscu (może być async); False = bez zapisu
+        ttl: Czas życia klucza (sekundy)
+        lock: Trzymany lock gry
+    
+    Returns:
+        Tuple: (lobby po zmianie albo None gdy brak lobby,
+                wersja zapisu: None = bez zapisu, 0 = odrzucony przez fencing)
+    
+    Raises:
+        LobbyWriteConflictError: Lobby zmieniane przy każdej z LOBBY_UPDATE_RETRIES prób
+    """
+    for _ in range(LOBBY_UPDATE_RETRIES):
+        lobby, rev = await load_lobby(client, lobby_id)
+        if lobby is None:
+            return None, None
+        
+        result = mutate(lobby)
+        if inspect.isawaitable(result):
+            result = await result
+        if result is False:
+            return lobby, None
+        
+        clean_data = {k: v for k, v in lobby.items() if k not in LOBBY_TRANSIENT_KEYS}
+        new_rev = await store_lobby(client, lobby_id, clean_data, ttl, lock, expected_rev=rev)
+        if new_rev >= 0:
+            return lobby, new_rev
+    
+    raise LobbyWriteConflictError(f"Lobby {lobby_id} zmieniane równolegle - zapis porzucony")
+
+async def mget_keys(client: Redis, keys: List[str]) -> List[Optional[bytes]]:
+    """MGET kluczy różnych gier (w klastrze rozbity na sloty)"""
+    if not keys:
+        return []
+    if is_cluster_client(client):
+        return await client.mget_nonatomic(keys)
+    return await client.mget(keys)
+
 # ============================================
 # REDIS SERVICE CLASS
 # ============================================
@@ -82,33 +545,114 @@ class RedisService:
     # LOBBY OPERATIONS
     # ============================================
     
-    async def save_lobby(self, lobby_id: str, lobby_data: dict) -> bool:
+    def game_lock(self, game_id: str) -> RedisLock:
+        """
+        Lock mutacji gry (silnik + lobby w trakcie gry) między procesami
+        
+        Zapisy pod lockiem przekazują go do save_game_engine/save_lobby,
+        które odrzucają zapis z nieaktualnym tokenem fencingu.
+        
+        Args:
+            game_id: ID gry
+        
+        Returns:
+            RedisLock: Lock (async with), przedłużany w tle
+        """
+        return RedisLock(
+            self.redis, game_lock_key(game_id),
+            timeout=GAME_LOCK_TIMEOUT,
+            fence_key=game_fence_key(game_id),
+            auto_renew=True,
+            wait_timeout=GAME_LOCK_WAIT_TIMEOUT
+        )
+    
+    @asynccontextmanager
+    async def held_game_lock(self, game_id: str, lock: Optional[RedisLock] = None):
+        """
+        Lock gry na czas bloku: przekazany (już trzymany przez wywołującego)
+        albo zdobyty tutaj - dla funkcji wołanych zarówno pod lockiem, jak i bez niego
+        
+        Usage:
+            async with redis.held_game_lock(game_id, lock) as lock:
+                await redis.save_lobby(game_id, lobby_data, lock=lock)
+        """
+        if lock is not None:
+            yield lock
+            return
+        async with self.game_lock(game_id) as new_lock:
+            yield new_lock
+    
+    def _stale_write(self, lock: RedisLock, what: str):
+        lock_metrics.record(lock.lock_key, 'stale_writes')
+        return StaleFencingTokenError(
+            f"Odrzucono zapis {what}: nieaktualny token fencingu {lock.token} ({lock.lock_key})"
+        )
+    
+    async def save_lobby(self, lobby_id: str, lobby_data: dict, lock: Optional[RedisLock] = None) -> bool:
         """
         Zapisz lobby do Redis
         
         Args:
             lobby_id: ID lobby
             lobby_data: Dane lobby (dict)
+            lock: Trzymany lock gry - zapis tylko z aktualnym tokenem fencingu
         
         Returns:
             bool: True jeśli sukces
+        
+        Raises:
+            StaleFencingTokenError: Jeśli lock przejął inny proces
         """
         try:
             # Usuwamy klucze przejściowe przed zapisem
-            clean_data = lobby_data.copy()
-            clean_data.pop("timer_task", None)
-            clean_data.pop("bot_loop_lock", None)
+            clean_data = {k: v for k, v in lobby_data.items() if k not in LOBBY_TRANSIENT_KEYS}
             
-            json_data = json.dumps(clean_data)
-            await self.redis.set(
-                lobby_key(lobby_id),
-                json_data,
-                ex=self.expiration
-            )
-            return True
+            # Zapis w slocie gry, potem indeks (tylko nowsza wersja)
+            saved = await store_lobby(self.redis, lobby_id, clean_data, self.expiration, lock)
         except Exception as e:
             print(f"❌ Redis save_lobby error [{lobby_id}]: {e}")
             return False
+        
+        if not saved:
+            raise self._stale_write(lock, f"lobby {lobby_id}")
+        return True
+    
+    async def update_lobby(
+        self,
+        lobby_id: str,
+        mutate: Callable[[dict], Any],
+        lock: Optional[RedisLock] = None
+    ) -> Optional[dict]:
+        """
+        Odczyt-modyfikacja-zapis lobby z kontrolą wersji (zob. update_stored_lobby)
+        
+        Usage:
+            async with redis.game_lock(game_id) as lock:
+                await redis.update_lobby(game_id, lambda lobby: lobby.update(status_partii='ZAKONCZONA'), lock=lock)
+        
+        Args:
+            lobby_id: ID lobby
+            mutate: Zmienia lobby w miejscu (może być async); False = bez zapisu
+            lock: Trzymany lock gry - zapis tylko z aktualnym tokenem fencingu
+        
+        Returns:
+            Optional[dict]: Lobby po zmianie (None = brak lobby albo błąd)
+        
+        Raises:
+            StaleFencingTokenError: Jeśli lock przejął inny proces
+            LobbyWriteConflictError: Lobby zmieniane równolegle przy każdej próbie
+        """
+        try:
+            lobby, rev = await update_stored_lobby(self.redis, lobby_id, mutate, self.expiration, lock)
+        except LobbyWriteConflictError:
+            raise
+        except Exception as e:
+            print(f"❌ Redis update_lobby error [{lobby_id}]: {e}")
+            return None
+        
+        if rev == 0:
+            raise self._stale_write(lock, f"lobby {lobby_id}")
+        return lobby
     
     async def get_lobby(self, lobby_id: str) -> Optional[dict]:
         """
@@ -123,45 +667,414 @@ class RedisService:
         try:
             json_data = await self.redis.get(lobby_key(lobby_id))
             if json_data:
-                return json.loads(json_data.decode('utf-8'))
+                return normalize_lobby(json.loads(json_data.decode('utf-8')))
             return None
         except Exception as e:
             print(f"❌ Redis get_lobby error [{lobby_id}]: {e}")
             return None
     
-    async def list_lobbies(self) -> List[dict]:
+    async def list_lobbies(
+        self,
+        status: Union[str, Iterable[str], None] = None,
+        typ_gry: Optional[str] = None,
+        offset: int = 0,
+        limit: Optional[int] = None
+    ) -> List[dict]:
         """
-        Lista wszystkich lobby
+        Lista lobby z indeksu (od najnowszej aktywności)
+        
+        Args:
+            status: Status lub lista statusów (None = wszystkie)
+            typ_gry: Filtr typu gry (None = wszystkie)
+            offset: Ile pozycji pominąć
+            limit: Maksymalna liczba wyników (None = bez limitu)
         
         Returns:
-            List[dict]: Lista lobby
+            List[dict]: Lista lobby (pełne dane)
         """
         try:
-            # Pobierz wszystkie klucze lobby:* (ale bez :chat)
-            pattern = f"{REDIS_PREFIX_LOBBY}*"
-            keys = []
-            async for key in self.redis.scan_iter(match=pattern):
-                key_str = key.decode('utf-8') if isinstance(key, bytes) else key
-                
-                # ✅ POPRAWIONE - Pomiń klucze czatu
-                if ':chat' in key_str:
-                    continue
-                
-                keys.append(key)
+            ids = await self._query_lobby_index(status, typ_gry, offset, limit)
+            if not ids:
+                return []
+            
+            # Jedno MGET zamiast GET per lobby (w klastrze - jedno na slot)
+            values = await mget_keys(self.redis, [lobby_key(lobby_id) for lobby_id in ids])
             
-            # Pobierz dane dla każdego lobby
             lobbies = []
-            for key in keys:
-                json_data = await self.redis.get(key)
+            missing = []
+            for lobby_id, json_data in zip(ids, values):
                 if json_data:
-                    lobby_data = json.loads(json_data.decode('utf-8'))
-                    lobbies.append(lobby_data)
+                    lobbies.append(normalize_lobby(json.loads(json_data.decode('utf-8'))))
+                else:
+                    missing.append(lobby_id)
+            
+            # Lobby wygasło (TTL) bez delete_lobby - posprzątaj indeks
+            if missing:
+                await self._unindex_lobbies(missing)
             
             return lobbies
         except Exception as e:
             print(f"❌ Redis list_lobbies error: {e}")
             return []
     
+    async def list_lobby_summaries(
+        self,
+        status: Union[str, Iterable[str], None] = None,
+        typ_gry: Optional[str] = None,
+        offset: int = 0,
+        limit: Optional[int] = None
+    ) -> List[dict]:
+        """
+        Lista kompaktowych podsumowań lobby (HMGET z {lobby_index}:summary)
+        
+        Args:
+            status: Status lub lista statusów (None = wszystkie)
+            typ_gry: Filtr typu gry (None = wszystkie)
+            offset: Ile pozycji pominąć
+            limit: Maksymalna liczba wyników (None = bez limitu)
+        
+        Returns:
+            List[dict]: Podsumowania (patrz build_lobby_summary)
+        """
+        try:
+            ids = await self._query_lobby_index(status, typ_gry, offset, limit)
+            if not ids:
+                return []
+            
+            values = await self.redis.hmget(LOBBY_INDEX_SUMMARY, ids)
+            
+            # Podsumowanie nie wygasa razem z lobby (TTL) - sprawdź, czy klucze jeszcze są
+            exists = await self._lobbies_exist(ids)
+            missing = [lobby_id for lobby_id, raw in zip(ids, values) if not raw or not exists[lobby_id]]
+            if missing:
+                await self._unindex_lobbies(missing)
+            
+            return [
+                normalize_lobby(json.loads(raw.decode('utf-8')))
+                for lobby_id, raw in zip(ids, values)
+                if raw and exists[lobby_id]
+            ]
+        except Exception as e:
+            print(f"❌ Redis list_lobby_summaries error: {e}")
+            return []
+    
+    async def count_lobbies(
+        self,
+        status: Union[str, Iterable[str], None] = None,
+        typ_gry: Optional[str] = None
+    ) -> int:
+        """
+        Liczba lobby w indeksie (ZCARD, bez ładowania danych)
+        
+        Wpisy lobby wygasłych po TTL znikają przy odczycie listy
+        albo w prune_lobby_index (garbage collector).
+        
+        Args:
+            status: Status lub lista statusów (None = wszystkie)
+            typ_gry: Filtr typu gry (None = wszystkie)
+        
+        Returns:
+            int: Liczba lobby
+        """
+        try:
+            keys = self._lobby_index_keys(status, typ_gry)
+            pipe = self.redis.pipeline(transaction=False)
+            for key in keys:
+                pipe.zcard(key)
+            return sum(await pipe.execute())
+        except Exception as e:
+            print(f"❌ Redis count_lobbies error: {e}")
+            return 0
+    
+    def _lobby_index_keys(
+        self,
+        status: Union[str, Iterable[str], None],
+        typ_gry: Optional[str]
+    ) -> List[str]:
+        """Klucze ZSET indeksu dla podanych filtrów"""
+        if status is None:
+            return [lobby_index_key(None, typ_gry)]
+        
+        statuses = [status] if isinstance(status, str) else list(status)
+        return [lobby_index_key(st, typ_gry) for st in statuses]
+    
+    async def _query_lobby_index(
+        self,
+        status: Union[str, Iterable[str], None],
+        typ_gry: Optional[str],
+        offset: int,
+        limit: Optional[int]
+    ) -> List[str]:
+        """
+        Zwróć ID lobby ze strony indeksu (malejąco po last_activity)
+        
+        Przy kilku statusach pobiera z każdego ZSET tylko offset+limit
+        pozycji i scala je po score - koszt zależy od rozmiaru strony.
+        """
+        keys = self._lobby_index_keys(status, typ_gry)
+        stop = -1 if limit is None else offset + limit - 1
+        
+        pipe = self.redis.pipeline(transaction=False)
+        for key in keys:
+            pipe.zrevrange(key, 0, stop, withscores=True)
+        results = await pipe.execute()
+        
+        if len(results) == 1:
+            entries = results[0]
+        else:
+            entries = list(heapq.merge(*results, key=lambda e: e[1], reverse=True))
+        
+        ids = [
+            member.decode('utf-8') if isinstance(member, bytes) else member
+            for member, _ in entries
+        ]
+        
+        if limit is None:
+            return ids[offset:]
+        return ids[offset:offset + limit]
+    
+    async def _unindex_lobbies(self, lobby_ids: List[str]):
+        """Usuń wpisy indeksu dla lobby, których klucze już nie istnieją"""
+        pipe = self.redis.pipeline(transaction=False)
+        for lobby_id in lobby_ids:
+            unindex_lobby(pipe, lobby_id)
+        await pipe.execute()
+    
+    async def _lobbies_exist(self, lobby_ids: List[str]) -> Dict[str, bool]:
+        """EXISTS kluczy lobby w jednym pipeline (w klastrze - per węzeł)"""
+        pipe = self.redis.pipeline(transaction=False)
+        for lobby_id in lobby_ids:
+            pipe.exists(lobby_key(lobby_id))
+        return {lobby_id: bool(found) for lobby_id, found in zip(lobby_ids, await pipe.execute())}
+    
+    async def prune_lobby_index(self, batch_size: int = 500) -> int:
+        """
+        Usuń z indeksu lobby, które wygasły (TTL) bez delete_lobby
+        
+        Sprawdza tylko kandydatów: wpisy {lobby_index}:all bez aktywności
+        dłużej niż LOBBY_MIN_TTL, najwyżej batch_size na przebieg. Kursor
+        (score ostatniego wpisu) przechodzi do kolejnego przebiegu, a po
+        końcu zakresu przegląd zaczyna się od początku. Listy lobby usuwają
+        wygasłe wpisy od razu przy odczycie (list_lobby_summaries).
+        
+        Args:
+            batch_size: Ilu kandydatów sprawdzić w tym przebiegu
+        
+        Returns:
+            int: Liczba usuniętych wpisów
+        """
+        try:
+            cursor = await self.redis.get(LOBBY_INDEX_PRUNE_CURSOR)
+            entries = await self.redis.zrangebyscore(
+                LOBBY_INDEX_ALL, f"({_decode(cursor)}" if cursor else '-inf', time.time() - LOBBY_MIN_TTL,
+                start=0, num=batch_size, withscores=True
+            )
+            if len(entries) < batch_size:
+                await self.redis.delete(LOBBY_INDEX_PRUNE_CURSOR)
+            else:
+                await self.redis.set(LOBBY_INDEX_PRUNE_CURSOR, repr(entries[-1][1]))
+            
+            if not entries:
+                return 0
+            return await self._prune_lobby_batch([_decode(member) for member, _ in entries])
+        except Exception as e:
+            print(f"❌ Redis prune_lobby_index error: {e}")
+            return 0
+    
+    async def _prune_lobby_batch(self, lobby_ids: List[str]) -> int:
+        """Wyrzuć z indeksu ID partii, dla których nie ma klucza lobby"""
+        exists = await self._lobbies_exist(lobby_ids)
+        missing = [lobby_id for lobby_id in lobby_ids if not exists[lobby_id]]
+        if missing:
+            await self._unindex_lobbies(missing)
+        return len(missing)
+    
+    async def rebuild_lobby_index(self) -> int:
+        """
+        Odbuduj indeks lobby z jawnego rejestru ({lobby_index}:created + summary)
+        i aktualnych danych lobby - bez SCAN, więc tak samo na jednym węźle
+        i w klastrze. Wywoływane przy starcie, po migracji kluczy (lobby
+        przeniesione spod starych nazw są już w rejestrze).
+        
+        Returns:
+            int: Liczba zaindeksowanych lobby
+        """
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.zrange(LOBBY_INDEX_CREATED, 0, -1)
+            pipe.hgetall(LOBBY_INDEX_SUMMARY)
+            created_ids, old_summaries = await pipe.execute()
+            
+            ids = {_decode(lobby_id) for lobby_id in created_ids}
+            ids.update(_decode(lobby_id) for lobby_id in old_summaries)
+            
+            # Stare klucze indeksu: stałe + statusy/typy z dotychczasowych podsumowań
+            old_keys = {
+                LOBBY_INDEX_ALL, LOBBY_INDEX_CREATED, LOBBY_INDEX_SUMMARY, LOBBY_INDEX_REVS,
+                LOBBY_INDEX_PRUNE_CURSOR
+            }
+            for raw in old_summaries.values():
+                try:
+                    old = json.loads(raw)
+                except (ValueError, TypeError):
+                    continue
+                status, typ_gry = old.get('status'), old.get('typ_gry')
+                old_keys.update(
+                    lobby_index_key(st, tg)
+                    for st, tg in ((status, None), (None, typ_gry), (status, typ_gry))
+                    if st or tg
+                )
+            # Jeden slot ({lobby_index}) - jedno DEL
+            await self.redis.delete(*old_keys)
+            
+            ids = sorted(ids)
+            indexed = 0
+            for i in range(0, len(ids), 500):
+                chunk = ids[i:i + 500]
+                values = await mget_keys(self.redis, [lobby_key(lobby_id) for lobby_id in chunk])
+                revs = await mget_keys(self.redis, [lobby_rev_key(lobby_id) for lobby_id in chunk])
+                
+                pipe = self.redis.pipeline(transaction=False)
+                for lobby_id, json_data, rev in zip(chunk, values, revs):
+                    if not json_data:
+                        continue
+                    summary = build_lobby_summary(json.loads(json_data.decode('utf-8')))
+                    score = summary['last_activity'] or time.time()
+                    
+                    pipe.zadd(LOBBY_INDEX_ALL, {lobby_id: score})
+                    pipe.zadd(LOBBY_INDEX_CREATED, {lobby_id: summary['created_at'] or score})
+                    pipe.zadd(lobby_index_key(summary['status']), {lobby_id: score})
+                    pipe.zadd(lobby_index_key(None, summary['typ_gry']), {lobby_id: score})
+                    pipe.zadd(lobby_index_key(summary['status'], summary['typ_gry']), {lobby_id: score})
+                    pipe.hset(LOBBY_INDEX_SUMMARY, lobby_id, json.dumps(summary))
+                    pipe.hset(LOBBY_INDEX_REVS, lobby_id, int(rev) if rev else 0)
+                    indexed += 1
+                await pipe.execute()
+            
+            print(f"✅ Indeks lobby odbudowany ({indexed} lobby)")
+            return indexed
+        except Exception as e:
+            print(f"❌ Redis rebuild_lobby_index error: {e}")
+            return 0
+    
+    async def find_lobbies_idle(
+        self,
+        status: Optional[str],
+        idle_seconds: float,
+        limit: int = 500
+    ) -> List[str]:
+        """
+        ID lobby (w danym statusie) bez aktywności dłużej niż idle_seconds
+        
+        Args:
+            status: Status lobby (None = wszystkie)
+            idle_seconds: Próg nieaktywności (sekundy)
+            limit: Maksymalna liczba wyników
+        
+        Returns:
+            List[str]: ID lobby - tylko kandydaci, bez ładowania danych
+        """
+        try:
+            ids = await self.redis.zrangebyscore(
+                lobby_index_key(status), '-inf', time.time() - idle_seconds,
+                start=0, num=limit
+            )
+            return [i.decode('utf-8') if isinstance(i, bytes) else i for i in ids]
+        except Exception as e:
+            print(f"❌ Redis find_lobbies_idle error: {e}")
+            return []
+    
+    async def find_lobbies_older_than(self, age_seconds: float, limit: int = 500) -> List[str]:
+        """
+        ID lobby utworzonych wcześniej niż age_seconds temu
+        
+        Args:
+            age_seconds: Próg wieku (sekundy)
+            limit: Maksymalna liczba wyników
+        
+        Returns:
+            List[str]: ID lobby
+        """
+        try:
+            ids = await self.redis.zrangebyscore(
+                LOBBY_INDEX_CREATED, '-inf', time.time() - age_seconds,
+                start=0, num=limit
+            )
+            return [i.decode('utf-8') if isinstance(i, bytes) else i for i in ids]
+        except Exception as e:
+            print(f"❌ Redis find_lobbies_older_than error: {e}")
+            return []
+    
+    async def get_lobby_summaries(self, lobby_ids: List[str]) -> Dict[str, dict]:
+        """
+        Podsumowania konkretnych lobby (jedno HMGET)
+        
+        Args:
+            lobby_ids: Lista ID lobby
+        
+        Returns:
+            Dict[str, dict]: id -> podsumowanie (brakujące pominięte)
+        """
+        if not lobby_ids:
+            return {}
+        try:
+            values = await self.redis.hmget(LOBBY_INDEX_SUMMARY, lobby_ids)
+            return {
+                lobby_id: normalize_lobby(json.loads(raw.decode('utf-8')))
+                for lobby_id, raw in zip(lobby_ids, values)
+                if raw
+            }
+        except Exception as e:
+            print(f"❌ Redis get_lobby_summaries error: {e}")
+            return {}
+    
+    async def purge_games(self, game_ids: List[str], players: Optional[Dict[str, List[str]]] = None) -> int:
+        """
+        Usuń wiele gier w jednym pipeline: lobby, silnik, czat, klucze
+        rozłączeń, głosowania i wpisy indeksu lobby.
+        
+        Args:
+            game_ids: Lista ID gier
+            players: Nazwy graczy per gra (gdy podsumowania już nie ma w indeksie)
+        
+        Returns:
+            int: Liczba usuniętych gier
+        """
+        if not game_ids:
+            return 0
+        # Import tutaj - timer_service i disconnect_service importują ten moduł
+        from services.timer_service import get_disconnect_scheduler, disconnect_timer_id
+        from services.disconnect_service import DisconnectService
+        
+        try:
+            # Nazwy graczy z podsumowań - potrzebne do kluczy rozłączeń
+            summaries = await self.get_lobby_summaries(game_ids) if players is None else {}
+            
+            pipe = self.redis.pipeline(transaction=False)
+            timer_ids = []
+            for game_id in game_ids:
+                if players is not None:
+                    names = [p for p in players.get(game_id, []) if p]
+                else:
+                    names = [p for p in summaries.get(game_id, {}).get('gracze', []) if p]
+                
+                # Klucze gry w jednym slocie - jedno DEL; indeks osobno
+                pipe.delete(*game_keys(game_id, names))
+                unindex_lobby(pipe, game_id)
+                
+                # Timery rozłączeń tej gry nie mają już sensu
+                timer_ids += [disconnect_timer_id(game_id, player) for player in names]
+                timer_ids += [DisconnectService._timer_id(game_id, player) for player in names]
+            
+            await pipe.execute()
+            
+            # Przez API harmonogramu - usuwa też timery w trakcie obsługi (processing)
+            await get_disconnect_scheduler().cancel_many(timer_ids)
+            return len(game_ids)
+        except Exception as e:
+            print(f"❌ Redis purge_games error: {e}")
+            return 0
+    
     async def delete_lobby(self, lobby_id: str) -> bool:
         """
         Usuń lobby
@@ -173,39 +1086,117 @@ class RedisService:
             bool: True jeśli sukces
         """
         try:
-            await self.redis.delete(lobby_key(lobby_id))
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.delete(lobby_key(lobby_id), lobby_rev_key(lobby_id))
+            unindex_lobby(pipe, lobby_id)
+            await pipe.execute()
             return True
         except Exception as e:
             print(f"❌ Redis delete_lobby error [{lobby_id}]: {e}")
             return False
     
+    # ============================================
+    # CHAT OPERATIONS
+    # ============================================
+    
+    async def append_chat(
+        self,
+        lobby_id: str,
+        message: dict,
+        max_messages: int = CHAT_MAX_MESSAGES,
+        ttl: int = CHAT_TTL
+    ) -> str:
+        """
+        Dopisz wiadomość do czatu lobby (XADD MAXLEN + EXPIRE + powiadomienie, jeden skrypt)
+        
+        Args:
+            lobby_id: ID lobby
+            message: Wiadomość (dict -> JSON)
+            max_messages: Ile ostatnich wiadomości trzymać (w przybliżeniu)
+            ttl: Czas życia czatu (sekundy)
+        
+        Returns:
+            str: Kursor wiadomości
+        """
+        return _decode(await append_chat_message(self.redis, lobby_id, message, max_messages, ttl))
+    
+    async def get_chat(
+        self,
+        lobby_id: str,
+        limit: int = 50,
+        before: Optional[str] = None,
+        after: Optional[str] = None
+    ) -> Optional[List[dict]]:
+        """
+        Pobierz wiadomości czatu (od najstarszej) stronicowane kursorem
+        Jeden round-trip: EXISTS lobby + XRANGE/XREVRANGE (wspólny slot gry)
+        
+        Args:
+            lobby_id: ID lobby
+            limit: Max liczba wiadomości
+            before: Tylko starsze niż kursor (poprzednia strona historii)
+            after: Tylko nowsze niż kursor (dosłanie po ostatnio widzianej)
+        
+        Returns:
+            Optional[List[dict]]: Wiadomości z polem 'cursor' (None - brak lobby)
+        """
+        key = chat_key(lobby_id)
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.exists(lobby_key(lobby_id))
+        if after:
+            pipe.xrange(key, min=f"({after}", count=limit)
+        else:
+            pipe.xrevrange(key, max=f"({before}" if before else '+', count=limit)
+        exists, entries = await pipe.execute()
+        
+        if not exists:
+            return None
+        if not after:
+            entries.reverse()
+        return parse_chat_entries(entries)
+    
     # ============================================
     # GAME OPERATIONS
     # ============================================
     
-    async def save_game_engine(self, game_id: str, engine: Any) -> bool:
+    async def save_game_engine(self, game_id: str, engine: Any, lock: Optional[RedisLock] = None) -> bool:
         """
         Zapisz silnik gry do Redis (pickle)
         
         Args:
             game_id: ID gry
             engine: Obiekt silnika gry
+            lock: Trzymany lock gry - zapis tylko z aktualnym tokenem fencingu
         
         Returns:
             bool: True jeśli sukces
+        
+        Raises:
+            StaleFencingTokenError: Jeśli lock przejął inny proces
         """
         try:
             # Serializacja za pomocą cloudpickle
             pickled_engine = cloudpickle.dumps(engine)
-            await self.redis.set(
-                engine_key(game_id),
-                pickled_engine,
-                ex=self.expiration
+            if lock is None:
+                await self.redis.set(
+                    engine_key(game_id),
+                    pickled_engine,
+                    ex=self.expiration
+                )
+                return True
+            
+            saved = await self.redis.eval(
+                LUA_SAVE_ENGINE_FENCED, 2,
+                engine_key(game_id), lock.fence_key,
+                lock.token, pickled_engine, self.expiration
             )
-            return True
         except Exception as e:
             print(f"❌ Redis save_game_engine error [{game_id}]: {e}")
             return False
+        
+        if not saved:
+            raise self._stale_write(lock, f"silnika gry {game_id}")
+        return True
     
     async def get_game_engine(self, game_id: str) -> Optional[Any]:
         """
@@ -227,9 +1218,54 @@ class RedisService:
             print(f"❌ Redis get_game_engine error [{game_id}]: {e}")
             return None
     
+    async def get_game_state(self, game_id: str, with_engine: bool = True) -> Tuple[Optional[dict], Optional[Any]]:
+        """
+        Pobierz lobby i silnik gry jednym MGET (wspólny slot gry)
+        
+        Args:
+            game_id: ID gry
+            with_engine: False - silnik tylko gdy gra trwa (W_GRZE/W_TRAKCIE)
+        
+        Returns:
+            Tuple: (lobby lub None, silnik lub None)
+        """
+        try:
+            raw_lobby, pickled_engine = await self.redis.mget(lobby_key(game_id), engine_key(game_id))
+        except Exception as e:
+            print(f"❌ Redis get_game_state error [{game_id}]: {e}")
+            return None, None
+        
+        lobby_data = None
+        engine = None
+        try:
+            if raw_lobby:
+                lobby_data = normalize_lobby(json.loads(raw_lobby.decode('utf-8')))
+            in_game = lobby_data is not None and lobby_data.get('status_partii') in ['W_GRZE', 'W_TRAKCIE']
+            if pickled_engine and (with_engine or in_game):
+                engine = cloudpickle.loads(pickled_engine)
+        except Exception as e:
+            print(f"❌ Redis get_game_state decode error [{game_id}]: {e}")
+        return lobby_data, engine
+    
+    async def pop_value(self, key: str) -> Optional[bytes]:
+        """
+        Odczytaj i usuń klucz w jednym round-tripie (MULTI: GET + DEL)
+        
+        Args:
+            key: Klucz Redis
+        
+        Returns:
+            Optional[bytes]: Wartość sprzed usunięcia lub None
+        """
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.get(key)
+        pipe.delete(key)
+        value, _ = await pipe.execute()
+        return value
+    
     async def delete_game(self, game_id: str) -> bool:
         """
-        Usuń grę (lobby + engine)
+        Usuń grę: lobby, silnik, czat, klucze pomocnicze i rozłączeń + wpis indeksu
         
         Args:
             game_id: ID gry
@@ -238,10 +1274,14 @@ class RedisService:
             bool: True jeśli sukces
         """
         try:
-            await self.redis.delete(
-                lobby_key(game_id),
-                engine_key(game_id)
-            )
+            # Nazwy graczy z podsumowania - potrzebne do kluczy rozłączeń
+            summary = (await self.get_lobby_summaries([game_id])).get(game_id, {})
+            names = [p for p in summary.get('gracze', []) if p]
+            
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.delete(*game_keys(game_id, names))
+            unindex_lobby(pipe, game_id)
+            await pipe.execute()
             print(f"🗑️ Usunięto grę {game_id} z Redis")
             return True
         except Exception as e:
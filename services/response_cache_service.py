@@ -0,0 +1,178 @@
+"""
+Service: Mikro-cache odpowiedzi publicznych endpointów
+Odpowiedzialność: Krótki cache GET + ETag/If-None-Match (304) + single-flight
+
+- Tylko publiczne endpointy bez danych użytkownika (RESPONSE_CACHE_RULES: ścieżka -> TTL)
+- Klucz: ścieżka + posortowane parametry zapytania; cache w procesie
+- Równoczesne chybienia tego samego klucza liczą odpowiedź raz (single-flight),
+  reszta czeka na wynik pierwszego żądania
+- ETag = skrót treści - po przeliczeniu z tymi samymi danymi klient nadal dostaje 304
+- Cache'owane tylko odpowiedzi 200
+"""
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+# Ścieżka -> TTL (sekundy)
+RESPONSE_CACHE_RULES: Dict[str, float] = {
+    '/api/stats': 10,
+    '/api/stats/ranking': 15,
+    '/api/stats/ranks': 300,
+    '/api/lobby/list': 2,
+    '/api/health': 2,
+    '/health': 2,
+}
+# Maksymalna liczba wpisów (najstarsze usuwane jako pierwsze)
+RESPONSE_CACHE_MAX_ENTRIES = 1000
+
+# Nagłówki odpowiedzi, których nie przechowujemy (liczone na nowo / per żądanie)
+_SKIPPED_HEADERS = {'content-length', 'etag', 'cache-control', 'x-redis-roundtrips'}
+
+class CachedResponse:
+    """Zapamiętana odpowiedź 200 (treść + nagłówki + ETag)"""
+    
+    def __init__(self, body: bytes, headers: Dict[str, str], media_type: Optional[str], ttl: float):
+        self.body = body
+        self.headers = headers
+        self.media_type = media_type
+        self.etag = '"' + hashlib.blake2b(body, digest_size=8).hexdigest() + '"'
+        self.expires_at = time.monotonic() + ttl
+    
+    @property
+    def fresh(self) -> bool:
+        return time.monotonic() < self.expires_at
+    
+    @property
+    def max_age(self) -> int:
+        return max(0, int(self.expires_at - time.monotonic()))
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Czy nagłówek If-None-Match pasuje do ETag (porównanie słabe, obsługa '*')"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate == '*' or candidate.removeprefix('W/') == etag:
+            return True
+    return False
+
+# ============================================
+# RESPONSE CACHE CLASS
+# ============================================
+
+class ResponseCache:
+    """Cache odpowiedzi w procesie (middleware HTTP w main.py)"""
+    
+    def __init__(self, rules: Dict[str, float], max_entries: int = RESPONSE_CACHE_MAX_ENTRIES):
+        self.rules = rules
+        self.max_entries = max_entries
+        self.entries: 'OrderedDict[str, CachedResponse]' = OrderedDict()
+        # Klucz -> wynik liczony właśnie przez pierwsze żądanie
+        self._inflight: Dict[str, asyncio.Future] = {}
+        
+        # Metryki
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.not_modified = 0
+    
+    @staticmethod
+    def cache_key(request: Request) -> str:
+        query = sorted(request.query_params.multi_items())
+        return request.url.path + ('?' + '&'.join(f"{k}={v}" for k, v in query) if query else '')
+    
+    async def handle(self, request: Request, call_next) -> Response:
+        """
+        Obsłuż żądanie z cache albo policz je (raz dla równoczesnych chybień)
+        
+        Args:
+            request: Żądanie HTTP
+            call_next: Następny handler (middleware)
+        
+        Returns:
+            Response: Odpowiedź (200 z cache / świeża / 304)
+        """
+        ttl = self.rules.get(request.url.path)
+        if ttl is None or request.method != 'GET':
+            return await call_next(request)
+        
+        key = self.cache_key(request)
+        entry = self.entries.get(key)
+        if entry is not None and entry.fresh:
+            self.hits += 1
+            return self._respond(request, entry, 'HIT')
+        
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            # Ktoś już liczy ten klucz - poczekaj na jego wynik
+            entry = await asyncio.shield(inflight)
+            if entry is not None:
+                self.coalesced += 1
+                return self._respond(request, entry, 'HIT')
+            return await call_next(request)
+        
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        entry = None
+        try:
+            response = await call_next(request)
+            body = b''.join([chunk async for chunk in response.body_iterator])
+            
+            if response.status_code != 200:
+                return Response(
+                    content=body,
+                    status_code=response.status_code,
+                    headers={k: v for k, v in response.headers.items() if k.lower() != 'content-length'},
+                    media_type=response.media_type
+                )
+            
+            headers = {k: v for k, v in response.headers.items() if k.lower() not in _SKIPPED_HEADERS}
+            entry = CachedResponse(body, headers, response.media_type, ttl)
+            self._store(key, entry)
+            return self._respond(request, entry, 'MISS')
+        finally:
+            self._inflight.pop(key, None)
+            if not future.done():
+                future.set_result(entry)
+    
+    def _store(self, key: str, entry: CachedResponse):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+    
+    def _respond(self, request: Request, entry: CachedResponse, status: str) -> Response:
+        headers = {
+            'ETag': entry.etag,
+            'Cache-Control': f"public, max-age={entry.max_age}",
+            'X-Cache': status
+        }
+        if etag_matches(request.headers.get('if-none-match'), entry.etag):
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        
+        return Response(
+            content=entry.body,
+            status_code=200,
+            headers={**entry.headers, **headers},
+            media_type=entry.media_type
+        )
+    
+    def snapshot(self) -> dict:
+        """Metryki dla /api/admin/stats"""
+        return {
+            'entries': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'not_modified': self.not_modified
+        }
+
+# Singleton
+response_cache = ResponseCache(RESPONSE_CACHE_RULES)
@@ -0,0 +1,158 @@
+"""
+Service: Sesje
+Odpowiedzialność: Cache rekordu użytkownika dla get_current_user (bez SELECT na każde żądanie)
+
+- session:{user_id}         -> JSON {id, username, email, is_guest, is_admin, version}
+- session:{user_id}:version -> licznik unieważnień (INCR przy zmianie użytkownika)
+  (user_id jako hash tag - rekord i wersja w jednym slocie Redis Cluster)
+- lokalny cache procesu token -> rekord na SESSION_LOCAL_TTL sekund
+
+Rekord zapisywany jest tylko jeśli wersja nie zmieniła się od odczytu z bazy
+(compare-and-set w Lua), więc równoległe unieważnienie nie zostanie nadpisane
+starymi danymi.
+"""
+import json
+import time
+from typing import Dict, Optional, Tuple
+
+from config import REDIS_PREFIX_SESSION
+from services.redis_service import get_redis_client
+
+# Rekord w Redis żyje tyle co token
+SESSION_TTL = 86400
+
+# Lokalny cache procesu - krótki, bo unieważnienie w innym procesie go nie czyści
+SESSION_LOCAL_TTL = 5.0
+SESSION_LOCAL_MAX = 10000
+
+def session_key(user_id) -> str:
+    """Klucz rekordu sesji użytkownika"""
+    return f"{REDIS_PREFIX_SESSION}{{{user_id}}}"
+
+def session_version_key(user_id) -> str:
+    """Klucz licznika wersji sesji użytkownika"""
+    return f"{REDIS_PREFIX_SESSION}{{{user_id}}}:version"
+
+# ============================================
+# LUA
+# ============================================
+
+# KEYS[1] = session:{id}, KEYS[2] = session:{id}:version
+# ARGV[1] = rekord JSON, ARGV[2] = oczekiwana wersja, ARGV[3] = TTL
+LUA_STORE = """
+local version = redis.call('GET', KEYS[2]) or '0'
+if version ~= ARGV[2] then return 0 end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', tonumber(ARGV[3]))
+return 1
+"""
+
+# ============================================
+# SESSION SERVICE CLASS
+# ============================================
+
+class SessionService:
+    """Cache sesji użytkowników (Redis + lokalny TTL cache)"""
+    
+    def __init__(self):
+        # token -> (expires_at, user_id, user dict)
+        self._local: Dict[str, Tuple[float, int, Dict]] = {}
+    
+    @property
+    def redis(self):
+        return get_redis_client()
+    
+    def _remember(self, token: str, user: Dict):
+        """Zapamiętaj rekord w lokalnym cache"""
+        if len(self._local) >= SESSION_LOCAL_MAX:
+            self._local.clear()
+        self._local[token] = (time.monotonic() + SESSION_LOCAL_TTL, user['id'], user)
+    
+    def get_local(self, token: str) -> Optional[Dict]:
+        """Rekord z lokalnego cache (None jeśli brak lub wygasł)"""
+        entry = self._local.get(token)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            self._local.pop(token, None)
+            return None
+        return entry[2]
+    
+    async def resolve(self, token: str) -> Tuple[Optional[int], Optional[Dict], str]:
+        """
+        Token -> (user_id, rekord sesji lub None, wersja)
+        Token i sesja leżą w różnych slotach: GET tokena, potem jedno MGET
+        rekordu i wersji (ten sam slot użytkownika).
+        
+        Returns:
+            Tuple: (None, None, '0') jeśli token nie istnieje
+        """
+        raw_id = await self.redis.get(f"token:{token}")
+        if not raw_id:
+            return None, None, '0'
+        
+        user_id = int(raw_id.decode('utf-8') if isinstance(raw_id, bytes) else raw_id)
+        raw_record, raw_version = await self.redis.mget(session_key(user_id), session_version_key(user_id))
+        if raw_version is None:
+            version = '0'
+        else:
+            version = raw_version.decode('utf-8') if isinstance(raw_version, bytes) else str(raw_version)
+        
+        record = None
+        if raw_record:
+            try:
+                record = json.loads(raw_record)
+            except (ValueError, TypeError):
+                record = None
+        
+        return user_id, record, version
+    
+    async def store(self, token: str, user: Dict, version: str) -> bool:
+        """
+        Zapisz rekord sesji (tylko jeśli wersja się nie zmieniła)
+        
+        Args:
+            token: Token (dla lokalnego cache)
+            user: Rekord użytkownika
+            version: Wersja odczytana przed zapytaniem do bazy
+        
+        Returns:
+            bool: True jeśli zapisano
+        """
+        record = dict(user, version=int(version))
+        try:
+            stored = await self.redis.eval(
+                LUA_STORE, 2,
+                session_key(user['id']), session_version_key(user['id']),
+                json.dumps(record), version, SESSION_TTL
+            )
+        except Exception as e:
+            print(f"❌ Session store error [{user['id']}]: {e}")
+            return False
+        
+        if stored:
+            self._remember(token, record)
+        return bool(stored)
+    
+    def remember(self, token: str, user: Dict):
+        """Zapamiętaj rekord z Redis w lokalnym cache"""
+        self._remember(token, user)
+    
+    async def invalidate(self, user_id: int):
+        """
+        Unieważnij sesję użytkownika (zmiana is_admin/statusu/usunięcie)
+        Następne żądanie odczyta rekord z bazy.
+        """
+        for token in [t for t, entry in self._local.items() if entry[1] == user_id]:
+            self._local.pop(token, None)
+        
+        try:
+            pipe = self.redis.pipeline(transaction=True)
+            pipe.incr(session_version_key(user_id))
+            pipe.expire(session_version_key(user_id), SESSION_TTL)
+            pipe.delete(session_key(user_id))
+            await pipe.execute()
+        except Exception as e:
+            print(f"❌ Session invalidate error [{user_id}]: {e}")
+
+# Singleton
+session_service = SessionService()
@@ -0,0 +1,275 @@
+"""
+Service: Pliki statyczne (bez nginx przed aplikacją)
+Odpowiedzialność: Serwowanie static/ z prekompresją, cache i ETag
+
+- Przy starcie: skan katalogu, metadane w pamięci (rozmiar, typ, ETag ze skrótu
+  treści) + warianty gzip/brotli plików tekstowych (trzymane w pamięci)
+- Wybór kodowania po Accept-Encoding (br > gzip > bez kompresji)
+- Pliki z katalogu assets/ (build Vite - nazwy z hashem treści, np.
+  assets/index-B3f2a9c1.js) - Cache-Control immutable na rok; HTML - no-cache;
+  reszta (obrazki, favicon) - krótki max-age; wszystko z ETag (304 po If-None-Match)
+- Plik dodany po starcie indeksowany przy pierwszym żądaniu, zmieniony
+  (inny mtime/rozmiar) - indeksowany ponownie
+- Brotli opcjonalny (pakiet brotli) - bez niego tylko gzip
+"""
+import asyncio
+import gzip
+import hashlib
+import mimetypes
+import os
+from typing import Dict, Optional
+
+from fastapi import HTTPException, Request
+from fastapi.responses import FileResponse, Response
+
+from config import settings
+from services.response_cache_service import etag_matches
+
+# Pliki mniejsze nie są kompresowane (narzut nagłówków > zysk)
+STATIC_COMPRESS_MIN_SIZE = 1024
+# Wariant trzymany tylko gdy jest mniejszy niż ten ułamek oryginału
+STATIC_COMPRESS_MAX_RATIO = 0.9
+# Pliki większe nie są kompresowane ani trzymane w pamięci
+STATIC_COMPRESS_MAX_SIZE = 8 * 1024 * 1024
+
+STATIC_CACHE_IMMUTABLE = "public, max-age=31536000, immutable"
+STATIC_CACHE_HTML = "no-cache"
+STATIC_CACHE_DEFAULT = "public, max-age=3600"
+
+# Katalog buildu Vite z plikami nazwanymi hashem treści (build.assetsDir)
+STATIC_IMMUTABLE_DIR = "assets/"
+
+_COMPRESSIBLE_TYPES = {
+    'application/javascript', 'application/json', 'application/xml',
+    'application/manifest+json', 'image/svg+xml', 'text/javascript'
+}
+
+def _is_compressible(content_type: str) -> bool:
+    return content_type.startswith('text/') or content_type in _COMPRESSIBLE_TYPES
+
+def is_immutable_asset(relative_path: str) -> bool:
+    """
+    Czy plik można cache'ować na zawsze - tylko assets/ z buildu Vite
+    (nazwy z hashem treści); po nazwie pliku nie zgadujemy - card-background.png
+    wygląda jak hash, a hash Vite bywa z '-' w środku
+    """
+    return relative_path.startswith(STATIC_IMMUTABLE_DIR) and not relative_path.endswith('.html')
+
+def accepted_encodings(accept_encoding: Optional[str]) -> Dict[str, float]:
+    """Accept-Encoding -> {kodowanie: q} (np. "br;q=1.0, gzip" -> {'br': 1.0, 'gzip': 1.0})"""
+    result = {}
+    for part in (accept_encoding or '').split(','):
+        name, _, params = part.strip().partition(';')
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        result[name.strip().lower()] = q
+    return result
+
+class StaticAsset:
+    """Metadane jednego pliku + warianty skompresowane"""
+    
+    def __init__(self, path: str, relative_path: str, stat_result: os.stat_result, digest: str):
+        self.path = path
+        self.stat_result = stat_result
+        self.content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        self.etag = f'"{digest}"'
+        self.cache_control = (
+            STATIC_CACHE_HTML if self.content_type == 'text/html'
+            else STATIC_CACHE_IMMUTABLE if is_immutable_asset(relative_path)
+            else STATIC_CACHE_DEFAULT
+        )
+        # kodowanie -> skompresowana treść
+        self.variants: Dict[str, bytes] = {}
+
+# ============================================
+# STATIC ASSETS CLASS
+# ============================================
+
+class StaticAssets:
+    """Indeks plików statycznych w pamięci + odpowiedzi z wybranym kodowaniem"""
+    
+    def __init__(self, directory: str, precompress: bool = True):
+        self.directory = os.path.abspath(directory)
+        self.precompress = precompress
+        self.assets: Dict[str, StaticAsset] = {}
+        
+        # Metryki
+        self.served: Dict[str, int] = {'br': 0, 'gzip': 0, 'identity': 0}
+        self.not_modified = 0
+    
+    def _load(self, relative_path: str) -> Optional[StaticAsset]:
+        """Zaindeksuj jeden plik (skrót treści + warianty gzip/brotli)"""
+        path = os.path.join(self.directory, relative_path)
+        try:
+            stat_result = os.stat(path)
+        except OSError:
+            return None
+        if not os.path.isfile(path):
+            return None
+        
+        with open(path, 'rb') as f:
+            data = f.read() if stat_result.st_size <= STATIC_COMPRESS_MAX_SIZE else None
+        if data is None:
+            # Duży plik - ETag z metadanych, bez kompresji
+            digest = hashlib.blake2b(f"{stat_result.st_mtime_ns}-{stat_result.st_size}".encode(), digest_size=8).hexdigest()
+        else:
+            digest = hashlib.blake2b(data, digest_size=8).hexdigest()
+        
+        asset = StaticAsset(path, relative_path, stat_result, digest)
+        if (
+            self.precompress and data is not None
+            and len(data) >= STATIC_COMPRESS_MIN_SIZE
+            and _is_compressible(asset.content_type)
+        ):
+            compressed = {'gzip': gzip.compress(data, compresslevel=9, mtime=0)}
+            try:
+                import brotli
+                compressed['br'] = brotli.compress(data, quality=11)
+            except ImportError:
+                pass
+            asset.variants = {
+                encoding: body for encoding, body in compressed.items()
+                if len(body) < len(data) * STATIC_COMPRESS_MAX_RATIO
+            }
+        
+        self.assets[relative_path] = asset
+        return asset
+    
+    def scan(self) -> int:
+        """
+        Zaindeksuj cały katalog (wywoływane przy starcie)
+        
+        Returns:
+            int: Liczba plików
+        """
+        self.assets.clear()
+        if not os.path.isdir(self.directory):
+            return 0
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                relative_path = os.path.relpath(os.path.join(root, name), self.directory).replace(os.sep, '/')
+                self._load(relative_path)
+        return len(self.assets)
+    
+    def get(self, relative_path: str) -> Optional[StaticAsset]:
+        """Plik z indeksu (nowy plik - indeksowany przy pierwszym żądaniu)"""
+        relative_path = relative_path.lstrip('/')
+        asset = self.assets.get(relative_path)
+        if asset is not None:
+            # Plik podmieniony/usunięty po indeksowaniu - nowy ETag i warianty
+            try:
+                current = os.stat(asset.path)
+            except OSError:
+                self.assets.pop(relative_path, None)
+                return None
+            if (current.st_mtime_ns, current.st_size) == (asset.stat_result.st_mtime_ns, asset.stat_result.st_size):
+                return asset
+            return self._load(relative_path)
+        
+        # Ochrona przed ../ poza katalogiem
+        path = os.path.abspath(os.path.join(self.directory, relative_path))
+        if not path.startswith(self.directory + os.sep):
+            return None
+        return self._load(relative_path)
+    
+    def response(self, request: Request, relative_path: str) -> Response:
+        """
+        Odpowiedź dla pliku (304 / wariant skompresowany / plik z dysku)
+        
+        Args:
+            request: Żądanie HTTP (If-None-Match, Accept-Encoding)
+            relative_path: Ścieżka względem katalogu static
+        
+        Returns:
+            Response: Odpowiedź
+        
+        Raises:
+            HTTPException: 404 gdy pliku nie ma
+        """
+        asset = self.get(relative_path)
+        if asset is None:
+            raise HTTPException(status_code=404, detail="Nie znaleziono pliku")
+        
+        encoding = None
+        if asset.variants:
+            accepted = accepted_encodings(request.headers.get('accept-encoding'))
+            for candidate in ('br', 'gzip'):
+                if candidate in asset.variants and accepted.get(candidate, 0) > 0:
+                    encoding = candidate
+                    break
+        
+        # Każdy wariant ma własny ETag (inna treść na łączu)
+        etag = asset.etag if encoding is None else f'{asset.etag[:-1]}-{encoding}"'
+        headers = {'ETag': etag, 'Cache-Control': asset.cache_control}
+        if asset.variants:
+            headers['Vary'] = 'Accept-Encoding'
+        
+        if etag_matches(request.headers.get('if-none-match'), etag):
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        
+        self.served[encoding or 'identity'] += 1
+        if encoding is None:
+            # Bez stat_result z indeksu - FileResponse sprawdzi plik tuż przed wysłaniem
+            return FileResponse(asset.path, headers=headers, media_type=asset.content_type)
+        
+        headers['Content-Encoding'] = encoding
+        body = b'' if request.method == 'HEAD' else asset.variants[encoding]
+        response = Response(content=body, headers=headers, media_type=asset.content_type)
+        if request.method == 'HEAD':
+            response.headers['Content-Length'] = str(len(asset.variants[encoding]))
+        return response
+    
+    def get_stats(self) -> dict:
+        """Statystyki dla /api/admin/stats"""
+        return {
+            'files': len(self.assets),
+            'compressed': sum(1 for asset in self.assets.values() if asset.variants),
+            'served': dict(self.served),
+            'not_modified': self.not_modified
+        }
+
+class StaticAssetsApp:
+    """Aplikacja ASGI do app.mount (zamiast StaticFiles) - pliki z podkatalogu indeksu"""
+    
+    def __init__(self, assets: StaticAssets, prefix: str = ''):
+        self.assets = assets
+        self.prefix = prefix.strip('/')
+    
+    async def __call__(self, scope, receive, send):
+        request = Request(scope, receive)
+        if request.method not in ('GET', 'HEAD'):
+            response = Response(status_code=405, headers={'Allow': 'GET, HEAD'})
+        else:
+            # Ścieżka względem punktu montowania (nowszy Starlette zostawia pełną ścieżkę)
+            path, root_path = scope['path'], scope.get('root_path', '')
+            if root_path and path.startswith(root_path):
+                path = path[len(root_path):]
+            relative_path = f"{self.prefix}/{path.lstrip('/')}" if self.prefix else path
+            try:
+                response = self.assets.response(request, relative_path)
+            except HTTPException as e:
+                response = Response(content=e.detail, status_code=e.status_code, media_type='text/plain')
+        await response(scope, receive, send)
+
+# Singleton
+static_assets = StaticAssets(settings.STATIC_DIR, precompress=settings.STATIC_PRECOMPRESS)
+
+async def setup_static_assets():
+    """
+    Zaindeksuj i skompresuj pliki statyczne (w wątku - nie blokuje pętli)
+    Wywoływane w main.py przy startup
+    """
+    try:
+        files = await asyncio.to_thread(static_assets.scan)
+        compressed = sum(1 for asset in static_assets.assets.values() if asset.variants)
+        print(f"✅ Pliki statyczne: {files} plików, {compressed} z prekompresją ({static_assets.directory})")
+    except Exception as e:
+        print(f"⚠️ OSTRZEŻENIE pliki statyczne: {e}")
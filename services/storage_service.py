@@ -0,0 +1,224 @@
+"""
+Service: Magazyn stanu (backend klienta Redis)
+Odpowiedzialność: Wybór backendu z konfiguracji + snapshoty backendu w pamięci
+
+- "redis": serwer Redis (redis.asyncio) - wiele procesów/serwerów
+- "cluster": Redis Cluster (RedisCluster) - klucze gry mają wspólny hash tag,
+  więc skrypty i transakcje gry działają w obrębie jednego slotu
+- "memory": serwer Redis emulowany w procesie (fakeredis, z Lua) - ten sam
+  interfejs klienta (TTL, listy czatu, pub/sub, strumienie, skrypty Lua),
+  ale bez sieci; dla wdrożeń na jednym serwerze (jeden proces), testów i benchmarków
+- Snapshot backendu "memory": DUMP + TTL wszystkich kluczy do pliku co
+  STORAGE_SNAPSHOT_INTERVAL sekund, wczytywany przy starcie
+"""
+import asyncio
+import os
+import pickle
+import time
+from typing import Optional
+
+from redis.asyncio import Redis, from_url
+
+from config import settings
+
+STORAGE_BACKENDS = ('redis', 'cluster', 'memory')
+
+def create_storage_client(backend: Optional[str] = None) -> Redis:
+    """
+    Utwórz klienta magazynu stanu (bez łączenia)
+    
+    Args:
+        backend: "redis", "cluster" lub "memory" (domyślnie settings.STORAGE_BACKEND)
+    
+    Returns:
+        Redis: Klient z interfejsem redis.asyncio (decode_responses=False - pickle)
+    
+    Raises:
+        ValueError: Nieznany backend
+        RuntimeError: Backend "memory" bez zainstalowanego fakeredis[lua] (fakeredis + lupa)
+    """
+    backend = (backend or settings.STORAGE_BACKEND).lower()
+    
+    if backend == 'redis':
+        return from_url(
+            f"redis://{settings.REDIS_HOST}:{settings.REDIS_PORT}/{settings.REDIS_DB}",
+            password=settings.REDIS_PASSWORD,
+            decode_responses=False  # Dla pickle (binarny)
+        )
+    
+    if backend == 'cluster':
+        from redis.asyncio.cluster import RedisCluster, ClusterNode
+        
+        nodes = settings.REDIS_CLUSTER_NODES or f"{settings.REDIS_HOST}:{settings.REDIS_PORT}"
+        startup_nodes = []
+        for node in nodes.split(','):
+            host, _, port = node.strip().rpartition(':')
+            startup_nodes.append(ClusterNode(host, int(port)))
+        return RedisCluster(
+            startup_nodes=startup_nodes,
+            password=settings.REDIS_PASSWORD,
+            decode_responses=False  # Dla pickle (binarny)
+        )
+    
+    if backend == 'memory':
+        try:
+            import fakeredis
+        except ImportError as e:
+            raise RuntimeError(
+                "STORAGE_BACKEND=memory wymaga pakietu fakeredis[lua] (pip install 'fakeredis[lua]')"
+            ) from e
+        try:
+            import lupa  # noqa: F401 - skrypty Lua (lobby, timery, locki) w fakeredis
+        except ImportError as e:
+            raise RuntimeError(
+                "STORAGE_BACKEND=memory wymaga obsługi Lua w fakeredis (pip install 'fakeredis[lua]')"
+            ) from e
+        return fakeredis.FakeAsyncRedis(decode_responses=False)
+    
+    raise ValueError(f"Nieznany STORAGE_BACKEND: {backend} (dostępne: {', '.join(STORAGE_BACKENDS)})")
+
+# ============================================
+# SNAPSHOTY BACKENDU "MEMORY"
+# ============================================
+
+class StorageSnapshotter:
+    """Okresowy zapis/odczyt zawartości magazynu w pamięci do pliku"""
+    
+    def __init__(self, path: str, interval: int = 60):
+        self.path = path
+        self.interval = interval
+        self.task: Optional[asyncio.Task] = None
+    
+    async def save(self, client: Redis) -> int:
+        """
+        Zapisz wszystkie klucze (DUMP + PTTL) - atomowo przez plik tymczasowy
+        
+        Returns:
+            int: Liczba zapisanych kluczy
+        """
+        keys = [key async for key in client.scan_iter(count=1000)]
+        
+        pipe = client.pipeline(transaction=False)
+        for key in keys:
+            pipe.dump(key)
+            pipe.pttl(key)
+        results = await pipe.execute() if keys else []
+        
+        now = time.time()
+        entries = []
+        for i, key in enumerate(keys):
+            data, pttl = results[2 * i], results[2 * i + 1]
+            if data is None:
+                continue  # Klucz wygasł w międzyczasie
+            expires_at = now + pttl / 1000 if pttl and pttl > 0 else None
+            entries.append((key, data, expires_at))
+        
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump({'saved_at': now, 'entries': entries}, f)
+        os.replace(tmp_path, self.path)
+        return len(entries)
+    
+    async def load(self, client: Redis) -> int:
+        """
+        Wczytaj snapshot (jeśli istnieje); klucze po terminie są pomijane
+        
+        Returns:
+            int: Liczba przywróconych kluczy
+        """
+        if not os.path.exists(self.path):
+            return 0
+        
+        with open(self.path, 'rb') as f:
+            snapshot = pickle.load(f)
+        
+        now = time.time()
+        restored = 0
+        pipe = client.pipeline(transaction=False)
+        for key, data, expires_at in snapshot.get('entries', []):
+            if expires_at is None:
+                ttl_ms = 0
+            else:
+                ttl_ms = int((expires_at - now) * 1000)
+                if ttl_ms <= 0:
+                    continue
+            pipe.restore(key, ttl_ms, data, replace=True)
+            restored += 1
+        if restored:
+            await pipe.execute()
+        return restored
+    
+    async def run(self, client: Redis):
+        """Pętla zapisu co `interval` sekund"""
+        while True:
+            try:
+                await asyncio.sleep(self.interval)
+                await self.save(client)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ Storage snapshot error: {e}")
+
+_snapshotter: Optional[StorageSnapshotter] = None
+
+def get_snapshotter() -> Optional[StorageSnapshotter]:
+    """Snapshotter dla backendu "memory" z ustawionym STORAGE_SNAPSHOT_PATH (inaczej None)"""
+    global _snapshotter
+    if settings.STORAGE_BACKEND.lower() != 'memory' or not settings.STORAGE_SNAPSHOT_PATH:
+        return None
+    if _snapshotter is None:
+        _snapshotter = StorageSnapshotter(
+            settings.STORAGE_SNAPSHOT_PATH,
+            interval=settings.STORAGE_SNAPSHOT_INTERVAL
+        )
+    return _snapshotter
+
+async def restore_storage_snapshot(client: Redis):
+    """
+    Wczytaj snapshot przy starcie (przed odbudową indeksów)
+    Wywoływane w init_redis
+    """
+    snapshotter = get_snapshotter()
+    if snapshotter is None:
+        return
+    try:
+        restored = await snapshotter.load(client)
+        print(f"💾 Snapshot magazynu wczytany: {restored} kluczy ({snapshotter.path})")
+    except Exception as e:
+        print(f"❌ Storage snapshot load error: {e}")
+
+def setup_storage_snapshots(client: Redis):
+    """
+    Uruchom okresowe snapshoty (tylko backend "memory" z plikiem)
+    Wywoływane w main.py przy startup (po init_redis)
+    """
+    snapshotter = get_snapshotter()
+    if snapshotter is None:
+        return
+    if snapshotter.task is None or snapshotter.task.done():
+        snapshotter.task = asyncio.create_task(snapshotter.run(client))
+        print(f"✅ Snapshoty magazynu co {snapshotter.interval}s -> {snapshotter.path}")
+
+async def stop_storage_snapshots(client: Redis):
+    """
+    Zatrzymaj snapshoty i zapisz ostatni stan
+    Wywoływane w main.py przy shutdown (przed close_redis)
+    """
+    snapshotter = get_snapshotter()
+    if snapshotter is None:
+        return
+    
+    task = snapshotter.task
+    if task and not task.done():
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    snapshotter.task = None
+    
+    try:
+        saved = await snapshotter.save(client)
+        print(f"💾 Snapshot magazynu zapisany: {saved} kluczy")
+    except Exception as e:
+        print(f"❌ Storage snapshot save error: {e}")
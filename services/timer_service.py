@@ -0,0 +1,77 @@
+"""
+Service: Timery (harmonogram deadline w Redis)
+Odpowiedzialność: Timeouty na powrót po rozłączeniu - przeżywają restart serwera
+"""
+import asyncio
+from typing import Optional
+
+from redis_utils import DeadlineScheduler
+from services.redis_service import get_redis_client
+
+# Kolejka timerów rozłączeń (ruchy obsługuje timer_worker, kolejka "move")
+DISCONNECT_TIMER_QUEUE = "disconnect"
+
+_scheduler: Optional[DeadlineScheduler] = None
+scheduler_task: Optional[asyncio.Task] = None
+
+def disconnect_timer_id(game_id: str, player_id: str) -> str:
+    """ID timera rozłączenia gracza w grze"""
+    return f"{game_id}:{player_id}"
+
+def get_disconnect_scheduler() -> DeadlineScheduler:
+    """
+    Pobierz harmonogram timerów rozłączeń (singleton)
+
+    Returns:
+        DeadlineScheduler: Harmonogram dla kolejki "disconnect"
+    """
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = DeadlineScheduler(
+            get_redis_client(),
+            DISCONNECT_TIMER_QUEUE,
+            poll_interval=1.0
+        )
+    return _scheduler
+
+def setup_timer_scheduler():
+    """
+    Zarejestruj handlery i uruchom pętlę harmonogramu
+    Wywoływane w main.py przy startup (po init_redis)
+    """
+    global scheduler_task
+
+    # Import tutaj - unikamy cyklicznych importów z routerami
+    from routers.websocket_router import handle_disconnect_timer
+    from services.disconnect_service import disconnect_service
+
+    scheduler = get_disconnect_scheduler()
+    scheduler.register_handler("ws_disconnect", handle_disconnect_timer)
+    scheduler.register_handler("disconnect_service", disconnect_service.handle_timer)
+
+    if scheduler_task is None or scheduler_task.done():
+        scheduler_task = asyncio.create_task(scheduler.run())
+        print("✅ Harmonogram timerów uruchomiony")
+    else:
+        print("⚠️ Harmonogram timerów już działa")
+
+async def stop_timer_scheduler():
+    """
+    Zatrzymaj pętlę harmonogramu
+    Wywoływane w main.py przy shutdown
+    """
+    global scheduler_task, _scheduler
+
+    if _scheduler:
+        _scheduler.stop()
+
+    if scheduler_task and not scheduler_task.done():
+        scheduler_task.cancel()
+        try:
+            await scheduler_task
+        except asyncio.CancelledError:
+            pass
+        print("👋 Harmonogram timerów zatrzymany")
+
+    scheduler_task = None
+    _scheduler = None
@@ -0,0 +1,109 @@
+"""
+Service: Liczniki użytkowników platformy
+Odpowiedzialność: Zmaterializowane liczniki kont (zarejestrowani/boty/goście) w Redis
+
+- Liczniki aktualizowane przy zapisie (rejestracja, gość, bot, usunięcie konta)
+- Przy starcie odbudowywane jednym zapytaniem GROUP BY (is_bot, is_guest)
+- Liczba online pochodzi z indeksu obecności (presence_service)
+"""
+from typing import Dict
+
+from services.redis_service import get_redis_client
+
+# Wspólny hash tag - MGET/MSET liczników w jednym slocie Redis Cluster
+USER_COUNTER_KEYS = {
+    'registered': "stats:{users}:registered",
+    'bots': "stats:{users}:bots",
+    'guests': "stats:{users}:guests",
+}
+
+def user_kind(is_bot: bool = False, is_guest: bool = False) -> str:
+    """Rodzaj konta -> nazwa licznika"""
+    if is_bot:
+        return 'bots'
+    if is_guest:
+        return 'guests'
+    return 'registered'
+
+# ============================================
+# USER COUNTERS SERVICE CLASS
+# ============================================
+
+class UserCountersService:
+    """Liczniki kont użytkowników w Redis"""
+    
+    @property
+    def redis(self):
+        return get_redis_client()
+    
+    async def rebuild(self, redis_client=None) -> Dict[str, int]:
+        """
+        Przelicz liczniki z bazy (jedno zapytanie) i zapisz w Redis
+        
+        Args:
+            redis_client: Opcjonalny klient (skrypty poza serwerem)
+        
+        Returns:
+            dict: Nowe wartości liczników
+        """
+        from database import async_sessionmaker, User
+        from sqlalchemy import select, func
+        
+        counts = {kind: 0 for kind in USER_COUNTER_KEYS}
+        try:
+            async with async_sessionmaker() as session:
+                result = await session.execute(
+                    select(User.is_bot, User.is_guest, func.count(User.id))
+                    .group_by(User.is_bot, User.is_guest)
+                )
+                for is_bot, is_guest, count in result.all():
+                    counts[user_kind(is_bot, is_guest)] += count
+            
+            redis = redis_client or self.redis
+            await redis.mset({USER_COUNTER_KEYS[kind]: value for kind, value in counts.items()})
+            print(f"📊 Liczniki użytkowników: {counts}")
+        except Exception as e:
+            print(f"❌ User counters rebuild error: {e}")
+        return counts
+    
+    async def user_created(self, is_bot: bool = False, is_guest: bool = False):
+        """Nowe konto - zwiększ licznik"""
+        try:
+            await self.redis.incr(USER_COUNTER_KEYS[user_kind(is_bot, is_guest)])
+        except Exception as e:
+            print(f"❌ User counters incr error: {e}")
+    
+    async def user_deleted(self, is_bot: bool = False, is_guest: bool = False):
+        """Usunięte konto - zmniejsz licznik"""
+        try:
+            await self.redis.decr(USER_COUNTER_KEYS[user_kind(is_bot, is_guest)])
+        except Exception as e:
+            print(f"❌ User counters decr error: {e}")
+    
+    async def get_counts(self) -> Dict[str, int]:
+        """
+        Liczniki kont + online (jeden MGET + pipeline ZCOUNT)
+        
+        Returns:
+            dict: registered, bots, guests, total, online, guests_online, bots_online
+        """
+        from services.presence_service import presence_service
+        
+        counts: Dict[str, int] = {}
+        try:
+            values = await self.redis.mget(list(USER_COUNTER_KEYS.values()))
+            for kind, value in zip(USER_COUNTER_KEYS, values):
+                counts[kind] = max(int(value), 0) if value else 0
+        except Exception as e:
+            print(f"❌ User counters get error: {e}")
+            counts = {kind: 0 for kind in USER_COUNTER_KEYS}
+        
+        online = await presence_service.get_counts()
+        counts['total'] = counts['registered'] + counts['bots'] + counts['guests']
+        counts['online'] = online['all']
+        counts['guests_online'] = online['guest']
+        counts['bots_online'] = online['bot']
+        return counts
+
+# Singleton
+user_counters_service = UserCountersService()
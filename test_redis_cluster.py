@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Test układu kluczy pod Redis Cluster + lokalny klaster testowy
+
+- Klucze jednej gry (hash tag {id_gry}) i rodziny kluczy globalnych muszą
+  leżeć w jednym slocie - inaczej Lua/MULTI/DEL zwróci CROSSSLOT
+- Migracja kluczy sprzed hash tagów na fakeredis (pomijana bez fakeredis)
+- Testy na prawdziwym klastrze uruchamiają kilka procesów redis-server na
+  localhost (pomijane, gdy redis-server / redis-cli nie są zainstalowane)
+
+Uruchomienie:
+    pytest test_redis_cluster.py -v
+    python test_redis_cluster.py      # klaster na 127.0.0.1:7000-7002 do ręcznych testów
+"""
+import asyncio
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+import pytest
+
+pytest.importorskip("redis")
+pytest.importorskip("pydantic_settings")
+
+from redis.crc import key_slot
+
+CLUSTER_BASE_PORT = 7000
+CLUSTER_MASTERS = 3
+
+# ============================================
+# LOKALNY KLASTER (kilka procesów redis-server)
+# ============================================
+
+class LocalRedisCluster:
+    """Klaster Redis z kilku procesów redis-server na localhost (bez replik)"""
+    
+    def __init__(self, base_port: int = CLUSTER_BASE_PORT, masters: int = CLUSTER_MASTERS):
+        self.ports = [base_port + i for i in range(masters)]
+        self.workdir = None
+        self.processes = []
+    
+    @property
+    def nodes(self) -> str:
+        """Węzły w formacie REDIS_CLUSTER_NODES"""
+        return ",".join(f"127.0.0.1:{port}" for port in self.ports)
+    
+    @staticmethod
+    def available() -> bool:
+        return bool(shutil.which("redis-server") and shutil.which("redis-cli"))
+    
+    def _cli(self, port: int, *args: str) -> str:
+        return subprocess.run(
+            ["redis-cli", "-p", str(port), *args],
+            capture_output=True, text=True, timeout=30
+        ).stdout
+    
+    def start(self):
+        self.workdir = tempfile.mkdtemp(prefix="redis-cluster-")
+        for port in self.ports:
+            node_dir = os.path.join(self.workdir, str(port))
+            os.makedirs(node_dir)
+            self.processes.append(subprocess.Popen(
+                [
+                    "redis-server",
+                    "--port", str(port),
+                    "--cluster-enabled", "yes",
+                    "--cluster-config-file", "nodes.conf",
+                    "--dir", node_dir,
+                    "--save", "",
+                    "--appendonly", "no",
+                ],
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+            ))
+        
+        for port in self.ports:
+            self._wait(lambda: self._cli(port, "ping").strip() == "PONG", f"węzeł {port}")
+        
+        subprocess.run(
+            ["redis-cli", "--cluster", "create",
+             *[f"127.0.0.1:{port}" for port in self.ports],
+             "--cluster-replicas", "0", "--cluster-yes"],
+            capture_output=True, text=True, timeout=60, check=True
+        )
+        for port in self.ports:
+            self._wait(lambda: "cluster_state:ok" in self._cli(port, "cluster", "info"), f"klaster ({port})")
+        print(f"✅ Klaster Redis gotowy: {self.nodes}")
+    
+    def stop(self):
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        self.processes = []
+        if self.workdir:
+            shutil.rmtree(self.workdir, ignore_errors=True)
+            self.workdir = None
+    
+    @staticmethod
+    def _wait(check, what: str, timeout: float = 20.0):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if check():
+                return
+            time.sleep(0.2)
+        raise RuntimeError(f"Timeout: {what}")
+
+@pytest.fixture(scope="module")
+def cluster():
+    if not LocalRedisCluster.available():
+        pytest.skip("redis-server / redis-cli niedostępne")
+    local_cluster = LocalRedisCluster()
+    try:
+        local_cluster.start()
+        yield local_cluster
+    finally:
+        local_cluster.stop()
+
+def _slots(keys) -> set:
+    return {key_slot(key.encode()) for key in keys}
+
+# ============================================
+# UKŁAD KLUCZY (bez serwera)
+# ============================================
+
+def test_game_keys_share_slot():
+    """Wszystkie klucze gry w jednym slocie, różne gry w różnych slotach"""
+    from services.redis_service import game_keys, game_lock_key, game_fence_key, lobby_key
+    
+    keys = game_keys("abc123", ["Jakub", "Bot #1"]) + [game_lock_key("abc123"), game_fence_key("abc123")]
+    assert len(_slots(keys)) == 1
+    
+    lobby_slots = _slots(lobby_key(f"gra{i}") for i in range(50))
+    assert len(lobby_slots) > 1
+
+def test_global_key_families_share_slot():
+    """Klucze używane razem w Lua/MULTI mają wspólny hash tag"""
+    from services.redis_service import (
+        LOBBY_INDEX_ALL, LOBBY_INDEX_SUMMARY, LOBBY_INDEX_CREATED, LOBBY_INDEX_REVS, lobby_index_key
+    )
+    from services.presence_service import PRESENCE_ONLINE, PRESENCE_GUESTS, PRESENCE_BOTS, PRESENCE_DIRTY
+    from services.leaderboard_service import (
+        LEADERBOARD_GLOBAL, LEADERBOARD_ADMINS, LEADERBOARD_GAMES, LEADERBOARD_BUILT, leaderboard_key
+    )
+    from services.session_service import session_key, session_version_key
+    from services.user_counters_service import USER_COUNTER_KEYS
+    from redis_utils import timer_queue_key
+    
+    families = [
+        [LOBBY_INDEX_ALL, LOBBY_INDEX_SUMMARY, LOBBY_INDEX_CREATED, LOBBY_INDEX_REVS,
+         lobby_index_key("LOBBY"), lobby_index_key(None, "66"), lobby_index_key("W_GRZE", "tysiac")],
+        [PRESENCE_ONLINE, PRESENCE_GUESTS, PRESENCE_BOTS, PRESENCE_DIRTY],
+        [LEADERBOARD_GLOBAL, LEADERBOARD_ADMINS, LEADERBOARD_GAMES, LEADERBOARD_BUILT,
+         leaderboard_key(1), f"{leaderboard_key(1)}:rebuild"],
+        [session_key(7), session_version_key(7)],
+        list(USER_COUNTER_KEYS.values()),
+        [timer_queue_key("move", part) for part in ("deadlines", "processing", "payload")],
+    ]
+    for family in families:
+        assert len(_slots(family)) == 1, family
+
+# ============================================
+# MIGRACJA KLUCZY SPRZED HASH TAGÓW (fakeredis)
+# ============================================
+
+async def _legacy_migration():
+    import fakeredis
+    import json
+    import services.redis_service as redis_module
+    from services.redis_service import RedisService, lobby_key, engine_key, disconnect_key, LOBBY_INDEX_ALL
+    from services.leaderboard_service import LEADERBOARD_GLOBAL
+    from services.session_service import session_key
+    from services.key_migration_service import migrate_legacy_keys
+    from redis_utils import timer_queue_key
+    
+    client = fakeredis.FakeAsyncRedis(decode_responses=False)
+    redis_module._redis_client = client
+    try:
+        now = time.time()
+        await client.set("lobby:abc123", json.dumps({
+            "id_gry": "abc123", "nazwa": "Stary stół", "status_partii": "LOBBY",
+            "opcje": {"typ_gry": "66"}, "max_graczy": 2, "host_id": 1,
+            "slots": [{"typ": "pusty"}, {"typ": "pusty"}],
+            "created_at": now, "last_activity": now,
+        }), ex=3600)
+        await client.set("game:abc123", b"silnik")
+        await client.set("disconnected:abc123:Jakub", now)
+        await client.zadd("ranking:global", {"Jakub": 1200})
+        await client.set("session:7", b"{}")
+        await client.zadd("timers:move:deadlines", {"abc123:Jakub": now})
+        await client.zadd("lobby_index:all", {"abc123": now})
+        # Nowsza wartość pod nową nazwą wygrywa
+        await client.zadd(LEADERBOARD_GLOBAL, {"Jakub": 1300})
+        
+        assert await migrate_legacy_keys(client) == 5
+        for key in (lobby_key("abc123"), engine_key("abc123"), disconnect_key("abc123", "Jakub"),
+                    session_key(7), timer_queue_key("move", "deadlines")):
+            assert await client.exists(key), key
+        assert 0 < await client.ttl(lobby_key("abc123")) <= 3600
+        assert await client.zscore(LEADERBOARD_GLOBAL, "Jakub") == 1300
+        assert await client.keys("lobby_index:*") == []
+        assert await client.keys("ranking:*") == []
+        
+        # Indeks odbudowany z przeniesionych kluczy, drugi start bez SCAN
+        assert await RedisService().rebuild_lobby_index() == 1
+        assert await client.zrange(LOBBY_INDEX_ALL, 0, -1) == [b"abc123"]
+        await client.set("lobby:pozniej", b"{}")
+        assert await migrate_legacy_keys(client) == 0
+    finally:
+        redis_module._redis_client = None
+        await client.aclose()
+
+def test_legacy_keys_migration():
+    """Klucze sprzed hash tagów przeniesione pod nowe nazwy, indeks odbudowany"""
+    pytest.importorskip("fakeredis")
+    asyncio.run(_legacy_migration())
+
+# ============================================
+# PRAWDZIWY KLASTER
+# ============================================
+
+async def _lobby_flow(nodes: str):
+    from config import settings
+    import services.redis_service as redis_module
+    from services.redis_service import RedisService, lobby_key
+    from services.lobby_service import LobbyService
+    from services.storage_service import create_storage_client
+    
+    settings.REDIS_CLUSTER_NODES = nodes
+    client = create_storage_client("cluster")
+    redis_module._redis_client = client
+    try:
+        redis = RedisService()
+        lobby_ids = [f"klaster{i}" for i in range(8)]
+        for i, lobby_id in enumerate(lobby_ids):
+            await redis.save_lobby(lobby_id, {
+                "id_gry": lobby_id,
+                "nazwa": f"Stół {i}",
+                "status_partii": "LOBBY",
+                "opcje": {"typ_gry": "66"},
+                "max_graczy": 2,
+                "host_id": 1,
+                "slots": [{"typ": "pusty"}, {"typ": "pusty"}],
+                "created_at": time.time(),
+                "last_activity": time.time(),
+            })
+        
+        # Lobby rozłożone na kilka węzłów
+        nodes_used = {client.nodes_manager.get_node_from_slot(key_slot(lobby_key(i).encode())).name for i in lobby_ids}
+        assert len(nodes_used) > 1
+        
+        # Mutacja w slocie gry + indeks w slocie indeksu
+        lobby, error, _ = await LobbyService(redis).join(lobby_ids[0], 5, "Jakub")
+        assert error is None and lobby["slots"][0]["nazwa"] == "Jakub"
+        
+        assert await redis.count_lobbies("LOBBY") == len(lobby_ids)
+        assert len(await redis.list_lobbies("LOBBY")) == len(lobby_ids)
+        summaries = await redis.get_lobby_summaries(lobby_ids[:1])
+        assert summaries[lobby_ids[0]]["players"] == 1
+        
+        # Silnik pod lockiem (lock, fencing i silnik w jednym slocie)
+        async with redis.game_lock(lobby_ids[0]) as lock:
+            assert await redis.save_game_engine(lobby_ids[0], {"rozdanie": 1}, lock=lock)
+        assert await redis.get_game_engine(lobby_ids[0]) == {"rozdanie": 1}
+        
+        await redis.append_chat(lobby_ids[0], {"tresc": "cześć"})
+        
+        assert await redis.rebuild_lobby_index() == len(lobby_ids)
+        
+        assert await redis.purge_games(lobby_ids) == len(lobby_ids)
+        assert await redis.count_lobbies() == 0
+        assert await redis.get_lobby(lobby_ids[0]) is None
+    finally:
+        redis_module._redis_client = None
+        await client.aclose()
+
+def test_lobby_flow_on_cluster(cluster):
+    """Zapis, mutacje, lista, lock, czat i usuwanie gier na klastrze 3 węzłów"""
+    asyncio.run(_lobby_flow(cluster.nodes))
+
+if __name__ == "__main__":
+    # Klaster do ręcznych testów: STORAGE_BACKEND=cluster REDIS_CLUSTER_NODES=...
+    local_cluster = LocalRedisCluster()
+    local_cluster.start()
+    print(f"STORAGE_BACKEND=cluster REDIS_CLUSTER_NODES={local_cluster.nodes}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        local_cluster.stop()
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Test backendów magazynu stanu (services/storage_service.py)
+
+- Wybór klienta z STORAGE_BACKEND: redis / cluster / memory, nieznany -> ValueError
+- Backend "memory" (fakeredis z Lua): zapis lobby pod lockiem gry (skrypty Lua
+  fencingu i indeksu), odczyt, TTL, zapis z kontrolą wersji lobby
+- Snapshot: DUMP + TTL do pliku i przywrócenie - TTL zachowany, klucze po
+  terminie pominięte
+
+Uruchomienie:
+    pytest test_storage_backend.py -v
+"""
+import asyncio
+import os
+import tempfile
+
+import pytest
+
+pytest.importorskip("redis")
+pytest.importorskip("pydantic_settings")
+
+# ============================================
+# WYBÓR BACKENDU
+# ============================================
+
+def test_backend_selection():
+    """Każdy backend daje właściwego klienta, nieznany kończy się ValueError"""
+    from redis.asyncio import Redis
+    from redis.asyncio.cluster import RedisCluster
+    from config import settings
+    from services.storage_service import create_storage_client
+    
+    assert isinstance(create_storage_client("redis"), Redis)
+    
+    previous = settings.REDIS_CLUSTER_NODES
+    settings.REDIS_CLUSTER_NODES = "127.0.0.1:7000"
+    try:
+        # Bez łączenia - klaster wykrywany dopiero przy pierwszej komendzie
+        assert isinstance(create_storage_client("CLUSTER"), RedisCluster)
+    finally:
+        settings.REDIS_CLUSTER_NODES = previous
+    
+    with pytest.raises(ValueError):
+        create_storage_client("memcached")
+
+def test_memory_backend_selection():
+    """Backend "memory" to fakeredis z obsługą Lua"""
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    from services.storage_service import create_storage_client
+    
+    client = create_storage_client("memory")
+    assert isinstance(client, fakeredis.FakeAsyncRedis)
+    
+    async def _eval():
+        try:
+            return await client.eval("return redis.call('SET', KEYS[1], ARGV[1])", 1, "k", "v")
+        finally:
+            await client.aclose()
+    
+    assert asyncio.run(_eval()) in (b"OK", "OK", True)
+
+def test_memory_backend_without_lua(monkeypatch):
+    """Bez lupa backend "memory" kończy start czytelnym RuntimeError"""
+    pytest.importorskip("fakeredis")
+    import sys
+    from services.storage_service import create_storage_client
+    
+    monkeypatch.setitem(sys.modules, "lupa", None)
+    with pytest.raises(RuntimeError, match="fakeredis\\[lua\\]"):
+        create_storage_client("memory")
+
+# ============================================
+# BACKEND "MEMORY"
+# ============================================
+
+async def _memory_lobby_flow():
+    import services.redis_service as redis_module
+    from services.redis_service import RedisService, lobby_key
+    from services.storage_service import create_storage_client
+    
+    client = create_storage_client("memory")
+    redis_module._redis_client = client
+    try:
+        redis = RedisService()
+        lobby = {
+            "id_gry": "pamiec1", "nazwa": "Stół w pamięci", "status_partii": "LOBBY",
+            "opcje": {"typ_gry": "66"}, "max_graczy": 2, "host_id": 1,
+            "slots": [{"typ": "pusty"}, {"typ": "pusty"}],
+        }
+        async with redis.game_lock("pamiec1") as lock:
+            assert await redis.save_lobby("pamiec1", lobby, lock=lock)
+        
+        saved = await redis.get_lobby("pamiec1")
+        assert saved["nazwa"] == "Stół w pamięci"
+        assert await client.ttl(lobby_key("pamiec1")) > 0
+        
+        summaries = await redis.list_lobby_summaries()
+        assert [s["id_gry"] for s in summaries] == ["pamiec1"]
+    finally:
+        redis_module._redis_client = None
+        await client.aclose()
+
+def test_memory_backend_lobby():
+    """Zapis lobby pod lockiem gry (Lua) i odczyt na backendzie "memory" """
+    pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    asyncio.run(_memory_lobby_flow())
+
+async def _versioned_update_flow():
+    import services.redis_service as redis_module
+    from services.redis_service import RedisService
+    from services.lobby_service import LobbyService
+    from services.storage_service import create_storage_client
+    
+    client = create_storage_client("memory")
+    redis_module._redis_client = client
+    try:
+        redis = RedisService()
+        await redis.save_lobby("wersja1", {
+            "id_gry": "wersja1", "nazwa": "Po meczu", "status_partii": "ZAKONCZONA",
+            "opcje": {"typ_gry": "66"}, "max_graczy": 2, "host_id": 1,
+            "slots": [
+                {"typ": "gracz", "id_uzytkownika": 1, "nazwa": "Anna", "is_host": True},
+                {"typ": "gracz", "id_uzytkownika": 2, "nazwa": "Jakub", "is_host": False},
+            ],
+        })
+        calls = []
+        
+        async def rewrite_slots(lobby):
+            calls.append([s["nazwa"] for s in lobby["slots"]])
+            if len(calls) == 1:
+                # Jakub wychodzi (Lua, bez locka gry) między odczytem a zapisem
+                await LobbyService(redis).leave("wersja1", user_id=2, keep_lobby=True)
+            lobby["status_partii"] = "LOBBY"
+        
+        async with redis.game_lock("wersja1") as lock:
+            saved = await redis.update_lobby("wersja1", rewrite_slots, lock=lock)
+        
+        assert calls == [["Anna", "Jakub"], ["Anna", None]]
+        assert saved["status_partii"] == "LOBBY"
+        assert [s["nazwa"] for s in (await redis.get_lobby("wersja1"))["slots"]] == ["Anna", None]
+        
+        # mutate zwraca False - bez zapisu
+        assert (await redis.update_lobby("wersja1", lambda lobby: False))["status_partii"] == "LOBBY"
+        assert await redis.update_lobby("brak", lambda lobby: None) is None
+    finally:
+        redis_module._redis_client = None
+        await client.aclose()
+
+def test_versioned_lobby_update():
+    """Zapis pod lockiem nie nadpisuje równoległej operacji Lua - mutate na świeżym lobby"""
+    pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    asyncio.run(_versioned_update_flow())
+
+# ============================================
+# SNAPSHOTY
+# ============================================
+
+async def _snapshot_round_trip(path: str):
+    from services.storage_service import create_storage_client, StorageSnapshotter
+    
+    client = create_storage_client("memory")
+    try:
+        await client.set("trwaly", b"\x80binarny")
+        await client.set("z_ttl", b"wartosc", ex=3600)
+        await client.set("krotki", b"zaraz", px=200)
+        await client.rpush("lista", b"a", b"b")
+        await client.zadd("zbior", {"x": 1.5})
+        
+        snapshotter = StorageSnapshotter(path)
+        assert await snapshotter.save(client) == 5
+        assert not os.path.exists(f"{path}.tmp")
+        
+        await client.flushall()
+        await asyncio.sleep(0.3)  # "krotki" wygasa między zapisem a odczytem
+        
+        assert await snapshotter.load(client) == 4
+        assert await client.get("trwaly") == b"\x80binarny"
+        assert await client.ttl("trwaly") == -1
+        assert 3500 < await client.ttl("z_ttl") <= 3600
+        assert not await client.exists("krotki")
+        assert await client.lrange("lista", 0, -1) == [b"a", b"b"]
+        assert await client.zscore("zbior", "x") == 1.5
+        
+        # Brak pliku - nic do przywrócenia
+        assert await StorageSnapshotter(f"{path}.brak").load(client) == 0
+    finally:
+        await client.aclose()
+
+def test_snapshot_round_trip():
+    """Snapshot zachowuje wartości i TTL, pomija klucze po terminie"""
+    pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    with tempfile.TemporaryDirectory() as tmp:
+        asyncio.run(_snapshot_round_trip(os.path.join(tmp, "storage.snapshot")))
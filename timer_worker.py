@@ -9,6 +9,10 @@ Ten moduł może być:
 3. Uruchomiony jako osobny kontener Docker
 
 Zaleta: Timer działa nawet jeśli serwer obsługujący gracza się restartuje.
+
+Timery trzymane są w sorted secie Redis (DeadlineScheduler, kolejka "move"),
+więc worker dotyka tylko gier, których deadline minął - bez skanowania
+wszystkich lobby co sekundę.
 """
 
 import asyncio
@@ -38,6 +42,33 @@ except ImportError:
             remaining = timer_info.get("deadline_timestamp", time.time()) - time.time()
             return max(0.0, remaining)
 
+from redis_utils import DeadlineScheduler, RedisLock, LockTimeoutError
+
+try:
+    from services.redis_service import (
+        lobby_key, game_lock_key, game_fence_key, GAME_LOCK_TIMEOUT, GAME_LOCK_WAIT_TIMEOUT
+    )
+except ImportError:
+    # Standalone: ten sam schemat kluczy (hash tag gry)
+    def lobby_key(id_gry: str) -> str:
+        return f"lobby:{{{id_gry}}}"
+    
+    def game_lock_key(id_gry: str) -> str:
+        return f"lock:game:{{{id_gry}}}"
+    
+    def game_fence_key(id_gry: str) -> str:
+        return f"fence:game:{{{id_gry}}}"
+    
+    GAME_LOCK_TIMEOUT = 10
+    GAME_LOCK_WAIT_TIMEOUT = 15.0
+
+# Kolejka timerów ruchu (wspólna dla wszystkich instancji workera)
+MOVE_TIMER_QUEUE = "move"
+
+def move_timer_id(id_gry: str) -> str:
+    """ID timera ruchu dla gry (jeden aktywny timer na grę)"""
+    return f"move:{id_gry}"
+
 
 class TimerWorker:
     """
@@ -48,28 +79,38 @@ class TimerWorker:
         self, 
         redis_url: str = "redis://localhost",
         check_interval: float = 1.0,
-        debug: bool = False
+        debug: bool = False,
+        redis_client: Optional[aioredis.Redis] = None
     ):
         """
         Args:
             redis_url: URL do Redis
             check_interval: Interwał sprawdzania (sekundy)
             debug: Czy włączyć szczegółowe logi
+            redis_client: Gotowy klient (np. Redis Cluster) zamiast redis_url
         """
         self.redis_url = redis_url
         self.check_interval = check_interval
         self.debug = debug
-        self.redis_client: Optional[aioredis.Redis] = None
+        self.redis_client: Optional[aioredis.Redis] = redis_client
+        self.scheduler: Optional[DeadlineScheduler] = None
         self.running = False
     
     async def connect(self):
         """Łączy się z Redis"""
-        if not self.redis_client:
-            self.redis_client = aioredis.from_url(
-                self.redis_url, 
-                decode_responses=False
-            )
+        if not self.scheduler:
+            if not self.redis_client:
+                self.redis_client = aioredis.from_url(
+                    self.redis_url, 
+                    decode_responses=False
+                )
             await self.redis_client.ping()
+            self.scheduler = DeadlineScheduler(
+                self.redis_client,
+                MOVE_TIMER_QUEUE,
+                poll_interval=self.check_interval
+            )
+            self.scheduler.register_handler("move", self._on_move_timer)
             print("[Timer Worker] Połączono z Redis")
     
     async def close(self):
@@ -81,30 +122,74 @@ class TimerWorker:
     async def get_lobby_data(self, id_gry: str) -> Optional[Dict[str, Any]]:
         """Pobiera dane lobby z Redis"""
         try:
-            json_data = await self.redis_client.get(f"lobby:{id_gry}")
+            json_data = await self.redis_client.get(lobby_key(id_gry))
             if json_data:
-                return json.loads(json_data.decode('utf-8'))
+                lobby_data = json.loads(json_data.decode('utf-8'))
+                # Lobby zapisane przez Lua (cjson) może mieć {} zamiast []
+                for field in ('slots', 'kicked_players'):
+                    if lobby_data.get(field) == {}:
+                        lobby_data[field] = []
+                return lobby_data
             return None
         except Exception as e:
             print(f"[Timer Worker] BŁĄD get_lobby: {e}")
             return None
     
-    async def save_lobby_data(self, id_gry: str, lobby_data: Dict[str, Any]):
-        """Zapisuje dane lobby do Redis"""
+    def game_lock(self, id_gry: str) -> RedisLock:
+        """Lock mutacji gry - ten sam co RedisService.game_lock w serwerze"""
+        return RedisLock(
+            self.redis_client, game_lock_key(id_gry),
+            timeout=GAME_LOCK_TIMEOUT,
+            fence_key=game_fence_key(id_gry),
+            auto_renew=True,
+            wait_timeout=GAME_LOCK_WAIT_TIMEOUT
+        )
+    
+    async def save_lobby_data(self, id_gry: str, lobby_data: Dict[str, Any], lock: Optional[RedisLock] = None):
+        """Zapisuje dane lobby do Redis (z lockiem gry - zapis z tokenem fencingu)"""
         try:
             # Usuń przejściowe dane (jeśli istnieją)
             lobby_data.pop("timer_task", None)
             lobby_data.pop("bot_loop_lock", None)
             
-            json_data = json.dumps(lobby_data)
-            await self.redis_client.set(
-                f"lobby:{id_gry}", 
-                json_data, 
-                ex=21600  # 6 godzin
-            )
+            try:
+                # Zapis razem z indeksem lobby (jak RedisService.save_lobby)
+                from services.redis_service import store_lobby
+            except ImportError:
+                await self.redis_client.set(
+                    lobby_key(id_gry), 
+                    json.dumps(lobby_data), 
+                    ex=21600  # 6 godzin
+                )
+                return
+            
+            await store_lobby(self.redis_client, id_gry, lobby_data, 21600, lock)
         except Exception as e:
             print(f"[Timer Worker] BŁĄD save_lobby: {e}")
     
+    async def update_lobby_data(self, id_gry: str, mutate, lock: Optional[RedisLock] = None) -> bool:
+        """
+        Odczyt-modyfikacja-zapis lobby z kontrolą wersji (jak RedisService.update_lobby)
+        
+        Returns:
+            bool: True jeśli lobby zapisane (mutate nie zwróciło False)
+        """
+        try:
+            from services.redis_service import update_stored_lobby
+        except ImportError:
+            lobby_data = await self.get_lobby_data(id_gry)
+            if not lobby_data or mutate(lobby_data) is False:
+                return False
+            await self.save_lobby_data(id_gry, lobby_data, lock)
+            return True
+        
+        try:
+            _, rev = await update_stored_lobby(self.redis_client, id_gry, mutate, 21600, lock)
+            return bool(rev)
+        except Exception as e:
+            print(f"[Timer Worker] BŁĄD update_lobby: {e}")
+            return False
+    
     async def publish_state_update(self, id_gry: str):
         """Publikuje powiadomienie o zmianie stanu"""
         try:
@@ -116,6 +201,23 @@ class TimerWorker:
     async def publish_chat_message(self, id_gry: str, message_text: str):
         """Publikuje wiadomość systemową na czat"""
         try:
+            try:
+                # Strumień czatu lobby (dostarczany graczom przez WebSocket)
+                from services.redis_service import append_chat_message
+            except ImportError:
+                append_chat_message = None
+            
+            if append_chat_message is not None:
+                await append_chat_message(self.redis_client, id_gry, {
+                    "id": int(time.time() * 1000),
+                    "user_id": None,
+                    "username": "System",
+                    "message": message_text,
+                    "timestamp": time.time(),
+                    "is_system": True
+                })
+                return
+            
             chat_data = {
                 "type": "CHAT",
                 "typ_wiadomosci": "czat",
@@ -139,93 +241,154 @@ class TimerWorker:
         """
         print(f"[Timer Worker] ⏰ TIMEOUT dla {player_id} w grze {id_gry}")
         
-        lobby_data = await self.get_lobby_data(id_gry)
-        if not lobby_data:
-            print(f"[Timer Worker] BŁĄD: Brak lobby dla {id_gry}")
-            return
+        # Pod lockiem gry - ruch gracza nie może nałożyć się na zakończenie na czas
+        async with self.game_lock(id_gry) as lock:
+            if not await self._end_game_on_timeout(id_gry, player_id, timer_info, lock):
+                return
         
-        # Sprawdź, czy to wciąż ten sam ruch
-        if lobby_data.get("timer_info", {}).get("move_number") != timer_info.get("move_number"):
-            if self.debug:
-                print(f"[Timer Worker] Timer nieaktualny dla {id_gry} (ruch się zmienił)")
-            return
+        # === POWIADOM KLIENTÓW ===
+        await self.publish_state_update(id_gry)
+        await self.publish_chat_message(
+            id_gry, 
+            f"Gracz {player_id} przegrał na czas! ⏰"
+        )
         
-        # Sprawdź, czy gra wciąż trwa
-        if lobby_data.get("status_partii") != "W_TRAKCIE":
-            if self.debug:
-                print(f"[Timer Worker] Gra {id_gry} już nie jest W_TRAKCIE")
-            return
+        print(f"[Timer Worker] ✓ Obsłużono timeout dla {player_id} w {id_gry}")
+    
+    async def _end_game_on_timeout(
+        self, id_gry: str, player_id: str, timer_info: dict, lock: RedisLock
+    ) -> bool:
+        """
+        Kończy grę na czas (wywoływane pod lockiem gry, na świeżym lobby).
         
-        # === USTAL ZWYCIĘZCÓW ===
+        Returns:
+            bool: True jeśli gra zakończona (timer aktualny, gra w toku)
+        """
+        found = []
         outcome = {}
-        max_graczy = lobby_data.get("max_graczy", 4)
         
-        if max_graczy == 4:
-            # Gra 4-osobowa (drużyny)
-            przegrany_slot = next(
-                (s for s in lobby_data["slots"] if s["nazwa"] == player_id), 
-                None
-            )
+        def end_on_timeout(lobby_data: Dict[str, Any]) -> bool:
+            found[:] = [lobby_data]
+            outcome.clear()
+            
+            # Sprawdź, czy to wciąż ten sam ruch
+            if lobby_data.get("timer_info", {}).get("move_number") != timer_info.get("move_number"):
+                if self.debug:
+                    print(f"[Timer Worker] Timer nieaktualny dla {id_gry} (ruch się zmienił)")
+                return False
             
-            if przegrany_slot:
-                przegrana_druzyna = przegrany_slot.get("druzyna")
+            # Sprawdź, czy gra wciąż trwa
+            if lobby_data.get("status_partii") != "W_TRAKCIE":
+                if self.debug:
+                    print(f"[Timer Worker] Gra {id_gry} już nie jest W_TRAKCIE")
+                return False
+            
+            # === USTAL ZWYCIĘZCÓW ===
+            max_graczy = lobby_data.get("max_graczy", 4)
+            
+            if max_graczy == 4:
+                # Gra 4-osobowa (drużyny)
+                przegrany_slot = next(
+                    (s for s in lobby_data["slots"] if s["nazwa"] == player_id), 
+                    None
+                )
                 
-                # Wszyscy z przegranej drużyny przegrywają
+                if przegrany_slot:
+                    przegrana_druzyna = przegrany_slot.get("druzyna")
+                    
+                    # Wszyscy z przegranej drużyny przegrywają
+                    for slot in lobby_data["slots"]:
+                        if slot.get("druzyna") == przegrana_druzyna:
+                            outcome[slot["nazwa"]] = 0.0  # Przegrana
+                        else:
+                            outcome[slot["nazwa"]] = 1.0  # Wygrana
+            
+            elif max_graczy == 3:
+                # Gra 3-osobowa (FFA)
+                # Gracz który timeout'ował przegrywa
+                # Pozostali dzielą wygraną
                 for slot in lobby_data["slots"]:
-                    if slot.get("druzyna") == przegrana_druzyna:
+                    if slot["nazwa"] == player_id:
                         outcome[slot["nazwa"]] = 0.0  # Przegrana
                     else:
-                        outcome[slot["nazwa"]] = 1.0  # Wygrana
-        
-        elif max_graczy == 3:
-            # Gra 3-osobowa (FFA)
-            # Gracz który timeout'ował przegrywa
-            # Pozostali dzielą wygraną
-            for slot in lobby_data["slots"]:
-                if slot["nazwa"] == player_id:
-                    outcome[slot["nazwa"]] = 0.0  # Przegrana
-                else:
-                    outcome[slot["nazwa"]] = 0.5  # Podział wygranej
-        
-        # === ZAKOŃCZ GRĘ ===
-        lobby_data["status_partii"] = "ZAKONCZONA"
-        lobby_data["timer_info"] = None  # Usuń timer
-        lobby_data["timeout_result"] = {
-            "reason": "timeout",
-            "player": player_id,
-            "outcome": outcome,
-            "timestamp": time.time()
-        }
-        
-        # === AKTUALIZUJ ELO (jeśli rankingowa) ===
-        if lobby_data.get("opcje", {}).get("rankingowa", False):
-            # TODO: Ta część wymaga dostępu do bazy danych
-            # Można to zrobić przez:
-            # 1. Osobny endpoint HTTP w main.py: POST /internal/update_elo
-            # 2. Bezpośrednie połączenie z PostgreSQL (wymaga importu SQLAlchemy)
-            # 3. Zapisanie outcome w Redis i przetworzenie przez główny serwer
+                        outcome[slot["nazwa"]] = 0.5  # Podział wygranej
             
-            # Opcja 3 (najprostsza):
-            lobby_data["elo_to_process"] = {
+            # === ZAKOŃCZ GRĘ ===
+            lobby_data["status_partii"] = "ZAKONCZONA"
+            lobby_data["timer_info"] = None  # Usuń timer
+            lobby_data["timeout_result"] = {
+                "reason": "timeout",
+                "player": player_id,
                 "outcome": outcome,
-                "processed": False
+                "timestamp": time.time()
             }
-            print(f"[Timer Worker] Oznaczono Elo do przetworzenia dla {id_gry}")
+            return True
         
-        # === ZAPISZ ZMIANY ===
-        await self.save_lobby_data(id_gry, lobby_data)
+        # === ZAPISZ ZMIANY (świeże lobby, z kontrolą wersji) ===
+        if not await self.update_lobby_data(id_gry, end_on_timeout, lock):
+            if not found:
+                print(f"[Timer Worker] BŁĄD: Brak lobby dla {id_gry}")
+            return False
         
-        # === POWIADOM KLIENTÓW ===
-        await self.publish_state_update(id_gry)
-        await self.publish_chat_message(
-            id_gry, 
-            f"Gracz {player_id} przegrał na czas! ⏰"
-        )
+        # === ZGŁOŚ WYNIK (statystyki i ELO księguje worker wyników meczów) ===
+        if outcome:
+            await self.publish_match_result(id_gry, found[0], outcome)
+        return True
+    
+    async def publish_match_result(self, id_gry: str, lobby_data: Dict[str, Any], outcome: Dict[str, float]):
+        """
+        Publikuje wynik meczu zakończonego na czas do strumienia wyników
+        (ten sam strumień co koniec meczu w serwerze - worker nie potrzebuje bazy)
+        """
+        try:
+            from services.match_results_service import (
+                MATCH_RESULTS_STREAM, MATCH_RESULTS_MAXLEN, encode_match_result
+            )
+            
+            typ_gry = lobby_data.get("opcje", {}).get("typ_gry", "66")
+            game_type_name = "Tysiąc" if typ_gry in ("tysiac", "1000") else "66"
+            match_id = lobby_data.get("match_id") or f"{id_gry}:timeout:{int(time.time())}"
+            
+            fields = encode_match_result(
+                match_id,
+                game_type_name,
+                [name for name, score in outcome.items() if score > 0],
+                [name for name, score in outcome.items() if score <= 0],
+                lobby_data.get("is_casual", False)
+            )
+            await self.redis_client.xadd(
+                MATCH_RESULTS_STREAM, fields, maxlen=MATCH_RESULTS_MAXLEN, approximate=True
+            )
+            print(f"[Timer Worker] Wynik meczu {match_id} w kolejce do zaksięgowania")
+        except Exception as e:
+            print(f"[Timer Worker] BŁĄD publikacji wyniku: {e}")
+    
+    async def schedule_timer(self, id_gry: str, timer_info: dict):
+        """
+        Rejestruje timer ruchu w harmonogramie (nadpisuje poprzedni dla gry).
         
-        print(f"[Timer Worker] ✓ Obsłużono timeout dla {player_id} w {id_gry}")
+        Args:
+            id_gry: ID gry
+            timer_info: Wynik TimerInfo.create(...) zapisany w lobby_data["timer_info"]
+        """
+        await self.scheduler.schedule(
+            move_timer_id(id_gry),
+            timer_info.get("deadline_timestamp", time.time()),
+            {
+                "kind": "move",
+                "id_gry": id_gry,
+                "player_id": timer_info.get("player_id"),
+                "move_number": timer_info.get("move_number")
+            }
+        )
+    
+    async def cancel_timer(self, id_gry: str):
+        """Usuwa timer ruchu gry (np. koniec gry)"""
+        await self.scheduler.cancel(move_timer_id(id_gry))
     
-    async def check_game_timers(self, id_gry: str):
-        """Sprawdza timery dla jednej gry"""
+    async def _on_move_timer(self, timer_id: str, payload: dict):
+        """Handler harmonogramu - deadline ruchu minął"""
+        id_gry = payload.get("id_gry")
         try:
             lobby_data = await self.get_lobby_data(id_gry)
             if not lobby_data:
@@ -244,53 +407,45 @@ class TimerWorker:
             if not timer_info:
                 return
             
-            # Sprawdź czy wygasł
-            if TimerInfo.is_expired(timer_info):
-                player_id = timer_info.get("player_id")
-                if player_id:
-                    await self.handle_timeout(id_gry, player_id, timer_info)
+            # Fencing - timer z harmonogramu musi dotyczyć bieżącego ruchu
+            if timer_info.get("move_number") != payload.get("move_number"):
+                if self.debug:
+                    print(f"[Timer Worker] Timer {timer_id} nieaktualny (ruch się zmienił)")
+                return
+            
+            # Deadline mógł zostać przesunięty bez przeplanowania
+            if not TimerInfo.is_expired(timer_info):
+                await self.schedule_timer(id_gry, timer_info)
+                return
+            
+            player_id = timer_info.get("player_id")
+            if player_id:
+                await self.handle_timeout(id_gry, player_id, timer_info)
         
+        except LockTimeoutError:
+            # Gra zajęta dłużej niż GAME_LOCK_WAIT_TIMEOUT - spróbuj ponownie za chwilę
+            print(f"[Timer Worker] Gra {id_gry} zajęta - timer przełożony")
+            await self.scheduler.schedule(timer_id, time.time() + 1.0, payload)
         except Exception as e:
-            print(f"[Timer Worker] BŁĄD check_game_timers dla {id_gry}: {e}")
+            print(f"[Timer Worker] BŁĄD timera dla {id_gry}: {e}")
             if self.debug:
                 traceback.print_exc()
     
     async def run(self):
         """
         Główna pętla workera.
-        Skanuje wszystkie gry i sprawdza timeouty.
+        Obsługuje tylko timery, których deadline minął (sorted set w Redis).
         """
         await self.connect()
         self.running = True
         
         print(f"[Timer Worker] Uruchomiono (interwał: {self.check_interval}s)")
         
-        iteration = 0
-        
-        while self.running:
-            try:
-                iteration += 1
-                
-                if self.debug and iteration % 10 == 0:
-                    print(f"[Timer Worker] Iteracja {iteration}")
-                
-                # Skanuj wszystkie gry
-                game_ids = []
-                async for key in self.redis_client.scan_iter("lobby:*"):
-                    id_gry = key.decode('utf-8').split(":")[-1]
-                    game_ids.append(id_gry)
-                
-                # Sprawdź timery dla każdej gry
-                for id_gry in game_ids:
-                    await self.check_game_timers(id_gry)
-                
-                # Czekaj przed następnym sprawdzeniem
-                await asyncio.sleep(self.check_interval)
-            
-            except Exception as e:
-                print(f"[Timer Worker] BŁĄD KRYTYCZNY w pętli: {e}")
-                traceback.print_exc()
-                await asyncio.sleep(5.0)  # Czekaj dłużej po błędzie
+        try:
+            await self.scheduler.run()
+        except Exception as e:
+            print(f"[Timer Worker] BŁĄD KRYTYCZNY w pętli: {e}")
+            traceback.print_exc()
         
         await self.close()
         print("[Timer Worker] Zamknięto")
@@ -299,6 +454,8 @@ class TimerWorker:
         """Zatrzymuje worker"""
         print("[Timer Worker] Zatrzymywanie...")
         self.running = False
+        if self.scheduler:
+            self.scheduler.stop()
 
 
 # ============================================================================
@@ -312,10 +469,20 @@ async def main_standalone():
     Użycie:
         python timer_worker.py
     """
+    redis_client = None
+    try:
+        from config import settings
+        if settings.STORAGE_BACKEND == "cluster":
+            from services.storage_service import create_storage_client
+            redis_client = create_storage_client()
+    except ImportError:
+        pass
+    
     worker = TimerWorker(
         redis_url="redis://localhost",
         check_interval=1.0,
-        debug=True
+        debug=True,
+        redis_client=redis_client
     )
     
     try:
@@ -15,6 +15,101 @@ from config import settings
 
 cleanup_task: Optional[asyncio.Task] = None
 
+# Progi czyszczenia (sekundy)
+FINISHED_GAME_TTL = 600          # ZAKONCZONA - 10 min bez aktywności
+EMPTY_LOBBY_IDLE_TIMEOUT = 300   # LOBBY bez prawdziwych graczy - 5 min
+LOBBY_IDLE_TIMEOUT = 1800        # LOBBY nieaktywne - 30 min
+GAME_IDLE_TIMEOUT = 3600         # W_GRZE / W_TRAKCIE nieaktywne - 1h
+CLEANUP_BATCH_SIZE = 500         # Maksymalnie tyle kandydatów na regułę w jednym przebiegu
+
+# Metryki garbage collectora (dla /api/admin i get_cleanup_stats)
+cleanup_metrics = {
+    'runs': 0,
+    'last_run_at': None,
+    'last_run_duration_ms': 0.0,
+    'last_candidates': 0,
+    'last_deleted': 0,
+    'deleted_total': 0,
+    'deleted_by_reason': {},
+    'index_pruned_total': 0,
+}
+
+async def collect_cleanup_candidates(redis: RedisService) -> dict:
+    """
+    Wybierz lobby do usunięcia na podstawie indeksu (ZSET po created_at /
+    last_activity per status) - dotykamy tylko kandydatów powyżej progu.
+    
+    Returns:
+        dict: game_id -> powód
+    """
+    max_age = settings.MAX_LOBBY_AGE_HOURS * 3600  # Godziny -> sekundy
+    to_delete = {}
+    
+    # 1. Starsze niż MAX_LOBBY_AGE_HOURS
+    for lobby_id in await redis.find_lobbies_older_than(max_age, CLEANUP_BATCH_SIZE):
+        to_delete[lobby_id] = "stare"
+    
+    # 2. Status ZAKONCZONA i bez aktywności > 10 min
+    for lobby_id in await redis.find_lobbies_idle('ZAKONCZONA', FINISHED_GAME_TTL, CLEANUP_BATCH_SIZE):
+        to_delete.setdefault(lobby_id, "zakończone > 10min")
+    
+    # 3./4. LOBBY: puste (same boty) > 5 min lub nieaktywne > 30 min
+    idle_lobbies = await redis.find_lobbies_idle('LOBBY', EMPTY_LOBBY_IDLE_TIMEOUT, CLEANUP_BATCH_SIZE)
+    if idle_lobbies:
+        summaries = await redis.get_lobby_summaries(idle_lobbies)
+        current_time = time.time()
+        for lobby_id in idle_lobbies:
+            summary = summaries.get(lobby_id)
+            if not summary:
+                continue
+            idle_time = current_time - (summary.get('last_activity') or 0)
+            if summary.get('humans', 0) == 0:
+                to_delete.setdefault(lobby_id, "puste lobby > 5min")
+            elif idle_time > LOBBY_IDLE_TIMEOUT:
+                to_delete.setdefault(lobby_id, "nieaktywne lobby")
+    
+    # 5. Gra W_GRZE nieaktywna przez 1h (prawdopodobnie bug)
+    for status in ['W_GRZE', 'W_TRAKCIE']:
+        for lobby_id in await redis.find_lobbies_idle(status, GAME_IDLE_TIMEOUT, CLEANUP_BATCH_SIZE):
+            to_delete.setdefault(lobby_id, "nieaktywna gra")
+    
+    return to_delete
+
+async def run_cleanup_pass(redis: RedisService) -> dict:
+    """
+    Jeden przebieg garbage collectora
+    
+    Returns:
+        dict: {powód: liczba usuniętych}
+    """
+    started = time.perf_counter()
+    
+    # Wpisy indeksu po lobby wygasłych (TTL) - inaczej count_lobbies je liczy;
+    # jedna partia kandydatów na przebieg (kursor między przebiegami)
+    pruned = await redis.prune_lobby_index(CLEANUP_BATCH_SIZE)
+    
+    to_delete = await collect_cleanup_candidates(redis)
+    deleted = await redis.purge_games(list(to_delete.keys()))
+    
+    by_reason = {}
+    if deleted:
+        for lobby_id, reason in to_delete.items():
+            by_reason[reason] = by_reason.get(reason, 0) + 1
+            print(f"[Cleanup] Usunięto lobby {lobby_id} ({reason})")
+    
+    # Metryki
+    cleanup_metrics['runs'] += 1
+    cleanup_metrics['last_run_at'] = time.time()
+    cleanup_metrics['last_run_duration_ms'] = round((time.perf_counter() - started) * 1000, 2)
+    cleanup_metrics['last_candidates'] = len(to_delete)
+    cleanup_metrics['last_deleted'] = deleted
+    cleanup_metrics['deleted_total'] += deleted
+    cleanup_metrics['index_pruned_total'] += pruned
+    for reason, count in by_reason.items():
+        cleanup_metrics['deleted_by_reason'][reason] = cleanup_metrics['deleted_by_reason'].get(reason, 0) + count
+    
+    return by_reason
+
 async def cleanup_old_games():
     """
     Periodic task - czyści stare gry/lobby
@@ -28,68 +123,12 @@ async def cleanup_old_games():
             
             print("[Cleanup] Rozpoczynam czyszczenie starych gier...")
             
-            # Pobierz wszystkie lobby
-            lobbies = await redis.list_lobbies()
-            
-            current_time = time.time()
-            max_age = settings.MAX_LOBBY_AGE_HOURS * 3600  # Godziny -> sekundy
-            lobby_idle_timeout = 1800  # 30 minut bez aktywności dla LOBBY
-            game_idle_timeout = 3600   # 1 godzina dla gier W_GRZE
-            
-            cleaned = 0
-            inactive_kicked = 0
-            
-            for lobby in lobbies:
-                lobby_id = lobby.get('id_gry')
-                created_at = lobby.get('created_at', 0)
-                status = lobby.get('status_partii', 'UNKNOWN')
-                last_activity = lobby.get('last_activity', created_at)
-                slots = lobby.get('slots', [])
-                
-                # Oblicz wiek lobby i czas nieaktywności
-                age = current_time - created_at
-                idle_time = current_time - last_activity
-                
-                # Sprawdź czy są prawdziwi gracze (nie boty)
-                real_players = sum(1 for s in slots if s.get('typ') == 'gracz' and s.get('nazwa'))
-                
-                # Usuń jeśli:
-                should_delete = False
-                reason = ""
-                
-                # 1. Starsze niż MAX_LOBBY_AGE_HOURS
-                if age > max_age:
-                    should_delete = True
-                    reason = f"stare ({age/3600:.1f}h)"
-                
-                # 2. Status ZAKONCZONA i starsze niż 10 min
-                elif status == 'ZAKONCZONA' and age > 600:
-                    should_delete = True
-                    reason = "zakończone > 10min"
-                
-                # 3. LOBBY bez graczy (same boty lub puste) przez 5 min
-                elif status == 'LOBBY' and real_players == 0 and idle_time > 300:
-                    should_delete = True
-                    reason = "puste lobby > 5min"
-                
-                # 4. LOBBY nieaktywne przez 30 min
-                elif status == 'LOBBY' and idle_time > lobby_idle_timeout:
-                    should_delete = True
-                    reason = f"nieaktywne lobby ({idle_time/60:.0f}min)"
-                
-                # 5. Gra W_GRZE nieaktywna przez 1h (prawdopodobnie bug)
-                elif status in ['W_GRZE', 'W_TRAKCIE'] and idle_time > game_idle_timeout:
-                    should_delete = True
-                    reason = f"nieaktywna gra ({idle_time/60:.0f}min)"
-                
-                if should_delete:
-                    # Usuń lobby i silnik
-                    await redis.delete_game(lobby_id)
-                    cleaned += 1
-                    print(f"[Cleanup] Usunięto lobby {lobby_id} ({reason})")
+            by_reason = await run_cleanup_pass(redis)
+            cleaned = sum(by_reason.values())
             
             if cleaned > 0:
-                print(f"[Cleanup] Wyczyszczono {cleaned} starych gier")
+                print(f"[Cleanup] Wyczyszczono {cleaned} starych gier "
+                      f"({cleanup_metrics['last_run_duration_ms']}ms)")
             else:
                 print("[Cleanup] Brak gier do wyczyszczenia")
         
@@ -132,42 +171,24 @@ async def stop_cleanup():
 
 inactive_users_task: Optional[asyncio.Task] = None
 
+# Co ile sekund synchronizować status online/offline z bazą
+PRESENCE_SYNC_INTERVAL = 60
+
 async def cleanup_inactive_users():
     """
-    Periodic task - ustawia offline użytkowników bez heartbeat
-    Uruchamiany co 2 minuty
+    Periodic task - zbiorcza synchronizacja users.status z obecnością w Redis
+    Uruchamiany co PRESENCE_SYNC_INTERVAL sekund
     """
-    from services.redis_service import RedisService
-    from database import async_sessionmaker, User
-    from sqlalchemy import select, update
+    from services.presence_service import presence_service
     
     while True:
         try:
-            await asyncio.sleep(120)  # 2 minuty
+            await asyncio.sleep(PRESENCE_SYNC_INTERVAL)
             
-            redis = RedisService()
+            result = await presence_service.sync_status_to_db()
             
-            async with async_sessionmaker() as session:
-                # Pobierz wszystkich online userów
-                result = await session.execute(
-                    select(User).where(User.status == 'online')
-                )
-                online_users = result.scalars().all()
-                
-                offline_count = 0
-                
-                for user in online_users:
-                    # Sprawdź czy ma aktywny heartbeat w Redis
-                    heartbeat = await redis.redis.get(f"heartbeat:{user.id}")
-                    
-                    if not heartbeat:
-                        # Brak heartbeat - ustaw offline
-                        user.status = 'offline'
-                        offline_count += 1
-                
-                if offline_count > 0:
-                    await session.commit()
-                    print(f"[📴 Cleanup] Ustawiono {offline_count} użytkowników na offline")
+            if result['offline'] > 0:
+                print(f"[📴 Cleanup] Ustawiono {result['offline']} użytkowników na offline")
         
         except Exception as e:
             print(f"[Cleanup Users] Błąd: {e}")
@@ -214,7 +235,7 @@ async def cleanup_specific_game(game_id: str) -> bool:
     """
     try:
         redis = RedisService()
-        await redis.delete_game(game_id)
+        await redis.purge_games([game_id])
         print(f"[Cleanup] Ręcznie usunięto grę {game_id}")
         return True
     except Exception as e:
@@ -235,37 +256,24 @@ async def cleanup_disconnected_players():
 
 async def get_cleanup_stats() -> dict:
     """
-    Statystyki cleanup
+    Statystyki cleanup (z indeksu lobby - bez ładowania lobby)
     
     Returns:
         dict: Statystyki
     """
     redis = RedisService()
-    lobbies = await redis.list_lobbies()
-    
-    current_time = time.time()
     
     stats = {
-        'total_lobbies': len(lobbies),
+        'total_lobbies': await redis.count_lobbies(),
         'by_status': {},
-        'old_lobbies': 0,
-        'active_games': 0
+        'old_lobbies': len(await redis.find_lobbies_older_than(settings.MAX_LOBBY_AGE_HOURS * 3600)),
+        'active_games': await redis.count_lobbies(status=['W_GRZE', 'W_TRAKCIE']),
+        'gc': dict(cleanup_metrics)
     }
     
-    for lobby in lobbies:
-        status = lobby.get('status_partii', 'UNKNOWN')
-        created_at = lobby.get('created_at', 0)
-        age_hours = (current_time - created_at) / 3600
-        
-        # Count by status
-        stats['by_status'][status] = stats['by_status'].get(status, 0) + 1
-        
-        # Count old
-        if age_hours > settings.MAX_LOBBY_AGE_HOURS:
-            stats['old_lobbies'] += 1
-        
-        # Count active
-        if status in ['W_GRZE', 'W_TRAKCIE', 'IN_PROGRESS']:
-            stats['active_games'] += 1
+    for status in ['LOBBY', 'W_GRZE', 'W_TRAKCIE', 'ZAKONCZONA']:
+        count = await redis.count_lobbies(status=status)
+        if count:
+            stats['by_status'][status] = count
     
-    return stats
\ No newline at end of file
+    return stats